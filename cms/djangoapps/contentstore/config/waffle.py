@@ -11,6 +11,7 @@ WAFFLE_NAMESPACE = u'studio'
 
 # Switches
 ENABLE_ACCESSIBILITY_POLICY_PAGE = u'enable_policy_page'
+GENERATE_ASSET_THUMBNAILS_ASYNC = u'generate_asset_thumbnails_async'
 
 
 def waffle():
@@ -25,7 +25,7 @@ from django.core.files.base import ContentFile
 from django.test import RequestFactory
 from django.utils.text import get_valid_filename
 from django.utils.translation import ugettext as _
-from opaque_keys.edx.keys import CourseKey
+from opaque_keys.edx.keys import AssetKey, CourseKey
 from opaque_keys.edx.locator import LibraryLocator
 from organizations.models import OrganizationCourse
 from path import Path as path
@@ -35,19 +35,21 @@ from six.moves import range
 from user_tasks.models import UserTaskArtifact, UserTaskStatus
 from user_tasks.tasks import UserTask
 
+from contentstore.config.waffle import GENERATE_ASSET_THUMBNAILS_ASYNC, waffle
 from contentstore.courseware_index import CoursewareSearchIndexer, LibrarySearchIndexer, SearchIndexingError
 from contentstore.storage import course_import_export_storage
 from contentstore.utils import initialize_permissions, reverse_usage_url, translation_language
 from contentstore.video_utils import scrape_youtube_thumbnail
 from course_action_state.models import CourseRerunState
 from models.settings.course_metadata import CourseMetadata
+from openedx.core.djangoapps.contentserver.caching import del_cached_content, invalidate_course_assets
 from openedx.core.djangoapps.embargo.models import CountryAccessRule, RestrictedCourse
 from openedx.core.lib.extract_tar import safetar_extractall
 from student.auth import has_course_author_access
 from util.organizations_helpers import add_organization_course, get_organization_by_short_name
 from xmodule.contentstore.django import contentstore
 from xmodule.course_module import CourseFields
-from xmodule.exceptions import SerializationError
+from xmodule.exceptions import NotFoundError, SerializationError
 from xmodule.modulestore import COURSE_ROOT, LIBRARY_ROOT
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.exceptions import DuplicateCourseError, ItemNotFoundError
@@ -201,6 +203,52 @@ def update_library_index(library_id, triggered_time_isoformat):
         LOGGER.debug(u'Search indexing successful for library %s', library_id)
 
 
+def queue_asset_thumbnail_generation(asset_keys):
+    """
+    Queues tasks generating the thumbnails of the given assets, in batches of
+    ASSET_THUMBNAIL_BATCH_SIZE assets. Course imports queue all their images at once.
+    """
+    asset_key_strings = [text_type(asset_key) for asset_key in asset_keys]
+    batch_size = settings.ASSET_THUMBNAIL_BATCH_SIZE
+    for start in range(0, len(asset_key_strings), batch_size):
+        generate_asset_thumbnails.delay(asset_key_strings[start:start + batch_size])
+
+
+@task()
+def generate_asset_thumbnails(asset_key_strings):
+    """
+    Generates the thumbnails of a batch of uploaded images: the default one, which
+    is recorded on the asset, and the ones configured by ASSET_THUMBNAIL_SIZES and
+    ASSET_THUMBNAIL_WEBP.
+    """
+    store = contentstore()
+    thumbnail_attrs = {}
+    for asset_key_string in asset_key_strings:
+        asset_key = AssetKey.from_string(asset_key_string)
+        content = store.find(asset_key, throw_on_not_found=False)
+        if content is None:
+            LOGGER.info(u'Asset %s was deleted before its thumbnails were generated', asset_key_string)
+            continue
+
+        thumbnail_content, thumbnail_location = store.generate_thumbnail(content)
+        # delete cached thumbnails even if they couldn't be created this time (else the old ones will continue to show)
+        del_cached_content(thumbnail_location)
+        for variant_location in store.generate_thumbnail_variants(
+            content, sizes=settings.ASSET_THUMBNAIL_SIZES, webp=settings.ASSET_THUMBNAIL_WEBP
+        ):
+            del_cached_content(variant_location)
+
+        if thumbnail_content is not None:
+            thumbnail_attrs[asset_key] = {'thumbnail_location': thumbnail_location.to_deprecated_list_repr()}
+
+    try:
+        store.set_attrs_for_assets(thumbnail_attrs)
+    except NotFoundError:
+        LOGGER.info(u'Some assets were deleted before their thumbnails were recorded: %s', asset_key_strings)
+    for asset_key in thumbnail_attrs:
+        del_cached_content(asset_key)
+
+
 class CourseExportTask(UserTask):  # pylint: disable=abstract-method
     """
     Base class for course and library export tasks.
@@ -510,7 +558,10 @@ def import_olx(self, user_id, course_key_string, archive_path, archive_name, lan
             settings.GITHUB_REPO_ROOT, [dirpath],
             load_error_modules=False,
             static_content_store=contentstore(),
-            target_id=courselike_key
+            target_id=courselike_key,
+            queue_thumbnails=(
+                queue_asset_thumbnail_generation if waffle().is_enabled(GENERATE_ASSET_THUMBNAILS_ASYNC) else None
+            ),
         )
 
         new_location = courselike_items[0].location
@@ -521,6 +572,9 @@ def import_olx(self, user_id, course_key_string, archive_path, archive_name, lan
         LOGGER.exception(u'error importing course', exc_info=True)
         self.status.fail(text_type(exception))
     finally:
+        if is_course:
+            # Imported assets are saved straight to the contentstore, even if the import fails midway.
+            invalidate_course_assets(courselike_key)
         if course_dir.isdir():
             shutil.rmtree(course_dir)
             LOGGER.info(u'Course import %s: Temp data cleared', courselike_key)
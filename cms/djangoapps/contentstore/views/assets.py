@@ -19,6 +19,8 @@ from opaque_keys.edx.keys import AssetKey, CourseKey
 from pymongo import ASCENDING, DESCENDING
 from six import text_type
 
+from contentstore.config.waffle import GENERATE_ASSET_THUMBNAILS_ASYNC, waffle
+from contentstore.tasks import queue_asset_thumbnail_generation
 from contentstore.views.exception import AssetNotFoundException, AssetSizeTooLargeException
 from edxmako.shortcuts import render_to_response
 from openedx.core.djangoapps.contentserver.caching import del_cached_content
@@ -380,6 +382,13 @@ def update_course_run_asset(course_key, upload_file):
 
     content, temporary_file_path = _get_file_content_and_path(file_metadata, course_key)
 
+    if waffle().is_enabled(GENERATE_ASSET_THUMBNAILS_ASYNC) and _is_image(content):
+        # Save the image right away, and let celery generate its thumbnails.
+        contentstore().save(content)
+        del_cached_content(content.location)
+        queue_asset_thumbnail_generation([content.location])
+        return content
+
     (thumbnail_content, thumbnail_location) = contentstore().generate_thumbnail(content,
                                                                                 tempfile_path=temporary_file_path)
 
@@ -499,6 +508,11 @@ def _get_file_content_and_path(file_metadata, course_key):
     return content, temporary_file_path
 
 
+def _is_image(content):
+    """returns whether the content is an image, which thumbnails can be generated for"""
+    return content.content_type is not None and content.content_type.split('/')[0] == 'image'
+
+
 def _check_thumbnail_uploaded(thumbnail_content):
     """returns whether thumbnail is None"""
     return thumbnail_content is not None
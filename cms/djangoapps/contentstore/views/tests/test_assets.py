@@ -17,6 +17,7 @@ from opaque_keys.edx.keys import AssetKey
 from opaque_keys.edx.locator import CourseLocator
 from PIL import Image
 from pytz import UTC
+from waffle.testutils import override_switch
 
 from contentstore.tests.utils import CourseTestCase
 from contentstore.utils import reverse_course_url
@@ -354,6 +355,32 @@ class UploadTestCase(AssetsTestCase):
         resp = self.upload_asset("test_image", asset_type="image")
         self.assertEqual(resp.status_code, 200)
 
+    @override_switch('studio.generate_asset_thumbnails_async', True)
+    @override_settings(ASSET_THUMBNAIL_SIZES=[(32, 32)])
+    def test_upload_image_async_thumbnails(self):
+        with patch('contentstore.views.assets.queue_asset_thumbnail_generation',
+                   wraps=assets.queue_asset_thumbnail_generation) as mock_queue:
+            resp = self.upload_asset("test_image", asset_type="image")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(json.loads(resp.content.decode('utf-8'))['asset']['thumbnail'])
+
+        asset_key = self.course.id.make_asset_key('asset', 'test_image.jpg')
+        mock_queue.assert_called_once_with([asset_key])
+        # celery runs eagerly in tests, so the thumbnails have been generated by now
+        content = contentstore().find(asset_key)
+        self.assertEqual(content.thumbnail_location, self.course.id.make_asset_key('thumbnail', 'test_image.jpg'))
+        self.assertIsNotNone(contentstore().find(content.thumbnail_location))
+        self.assertIsNotNone(
+            contentstore().find(self.course.id.make_asset_key('thumbnail', 'test_image-32x32.jpg'))
+        )
+
+    @override_switch('studio.generate_asset_thumbnails_async', True)
+    def test_upload_text_async_thumbnails(self):
+        with patch('contentstore.views.assets.queue_asset_thumbnail_generation') as mock_queue:
+            resp = self.upload_asset()
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(mock_queue.called)
+
     @data(
         (int(MAX_FILE_SIZE / 2.0), "small.file.test", 200),
         (MAX_FILE_SIZE, "justequals.file.test", 200),
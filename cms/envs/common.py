@@ -889,6 +889,14 @@ CODE_JAIL = {
         # Needs to be non-zero so that jailed code can use it as their temp directory.(1MiB in bytes)
         'FSIZE': 1048576,
     },
+
+    # Pre-warmed sandboxes each process keeps (see common/lib/capa/capa/safe_exec/README.rst).
+    'pool': {
+        # How many? 0 runs every execution in a sandbox of its own.
+        'SIZE': 0,
+        # After how many executions is a sandbox replaced?
+        'MAX_EXECUTIONS': 100,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -1011,6 +1019,11 @@ PIPELINE = {
 STATICFILES_STORAGE = 'openedx.core.storage.ProductionStorage'
 STATICFILES_STORAGE_KWARGS = {}
 
+# Number of staticfiles lookups, and of pieces of HTML with rewritten static URLs,
+# each process remembers (see static_replace).  0 disables these caches, as well
+# as the use of cached course asset manifests.
+STATIC_REPLACE_CACHE_SIZE = 1000
+
 # List of finder classes that know how to find static files in various locations.
 # Note: the pipeline finder is included to be able to discover optimized files
 STATICFILES_FINDERS = [
@@ -1677,6 +1690,15 @@ MAX_ASSET_UPLOAD_FILE_SIZE_IN_MB = 10
 # a file that exceeds the above size
 MAX_ASSET_UPLOAD_FILE_SIZE_URL = ""
 
+### Thumbnails of uploaded images, generated by celery when the
+### studio.generate_asset_thumbnails_async switch is enabled: the (width, height)
+### of the thumbnails generated in addition to the default one, whether to also
+### generate WebP versions of them, and the number of assets per task. The images
+### of a course import are queued together; Studio uploads send one file per request.
+ASSET_THUMBNAIL_SIZES = []
+ASSET_THUMBNAIL_WEBP = False
+ASSET_THUMBNAIL_BATCH_SIZE = 20
+
 ### Default value for entrance exam minimum score
 ENTRANCE_EXAM_MIN_SCORE_PCT = 50
 
@@ -1894,6 +1916,19 @@ CACHES = {
     },
 }
 
+# Local disk cache for course assets too large to be held in the course_assets
+# cache.  Disabled unless DIRECTORY is set; MAX_SIZE bounds the total size of
+# the cache and MAX_FILE_SIZE the size of any single asset in it, in bytes.
+CONTENTSERVER_DISK_CACHE = {
+    'DIRECTORY': None,
+    'MAX_SIZE': 10 * 1024 ** 3,
+    'MAX_FILE_SIZE': 2 * 1024 ** 3,
+}
+
+# Whether to serve the WebP version of an asset thumbnail, when one was generated,
+# to browsers which accept WebP.
+CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS = False
+
 ############################ OAUTH2 Provider ###################################
 
 
@@ -199,6 +199,14 @@ ALLOWED_HOSTS = [
 LOG_DIR = ENV_TOKENS['LOG_DIR']
 DATA_DIR = path(ENV_TOKENS.get('DATA_DIR', DATA_DIR))
 
+CONTENTSERVER_DISK_CACHE = ENV_TOKENS.get('CONTENTSERVER_DISK_CACHE', CONTENTSERVER_DISK_CACHE)
+CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS = ENV_TOKENS.get(
+    'CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS', CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS
+)
+ASSET_THUMBNAIL_SIZES = ENV_TOKENS.get('ASSET_THUMBNAIL_SIZES', ASSET_THUMBNAIL_SIZES)
+ASSET_THUMBNAIL_WEBP = ENV_TOKENS.get('ASSET_THUMBNAIL_WEBP', ASSET_THUMBNAIL_WEBP)
+ASSET_THUMBNAIL_BATCH_SIZE = ENV_TOKENS.get('ASSET_THUMBNAIL_BATCH_SIZE', ASSET_THUMBNAIL_BATCH_SIZE)
+
 CACHES = ENV_TOKENS['CACHES']
 # Cache used for location mapping -- called many times with the same key/value
 # in a given request.
@@ -216,6 +224,7 @@ if 'staticfiles' in CACHES:
 # Once we have migrated to service assets off S3, then we can convert this back to
 # managed by the yaml file contents
 STATICFILES_STORAGE = os.environ.get('STATICFILES_STORAGE', ENV_TOKENS.get('STATICFILES_STORAGE', STATICFILES_STORAGE))
+STATIC_REPLACE_CACHE_SIZE = ENV_TOKENS.get('STATIC_REPLACE_CACHE_SIZE', STATIC_REPLACE_CACHE_SIZE)
 
 # Load all AWS_ prefixed variables to allow an S3Boto3Storage to be configured
 _locals = locals()
@@ -36,6 +36,10 @@ class MakoLoader(object):
             module_directory = mkdtemp_clean()
 
         self.module_directory = module_directory
+        # Compiled Django templates, with the source they were compiled from,
+        # by absolute path, so that templates rendered over and over, such as
+        # the bodies of ACE emails, are not parsed each time.
+        self.template_cache = {}
 
     def __call__(self, template_name, template_dirs=None):
         return self.load_template(template_name)
@@ -67,8 +71,12 @@ class MakoLoader(object):
             return template
         else:
             # This is a regular template
+            cached = self.template_cache.get(origin.name)
+            if cached is not None and cached[0] == source:
+                return cached[1]
             try:
                 template = Engine.get_default().from_string(source)
+                self.template_cache[origin.name] = (source, template)
                 return template
             except ImproperlyConfigured:
                 # Either no DjangoTemplates engine was configured -or- multiple engines
@@ -93,6 +101,7 @@ class MakoLoader(object):
         raise TemplateDoesNotExist(template_name)
 
     def reset(self):
+        self.template_cache.clear()
         self.base_loader.reset()
 
 
@@ -1,5 +1,8 @@
 
 
+import os
+import shutil
+import tempfile
 import unittest
 
 import ddt
@@ -13,6 +16,7 @@ from edx_django_utils.cache import RequestCache
 from mock import Mock, patch
 
 from edxmako import LOOKUP, add_lookup
+from edxmako.makoloader import MakoFilesystemLoader
 from edxmako.request_context import get_template_request_context
 from edxmako.shortcuts import is_any_marketing_link_set, is_marketing_link_set, marketing_link, render_to_string
 from student.tests.factories import UserFactory
@@ -126,6 +130,34 @@ class AddLookupTests(TestCase):
         self.assertTrue(dirs[0].endswith('management'))
 
 
+class MakoLoaderTests(TestCase):
+    """
+    Test loading Django templates with the mako-aware loaders.
+    """
+    def setUp(self):
+        super(MakoLoaderTests, self).setUp()
+        self.template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.template_dir)
+        self.template_path = os.path.join(self.template_dir, 'greeting.html')
+        self.write_template(u'Hello {{ name }}')
+        self.loader = MakoFilesystemLoader(Mock(dirs=[self.template_dir], file_charset='utf-8'))
+
+    def write_template(self, source):
+        with open(self.template_path, 'w') as template_file:
+            template_file.write(source)
+
+    def test_django_templates_are_compiled_once(self):
+        template = self.loader.load_template('greeting.html')
+        self.assertIs(self.loader.load_template('greeting.html'), template)
+
+    def test_changed_templates_are_compiled_again(self):
+        template = self.loader.load_template('greeting.html')
+        self.write_template(u'Goodbye {{ name }}')
+        changed_template = self.loader.load_template('greeting.html')
+        self.assertIsNot(changed_template, template)
+        self.assertIn(u'Goodbye', changed_template.source)
+
+
 class MakoRequestContextTest(TestCase):
     """
     Test MakoMiddleware.
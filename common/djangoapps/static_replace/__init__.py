@@ -1,7 +1,24 @@
-
-
+"""
+Rewriting of /static/, /course/ and /jump_to_id/ URLs in course content.
+
+Rewriting a piece of HTML means running regexes over it and looking up every
+static URL it contains, in the staticfiles storage and the contentstore. When
+STATIC_REPLACE_CACHE_SIZE is set, each process remembers that many staticfiles
+lookups, and that many rewritten pieces of HTML, keyed by a hash of the HTML
+and by everything the rewrite depends on, including the generation of the
+course's assets (see `get_course_assets_generation`), so that the rewritten
+HTML is not reused once any asset of the course changes.  Course asset URLs
+are then also versioned from the course's asset manifest, which is built once
+per generation, rather than by looking up each asset.
+"""
+
+
+import functools
+import hashlib
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 import six
 from django.conf import settings
@@ -10,12 +27,98 @@ from django.contrib.staticfiles.storage import staticfiles_storage
 from opaque_keys.edx.locator import AssetLocator
 from six import text_type
 
+from openedx.core.djangoapps.contentserver.caching import get_course_asset_manifest, get_course_assets_generation
 from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 XBLOCK_STATIC_RESOURCE_PREFIX = '/static/xblock'
 
 
+class _LRUCache(object):
+    """
+    A thread-safe, least recently used cache holding up to STATIC_REPLACE_CACHE_SIZE values.
+    """
+    def __init__(self):
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def max_size():
+        """
+        The maximum number of values held, or 0 if caching is disabled.
+        """
+        if settings.DEBUG:
+            # Static files are collected and course content edited while developing.
+            return 0
+        return getattr(settings, 'STATIC_REPLACE_CACHE_SIZE', 0)
+
+    def get(self, key):
+        """
+        Returns the value cached for key, or None.
+        """
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Caches value for key, evicting the least recently used values if the cache is full.
+        """
+        max_size = self.max_size()
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+_staticfiles_lookups = _LRUCache()
+_rewritten_html = _LRUCache()
+
+
+def _cached(cache, key, compute):
+    """
+    Returns the value cached for key in cache, computing and caching it if needed.
+    """
+    if not cache.max_size() or key is None:
+        return compute()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def _staticfiles_exists(path):
+    """
+    Returns whether path exists in staticfiles_storage, remembering the answer.
+    """
+    return _cached(_staticfiles_lookups, (u'exists', path), lambda: staticfiles_storage.exists(path))
+
+
+def _staticfiles_url(path):
+    """
+    Returns the staticfiles_storage URL of path, remembering it.
+    """
+    return _cached(_staticfiles_lookups, (u'url', path), lambda: staticfiles_storage.url(path))
+
+
+def _rewrite_cache_key(text, *parts):
+    """
+    Returns the key under which the rewrite of text, which depends on parts, is cached.
+    """
+    if not _rewritten_html.max_size():
+        return None
+    data = text.encode('utf-8') if isinstance(text, six.text_type) else text
+    return (hashlib.sha1(data).hexdigest(),) + parts
+
+
 def _url_replace_regex(prefix):
     """
     Match static urls in quotes that don't end in '?raw'.
@@ -32,13 +135,21 @@ def _url_replace_regex(prefix):
         """.format(prefix=prefix)
 
 
+@functools.lru_cache(maxsize=64)
+def _compiled_url_replace_regex(prefix):
+    """
+    Returns the compiled `_url_replace_regex` for prefix.
+    """
+    return re.compile(_url_replace_regex(prefix))
+
+
 def try_staticfiles_lookup(path):
     """
     Try to lookup a path in staticfiles_storage.  If it fails, return
     a dead link instead of raising an exception.
     """
     try:
-        url = staticfiles_storage.url(path)
+        url = _staticfiles_url(path)
     except Exception as err:
         log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
             path, str(err)))
@@ -68,12 +179,15 @@ def replace_jump_to_id_urls(text, course_id, jump_to_id_base_url):
     output: <text> after the link rewriting rules are applied
     """
 
+    if '/jump_to_id/' not in text:
+        return text
+
     def replace_jump_to_id_url(match):
         quote = match.group('quote')
         rest = match.group('rest')
         return "".join([quote, jump_to_id_base_url + rest, quote])
 
-    return re.sub(_url_replace_regex('/jump_to_id/'), replace_jump_to_id_url, text)
+    return _compiled_url_replace_regex('/jump_to_id/').sub(replace_jump_to_id_url, text)
 
 
 def replace_course_urls(text, course_key):
@@ -86,6 +200,9 @@ def replace_course_urls(text, course_key):
     returns: text with the links replaced
     """
 
+    if '/course/' not in text:
+        return text
+
     course_id = text_type(course_key)
 
     def replace_course_url(match):
@@ -93,7 +210,7 @@ def replace_course_urls(text, course_key):
         rest = match.group('rest')
         return "".join([quote, '/courses/' + course_id + '/', rest, quote])
 
-    return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
+    return _compiled_url_replace_regex('/course/').sub(replace_course_url, text)
 
 
 def process_static_urls(text, replacement_function, data_dir=None):
@@ -123,14 +240,13 @@ def process_static_urls(text, replacement_function, data_dir=None):
 
         return replacement_function(original, prefix, quote, rest)
 
-    return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=data_dir
-        )),
-        wrap_part_extraction,
-        text
-    )
+    if '/static/' not in text and six.text_type(settings.STATIC_URL) not in text:
+        return text
+
+    return _compiled_url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=data_dir
+    )).sub(wrap_part_extraction, text)
 
 
 def make_static_urls_absolute(request, html):
@@ -169,6 +285,48 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
     if static_paths_out is None:
         static_paths_out = []
 
+    cache_key = None
+    if course_id and not static_asset_path:
+        # Course asset URLs depend on the assets themselves, and on the CDN configuration.
+        # Assets missing from the contentstore fall back to data_directory.
+        from static_replace.models import AssetBaseUrlConfig, AssetExcludedExtensionsConfig
+        generation = get_course_assets_generation(course_id) if _rewritten_html.max_size() else None
+        if generation is not None:
+            cache_key = _rewrite_cache_key(
+                text, u'static', text_type(course_id), data_directory, generation,
+                AssetBaseUrlConfig.get_base_url(),
+                tuple(AssetExcludedExtensionsConfig.get_excluded_extensions()),
+            )
+    else:
+        cache_key = _rewrite_cache_key(text, u'static', data_directory, static_asset_path)
+
+    def rewrite():
+        """
+        Returns the rewritten text along with its static paths.
+        """
+        paths = []
+        return _replace_static_urls(text, data_directory, course_id, static_asset_path, paths), tuple(paths)
+
+    rewritten, paths = _cached(_rewritten_html, cache_key, rewrite)
+    static_paths_out.extend(paths)
+    return rewritten
+
+
+def _replace_static_urls(text, data_directory, course_id, static_asset_path, static_paths_out):
+    """
+    Does the work of `replace_static_urls`.
+    """
+    asset_manifests = []
+
+    def get_asset_manifest():
+        """
+        Returns the asset manifest of the course, if any, fetching it the first time it's needed.
+        """
+        if not asset_manifests:
+            use_manifest = course_id and _rewritten_html.max_size()
+            asset_manifests.append(get_course_asset_manifest(course_id) if use_manifest else None)
+        return asset_manifests[0]
+
     def replace_static_url(original, prefix, quote, rest):
         """
         Replace a single matched url.
@@ -191,13 +349,13 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
 
             exists_in_staticfiles_storage = False
             try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
+                exists_in_staticfiles_storage = _staticfiles_exists(rest)
             except Exception as err:
                 log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
                     rest, str(err)))
 
             if exists_in_staticfiles_storage:
-                url = staticfiles_storage.url(rest)
+                url = _staticfiles_url(rest)
             else:
                 # if not, then assume it's courseware specific content and then look in the
                 # Mongo-backed database
@@ -205,7 +363,9 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
                 from static_replace.models import AssetBaseUrlConfig, AssetExcludedExtensionsConfig
                 base_url = AssetBaseUrlConfig.get_base_url()
                 excluded_exts = AssetExcludedExtensionsConfig.get_excluded_extensions()
-                url = StaticContent.get_canonicalized_asset_path(course_id, rest, base_url, excluded_exts)
+                url = StaticContent.get_canonicalized_asset_path(
+                    course_id, rest, base_url, excluded_exts, asset_manifest=get_asset_manifest()
+                )
 
                 if AssetLocator.CANONICAL_NAMESPACE in url:
                     url = url.replace('block@', 'block/', 1)
@@ -215,10 +375,10 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
             course_path = "/".join((static_asset_path or data_directory, rest))
 
             try:
-                if staticfiles_storage.exists(rest):
-                    url = staticfiles_storage.url(rest)
+                if _staticfiles_exists(rest):
+                    url = _staticfiles_url(rest)
                 else:
-                    url = staticfiles_storage.url(course_path)
+                    url = _staticfiles_url(course_path)
             # And if that fails, assume that it's course content, and add manually data directory
             except Exception as err:
                 log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
@@ -15,6 +15,8 @@ from opaque_keys.edx.keys import CourseKey
 from PIL import Image
 
 from static_replace import (
+    _rewritten_html,
+    _staticfiles_lookups,
     _url_replace_regex,
     make_static_urls_absolute,
     process_static_urls,
@@ -129,7 +131,9 @@ def test_mongo_filestore(mock_get_excluded_extensions, mock_get_base_url, mock_m
     assert '"' + mock_static_content.get_canonicalized_asset_path.return_value + '"' == \
         replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, course_id=COURSE_KEY)
 
-    mock_static_content.get_canonicalized_asset_path.assert_called_once_with(COURSE_KEY, 'file.png', u'', ['foobar'])
+    mock_static_content.get_canonicalized_asset_path.assert_called_once_with(
+        COURSE_KEY, 'file.png', u'', ['foobar'], asset_manifest=None
+    )
 
 
 @patch('static_replace.settings', autospec=True)
@@ -201,6 +205,61 @@ def test_static_paths_out(mock_modulestore, mock_storage):
     assert static_paths == [(static_url, static_course_url), (raw_url, raw_url)]
 
 
+@pytest.mark.django_db
+@override_settings(STATIC_REPLACE_CACHE_SIZE=10)
+@patch('static_replace.get_course_assets_generation')
+@patch('static_replace.StaticContent.get_canonicalized_asset_path', wraps=StaticContent.get_canonicalized_asset_path)
+@patch('static_replace.staticfiles_storage', autospec=True)
+@patch('xmodule.modulestore.django.modulestore', autospec=True)
+def test_rewrite_cache(mock_modulestore, mock_storage, mock_asset_path, mock_generation):
+    """
+    Rewritten text is reused, along with its static paths, until the course's assets change.
+    """
+    _rewritten_html.clear()
+    _staticfiles_lookups.clear()
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    mock_generation.return_value = 'generation-1'
+
+    text = 'EMBED src ="/static/file.png"'
+    expected = 'EMBED src ="/c4x/org/course/asset/file.png"'
+    expected_paths = [('/static/file.png', '/c4x/org/course/asset/file.png')]
+    for _ in range(2):
+        static_paths = []
+        assert replace_static_urls(text, DATA_DIRECTORY, COURSE_KEY, static_paths_out=static_paths) == expected
+        assert static_paths == expected_paths
+    assert mock_asset_path.call_count == 1
+
+    mock_generation.return_value = 'generation-2'
+    assert replace_static_urls(text, DATA_DIRECTORY, COURSE_KEY) == expected
+    assert mock_asset_path.call_count == 2
+    # Static URLs of the course may also point to its data directory.
+    assert replace_static_urls(text, 'other_data_dir', COURSE_KEY) == expected
+    assert mock_asset_path.call_count == 3
+    # Whether a path is a static file of the platform does not depend on the course.
+    assert mock_storage.exists.call_count == 1
+
+
+@pytest.mark.django_db
+@override_settings(STATIC_REPLACE_CACHE_SIZE=10)
+@patch('static_replace.get_course_assets_generation', return_value=None)
+@patch('static_replace.StaticContent.get_canonicalized_asset_path', wraps=StaticContent.get_canonicalized_asset_path)
+@patch('static_replace.staticfiles_storage', autospec=True)
+@patch('xmodule.modulestore.django.modulestore', autospec=True)
+def test_rewrite_not_cached_without_generation(mock_modulestore, mock_storage, mock_asset_path, _mock_generation):
+    """
+    Course asset URLs are rewritten every time if asset changes cannot be tracked.
+    """
+    _rewritten_html.clear()
+    _staticfiles_lookups.clear()
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+
+    replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_KEY)
+    replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_KEY)
+    assert mock_asset_path.call_count == 2
+
+
 def test_regex():
     yes = ('"/static/foo.png"',
            '"/static/foo.png"',
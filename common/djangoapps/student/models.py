@@ -1667,20 +1667,24 @@ class CourseEnrollment(models.Model):
         We try to preload all CourseOverviews, which are usually lazily loaded
         as the .course_overview property. This is to avoid making an extra
         query for every enrollment when displaying something like the student
-        dashboard. If some of the CourseOverviews are not found, we make no
-        attempt to initialize them -- we just fall back to existing lazy-load
-        behavior. The goal is to optimize the most common case as simply as
-        possible, without changing any of the existing contracts.
+        dashboard. The CourseOverviews are taken from those cached in the
+        process, which are shared with other requests. If some of them are
+        broken, we just fall back to existing lazy-load behavior.
 
         The name of this method is long, but was the end result of hashing out a
         number of alternatives, so pylint can stuff it (disable=invalid-name)
         """
-        enrollments = cls.enrollments_for_user(user).select_related('schedule', 'course', 'course__image_set')
+        enrollments = cls.enrollments_for_user(user).select_related('schedule')
 
         if courses_limit:
-            return enrollments.order_by('-created')[:courses_limit]
-        else:
-            return enrollments
+            enrollments = enrollments.order_by('-created')[:courses_limit]
+        enrollments = list(enrollments)
+
+        overviews = CourseOverview.get_from_ids_cached(enrollment.course_id for enrollment in enrollments)
+        for enrollment in enrollments:
+            if overviews[enrollment.course_id] is not None:
+                enrollment.course = overviews[enrollment.course_id]
+        return enrollments
 
     @classmethod
     def enrollment_status_hash_cache_key(cls, user):
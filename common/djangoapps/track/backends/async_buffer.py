@@ -0,0 +1,240 @@
+"""
+Event tracker backend that sends events from a background thread.
+
+Sending an event to most backends means serializing it and writing it to a
+file or a database, which every request emitting events otherwise pays for.
+`AsyncBufferedBackend` wraps another backend: `send` only appends the event
+to a bounded in-process buffer, and a background thread sends the buffered
+events to the wrapped backend in batches, through its `send_many` method if
+it has one.  It can wrap both ``TRACKING_BACKENDS`` and eventtracking
+backends, the latter including their processors::
+
+  TRACKING_BACKENDS = {
+      'logger': {
+          'ENGINE': 'track.backends.async_buffer.AsyncBufferedBackend',
+          'OPTIONS': {
+              'backend': {
+                  'ENGINE': 'track.backends.logger.LoggerBackend',
+                  'OPTIONS': {'name': 'tracking'},
+              },
+              'max_buffer_size': 10000,
+          }
+      }
+  }
+
+When the buffer is full, `send` waits up to ``block_timeout`` seconds for
+the thread to make room, then drops the event.  Dropped, sent and failed
+events are counted, see `stats`.  Buffered events are sent when the process
+exits, for at most ``shutdown_timeout`` seconds.
+"""
+
+
+import atexit
+import copy
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.utils.module_loading import import_string
+
+from track.backends import BaseBackend
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BUFFER_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BLOCK_TIMEOUT = 0.0
+DEFAULT_SHUTDOWN_TIMEOUT = 5.0
+
+
+class AsyncBufferedBackend(BaseBackend):
+    """
+    Event tracker backend that buffers events and sends them to another
+    backend in batches, from a background thread.
+    """
+
+    def __init__(self, backend, max_buffer_size=DEFAULT_MAX_BUFFER_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, block_timeout=DEFAULT_BLOCK_TIMEOUT,
+                 shutdown_timeout=DEFAULT_SHUTDOWN_TIMEOUT, **kwargs):
+        """
+        :Parameters:
+          - `backend`: the wrapped backend, or its configuration, as a dict
+            with an 'ENGINE' and optional 'OPTIONS'.
+          - `max_buffer_size`: number of events buffered before events are dropped.
+          - `batch_size`: maximum number of events sent to the wrapped backend at once.
+          - `flush_interval`: seconds the thread waits for a full batch before
+            sending the events buffered so far.
+          - `block_timeout`: seconds `send` waits for room in a full buffer
+            before dropping the event.
+          - `shutdown_timeout`: seconds spent at most sending buffered events at exit.
+        """
+        super(AsyncBufferedBackend, self).__init__(**kwargs)
+        if isinstance(backend, dict):
+            backend = import_string(backend['ENGINE'])(**backend.get('OPTIONS', {}))
+        self.backend = backend
+        self.max_buffer_size = max_buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.shutdown_timeout = shutdown_timeout
+
+        self._condition = threading.Condition()
+        self._buffer = deque()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._sending = 0
+        self._flushing = 0
+        self._counts = {'sent': 0, 'dropped': 0, 'failed': 0}
+        self._reported_drops = 0
+        atexit.register(self.close)
+
+    def send(self, event):
+        """
+        Buffers the event to be sent from the background thread, or drops it
+        if the buffer stays full for `block_timeout` seconds.
+        """
+        # Processors of eventtracking backends modify events in place, after
+        # the caller has moved on to other backends.
+        event = copy.deepcopy(event)
+        with self._condition:
+            self._ensure_thread()
+            if len(self._buffer) >= self.max_buffer_size and self.block_timeout > 0:
+                deadline = time.time() + self.block_timeout
+                while len(self._buffer) >= self.max_buffer_size and not self._closed:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            if len(self._buffer) >= self.max_buffer_size or self._closed:
+                self._counts['dropped'] += 1
+                return
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Waits until the events buffered so far have been sent, for at most
+        `timeout` seconds if given.  Returns whether they all were.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            self._ensure_thread()
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._buffer or self._sending:
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self):
+        """
+        Sends the buffered events, for at most `shutdown_timeout` seconds, and
+        stops the background thread.  Events sent afterwards are dropped.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            running = self._thread is not None and self._pid == os.getpid()
+            if not running:
+                self._closed = True
+        if running:
+            if not self.flush(self.shutdown_timeout):
+                log.warning(u'Dropping %d tracking events not sent at exit', len(self._buffer))
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+
+    def stats(self):
+        """
+        Returns the number of events sent, dropped because the buffer was
+        full, failed to be sent, and currently buffered.
+        """
+        with self._condition:
+            stats = dict(self._counts)
+            stats['buffered'] = len(self._buffer)
+        return stats
+
+    def _ensure_thread(self):
+        """
+        Starts the background thread, if it is not running in this process.
+
+        Must be called with the condition held.  A forked process, e.g. a
+        server worker, gets a thread of its own and drops the events it
+        inherited, which its parent will send.
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._buffer.clear()
+        self._sending = 0
+        self._flushing = 0
+        self._thread = threading.Thread(target=self._run, name='track-async-buffer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """
+        Sends buffered events in batches until closed.
+        """
+        while True:
+            with self._condition:
+                if not self._closed and (
+                        not self._buffer or (len(self._buffer) < self.batch_size and not self._flushing)
+                ):
+                    self._condition.wait(self.flush_interval)
+                if not self._buffer and self._closed:
+                    return
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._sending = len(batch)
+                # There is room in the buffer again.
+                self._condition.notify_all()
+            try:
+                if batch:
+                    self._send_batch(batch)
+            finally:
+                with self._condition:
+                    self._sending = 0
+                    self._condition.notify_all()
+                self._report_drops()
+
+    def _send_batch(self, batch):
+        """
+        Sends the events of `batch` to the wrapped backend.
+        """
+        send_many = getattr(self.backend, 'send_many', None)
+        if send_many is not None:
+            self._send_events(send_many, batch, len(batch))
+        else:
+            for event in batch:
+                self._send_events(self.backend.send, event, 1)
+
+    def _send_events(self, send, events, count):
+        """
+        Sends `count` events with `send`, and counts them as sent or failed.
+        """
+        try:
+            send(events)
+        except Exception:  # pylint: disable=broad-except
+            log.exception(u'Error sending %d tracking events', count)
+            with self._condition:
+                self._counts['failed'] += count
+        else:
+            with self._condition:
+                self._counts['sent'] += count
+
+    def _report_drops(self):
+        with self._condition:
+            dropped = self._counts['dropped'] - self._reported_drops
+            self._reported_drops = self._counts['dropped']
+        if dropped:
+            log.warning(u'Dropped %d tracking events because the buffer was full', dropped)
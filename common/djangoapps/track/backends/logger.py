@@ -1,13 +1,12 @@
 """Event tracker backend that saves events to a python logger."""
 
 
-import json
 import logging
 
 from django.conf import settings
 
 from track.backends import BaseBackend
-from track.utils import DateTimeJSONEncoder
+from track.serializers import get_event_serializer
 
 log = logging.getLogger('track.backends.logger')
 application_log = logging.getLogger('track.backends.application_log')  # pylint: disable=invalid-name
@@ -20,21 +19,34 @@ class LoggerBackend(BaseBackend):
 
     """
 
-    def __init__(self, name, **kwargs):
+    def __init__(self, name, serializer=None, **kwargs):
         """Event tracker backend that uses a python logger.
 
         :Parameters:
           - `name`: identifier of the logger, which should have
             been configured using the default python mechanisms.
+          - `serializer`: dotted path of the class serializing events,
+            see track.serializers.
 
         """
         super(LoggerBackend, self).__init__(**kwargs)
 
         self.event_logger = logging.getLogger(name)
+        self.serializer = get_event_serializer(serializer)
 
     def send(self, event):
+        self.event_logger.info(self._serialize(event))
+
+    def send_many(self, events):
+        """
+        Logs the given events, serializing them all before logging any.
+        """
+        for event_str in [self._serialize(event) for event in events]:
+            self.event_logger.info(event_str)
+
+    def _serialize(self, event):
         try:
-            event_str = json.dumps(event, cls=DateTimeJSONEncoder)
+            event_str = self.serializer.dumps(event)
         except UnicodeDecodeError:
             application_log.exception(
                 "UnicodeDecodeError Event_data: %r", event
@@ -44,6 +56,4 @@ class LoggerBackend(BaseBackend):
         # TODO: remove trucation of the serialized event, either at a
         # higher level during the emittion of the event, or by
         # providing warnings when the events exceed certain size.
-        event_str = event_str[:settings.TRACK_MAX_EVENT]
-
-        self.event_logger.info(event_str)
+        return event_str[:settings.TRACK_MAX_EVENT]
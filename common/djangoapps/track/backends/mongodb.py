@@ -98,3 +98,13 @@ class MongoBackend(BaseBackend):
             # during the next event.
             msg = 'Error inserting to MongoDB event tracker backend'
             log.exception(msg)
+
+    def send_many(self, events):
+        """Insert the events in to the Mongo collection, with a single request"""
+        try:
+            self.collection.insert_many(events, ordered=False)
+        except (PyMongoError, BSONError):
+            # As in send, the events are lost.  With an unordered insert,
+            # only the events that could not be inserted are.
+            msg = 'Error inserting to MongoDB event tracker backend'
+            log.exception(msg)
@@ -0,0 +1,87 @@
+"""Tests for the asynchronous buffered event tracker backend."""
+
+
+import threading
+
+from django.test import TestCase
+
+from track.backends import BaseBackend
+from track.backends.async_buffer import AsyncBufferedBackend
+
+
+class RecordingBackend(BaseBackend):
+    """
+    Backend recording the batches of events it is sent, which blocks while
+    `release` is not set.
+    """
+    def __init__(self, **kwargs):
+        super(RecordingBackend, self).__init__(**kwargs)
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, event):
+        self.send_many([event])
+
+    def send_many(self, events):
+        self.release.wait()
+        self.batches.append(list(events))
+
+
+class TestAsyncBufferedBackend(TestCase):
+    """
+    Test sending events from a background thread.
+    """
+    def make_backend(self, **kwargs):
+        backend = AsyncBufferedBackend({'ENGINE': __name__ + '.RecordingBackend'}, **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_events_are_sent_in_batches(self):
+        backend = self.make_backend(batch_size=3, flush_interval=60)
+        for number in range(7):
+            backend.send({'number': number})
+        self.assertTrue(backend.flush(timeout=10))
+
+        batches = backend.backend.batches
+        self.assertEqual([event['number'] for batch in batches for event in batch], list(range(7)))
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+        self.assertEqual(backend.stats(), {'sent': 7, 'dropped': 0, 'failed': 0, 'buffered': 0})
+
+    def test_events_are_copied(self):
+        backend = self.make_backend()
+        event = {'context': {'user_id': 1}}
+        backend.send(event)
+        event['context']['user_id'] = 2
+        backend.flush(timeout=10)
+        self.assertEqual(backend.backend.batches, [[{'context': {'user_id': 1}}]])
+
+    def test_full_buffer_drops_events(self):
+        backend = self.make_backend(max_buffer_size=2, batch_size=1)
+        backend.backend.release.clear()
+        backend.send({'number': 0})
+        # Wait for the thread to be blocked sending the first event.
+        while backend.stats()['buffered']:
+            backend.flush(timeout=0.01)
+        for number in range(1, 5):
+            backend.send({'number': number})
+        self.assertEqual(backend.stats()['dropped'], 2)
+
+        backend.backend.release.set()
+        self.assertTrue(backend.flush(timeout=10))
+        self.assertEqual([batch[0]['number'] for batch in backend.backend.batches], [0, 1, 2])
+
+    def test_failures_are_counted(self):
+        backend = self.make_backend()
+        backend.backend.send_many = lambda events: 1 / 0
+        backend.send({})
+        backend.flush(timeout=10)
+        self.assertEqual(backend.stats()['failed'], 1)
+
+    def test_close_sends_buffered_events(self):
+        backend = self.make_backend(flush_interval=60)
+        backend.send({'number': 0})
+        backend.close()
+        backend.send({'number': 1})
+        self.assertEqual(backend.backend.batches, [[{'number': 0}]])
+        self.assertEqual(backend.stats()['dropped'], 1)
@@ -36,3 +36,17 @@ def test_logger_backend(caplog):
 
     assert saved_events[0] == unpacked_event
     assert saved_events[1] == unpacked_event
+
+
+def test_logger_backend_send_many(caplog):
+    """
+    Send a batch of events and check that each was recorded separately.
+    """
+    caplog.set_level(logging.INFO)
+    logger_name = 'track.backends.logger.test'
+    backend = LoggerBackend(name=logger_name)
+
+    backend.send_many([{'number': 1}, {'number': 2}])
+
+    saved_events = [json.loads(e[2]) for e in caplog.record_tuples if e[0] == logger_name]
+    assert saved_events == [{'number': 1}, {'number': 2}]
@@ -0,0 +1,99 @@
+"""
+Measure how many tracking events per second each event serializer turns into
+JSON, on one core.
+
+The event is a typical server-side video event, with datetimes, a UUID and
+course keys.  `json.dumps` with `DateTimeJSONEncoder`, which track backends
+used to call for every event, is measured for comparison.
+
+    $ ./manage.py lms benchmark_tracking_serializers --events 100000
+"""
+
+
+import datetime
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys.edx.keys import CourseKey
+from pytz import UTC
+
+from track.serializers import JSONEventSerializer, OrjsonEventSerializer, orjson
+from track.utils import DateTimeJSONEncoder
+
+COURSE_KEY = CourseKey.from_string('course-v1:edX+DemoX+Demo_Course')
+
+
+def make_event():
+    """
+    Returns a tracking event like the ones video players emit.
+    """
+    return {
+        'username': 'learner',
+        'event_type': 'play_video',
+        'ip': '10.0.0.1',
+        'agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0 Safari/537.36',
+        'host': 'courses.example.com',
+        'referer': 'https://courses.example.com/courses/course-v1:edX+DemoX+Demo_Course/courseware/',
+        'accept_language': 'en-US,en;q=0.9',
+        'event': {
+            'id': 'i4x-edX-DemoX-video-0b9e39477cf34507a7a48f74be381fdd',
+            'code': 'html5',
+            'currentTime': 27.3,
+            'duration': 195.0,
+        },
+        'event_source': 'browser',
+        'time': datetime.datetime(2020, 6, 1, 12, 30, 15, 123456, tzinfo=UTC),
+        'page': 'https://courses.example.com/courses/course-v1:edX+DemoX+Demo_Course/courseware/',
+        'context': {
+            'course_id': COURSE_KEY,
+            'org_id': 'edX',
+            'user_id': 42,
+            'session': uuid.UUID('b5b0f8c4-3a57-4b5b-9c0f-0d4bd2c7b4f1'),
+            'received_at': datetime.datetime(2020, 6, 1, 12, 30, 15),
+            'path': '/event',
+        },
+    }
+
+
+class Command(BaseCommand):
+    """
+    Django management command to benchmark tracking event serializers.
+    """
+    help = 'Measure how many tracking events per second each event serializer turns into JSON, on one core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help='Number of events to serialize.')
+
+    def handle(self, *args, **options):
+        if options['events'] < 1:
+            raise CommandError('--events must be at least 1.')
+        event = make_event()
+        baseline = json.dumps(event, cls=DateTimeJSONEncoder)
+
+        serializers = [
+            (u'json.dumps', lambda event: json.dumps(event, cls=DateTimeJSONEncoder)),
+            (u'JSONEventSerializer', JSONEventSerializer().dumps),
+        ]
+        if orjson is not None:
+            serializers.append((u'OrjsonEventSerializer', OrjsonEventSerializer().dumps))
+        else:
+            self.stdout.write(u'orjson is not installed, OrjsonEventSerializer is not measured.')
+
+        for name, dumps in serializers:
+            output = dumps(event)
+            if output == baseline:
+                same = u'identical output'
+            elif json.loads(output) == json.loads(baseline):
+                same = u'same values'
+            else:
+                raise CommandError(u'{} serializes the event differently.'.format(name))
+
+            start = time.process_time()
+            for _ in range(options['events']):
+                dumps(event)
+            seconds = time.process_time() - start
+            self.stdout.write(u'{name}: {rate:.0f} events/s ({same})'.format(
+                name=name, rate=options['events'] / seconds, same=same,
+            ))
@@ -12,6 +12,8 @@ import json
 import logging
 import re
 import sys
+from collections.abc import Mapping
+from functools import lru_cache
 
 import six
 from django.conf import settings
@@ -34,6 +36,48 @@ META_KEY_TO_CONTEXT_KEY = {
     'HTTP_ACCEPT_LANGUAGE': 'accept_language',
 }
 
+# Number of encrypted session keys remembered per process.
+ENCRYPTED_SESSION_KEY_CACHE_SIZE = 10000
+
+
+class LazyContext(Mapping):
+    """
+    A tracking context holding the values computed by each of `builds` the
+    first time it is read, i.e. when the first event is emitted, if any.
+
+    Should one of `builds` fail, the error is logged and the context only holds
+    the values of the others, since it is read while emitting an event.
+    """
+
+    def __init__(self, *builds):
+        self._builds = builds
+        self._context = None
+
+    @property
+    def context(self):
+        """
+        The values of the context, computed on first access.
+        """
+        if self._context is None:
+            context = {}
+            builds, self._builds = self._builds, ()
+            for build in builds:
+                try:
+                    context.update(build())
+                except Exception:  # pylint: disable=broad-except
+                    log.exception(u'Unable to extract the tracking context of a request')
+            self._context = context
+        return self._context
+
+    def __getitem__(self, key):
+        return self.context[key]
+
+    def __iter__(self):
+        return iter(self.context)
+
+    def __len__(self):
+        return len(self.context)
+
 
 class TrackMiddleware(MiddlewareMixin):
     """
@@ -119,8 +163,26 @@ class TrackMiddleware(MiddlewareMixin):
 
     def enter_request_context(self, request):
         """
-        Extract information from the request and add it to the tracking
-        context.
+        Add information from the request to the tracking context.
+
+        The information is only extracted when the first event of the request
+        is emitted, so requests emitting no events do not pay for it.  The user
+        and the session key the request started with are captured right away,
+        without loading either, since logging in or out replaces them.
+        """
+        user = getattr(request, 'user', None)
+        session_key = self.get_raw_session_key(request)
+        tracker.get_tracker().enter_context(
+            CONTEXT_NAME,
+            LazyContext(
+                lambda: self.get_identity_context(user, session_key),
+                lambda: self.get_details_context(request),
+            )
+        )
+
+    def get_request_context(self, request):
+        """
+        Extract information from the request for the tracking context.
 
         The following fields are injected into the context:
 
@@ -133,10 +195,26 @@ class TrackMiddleware(MiddlewareMixin):
         * path - The path part of the requested URL.
         * client_id - The unique key used by Google Analytics to identify a user
         """
+        context = self.get_identity_context(getattr(request, 'user', None), self.get_raw_session_key(request))
+        context.update(self.get_details_context(request))
+        return context
+
+    def get_identity_context(self, user, session_key):
+        """
+        Extract the session, user_id and username fields of the tracking context
+        from the given user and unencrypted session key.
+        """
+        return {
+            'session': self.encrypt_session_key(session_key),
+            'user_id': getattr(user, 'pk', ''),
+            'username': getattr(user, 'username', ''),
+        }
+
+    def get_details_context(self, request):
+        """
+        Extract the fields of the tracking context other than those describing its identity.
+        """
         context = {
-            'session': self.get_session_key(request),
-            'user_id': self.get_user_primary_key(request),
-            'username': self.get_username(request),
             'ip': self.get_request_ip_address(request),
         }
         for header_name, context_key in six.iteritems(META_KEY_TO_CONTEXT_KEY):
@@ -157,38 +235,26 @@ class TrackMiddleware(MiddlewareMixin):
             context['client_id'] = '.'.join(google_analytics_cookie.split('.')[2:])
 
         context.update(contexts.course_context_from_url(request.build_absolute_uri()))
-
-        tracker.get_tracker().enter_context(
-            CONTEXT_NAME,
-            context
-        )
+        return context
 
     def get_session_key(self, request):
         """ Gets and encrypts the Django session key from the request or an empty string if it isn't found."""
+        return self.encrypt_session_key(self.get_raw_session_key(request))
+
+    def get_raw_session_key(self, request):
+        """Gets the Django session key from the request, without loading the session, or None."""
         try:
-            return self.encrypt_session_key(request.session.session_key)
+            return request.session.session_key
         except AttributeError:
-            return ''
+            return None
 
     def encrypt_session_key(self, session_key):
         """Encrypts a Django session key to another 32-character hex value."""
         if not session_key:
             return ''
 
-        # Follow the model of django.utils.crypto.salted_hmac() and
-        # django.contrib.sessions.backends.base._hash() but use MD5
-        # instead of SHA1 so that the result has the same length (32)
-        # as the original session_key.
-
-        # TODO: Switch to SHA224, which is secure.
-        # If necessary, drop the last little bit of the hash to make it the same length.
-        # Using a known-insecure hash to shorten is silly.
-        # Also, why do we need same length?
         key_salt = "common.djangoapps.track" + self.__class__.__name__
-        key_bytes = (key_salt + settings.SECRET_KEY).encode('utf-8')
-        key = hashlib.md5(key_bytes).digest()
-        encrypted_session_key = hmac.new(key, msg=session_key.encode('utf-8'), digestmod=hashlib.md5).hexdigest()
-        return encrypted_session_key
+        return _encrypt_session_key(key_salt, settings.SECRET_KEY, session_key)
 
     def get_user_primary_key(self, request):
         """Gets the primary key of the logged in Django user"""
@@ -220,3 +286,23 @@ class TrackMiddleware(MiddlewareMixin):
             pass
 
         return response
+
+
+@lru_cache(maxsize=ENCRYPTED_SESSION_KEY_CACHE_SIZE)
+def _encrypt_session_key(key_salt, secret_key, session_key):
+    """
+    Encrypts a Django session key with a key derived from `key_salt` and
+    `secret_key`, remembering the result, since a session spans many requests.
+    """
+    # Follow the model of django.utils.crypto.salted_hmac() and
+    # django.contrib.sessions.backends.base._hash() but use MD5
+    # instead of SHA1 so that the result has the same length (32)
+    # as the original session_key.
+
+    # TODO: Switch to SHA224, which is secure.
+    # If necessary, drop the last little bit of the hash to make it the same length.
+    # Using a known-insecure hash to shorten is silly.
+    # Also, why do we need same length?
+    key_bytes = (key_salt + secret_key).encode('utf-8')
+    key = hashlib.md5(key_bytes).digest()
+    return hmac.new(key, msg=session_key.encode('utf-8'), digestmod=hashlib.md5).hexdigest()
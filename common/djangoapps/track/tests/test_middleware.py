@@ -9,9 +9,11 @@ from django.contrib.sessions.middleware import SessionMiddleware
 from django.test import TestCase
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
+from django.utils.functional import SimpleLazyObject
 from eventtracking import tracker
-from mock import patch, sentinel
+from mock import Mock, patch, sentinel
 
+from track import middleware
 from track.middleware import TrackMiddleware
 
 
@@ -203,3 +205,57 @@ class TrackMiddlewareTestCase(TestCase):
             'agent': user_agent,
             'client_id': client_id_header
         })
+
+    def test_context_details_are_built_when_read(self):
+        request = self.request_factory.get('/heartbeat')
+        with patch.object(TrackMiddleware, 'get_details_context', return_value={'ip': '10.0.0.1'}) as mock_details:
+            self.track_middleware.process_request(request)
+            self.assertFalse(mock_details.called)
+            try:
+                self.assertEqual(
+                    tracker.get_tracker().resolve_context(),
+                    {'ip': '10.0.0.1', 'session': '', 'user_id': '', 'username': ''}
+                )
+                tracker.get_tracker().resolve_context()
+            finally:
+                self.track_middleware.process_response(request, None)
+        self.assertEqual(mock_details.call_count, 1)
+
+    def test_context_identity_is_captured_at_request_start(self):
+        request = self.request_factory.get('/heartbeat')
+        request.user = User(pk=1, username='before')
+        self.track_middleware.process_request(request)
+        try:
+            request.user = User(pk=2, username='after')
+            context = tracker.get_tracker().resolve_context()
+        finally:
+            self.track_middleware.process_response(request, None)
+        self.assert_dict_subset(context, {'user_id': 1, 'username': 'before'})
+
+    def test_context_user_is_loaded_when_read(self):
+        request = self.request_factory.get('/heartbeat')
+        load_user = Mock(return_value=User(pk=1, username='learner'))
+        request.user = SimpleLazyObject(load_user)
+        self.track_middleware.process_request(request)
+        try:
+            self.assertFalse(load_user.called)
+            context = tracker.get_tracker().resolve_context()
+        finally:
+            self.track_middleware.process_response(request, None)
+        self.assert_dict_subset(context, {'user_id': 1, 'username': 'learner'})
+
+    def test_context_detail_errors_keep_identity(self):
+        request = self.request_factory.get('/heartbeat')
+        request.user = User(pk=1, username='learner')
+        with patch.object(TrackMiddleware, 'get_details_context', side_effect=ValueError):
+            with patch.object(middleware.log, 'exception') as mock_log:
+                context = self.get_context_for_request(request)
+        self.assertEqual(context, {'session': '', 'user_id': 1, 'username': 'learner'})
+        self.assertTrue(mock_log.called)
+
+    def test_encrypted_session_keys_are_remembered(self):
+        session_key = '665924b49a93e22b46ee9365abf28c2a'
+        expected_session_key = self.track_middleware.encrypt_session_key(session_key)
+        hits = middleware._encrypt_session_key.cache_info().hits  # pylint: disable=protected-access
+        self.assertEqual(self.track_middleware.encrypt_session_key(session_key), expected_session_key)
+        self.assertEqual(middleware._encrypt_session_key.cache_info().hits, hits + 1)  # pylint: disable=protected-access
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Tests for tracking event serializers."""
+
+
+import json
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase
+from opaque_keys.edx.keys import CourseKey
+
+from track.serializers import JSONEventSerializer, OrjsonEventSerializer, get_event_serializer, orjson
+from track.utils import DateTimeJSONEncoder
+
+EVENT = {
+    'event_type': u'play_video',
+    'username': u'ŝŧüđěñŧ',
+    'event': {'currentTime': 27.3, 'code': u'html5', 'ids': [1, 2]},
+    'time': datetime(2012, 5, 1, 7, 27, 10, 20000),
+    'context': {
+        'course_id': CourseKey.from_string('course-v1:edX+DemoX+Demo_Course'),
+        'session': uuid.UUID('b5b0f8c4-3a57-4b5b-9c0f-0d4bd2c7b4f1'),
+        'received_at': datetime(2012, 5, 1, 9, 27, 10, tzinfo=timezone(timedelta(hours=2))),
+        'date': datetime(2012, 5, 1).date(),
+        1: None,
+    },
+}
+
+
+class TestEventSerializers(TestCase):
+    """
+    Test serializing tracking events.
+    """
+    def test_json_serializer_output_is_identical(self):
+        self.assertEqual(JSONEventSerializer().dumps(EVENT), json.dumps(EVENT, cls=DateTimeJSONEncoder))
+
+    def test_opaque_keys_and_uuids(self):
+        context = json.loads(JSONEventSerializer().dumps(EVENT))['context']
+        self.assertEqual(context['course_id'], u'course-v1:edX+DemoX+Demo_Course')
+        self.assertEqual(context['session'], u'b5b0f8c4-3a57-4b5b-9c0f-0d4bd2c7b4f1')
+        self.assertEqual(context['received_at'], u'2012-05-01T07:27:10+00:00')
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_serializer_values_are_identical(self):
+        self.assertEqual(
+            json.loads(OrjsonEventSerializer().dumps(EVENT)),
+            json.loads(json.dumps(EVENT, cls=DateTimeJSONEncoder)),
+        )
+
+    def test_get_event_serializer(self):
+        self.assertIsInstance(get_event_serializer(), JSONEventSerializer)
+        self.assertIsInstance(
+            get_event_serializer('track.serializers.OrjsonEventSerializer'), OrjsonEventSerializer,
+        )
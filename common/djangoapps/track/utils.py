@@ -3,12 +3,15 @@
 
 import json
 from datetime import date, datetime
+from uuid import UUID
 
+import six
+from opaque_keys import OpaqueKey
 from pytz import UTC
 
 
 class DateTimeJSONEncoder(json.JSONEncoder):
-    """JSON encoder aware of datetime.datetime and datetime.date objects"""
+    """JSON encoder aware of datetime.datetime, datetime.date, UUID and opaque key objects"""
 
     def default(self, obj):  # pylint: disable=method-hidden
         """
@@ -27,5 +30,7 @@ class DateTimeJSONEncoder(json.JSONEncoder):
             return obj.isoformat()
         elif isinstance(obj, date):
             return obj.isoformat()
+        elif isinstance(obj, (UUID, OpaqueKey)):
+            return six.text_type(obj)
 
         return super(DateTimeJSONEncoder, self).default(obj)
@@ -14,9 +14,11 @@ This is used by capa_module.
 """
 
 
+import hashlib
 import logging
 import os.path
 import re
+import threading
 from collections import OrderedDict
 from copy import deepcopy
 from datetime import datetime
@@ -76,6 +78,12 @@ html_problem_semantics = [
 
 log = logging.getLogger(__name__)
 
+# Number of parsed problems kept by each process, as templates for new LoncapaProblems (see
+# LoncapaProblem._parse_problem_text).
+PROBLEM_TEMPLATE_CACHE_SIZE = 500
+_problem_templates = OrderedDict()
+_problem_templates_lock = threading.Lock()
+
 #-----------------------------------------------------------------------------
 # main class for this module
 
@@ -185,12 +193,7 @@ class LoncapaProblem(object):
         self.problem_text = problem_text
 
         # parse problem XML file into an element tree
-        if isinstance(problem_text, six.text_type):
-            # etree chokes on Unicode XML with an encoding declaration
-            problem_text = problem_text.encode('utf-8')
-        self.tree = etree.XML(problem_text)
-
-        self.make_xml_compatible(self.tree)
+        self.tree = self._parse_problem_text(problem_text)
 
         # handle any <include file="foo"> tags
         self._process_includes()
@@ -226,6 +229,34 @@ class LoncapaProblem(object):
             if extract_tree:
                 self.extracted_tree = self._extract_html(self.tree)
 
+    def _parse_problem_text(self, problem_text):
+        """
+        Returns a new element tree of the problem XML, made compatible (see make_xml_compatible).
+
+        The XML is only parsed the first time a process sees a problem text: the tree is then
+        kept as a template, before anything specific to a seed or a learner is done to it, and
+        every later problem gets a copy of it, which is much faster than parsing.
+        """
+        if isinstance(problem_text, six.text_type):
+            # etree chokes on Unicode XML with an encoding declaration
+            problem_text = problem_text.encode('utf-8')
+        key = hashlib.sha1(problem_text).hexdigest()
+
+        with _problem_templates_lock:
+            template = _problem_templates.get(key)
+            if template is not None:
+                _problem_templates.move_to_end(key)
+
+        if template is None:
+            template = etree.XML(problem_text)
+            self.make_xml_compatible(template)
+            with _problem_templates_lock:
+                _problem_templates[key] = template
+                while len(_problem_templates) > PROBLEM_TEMPLATE_CACHE_SIZE:
+                    _problem_templates.popitem(last=False)
+
+        return deepcopy(template)
+
     def make_xml_compatible(self, tree):
         """
         Adjust tree xml in-place for compatibility before creating
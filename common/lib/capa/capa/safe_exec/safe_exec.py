@@ -10,6 +10,7 @@ import six
 from six import text_type
 
 from . import lazymod
+from .sandbox_pool import get_sandbox_pool
 
 # Establish the Python environment for Capa.
 # Capa assumes float-friendly division always.
@@ -139,7 +140,8 @@ def safe_exec(
     if unsafely:
         exec_fn = codejail_not_safe_exec
     else:
-        exec_fn = codejail_safe_exec
+        sandbox_pool = get_sandbox_pool()
+        exec_fn = sandbox_pool.safe_exec if sandbox_pool else codejail_safe_exec
 
     # Run the code!  Results are side effects in globals_dict.
     try:
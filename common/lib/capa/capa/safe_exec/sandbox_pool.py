@@ -0,0 +1,574 @@
+"""
+A pool of pre-warmed codejail sandboxes.
+
+codejail starts a new jailed Python interpreter for every execution, which
+then imports the modules capa code uses; for numpy alone that takes hundreds
+of milliseconds.  A SandboxPool keeps a few jailed "zygote" processes running
+instead, started with the command and user codejail is configured with (and
+so confined by the same AppArmor profile) and, as codejail does, with an empty
+environment, which have imported those modules once.  Each zygote forks the child for its next execution before that
+execution is requested, and the child then:
+
+* reads the request (code, globals, files) itself, so that the zygote never
+  holds it,
+* moves to a new session, and to a fresh codejail temporary directory
+  holding the files of the execution,
+* closes its copies of the zygote's pipes, so that nothing it leaves behind
+  can see other executions,
+* applies codejail's resource limits (CPU, memory, file size, processes),
+* runs the code, and writes the resulting globals to a pipe of its own.
+
+The zygote passes the results on through a buffer it clears after every
+chunk, and kills the child's whole session once they are in, or when it runs
+out of real time.  Every child thus starts from a zygote which has seen
+nothing of earlier executions, and is then thrown away, so code can't see or
+affect other executions any more than with plain codejail, provided it can't
+reach into the zygote itself: the sandbox user must not be allowed to ptrace
+other processes (Yama's ``ptrace_scope`` of 1 or more prevents it).  As an
+extra precaution, zygotes are replaced after ``MAX_EXECUTIONS`` executions,
+and after any execution that hit a limit.
+
+Executions for which no zygote is ready are run by codejail as usual, so a
+busy pool never makes anyone wait for a sandbox to start.
+
+The pool is configured with ``CODE_JAIL['pool']``: ``SIZE`` is the number of
+zygotes each process keeps (0, the default, disables the pool) and
+``MAX_EXECUTIONS`` the number of executions after which a zygote is replaced.
+"""
+
+
+import json
+import logging
+import os
+import shutil
+import signal
+import struct
+import subprocess
+import threading
+import time
+
+import six
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException, json_safe
+from codejail.safe_exec import safe_exec as codejail_safe_exec
+from codejail.util import temp_directory
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_EXECUTIONS = 100
+
+# Modules every zygote imports before running anything, on top of capa's assumed imports.
+PRELOADED_MODULES = ['json', 'random2', 'six', 'six.moves']
+
+# How long to wait for a zygote's answer beyond the real time limit of the execution.
+ANSWER_GRACE_SECONDS = 5
+
+# The program run by every zygote.  It is kept compatible with Python 2, which
+# older sandbox environments still use.
+#
+# The zygote never holds any data of an execution: the child for the next one
+# is forked before its request is sent, and reads it itself, and its results
+# are passed on through a buffer which is cleared after every chunk.  Children
+# therefore start from the same state as the zygote when it became ready.
+ZYGOTE_CODE = r'''
+import io
+import json
+import os
+import resource
+import select
+import signal
+import struct
+import sys
+import time
+import traceback
+
+# Keep the answers channel to ourselves, in case an import prints anything.
+answers = io.FileIO(os.dup(1), 'wb')
+os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+# Numerical libraries must not start threads which forked children would lack.
+os.environ['OPENBLAS_NUM_THREADS'] = '1'
+os.environ['OMP_NUM_THREADS'] = '1'
+
+for name in json.loads(sys.argv[1]):
+    try:
+        __import__(name)
+    except Exception:
+        pass
+
+REQUEST_HEADER = struct.Struct('>I')
+FRAME_HEADER = struct.Struct('>BI')
+REALTIME = struct.Struct('>d')
+CHUNK, DONE = 0, 1
+MAX_FD = os.sysconf('SC_OPEN_MAX')
+BUFFER = bytearray(65536)
+ZEROS = memoryview(bytearray(len(BUFFER)))
+
+
+def read_exactly(fd, size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def write_all(data):
+    view = memoryview(data)
+    while len(view):
+        view = view[answers.write(view):]
+
+
+def write_frame(kind, data):
+    write_all(FRAME_HEADER.pack(kind, len(data)))
+    write_all(data)
+
+
+def jsonable(value):
+    try:
+        json.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def child(result_fd):
+    header = read_exactly(0, REQUEST_HEADER.size)
+    if header is None:
+        return
+    request = json.loads(read_exactly(0, REQUEST_HEADER.unpack(header)[0]).decode('utf-8'))
+    os.write(result_fd, REALTIME.pack(request['realtime'] or 0))
+
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.closerange(3, result_fd)
+    os.closerange(result_fd + 1, MAX_FD)
+
+    os.chdir(request['directory'])
+    os.environ['TMPDIR'] = 'tmp'
+    for name, value in request['rlimits']:
+        resource.setrlimit(getattr(resource, name), (value, value))
+
+    try:
+        sys.path.extend(request['python_path'])
+        code, g_dict = request['code'], request['globals']
+        exec(code, g_dict)
+        message = {'globals': dict(
+            (key, value) for key, value in g_dict.items()
+            if key != '__builtins__' and jsonable(value)
+        )}
+    except BaseException:
+        message = {'error': traceback.format_exc()}
+
+    data = json.dumps(message).encode('utf-8')
+    while data:
+        data = data[os.write(result_fd, data):]
+
+
+def serve():
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            answers.close()
+            child(write_fd)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    results = io.FileIO(read_fd, 'rb')
+
+    started = read_exactly(read_fd, REALTIME.size)
+    if started is None:
+        # The input was closed before a request came.
+        results.close()
+        os.waitpid(pid, 0)
+        return False
+
+    realtime = REALTIME.unpack(started)[0]
+    deadline = time.time() + realtime if realtime else None
+    timed_out = False
+    view = memoryview(BUFFER)
+    while True:
+        timeout = max(0, deadline - time.time()) if deadline else None
+        readable, _, _ = select.select([read_fd], [], [], timeout)
+        if not readable:
+            timed_out = True
+            break
+        size = results.readinto(view)
+        if not size:
+            break
+        write_frame(CHUNK, view[:size])
+        view[:size] = ZEROS[:size]
+    results.close()
+
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    _, status = os.waitpid(pid, 0)
+    write_frame(DONE, json.dumps({'timed_out': timed_out, 'status': status}).encode('utf-8'))
+    return True
+
+
+write_frame(DONE, json.dumps({'ready': True}).encode('utf-8'))
+while serve():
+    pass
+'''
+
+_REQUEST_HEADER = struct.Struct('>I')
+_FRAME_HEADER = struct.Struct('>BI')
+_CHUNK, _DONE = 0, 1
+
+_pool = None
+_pool_configured = False
+_pool_lock = threading.Lock()
+
+
+class SandboxError(Exception):
+    """
+    Raised when a zygote fails, rather than the code it ran.
+    """
+    pass
+
+
+class _Zygote(object):
+    """
+    A jailed process which runs each execution in a forked child.
+    """
+    def __init__(self, command, preload):
+        self.executions = 0
+        self._close_lock = threading.Lock()
+        self._directory = temp_directory()
+        home = self._directory.__enter__()
+        self.process = subprocess.Popen(
+            command + ['-c', ZYGOTE_CODE, json.dumps(preload)],
+            cwd=home,
+            # As with codejail, nothing of this process's environment is passed on;
+            # each child sets TMPDIR itself.
+            env={},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True,
+        )
+        if self._read_frame() != (_DONE, b'{"ready": true}'):
+            self.close()
+            raise SandboxError(u'Sandbox failed to start')
+
+    def run(self, request, timeout):
+        """
+        Sends an execution request, and returns the zygote's answer.
+
+        Raises SandboxError, after killing the zygote, if no answer came within timeout
+        seconds (None for no timeout).
+        """
+        self.executions += 1
+        data = json.dumps(request).encode('utf-8')
+        watchdog = threading.Timer(timeout, self.close) if timeout is not None else None
+        if watchdog is not None:
+            watchdog.start()
+        try:
+            self.process.stdin.write(_REQUEST_HEADER.pack(len(data)) + data)
+            self.process.stdin.flush()
+            answer = self._read_answer()
+        except (IOError, OSError, ValueError):
+            answer = None
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        if answer is None:
+            self.close()
+            raise SandboxError(u'Sandbox died while running code')
+        return answer
+
+    def _read_answer(self):
+        """
+        Reads the results of an execution, and returns them, or the limit it hit.
+        """
+        chunks = []
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return None
+            kind, data = frame
+            if kind != _CHUNK:
+                break
+            chunks.append(data)
+
+        done = json.loads(data.decode('utf-8'))
+        if done['timed_out']:
+            return {'limit': 'REALTIME', 'status': -signal.SIGKILL}
+        try:
+            return json.loads(b''.join(chunks).decode('utf-8'))
+        except ValueError:
+            # The child died before writing its results, most likely because of a limit.
+            if os.WIFSIGNALED(done['status']):
+                return {'limit': 'signal', 'status': -os.WTERMSIG(done['status'])}
+            return {'limit': 'exit', 'status': os.WEXITSTATUS(done['status'])}
+
+    def _read_frame(self):
+        header = self.process.stdout.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            return None
+        kind, size = _FRAME_HEADER.unpack(header)
+        data = self.process.stdout.read(size)
+        if len(data) < size:
+            return None
+        return kind, data
+
+    def close(self):
+        """
+        Stops the zygote, which exits when its input is closed, and removes its directory.
+        """
+        with self._close_lock:
+            if self.process.poll() is None:
+                try:
+                    self.process.stdin.close()
+                    self.process.terminate()
+                except (IOError, OSError):
+                    pass
+            self.process.wait()
+            if self._directory is not None:
+                directory, self._directory = self._directory, None
+                directory.__exit__(None, None, None)
+
+
+class SandboxPool(object):
+    """
+    Runs code like codejail's safe_exec, in one of up to `size` pre-warmed sandboxes.
+
+    `command` is the command line starting a jailed Python, which defaults to
+    the one codejail is configured with.
+    """
+    def __init__(self, size, max_executions=DEFAULT_MAX_EXECUTIONS, command=None, preload=None):
+        self.size = size
+        self.max_executions = max_executions
+        self.command = command
+        self.preload = preload if preload is not None else _default_preload()
+        self.pid = os.getpid()
+        self._idle = []
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._fill()
+
+    def safe_exec(self, code, globals_dict, python_path=None, extra_files=None, slug=None):
+        """
+        Executes code with the globals in globals_dict, which it updates, like codejail's safe_exec.
+        """
+        zygote = self._acquire()
+        if zygote is None:
+            log.info(u'No pre-warmed sandbox available for %s', slug)
+            return codejail_safe_exec(
+                code, globals_dict, python_path=python_path, extra_files=extra_files, slug=slug,
+            )
+
+        retire = True
+        try:
+            answer = self._run(zygote, code, globals_dict, python_path, extra_files)
+            # Zygotes are replaced after any limit breach or failure, which set a status.
+            retire = 'status' in answer or zygote.executions >= self.max_executions
+        finally:
+            self._release(zygote, retire)
+
+        if 'globals' in answer:
+            globals_dict.update(answer['globals'])
+            return
+        stderr = answer.get('error') or u'{} limit exceeded'.format(answer['limit'])
+        status = answer.get('status', 1)
+        raise SafeExecException((
+            u"Couldn't execute jailed code: stdout: {stdout!r}, "
+            u"stderr: {stderr!r} with status code: {status}"
+        ).format(stdout=b'', stderr=stderr.encode('utf-8'), status=status))
+
+    def _run(self, zygote, code, globals_dict, python_path, extra_files):
+        """
+        Runs code in zygote, from a new temporary directory holding its files.
+        """
+        extra_names = set(name for name, _ in extra_files or ())
+        with temp_directory() as directory:
+            tmp = os.path.join(directory, 'tmp')
+            os.mkdir(tmp)
+            os.chmod(tmp, 0o777)
+            for name, contents in extra_files or ():
+                with open(os.path.join(directory, name), 'wb') as extra_file:
+                    extra_file.write(contents)
+
+            sys_path = []
+            for pydir in python_path or ():
+                pybase = os.path.basename(pydir)
+                sys_path.append(pybase)
+                if pybase in extra_names:
+                    continue
+                if os.path.isdir(pydir):
+                    shutil.copytree(pydir, os.path.join(directory, pybase))
+                else:
+                    shutil.copy(pydir, os.path.join(directory, pybase))
+
+            realtime = jail_code.LIMITS.get('REALTIME', 0)
+            timeout = realtime + ANSWER_GRACE_SECONDS if realtime else None
+            request = {
+                'code': code,
+                'globals': json_safe(globals_dict),
+                'python_path': sys_path,
+                'directory': directory,
+                'rlimits': _rlimits(),
+                'realtime': realtime,
+            }
+            try:
+                return zygote.run(request, timeout=timeout)
+            except SandboxError as error:
+                return {'error': six.text_type(error), 'status': -1}
+
+    def _acquire(self):
+        """
+        Returns an idle zygote, or None if there is none.
+        """
+        with self._lock:
+            forked = self.pid != os.getpid()
+            if forked:
+                # The zygotes belong to the parent process, and its starting threads weren't forked.
+                self.pid, self._idle, self._starting = os.getpid(), [], 0
+            zygote = self._idle.pop() if self._idle else None
+        if forked:
+            self._fill()
+        return zygote
+
+    def _release(self, zygote, retire):
+        """
+        Makes zygote available again, or replaces it if it is to be retired.
+        """
+        if retire:
+            zygote.close()
+            self._fill()
+            return
+        with self._lock:
+            if not self._closed and self.pid == os.getpid():
+                self._idle.append(zygote)
+                return
+        zygote.close()
+
+    def _fill(self):
+        """
+        Starts, in the background, as many zygotes as needed to have size of them.
+        """
+        with self._lock:
+            missing = self.size - len(self._idle) - self._starting
+            if self._closed or missing <= 0:
+                return
+            self._starting += missing
+        for _ in range(missing):
+            thread = threading.Thread(target=self._start_zygote, name=u'sandbox-pool')
+            thread.daemon = True
+            thread.start()
+
+    def _start_zygote(self):
+        """
+        Starts a zygote, and adds it to the idle ones.
+        """
+        zygote = None
+        try:
+            zygote = _Zygote(self.command or _jailed_python_command(), self.preload)
+        except Exception:  # pylint: disable=broad-except
+            log.exception(u'Failed to start a pre-warmed sandbox')
+            # Try again on the next execution rather than in a tight loop.
+            time.sleep(1)
+        with self._lock:
+            self._starting -= 1
+            if zygote is not None and not self._closed:
+                self._idle.append(zygote)
+                zygote = None
+        if zygote is not None:
+            zygote.close()
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Waits for all the zygotes to be started, for up to timeout seconds, and
+        returns whether they were.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.size:
+                    return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def close(self):
+        """
+        Stops all idle zygotes, and those in use as soon as they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for zygote in idle:
+            zygote.close()
+
+
+def _default_preload():
+    # Imported here since safe_exec imports this module.
+    from .safe_exec import ASSUMED_IMPORTS
+    return PRELOADED_MODULES + [modname for _, modname in ASSUMED_IMPORTS]
+
+
+def _jailed_python_command():
+    """
+    Returns the command line with which codejail starts jailed Python interpreters.
+    """
+    config = jail_code.COMMANDS['python']
+    command = list(config['cmdline_start'])
+    if config.get('user'):
+        command = ['sudo', '-u', config['user']] + command
+    return command
+
+
+def _rlimits():
+    """
+    Returns the (resource name, value) pairs of the limits codejail applies to jailed code.
+    """
+    limits = jail_code.LIMITS
+    rlimits = [('RLIMIT_NPROC', limits.get('NPROC', 15)), ('RLIMIT_FSIZE', limits.get('FSIZE', 0))]
+    if limits.get('CPU'):
+        rlimits.append(('RLIMIT_CPU', limits['CPU']))
+    if limits.get('VMEM'):
+        rlimits.append(('RLIMIT_AS', limits['VMEM']))
+    return rlimits
+
+
+def get_sandbox_pool():
+    """
+    Returns the SandboxPool of this process, or None if sandboxes aren't pooled.
+
+    The pool is created, as configured by ``CODE_JAIL['pool']``, the first time
+    it is needed once codejail is configured.
+    """
+    global _pool, _pool_configured  # pylint: disable=global-statement
+    if not jail_code.is_configured('python'):
+        return None
+    with _pool_lock:
+        if not _pool_configured:
+            config = getattr(settings, 'CODE_JAIL', {}).get('pool', {})
+            if config.get('SIZE'):
+                _pool = SandboxPool(config['SIZE'], config.get('MAX_EXECUTIONS', DEFAULT_MAX_EXECUTIONS))
+            _pool_configured = True
+        return _pool
+
+
+def configure_sandbox_pool(size, max_executions=DEFAULT_MAX_EXECUTIONS):
+    """
+    Replaces the SandboxPool of this process with one of the given size, or with
+    none if size is 0, regardless of ``CODE_JAIL['pool']``, and returns it.
+    """
+    global _pool, _pool_configured  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = SandboxPool(size, max_executions) if size else None
+        _pool_configured = True
+        return _pool
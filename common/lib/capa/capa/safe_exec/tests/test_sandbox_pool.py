@@ -0,0 +1,105 @@
+"""Test sandbox_pool.py"""
+
+
+import io
+import os
+import sys
+import unittest
+import zipfile
+
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException
+from mock import patch
+
+from capa.safe_exec.sandbox_pool import SandboxPool
+
+# The zygotes run unjailed, which is enough to test how they run code.
+LIMITS = {'CPU': 0, 'REALTIME': 2, 'VMEM': 0, 'FSIZE': 1048576}
+
+
+@patch.dict(jail_code.LIMITS, LIMITS)
+class TestSandboxPool(unittest.TestCase):
+    """
+    Test running code in pre-warmed sandboxes.
+    """
+    def make_pool(self, size=1, max_executions=10):
+        """
+        Returns a started pool of unjailed zygotes.
+        """
+        pool = SandboxPool(size, max_executions=max_executions, command=[sys.executable], preload=['math'])
+        self.addCleanup(pool.close)
+        self.assertTrue(pool.wait_until_ready(timeout=30))
+        return pool
+
+    def test_set_values(self):
+        pool = self.make_pool()
+        g = {'a': 17}
+        pool.safe_exec("b = a + 1\nprint('not in the results')", g)
+        self.assertEqual(g, {'a': 17, 'b': 18})
+
+    def test_python_path_and_extra_files(self):
+        pool = self.make_pool()
+        g = {}
+        pool.safe_exec(
+            "import constant\na = constant.A", g,
+            python_path=["lib.zip"], extra_files=[("lib.zip", _zip_file({"constant.py": b"A = 42\n"}))],
+        )
+        self.assertEqual(g['a'], 42)
+
+    def test_raising_exceptions(self):
+        pool = self.make_pool()
+        with self.assertRaises(SafeExecException) as context:
+            pool.safe_exec("1/0", {})
+        self.assertIn("ZeroDivisionError", str(context.exception))
+
+    def test_executions_are_isolated(self):
+        pool = self.make_pool()
+        g = {}
+        pool.safe_exec("import math\nmath.leaked = True", g)
+        pool.safe_exec("import math\nleaked = hasattr(math, 'leaked')", g)
+        self.assertFalse(g['leaked'])
+
+    def test_environment_not_inherited(self):
+        with patch.dict(os.environ, {'SANDBOX_POOL_SECRET': 'secret'}):
+            pool = self.make_pool()
+        g = {}
+        pool.safe_exec("import os\nenv = dict(os.environ)", g)
+        self.assertNotIn('SANDBOX_POOL_SECRET', g['env'])
+        self.assertEqual(g['env']['TMPDIR'], 'tmp')
+
+    def test_realtime_limit(self):
+        pool = self.make_pool()
+        with patch.dict(jail_code.LIMITS, {'REALTIME': 0.5}):
+            with self.assertRaises(SafeExecException) as context:
+                pool.safe_exec("while True: pass", {})
+        self.assertIn("REALTIME limit exceeded", str(context.exception))
+
+    def test_recycling(self):
+        pool = self.make_pool(max_executions=2)
+        pids = []
+        for _ in range(4):
+            self.assertTrue(pool.wait_until_ready(timeout=30))
+            g = {}
+            pool.safe_exec("import os\npid = os.getppid()", g)
+            pids.append(g['pid'])
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(pids[2], pids[3])
+
+    def test_falls_back_to_codejail_when_busy(self):
+        pool = self.make_pool()
+        with patch.object(pool, '_acquire', return_value=None):
+            with patch('capa.safe_exec.sandbox_pool.codejail_safe_exec') as mock_safe_exec:
+                pool.safe_exec("a = 1", {}, slug='slug')
+        self.assertTrue(mock_safe_exec.called)
+
+
+def _zip_file(files):
+    """
+    Returns the contents of a zip file holding the given {name: contents} files.
+    """
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zip_file:
+        for name, contents in files.items():
+            zip_file.writestr(name, contents)
+    return data.getvalue()
@@ -12,6 +12,7 @@ from lxml import etree
 from markupsafe import Markup
 from mock import patch
 
+from capa import capa_problem
 from capa.responsetypes import LoncapaProblemError
 from capa.tests.helpers import new_loncapa_problem
 from openedx.core.djangolib.markup import HTML
@@ -789,3 +790,48 @@ class CAPAProblemReportHelpersTest(unittest.TestCase):
         # Ensure that the answer is a string so that the dict returned from this
         # function can eventualy be serialized to json without issues.
         self.assertIsInstance(problem.get_question_answers()['1_solution_1'], six.text_type)
+
+
+class CAPAProblemTemplateTest(unittest.TestCase):
+    """
+    Test that problems share their parsed XML, but not the trees derived from it.
+    """
+    xml = textwrap.dedent("""
+        <problem>
+            <optionresponse>
+                <optioninput label="Color">
+                    <option correct="False">yellow</option>
+                    <option correct="True">blue</option>
+                </optioninput>
+            </optionresponse>
+        </problem>
+    """)
+
+    def setUp(self):
+        super(CAPAProblemTemplateTest, self).setUp()
+        capa_problem._problem_templates.clear()  # pylint: disable=protected-access
+
+    def test_problem_text_parsed_once(self):
+        with patch('capa.capa_problem.etree.XML', wraps=etree.XML) as mock_xml:
+            first = new_loncapa_problem(self.xml, problem_id='first')
+            second = new_loncapa_problem(self.xml, problem_id='second', seed=1)
+        self.assertEqual(mock_xml.call_count, 1)
+
+        self.assertIsNot(first.tree, second.tree)
+        for problem in (first, second):
+            optioninput = problem.tree.find('.//optioninput')
+            self.assertEqual(optioninput.get('id'), '{}_2_1'.format(problem.problem_id))
+            self.assertEqual(optioninput.get('correct'), 'blue')
+
+    def test_templates_are_bounded(self):
+        with patch('capa.capa_problem.PROBLEM_TEMPLATE_CACHE_SIZE', 2):
+            for color in ('red', 'green', 'blue'):
+                new_loncapa_problem(self.xml.replace('yellow', color))
+        self.assertEqual(len(capa_problem._problem_templates), 2)  # pylint: disable=protected-access
+
+    def test_invalid_problem_not_cached(self):
+        xml = self.xml.replace('correct="False"', 'correct="True"')
+        for _ in range(2):
+            with self.assertRaises(LoncapaProblemError):
+                new_loncapa_problem(xml)
+        self.assertEqual(len(capa_problem._problem_templates), 0)  # pylint: disable=protected-access
@@ -91,6 +91,21 @@ def randomization_bin(seed, problem_id):
     return int(r_hash.hexdigest()[:7], 16) % NUM_RANDOMIZATION_BINS
 
 
+def regrade_answers(lcp, attempts):
+    """
+    Updates the correct map of the LoncapaProblem `lcp` by grading its current
+    answers again, as answers to attempt number `attempts`.
+
+    Only the LCP is used, so answers can be regraded while the block which
+    created it is bound to another student, e.g. by a pool of threads.
+    """
+    # Make sure that the attempt number is always at least 1 for grading purposes,
+    # even if the number of attempts have been reset and this problem is regraded.
+    lcp.context['attempt'] = max(attempts, 1)
+    new_correct_map = lcp.get_grade_from_current_answers(None)
+    lcp.correct_map.update(new_correct_map)
+
+
 class Randomization(String):
     """
     Define a field to store how to randomize a problem.
@@ -1632,6 +1647,22 @@ class CapaMixin(ScorableXBlockMixin, CapaFields):
         Returns the error messages for exceptions occurring while performing
         the rescoring, rather than throwing them.
         """
+        event_info = self.start_rescore()
+        try:
+            calculated_score = self.calculate_rescore()
+        except Exception as error:
+            self.fail_rescore(event_info, error)
+            raise
+        self.finish_rescore(event_info, calculated_score, only_if_higher)
+
+    def start_rescore(self):
+        """
+        Checks that the existing answers to the problem can be rescored, and
+        returns the event info to pass to `finish_rescore` or `fail_rescore`.
+
+        Raises NotImplementedError if the problem cannot be rescored, or
+        NotFoundError if it has not been answered yet.
+        """
         event_info = {'state': self.lcp.get_state(), 'problem_id': text_type(self.location)}
 
         _ = self.runtime.service(self, "i18n").ugettext
@@ -1653,20 +1684,34 @@ class CapaMixin(ScorableXBlockMixin, CapaFields):
         orig_score = self.get_score()
         event_info['orig_score'] = orig_score.raw_earned
         event_info['orig_total'] = orig_score.raw_possible
-        try:
-            self.update_correctness()
-            calculated_score = self.calculate_score()
-        except (StudentInputError, ResponseError, LoncapaProblemError) as inst:
-            log.warning("Input error in capa_module:problem_rescore", exc_info=True)
-            event_info['failure'] = 'input_error'
-            self.track_function_unmask('problem_rescore_fail', event_info)
-            raise
+        return event_info
+
+    def calculate_rescore(self):
+        """
+        Regrades the existing answers and returns the resulting score.
 
-        except Exception:
+        This only updates the LCP: it neither saves, publishes nor tracks
+        anything.  See `regrade_answers` to regrade an LCP apart from its block.
+        """
+        self.update_correctness()
+        return self.calculate_score()
+
+    def fail_rescore(self, event_info, error):
+        """
+        Tracks that `calculate_rescore` raised `error`.
+        """
+        if isinstance(error, (StudentInputError, ResponseError, LoncapaProblemError)):
+            log.warning("Input error in capa_module:problem_rescore", exc_info=error)
+            event_info['failure'] = 'input_error'
+        else:
             event_info['failure'] = 'unexpected'
-            self.track_function_unmask('problem_rescore_fail', event_info)
-            raise
+        self.track_function_unmask('problem_rescore_fail', event_info)
 
+    def finish_rescore(self, event_info, calculated_score, only_if_higher=False):
+        """
+        Saves the state regraded by `calculate_rescore`, and publishes and
+        tracks the new score.
+        """
         # rescoring should have no effect on attempts, so don't
         # need to increment here, or mark done.  Just save.
         self.set_state_from_lcp()
@@ -1710,11 +1755,7 @@ class CapaMixin(ScorableXBlockMixin, CapaFields):
         Operates by creating a new correctness map based on the current
         state of the LCP, and updating the old correctness map of the LCP.
         """
-        # Make sure that the attempt number is always at least 1 for grading purposes,
-        # even if the number of attempts have been reset and this problem is regraded.
-        self.lcp.context['attempt'] = max(self.attempts, 1)
-        new_correct_map = self.lcp.get_grade_from_current_answers(None)
-        self.lcp.correct_map.update(new_correct_map)
+        regrade_answers(self.lcp, self.attempts)
 
     def calculate_score(self):
         """
@@ -4,6 +4,7 @@ import logging
 import os
 import re
 import uuid
+from collections import namedtuple
 from io import BytesIO
 
 import six
@@ -21,10 +22,15 @@ STATIC_CONTENT_VERSION = 1
 XASSET_LOCATION_TAG = 'c4x'
 XASSET_SRCREF_PREFIX = 'xasset:'
 XASSET_THUMBNAIL_TAIL_NAME = '.jpg'
+XASSET_WEBP_THUMBNAIL_TAIL_NAME = '.webp'
 STREAM_DATA_CHUNK_SIZE = 1024
+DEFAULT_ASSET_PAGE_SIZE = 100
 VERSIONED_ASSETS_PREFIX = '/assets/courseware'
 VERSIONED_ASSETS_PATTERN = r'/assets/courseware/(v[\d]/)?([a-f0-9]{32})'
 
+# What get_canonicalized_asset_path needs to know about an asset to link to it.
+AssetManifestEntry = namedtuple('AssetManifestEntry', ['content_digest', 'locked'])
+
 
 class StaticContent(object):
     def __init__(self, loc, name, content_type, data, last_modified_at=None, thumbnail_location=None, import_path=None,
@@ -69,6 +75,13 @@ class StaticContent(object):
             extension=extension,
         )
 
+    @staticmethod
+    def generate_webp_thumbnail_name(thumbnail_name):
+        """
+        Returns the name of the WebP version of the (JPEG) thumbnail named thumbnail_name.
+        """
+        return os.path.splitext(thumbnail_name)[0] + XASSET_WEBP_THUMBNAIL_TAIL_NAME
+
     @staticmethod
     def compute_location(course_key, path, revision=None, is_thumbnail=False):
         """
@@ -223,7 +236,7 @@ class StaticContent(object):
         return any(path.lower().endswith(excluded_ext.lower()) for excluded_ext in excluded_exts)
 
     @staticmethod
-    def get_canonicalized_asset_path(course_key, path, base_url, excluded_exts, encode=True):
+    def get_canonicalized_asset_path(course_key, path, base_url, excluded_exts, encode=True, asset_manifest=None):
         """
         Returns a fully-qualified path to a piece of static content.
 
@@ -233,6 +246,9 @@ class StaticContent(object):
         Args:
             course_key: key to the course which owns this asset
             path: the path to said content
+            asset_manifest: (optional) the course's assets, as returned by
+                ContentStore.get_course_asset_manifest, to look the asset up in
+                instead of the contentstore
 
         Returns:
             string: fully-qualified path to asset
@@ -247,13 +263,20 @@ class StaticContent(object):
         # Check the status of the asset to see if this can be served via CDN aka publicly.
         serve_from_cdn = False
         content_digest = None
-        try:
-            content = AssetManager.find(asset_key, as_stream=True)
-            serve_from_cdn = not getattr(content, "locked", True)
-            content_digest = getattr(content, "content_digest", None)
-        except (ItemNotFoundError, NotFoundError):
-            # If we can't find the item, just treat it as if it's locked.
-            serve_from_cdn = False
+        if asset_manifest is not None and StaticContent._is_in_manifest_of(asset_key, course_key):
+            entry = asset_manifest.get(asset_key.block_id)
+            # Assets missing from the manifest don't exist, and are treated as locked.
+            if entry is not None:
+                serve_from_cdn = not entry.locked
+                content_digest = entry.content_digest
+        else:
+            try:
+                content = AssetManager.find(asset_key, as_stream=True)
+                serve_from_cdn = not getattr(content, "locked", True)
+                content_digest = getattr(content, "content_digest", None)
+            except (ItemNotFoundError, NotFoundError):
+                # If we can't find the item, just treat it as if it's locked.
+                serve_from_cdn = False
 
         # Do a generic check to see if anything about this asset disqualifies it from being CDN'd.
         is_excluded = False
@@ -269,7 +292,7 @@ class StaticContent(object):
         for query_name, query_val in query_params:
             if query_val.startswith("/static/"):
                 new_val = StaticContent.get_canonicalized_asset_path(
-                    course_key, query_val, base_url, excluded_exts, encode=False)
+                    course_key, query_val, base_url, excluded_exts, encode=False, asset_manifest=asset_manifest)
                 updated_query_params.append((query_name, new_val.encode('utf-8')))
             else:
                 # Make sure we're encoding Unicode strings down to their byte string
@@ -292,6 +315,21 @@ class StaticContent(object):
 
         return urlunparse(('', base_url, asset_path, params, urlencode(updated_query_params), ''))
 
+    @staticmethod
+    def _is_in_manifest_of(asset_key, course_key):
+        """
+        Returns whether the asset at asset_key would be listed in the asset manifest of
+        course_key, which holds the assets, but not the thumbnails, of the course.
+        """
+        asset_course_key = asset_key.course_key
+        return (
+            asset_key.block_type == 'asset' and
+            asset_course_key.org == course_key.org and
+            asset_course_key.course == course_key.course and
+            # Old-style asset keys may not know the run of their course.
+            (asset_course_key.run == course_key.run or getattr(asset_key, 'deprecated', False))
+        )
+
     def stream_data(self):
         yield self._data
 
@@ -374,6 +412,43 @@ class ContentStore(object):
         '''
         raise NotImplementedError
 
+    def get_course_assets_page(self, course_key, after=None, page_size=DEFAULT_ASSET_PAGE_SIZE, **kwargs):
+        """
+        Returns a page of at most page_size static assets for a course, in the format of
+        get_all_content_for_course, followed by the cursor of the next page, or None if this
+        is the last page. `after` is the cursor returned with the previous page, or None to get
+        the first page.
+        """
+        raise NotImplementedError
+
+    def iter_course_assets(self, course_key, page_size=DEFAULT_ASSET_PAGE_SIZE, get_thumbnails=False):
+        """
+        Yields all the static assets for a course, in the format of get_all_content_for_course,
+        fetching them page_size at a time.
+        """
+        after = None
+        while True:
+            assets, after = self.get_course_assets_page(
+                course_key, after=after, page_size=page_size, get_thumbnails=get_thumbnails
+            )
+            for asset in assets:
+                yield asset
+            if after is None:
+                return
+
+    def get_course_asset_manifest(self, course_key):
+        """
+        Returns a dict mapping the name of each static asset of a course (excluding thumbnails)
+        to its AssetManifestEntry.
+        """
+        return {
+            asset['asset_key'].block_id: AssetManifestEntry(
+                content_digest=asset.get('md5'),
+                locked=bool(asset.get('locked', False)),
+            )
+            for asset in self.iter_course_assets(course_key)
+        }
+
     def delete_all_course_assets(self, course_key):
         """
         Delete all of the assets which use this course_key as an identifier
@@ -387,7 +462,7 @@ class ContentStore(object):
         """
         raise NotImplementedError
 
-    def generate_thumbnail(self, content, tempfile_path=None, dimensions=None):
+    def generate_thumbnail(self, content, tempfile_path=None, dimensions=None, webp=False):
         """Create a thumbnail for a given image.
 
         Returns a tuple of (StaticContent, AssetKey)
@@ -400,6 +475,9 @@ class ContentStore(object):
 
         `dimensions` is an optional param that represents (width, height) in
         pixels. It defaults to None.
+
+        `webp` is whether to create the WebP version of the thumbnail instead of
+        the JPEG one. No WebP version is created for SVG images.
         """
         thumbnail_content = None
         is_svg = content.content_type == 'image/svg+xml'
@@ -407,6 +485,10 @@ class ContentStore(object):
         thumbnail_name = StaticContent.generate_thumbnail_name(
             content.location.block_id, dimensions=dimensions, extension='.svg' if is_svg else None
         )
+        if webp:
+            if is_svg:
+                return None, None
+            thumbnail_name = StaticContent.generate_webp_thumbnail_name(thumbnail_name)
         thumbnail_file_location = StaticContent.compute_location(
             content.location.course_key, thumbnail_name, is_thumbnail=True
         )
@@ -447,12 +529,12 @@ class ContentStore(object):
                         dimensions = (128, 128)
 
                     thumbnail_image.thumbnail(dimensions, Image.ANTIALIAS)
-                    thumbnail_image.save(thumbnail_file, 'JPEG')
+                    thumbnail_image.save(thumbnail_file, 'WEBP' if webp else 'JPEG')
                     thumbnail_file.seek(0)
 
                 # store this thumbnail as any other piece of content
                 thumbnail_content = StaticContent(thumbnail_file_location, thumbnail_name,
-                                                  'image/jpeg', thumbnail_file)
+                                                  'image/webp' if webp else 'image/jpeg', thumbnail_file)
 
                 self.save(thumbnail_content)
 
@@ -464,6 +546,27 @@ class ContentStore(object):
 
         return thumbnail_content, thumbnail_file_location
 
+    def generate_thumbnail_variants(self, content, sizes=(), webp=False, tempfile_path=None):
+        """
+        Create the extra thumbnails of a given image: one for each (width, height)
+        in `sizes`, and, if `webp` is set, the WebP version of the default thumbnail
+        and of each of those.
+
+        Returns the list of the AssetKeys of the thumbnails created.
+        """
+        variants = [(dimensions, False) for dimensions in sizes]
+        if webp:
+            variants += [(dimensions, True) for dimensions in [None] + list(sizes)]
+
+        thumbnail_locations = []
+        for dimensions, is_webp in variants:
+            thumbnail_content, thumbnail_location = self.generate_thumbnail(
+                content, tempfile_path=tempfile_path, dimensions=dimensions, webp=is_webp
+            )
+            if thumbnail_content is not None:
+                thumbnail_locations.append(thumbnail_location)
+        return thumbnail_locations
+
     def ensure_indexes(self):
         """
         Ensure that all appropriate indexes are created that are needed by this modulestore, or raise
@@ -4,7 +4,9 @@ MongoDB/GridFS-level code for the contentstore.
 
 
 import json
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import gridfs
 import pymongo
@@ -21,7 +23,21 @@ from xmodule.modulestore.django import ASSET_IGNORE_REGEX
 from xmodule.mongo_utils import connect_to_mongodb, create_collection_index
 from xmodule.util.misc import escape_invalid_characters
 
-from .content import ContentStore, StaticContent, StaticContentStream
+from .content import DEFAULT_ASSET_PAGE_SIZE, ContentStore, StaticContent, StaticContentStream
+
+# GridFS attributes which can't be changed through set_attrs.
+PROTECTED_ATTRS = ['_id', 'md5', 'uploadDate', 'length']
+
+# Fields assets can be sorted by in get_course_assets_page, each backed by an index.
+ASSET_PAGE_SORT_FIELDS = ['uploadDate', 'displayname']
+
+# Number of threads copying the assets of a course at once.
+DEFAULT_COPY_WORKERS = 4
+
+# Number of assets removed per query when deleting all the assets of a course.
+DELETE_BATCH_SIZE = 100
+
+log = logging.getLogger(__name__)
 
 
 class MongoContentStore(ContentStore):
@@ -31,12 +47,14 @@ class MongoContentStore(ContentStore):
     # pylint: disable=unused-argument, bad-continuation
     def __init__(
         self, host, db,
-        port=27017, tz_aware=True, user=None, password=None, bucket='fs', collection=None, **kwargs
+        port=27017, tz_aware=True, user=None, password=None, bucket='fs', collection=None,
+        copy_workers=DEFAULT_COPY_WORKERS, **kwargs
     ):
         """
         Establish the connection with the mongo backend and connect to the collections
 
         :param collection: ignores but provided for consistency w/ other doc_store_config patterns
+        :param copy_workers: the number of threads copying assets in copy_all_course_assets
         """
         # GridFS will throw an exception if the Database is wrapped in a MongoProxy. So don't wrap it.
         # The appropriate methods below are marked as autoretry_read - those methods will handle
@@ -51,6 +69,7 @@ class MongoContentStore(ContentStore):
 
         self.fs_files = mongo_db[bucket + ".files"]  # the underlying collection GridFS uses
         self.chunks = mongo_db[bucket + ".chunks"]
+        self.copy_workers = copy_workers
 
     def close_connections(self):
         """
@@ -205,9 +224,7 @@ class MongoContentStore(ContentStore):
                 directory as the other policy files.
         """
         policy = {}
-        assets, __ = self.get_all_content_for_course(course_key)
-
-        for asset in assets:
+        for asset in self.iter_course_assets(course_key):
             # TODO: On 6/19/14, I had to put a try/except around this
             # to export a course. The course failed on JSON files in
             # the /static/ directory placed in it with an import.
@@ -336,10 +353,70 @@ class MongoContentStore(ContentStore):
         # We're constructing the asset key immediately after retrieval from the database so that
         # callers are insulated from knowing how our identifiers are stored.
         for asset in assets:
-            asset_id = asset.get('content_son', asset['_id'])
-            asset['asset_key'] = course_key.make_asset_key(asset_id['category'], asset_id['name'])
+            self._add_asset_key(course_key, asset)
         return assets, count
 
+    @autoretry_read()
+    def get_course_assets_page(
+        self, course_key, after=None, page_size=DEFAULT_ASSET_PAGE_SIZE, sort_field='uploadDate',
+        sort_direction=pymongo.DESCENDING, get_thumbnails=False, filter_params=None,
+    ):
+        """
+        Returns a page of at most page_size static assets for a course, in the format of
+        get_all_content_for_course, followed by the cursor of the next page, or None if this is
+        the last page.
+
+        Pages start right after the last asset of the previous page, which `after` (the cursor
+        returned with that page) identifies, instead of skipping over all the preceding assets;
+        so any page is as cheap to get as the first, however many assets the course has.
+
+        Assets are sorted by sort_field, one of ASSET_PAGE_SORT_FIELDS (displayname is compared
+        case-sensitively, and assets without one come first), then by filename, which is unique.
+        """
+        if sort_field not in ASSET_PAGE_SORT_FIELDS:
+            raise ValueError(u'Assets cannot be paged by {}.'.format(sort_field))
+
+        query = query_for_course(course_key, 'asset' if not get_thumbnails else 'thumbnail')
+        if filter_params:
+            query.update(filter_params)
+        if after is not None:
+            after_value, after_filename = after
+            comparison = '$gt' if sort_direction == pymongo.ASCENDING else '$lt'
+            conditions = [{sort_field: after_value, 'filename': {comparison: after_filename}}]
+            # Assets without a value (null) sort before all the others, but comparisons only
+            # match values of the same type: none matches null, and null doesn't match any.
+            if after_value is None:
+                if sort_direction == pymongo.ASCENDING:
+                    conditions.append({sort_field: {'$ne': None}})
+            else:
+                conditions.append({sort_field: {comparison: after_value}})
+                if sort_direction == pymongo.DESCENDING:
+                    conditions.append({sort_field: None})
+            query['$and'] = query.get('$and', []) + [{'$or': conditions}]
+
+        # Fetch one more asset than needed to find out whether there's a next page.
+        assets = list(
+            self.fs_files.find(query).sort(
+                [(sort_field, sort_direction), ('filename', sort_direction)]
+            ).limit(page_size + 1)
+        )
+        next_page = None
+        if len(assets) > page_size:
+            assets = assets[:page_size]
+            next_page = (assets[-1].get(sort_field), assets[-1]['filename'])
+
+        for asset in assets:
+            self._add_asset_key(course_key, asset)
+        return assets, next_page
+
+    @staticmethod
+    def _add_asset_key(course_key, asset):
+        """
+        Sets the asset_key of an asset data dictionary read from the database.
+        """
+        asset_id = asset.get('content_son', asset['_id'])
+        asset['asset_key'] = course_key.make_asset_key(asset_id['category'], asset_id['name'])
+
     def set_attr(self, asset_key, attr, value=True):
         """
         Add/set the given attr on the asset at the given location. Does not allow overwriting gridFS built in
@@ -376,7 +453,7 @@ class MongoContentStore(ContentStore):
         :param location:  a c4x asset location
         """
         for attr in six.iterkeys(attr_dict):
-            if attr in ['_id', 'md5', 'uploadDate', 'length']:
+            if attr in PROTECTED_ATTRS:
                 raise AttributeError("{} is a protected attribute.".format(attr))
         asset_db_key, __ = self.asset_db_key(location)
         # catch upsert error and raise NotFoundError if asset doesn't exist
@@ -401,41 +478,144 @@ class MongoContentStore(ContentStore):
             raise NotFoundError(asset_db_key)
         return item
 
+    def set_attrs_for_assets(self, attrs_by_location):
+        """
+        Like set_attrs but for many assets at once, in a single round trip to the database.
+
+        Returns nothing.
+
+        Raises NotFoundError, after updating the other assets, if any of the assets doesn't exist.
+        Raises AttributeError, without updating any asset, if any attr is one of the built in attrs.
+
+        :param attrs_by_location: a dict mapping asset locations to the dict of attrs to set on them
+        """
+        for attr_dict in six.itervalues(attrs_by_location):
+            for attr in six.iterkeys(attr_dict):
+                if attr in PROTECTED_ATTRS:
+                    raise AttributeError("{} is a protected attribute.".format(attr))
+        if not attrs_by_location:
+            return
+
+        updates = []
+        for location, attr_dict in six.iteritems(attrs_by_location):
+            asset_db_key, __ = self.asset_db_key(location)
+            updates.append(pymongo.UpdateOne({'_id': asset_db_key}, {'$set': attr_dict}, upsert=False))
+        result = self.fs_files.bulk_write(updates, ordered=False)
+        if result.matched_count < len(updates):
+            found = self.get_attrs_for_assets(list(attrs_by_location))
+            raise NotFoundError([
+                self.asset_db_key(location)[0] for location in attrs_by_location if location not in found
+            ])
+
+    @autoretry_read()
+    def get_attrs_for_assets(self, locations):
+        """
+        Like get_attrs but for many assets at once, in a single round trip to the database.
+
+        Returns a dict mapping each of the given locations to its attributes. Locations
+        of assets which don't exist are left out.
+
+        :param locations: a list of asset locations
+        """
+        locations_by_id = {}
+        for location in locations:
+            asset_db_key, __ = self.asset_db_key(location)
+            locations_by_id[_asset_id_lookup_key(asset_db_key)] = (asset_db_key, location)
+        if not locations_by_id:
+            return {}
+
+        items = self.fs_files.find({'_id': {'$in': [asset_db_key for asset_db_key, __ in locations_by_id.values()]}})
+        return {
+            locations_by_id[_asset_id_lookup_key(item['_id'])][1]: item
+            for item in items
+        }
+
     def copy_all_course_assets(self, source_course_key, dest_course_key):
         """
         See :meth:`.ContentStore.copy_all_course_assets`
 
-        This implementation fairly expensively copies all of the data
+        This implementation fairly expensively copies all of the data, using up to copy_workers
+        threads. Assets which the destination already has with the same content, according to
+        their md5, are not copied again but only get their attributes updated. Since a GridFS file
+        only becomes visible once all of its chunks are written, the destination assets are thus a
+        checkpoint of the copy: if it fails, running it again only copies what is still missing.
         """
+        dest_assets = {}
+        for dest_asset in self.fs_files.find(query_for_course(dest_course_key), {'md5': 1, 'content_son': 1}):
+            asset_id = dest_asset.get('content_son', dest_asset['_id'])
+            dest_assets[(asset_id['category'], asset_id['name'])] = (dest_asset.get('md5'), dest_asset['_id'])
+
         source_query = query_for_course(source_course_key)
         # it'd be great to figure out how to do all of this on the db server and not pull the bits over
-        for asset in self.fs_files.find(source_query):
-            asset_key = self.make_id_son(asset)
-            # don't convert from string until fs access
-            source_content = self.fs.get(asset_key)
-            if isinstance(asset_key, six.string_types):
-                asset_key = AssetKey.from_string(asset_key)
-                __, asset_key = self.asset_db_key(asset_key)
-            # Need to replace dict IDs with SON for chunk lookup to work under Python 3
-            # because field order can be different and mongo cares about the order
-            if isinstance(source_content._id, dict):
-                source_content._file['_id'] = asset_key.copy()
-            asset_key['org'] = dest_course_key.org
-            asset_key['course'] = dest_course_key.course
-            if getattr(dest_course_key, 'deprecated', False):  # remove the run if exists
-                if 'run' in asset_key:
-                    del asset_key['run']
-                asset_id = asset_key
-            else:  # add the run, since it's the last field, we're golden
-                asset_key['run'] = dest_course_key.run
-                asset_id = six.text_type(
-                    dest_course_key.make_asset_key(asset_key['category'], asset_key['name']).for_branch(None)
-                )
-            try:
-                self.create_asset(source_content, asset_id, asset, asset_key)
-            except FileExists:
-                self.fs.delete(file_id=asset_id)
-                self.create_asset(source_content, asset_id, asset, asset_key)
+        with ThreadPoolExecutor(max_workers=self.copy_workers) as executor:
+            futures = [
+                executor.submit(self._copy_asset, asset, dest_course_key, dest_assets)
+                for asset in self.fs_files.find(source_query)
+            ]
+
+        # Every asset was attempted, so that as much as possible is done before reporting a failure.
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            log.error(
+                u'Failed to copy %d of %d assets from %s to %s.',
+                len(errors), len(futures), source_course_key, dest_course_key,
+            )
+            raise errors[0]
+
+    def _copy_asset(self, asset, dest_course_key, dest_assets):
+        """
+        Copies the asset, a document of the files collection, to dest_course_key, unless
+        dest_assets, a dict mapping the (category, name) of the destination assets to their
+        md5 and their id as stored, shows the destination already has it.
+        """
+        asset_key = self.make_id_son(asset)
+        if isinstance(asset_key, six.string_types):
+            asset_key = AssetKey.from_string(asset_key)
+            __, asset_key = self.asset_db_key(asset_key)
+        else:
+            asset_key = asset_key.copy()
+        asset_key['org'] = dest_course_key.org
+        asset_key['course'] = dest_course_key.course
+        if getattr(dest_course_key, 'deprecated', False):  # remove the run if exists
+            if 'run' in asset_key:
+                del asset_key['run']
+            asset_id = asset_key
+        else:  # add the run, since it's the last field, we're golden
+            asset_key['run'] = dest_course_key.run
+            asset_id = six.text_type(
+                dest_course_key.make_asset_key(asset_key['category'], asset_key['name']).for_branch(None)
+            )
+
+        # The destination asset is looked up by its id as stored, since reordering its fields
+        # would make it match nothing.
+        dest_digest, dest_id = dest_assets.get((asset_key['category'], asset_key['name']), (None, None))
+        if dest_digest is not None and dest_digest == asset.get('md5'):
+            self.fs_files.update_one({'_id': dest_id}, {'$set': {
+                'filename': asset['filename'],
+                'contentType': asset['contentType'],
+                'displayname': asset['displayname'],
+                'thumbnail_location': asset['thumbnail_location'],
+                'import_path': asset['import_path'],
+                'locked': asset.get('locked', False),
+            }})
+            return
+        if dest_id is not None and dest_id != asset_id:
+            # A different version of the asset, stored under an id which the copy won't replace.
+            self.fs.delete(file_id=dest_id)
+
+        # don't convert from string until fs access
+        source_content = self.fs.get(asset['_id'])
+        # Need to replace dict IDs with SON for chunk lookup to work under Python 3
+        # because field order can be different and mongo cares about the order
+        if isinstance(source_content._id, dict):
+            source_content._file['_id'] = asset['_id']
+        try:
+            self.create_asset(source_content, asset_id, asset, asset_key)
+        except FileExists:
+            # Either a different version of the asset, or chunks left over by a failed copy.
+            self.fs.delete(file_id=asset_id)
+            source_content.seek(0)
+            self.create_asset(source_content, asset_id, asset, asset_key)
 
     def create_asset(self, source_content, asset_id, asset, asset_key):
         """
@@ -462,13 +642,25 @@ class MongoContentStore(ContentStore):
         """
         Delete all assets identified via this course_key. Dangerous operation which may remove assets
         referenced by other runs or other courses.
+
+        Assets are deleted DELETE_BATCH_SIZE at a time, removing their files then their chunks, so
+        an interrupted deletion never leaves a visible asset with missing chunks.
         :param course_key:
         """
         course_query = query_for_course(course_key)
-        matching_assets = self.fs_files.find(course_query)
-        for asset in matching_assets:
-            asset_key = self.make_id_son(asset)
-            self.fs.delete(asset_key)
+        while True:
+            # The ids are used as stored, since reordering their fields would make them match nothing.
+            asset_ids = [
+                asset['_id'] for asset in self.fs_files.find(course_query, {'_id': 1}).limit(DELETE_BATCH_SIZE)
+            ]
+            if not asset_ids:
+                return
+            deleted_count = self.fs_files.delete_many({'_id': {'$in': asset_ids}}).deleted_count
+            self.chunks.delete_many({'files_id': {'$in': asset_ids}})
+            if deleted_count == 0:
+                # Nothing found can be deleted, so looping again would find the same assets forever.
+                log.error(u'Failed to delete the assets of course %s', course_key)
+                return
 
     # codifying the original order which pymongo used for the dicts coming out of location_to_dict
     # stability of order is more important than sanity of order as any changes to order make things
@@ -601,6 +793,31 @@ class MongoContentStore(ContentStore):
             sparse=True,
             background=True
         )
+        # Indexes needed by `get_course_assets_page`, for each of the fields it can sort on.
+        for prefix in ['_id', 'content_son']:
+            for sort_field in ASSET_PAGE_SORT_FIELDS:
+                create_collection_index(
+                    self.fs_files,
+                    [
+                        ('{}.org'.format(prefix), pymongo.ASCENDING),
+                        ('{}.course'.format(prefix), pymongo.ASCENDING),
+                        ('{}.category'.format(prefix), pymongo.ASCENDING),
+                        (sort_field, pymongo.ASCENDING),
+                        ('filename', pymongo.ASCENDING)
+                    ],
+                    sparse=True,
+                    background=True
+                )
+
+
+def _asset_id_lookup_key(asset_db_key):
+    """
+    Returns a hashable key for the given asset _id, which is either a string or a SON/dict of fields
+    whose order depends on where it comes from.
+    """
+    if isinstance(asset_db_key, six.string_types):
+        return asset_db_key
+    return tuple(sorted(six.iteritems(asset_db_key)))
 
 
 def query_for_course(course_key, category=None):
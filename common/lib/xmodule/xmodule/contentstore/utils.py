@@ -19,8 +19,7 @@ def empty_asset_trashcan(course_locs):
             store.delete(thumb['asset_key'])
 
         # then delete all of the assets
-        assets, __ = store.get_all_content_for_course(course_loc)
-        for asset in assets:
+        for asset in store.iter_course_assets(course_loc):
             print("Deleting {0}...".format(asset))
             store.delete(asset['asset_key'])
 
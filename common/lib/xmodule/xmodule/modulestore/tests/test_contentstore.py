@@ -3,6 +3,7 @@
 """
 
 
+import itertools
 import logging
 import mimetypes
 import shutil
@@ -12,11 +13,14 @@ from uuid import uuid4
 
 import ddt
 import path
+import pymongo
+from bson.son import SON
+from mock import Mock, patch
 from opaque_keys.edx.keys import AssetKey
 from opaque_keys.edx.locator import AssetLocator, CourseLocator
 
 from xmodule.contentstore.content import StaticContent
-from xmodule.contentstore.mongo import MongoContentStore
+from xmodule.contentstore.mongo import MongoContentStore, query_for_course
 from xmodule.exceptions import NotFoundError
 from xmodule.modulestore.tests.mongo_connection import MONGO_HOST, MONGO_PORT_NUM
 from xmodule.tests import DATA_DIR
@@ -168,6 +172,120 @@ class TestContentstore(unittest.TestCase):
         self.assertEqual(count, 0)
         self.assertEqual(course_assets, [])
 
+    @ddt.data(
+        *itertools.product([True, False], ['uploadDate', 'displayname'], [pymongo.ASCENDING, pymongo.DESCENDING])
+    )
+    @ddt.unpack
+    def test_get_course_assets_page(self, deprecated, sort_field, sort_direction):
+        """
+        Test paging through a course's assets with get_course_assets_page
+        """
+        self.set_up_assets(deprecated)
+        all_assets, __ = self.contentstore.get_all_content_for_course(self.course1_key)
+        expected = [
+            asset['filename'] for asset in sorted(
+                all_assets,
+                key=lambda asset: (asset[sort_field], asset['filename']),
+                reverse=sort_direction == pymongo.DESCENDING,
+            )
+        ]
+
+        paged, after = [], None
+        for __ in range(len(self.course1_files)):
+            assets, after = self.contentstore.get_course_assets_page(
+                self.course1_key, after=after, page_size=1, sort_field=sort_field, sort_direction=sort_direction
+            )
+            self.assertEqual(len(assets), 1)
+            self.assertEqual(assets[0]['asset_key'].block_id, AssetKey.from_string(assets[0]['filename']).block_id)
+            paged.append(assets[0]['filename'])
+            if after is None:
+                break
+        self.assertIsNone(after)
+        self.assertEqual(paged, expected)
+
+        self.assertEqual(
+            [asset['filename'] for asset in self.contentstore.iter_course_assets(self.course1_key, page_size=2)],
+            [asset['filename'] for asset in self.contentstore.get_course_assets_page(self.course1_key)[0]],
+        )
+
+    @ddt.data(*itertools.product([True, False], [pymongo.ASCENDING, pymongo.DESCENDING]))
+    @ddt.unpack
+    def test_get_course_assets_page_without_sort_values(self, deprecated, sort_direction):
+        """
+        Test that assets without a value for the sort field are paged through with the others
+        """
+        self.set_up_assets(deprecated)
+        self.contentstore.fs_files.update_many(
+            {'displayname': {'$in': ['contains.sh', 'picture2.jpg']}}, {'$unset': {'displayname': ''}}
+        )
+        all_assets, __ = self.contentstore.get_all_content_for_course(self.course1_key)
+        expected = [
+            asset['filename'] for asset in sorted(
+                all_assets,
+                key=lambda asset: ('displayname' in asset, asset.get('displayname'), asset['filename']),
+                reverse=sort_direction == pymongo.DESCENDING,
+            )
+        ]
+
+        paged, after = [], None
+        for __ in range(len(self.course1_files)):
+            assets, after = self.contentstore.get_course_assets_page(
+                self.course1_key, after=after, page_size=1, sort_field='displayname', sort_direction=sort_direction
+            )
+            paged.extend(asset['filename'] for asset in assets)
+            if after is None:
+                break
+        self.assertIsNone(after)
+        self.assertEqual(paged, expected)
+
+    @ddt.data(True, False)
+    def test_get_course_assets_page_unknown_sort(self, deprecated):
+        self.set_up_assets(deprecated)
+        with self.assertRaises(ValueError):
+            self.contentstore.get_course_assets_page(self.course1_key, sort_field='length')
+
+    @ddt.data(True, False)
+    def test_attrs_for_assets(self, deprecated):
+        """
+        Test setting and getting the attrs of many assets at once
+        """
+        self.set_up_assets(deprecated)
+        asset_keys = [self.course1_key.make_asset_key('asset', filename) for filename in self.course1_files]
+        self.contentstore.set_attrs_for_assets({
+            asset_key: {'locked': index % 2 == 0, 'note': index} for index, asset_key in enumerate(asset_keys)
+        })
+
+        unknown_asset = self.course1_key.make_asset_key('asset', 'no_such_file.gif')
+        attrs = self.contentstore.get_attrs_for_assets(asset_keys + [unknown_asset])
+        self.assertEqual(set(attrs), set(asset_keys))
+        for index, asset_key in enumerate(asset_keys):
+            self.assertEqual(attrs[asset_key]['locked'], index % 2 == 0)
+            self.assertEqual(attrs[asset_key]['note'], index)
+            self.assertEqual(attrs[asset_key], self.contentstore.get_attrs(asset_key))
+
+        with self.assertRaises(NotFoundError):
+            self.contentstore.set_attrs_for_assets({asset_keys[0]: {'note': 'found'}, unknown_asset: {'note': 'lost'}})
+        self.assertEqual(self.contentstore.get_attr(asset_keys[0], 'note'), 'found')
+
+        with self.assertRaises(AttributeError):
+            self.contentstore.set_attrs_for_assets({asset_keys[1]: {'note': 'protected', 'md5': 'abc'}})
+        self.assertEqual(self.contentstore.get_attr(asset_keys[1], 'note'), 1)
+
+    @ddt.data(True, False)
+    def test_get_course_asset_manifest(self, deprecated):
+        """
+        Test get_course_asset_manifest
+        """
+        self.set_up_assets(deprecated)
+        manifest = self.contentstore.get_course_asset_manifest(self.course1_key)
+        self.assertEqual(set(manifest), set(self.course1_files))
+        for filename in self.course1_files:
+            content = self.contentstore.find(self.course1_key.make_asset_key('asset', filename), as_stream=True)
+            self.assertEqual(manifest[filename].content_digest, content.content_digest)
+            self.assertEqual(manifest[filename].locked, content.locked)
+
+        self.assertEqual(self.contentstore.get_course_asset_manifest(CourseLocator('test', 'fake', 'non')), {})
+
     @ddt.data(True, False)
     def test_attrs(self, deprecated):
         """
@@ -212,6 +330,74 @@ class TestContentstore(unittest.TestCase):
         self.assertEqual(count, 5)
 
     @ddt.data(True, False)
+    def test_copy_assets_skips_identical_content(self, deprecated):
+        """
+        Copying assets again only updates the attributes of the assets already copied
+        """
+        self.set_up_assets(deprecated)
+        dest_course = CourseLocator('test', 'destination', 'copy')
+        self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+
+        source_key = self.course1_key.make_asset_key('asset', self.course1_files[0])
+        dest_key = dest_course.make_asset_key('asset', self.course1_files[0])
+        locked = self.contentstore.get_attr(source_key, 'locked', False)
+        self.contentstore.set_attr(source_key, 'locked', not locked)
+
+        with patch.object(self.contentstore, 'create_asset') as mock_create_asset:
+            self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+        self.assertFalse(mock_create_asset.called)
+        self.assertEqual(self.contentstore.get_attr(dest_key, 'locked', False), not locked)
+
+    def test_copy_assets_updates_misordered_ids(self):
+        """
+        Assets already copied under ids whose fields are stored in another order get their attributes updated
+        """
+        self.set_up_assets(True)
+        dest_course = CourseLocator('test', 'destination', 'copy')
+        self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+
+        dest_key = dest_course.make_asset_key('asset', self.course1_files[0])
+        dest_id, __ = self.contentstore.asset_db_key(dest_key)
+        dest_asset = self.contentstore.fs_files.find_one_and_delete({'_id': dest_id})
+        dest_asset['_id'] = SON(reversed(list(dest_id.items())))
+        self.contentstore.fs_files.insert_one(dest_asset)
+
+        source_key = self.course1_key.make_asset_key('asset', self.course1_files[0])
+        locked = self.contentstore.get_attr(source_key, 'locked', False)
+        self.contentstore.set_attr(source_key, 'locked', not locked)
+        with patch.object(self.contentstore, 'create_asset') as mock_create_asset:
+            self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+        self.assertFalse(mock_create_asset.called)
+        self.assertEqual(self.contentstore.fs_files.find_one({'_id': dest_asset['_id']})['locked'], not locked)
+
+    @ddt.data(True, False)
+    def test_copy_assets_resumes_after_failure(self, deprecated):
+        """
+        A failed copy copies all the assets it can, and copying again copies the rest
+        """
+        self.set_up_assets(deprecated)
+        dest_course = CourseLocator('test', 'destination', 'copy')
+        failing_name = self.course1_files[1]
+        create_asset = self.contentstore.create_asset
+
+        def fail_for_one_asset(source_content, asset_id, asset, asset_key):
+            if asset_key['name'] == failing_name:
+                raise IOError('Lost connection')
+            return create_asset(source_content, asset_id, asset, asset_key)
+
+        with patch.object(self.contentstore, 'create_asset', side_effect=fail_for_one_asset):
+            with self.assertRaises(IOError):
+                self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+        __, count = self.contentstore.get_all_content_for_course(dest_course)
+        self.assertEqual(count, len(self.course1_files) - 1)
+
+        with patch.object(self.contentstore, 'create_asset', side_effect=create_asset) as mock_create_asset:
+            self.contentstore.copy_all_course_assets(self.course1_key, dest_course)
+        self.assertEqual(mock_create_asset.call_count, 1)
+        self.assertIsNotNone(self.contentstore.find(dest_course.make_asset_key('asset', failing_name)))
+
+    @ddt.data(True, False)
+    @patch('xmodule.contentstore.mongo.DELETE_BATCH_SIZE', 2)
     def test_delete_assets(self, deprecated):
         """
         delete_all_course_assets
@@ -220,6 +406,26 @@ class TestContentstore(unittest.TestCase):
         self.contentstore.delete_all_course_assets(self.course1_key)
         __, count = self.contentstore.get_all_content_for_course(self.course1_key)
         self.assertEqual(count, 0)
+        # Each of the test assets fits in a single chunk, so no chunk was left behind.
+        self.assertEqual(self.contentstore.chunks.count_documents({}), self.contentstore.fs_files.count_documents({}))
         # ensure it didn't remove any from other course
         __, count = self.contentstore.get_all_content_for_course(self.course2_key)
         self.assertEqual(count, len(self.course2_files))
+
+    @patch('xmodule.contentstore.mongo.DELETE_BATCH_SIZE', 2)
+    def test_delete_assets_with_misordered_ids(self):
+        """
+        Assets whose id fields are stored in another order than ordered_key_fields are deleted too.
+        """
+        self.set_up_assets(True)
+        asset_id, __ = self.contentstore.asset_db_key(self.course1_key.make_asset_key('asset', 'misordered.txt'))
+        misordered_id = SON(reversed(list(asset_id.items())))
+        self.contentstore.fs_files.insert_one({'_id': misordered_id, 'filename': 'misordered.txt'})
+        self.contentstore.delete_all_course_assets(self.course1_key)
+        self.assertEqual(self.contentstore.fs_files.count_documents(query_for_course(self.course1_key)), 0)
+
+    def test_delete_assets_stops_when_nothing_is_deleted(self):
+        self.set_up_assets(False)
+        with patch.object(self.contentstore.fs_files, 'delete_many', return_value=Mock(deleted_count=0)) as mock_delete:
+            self.contentstore.delete_all_course_assets(self.course1_key)
+        self.assertEqual(mock_delete.call_count, 1)
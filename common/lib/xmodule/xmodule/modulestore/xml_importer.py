@@ -84,10 +84,14 @@ class LocationMixin(XBlockMixin):
 
 
 class StaticContentImporter:
-    def __init__(self, static_content_store, course_data_path, target_id):
+    def __init__(self, static_content_store, course_data_path, target_id, defer_thumbnails=False):
         self.static_content_store = static_content_store
         self.target_id = target_id
         self.course_data_path = course_data_path
+        # when set, image thumbnails aren't generated here: the keys of the imported images are
+        # collected in deferred_thumbnail_keys instead
+        self.defer_thumbnails = defer_thumbnails
+        self.deferred_thumbnail_keys = []
         try:
             with open(course_data_path / 'policies/assets.json') as f:
                 self.policy = json.load(f)
@@ -163,11 +167,14 @@ class StaticContentImporter:
             import_path=file_subpath, locked=locked
         )
 
-        # first let's save a thumbnail so we can get back a thumbnail location
-        thumbnail_content, thumbnail_location = self.static_content_store.generate_thumbnail(content)
+        if self.defer_thumbnails and mime_type is not None and mime_type.split('/')[0] == 'image':
+            self.deferred_thumbnail_keys.append(asset_key)
+        else:
+            # first let's save a thumbnail so we can get back a thumbnail location
+            thumbnail_content, thumbnail_location = self.static_content_store.generate_thumbnail(content)
 
-        if thumbnail_content is not None:
-            content.thumbnail_location = thumbnail_location
+            if thumbnail_content is not None:
+                content.thumbnail_location = thumbnail_location
 
         # then commit the content
         try:
@@ -222,6 +229,10 @@ class ImportManager(object):
             create this file to implement custom logic in their course.
 
         default_class, load_error_modules: are arguments for constructing the XMLModuleStore (see its doc)
+
+        queue_thumbnails: If specified, the thumbnails of the imported images aren't generated during the
+            import. Instead, this function is called with the list of their asset keys once the static
+            content of a courselike is imported.
     """
     store_class = XMLModuleStore
 
@@ -234,6 +245,7 @@ class ImportManager(object):
             create_if_not_present=False, raise_on_failure=False,
             static_content_subdir=DEFAULT_STATIC_CONTENT_SUBDIR,
             python_lib_filename='python_lib.zip',
+            queue_thumbnails=None,
     ):
         self.store = store
         self.user_id = user_id
@@ -249,6 +261,7 @@ class ImportManager(object):
         self.do_import_python_lib = do_import_python_lib
         self.create_if_not_present = create_if_not_present
         self.raise_on_failure = raise_on_failure
+        self.queue_thumbnails = queue_thumbnails
         self.xml_module_store = self.store_class(
             data_dir,
             default_class=default_class,
@@ -280,7 +293,8 @@ class ImportManager(object):
         static_content_importer = StaticContentImporter(
             self.static_content_store,
             course_data_path=data_path,
-            target_id=dest_id
+            target_id=dest_id,
+            defer_thumbnails=self.queue_thumbnails is not None,
         )
         if self.do_import_static:
             if self.verbose:
@@ -319,6 +333,9 @@ class ImportManager(object):
                 content_subdir=simport, verbose=self.verbose
             )
 
+        if static_content_importer.deferred_thumbnail_keys:
+            self.queue_thumbnails(static_content_importer.deferred_thumbnail_keys)
+
     def import_asset_metadata(self, data_dir, course_id):
         """
         Read in assets XML file, parse it, and add all asset metadata to the modulestore.
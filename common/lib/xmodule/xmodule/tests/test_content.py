@@ -3,14 +3,17 @@
 
 import os
 import unittest
+from io import BytesIO
 
 import ddt
 from mock import Mock, patch
 from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.locator import AssetLocator, CourseLocator
 from path import Path as path
+from PIL import Image
 
-from xmodule.contentstore.content import ContentStore, StaticContent, StaticContentStream
+from xmodule.contentstore.content import AssetManifestEntry, ContentStore, StaticContent, StaticContentStream
+from xmodule.exceptions import NotFoundError
 from xmodule.static_content import _list_descriptors, _write_js
 
 SAMPLE_STRING = """
@@ -160,6 +163,39 @@ class ContentTest(unittest.TestCase):
             thumbnail_file_location
         )
 
+    def test_generate_thumbnail_variants(self):
+        content_store = ContentStore()
+        content_store.save = Mock()
+        course_key = CourseLocator(u'mitX', u'800', u'ignore_run')
+        content = Content(AssetLocator(course_key, u'asset', u'monsters.png'), 'image/png')
+        image_file = BytesIO()
+        Image.new('RGB', size=(300, 200), color=(255, 0, 0)).save(image_file, 'PNG')
+        content.data = image_file.getvalue()
+
+        thumbnail_locations = content_store.generate_thumbnail_variants(content, sizes=[(64, 64)], webp=True)
+        self.assertEqual(
+            thumbnail_locations,
+            [
+                AssetLocator(course_key, u'thumbnail', u'monsters-png-64x64.jpg'),
+                AssetLocator(course_key, u'thumbnail', u'monsters-png.webp'),
+                AssetLocator(course_key, u'thumbnail', u'monsters-png-64x64.webp'),
+            ]
+        )
+        saved = [call[0][0] for call in content_store.save.call_args_list]
+        self.assertEqual([thumbnail.content_type for thumbnail in saved], ['image/jpeg', 'image/webp', 'image/webp'])
+        with Image.open(saved[2].data) as thumbnail_image:
+            self.assertEqual(thumbnail_image.format, 'WEBP')
+            self.assertEqual(max(thumbnail_image.size), 64)
+
+    def test_no_webp_thumbnail_for_svg(self):
+        content_store = ContentStore()
+        content_store.save = Mock()
+        content = Content(AssetLocator(CourseLocator(u'mitX', u'800', u'ignore_run'), u'asset', u'test.svg'),
+                          'image/svg+xml')
+        content.data = b'mock svg file'
+        self.assertEqual(content_store.generate_thumbnail(content, webp=True), (None, None))
+        self.assertFalse(content_store.save.called)
+
     def test_compute_location(self):
         # We had a bug that __ got converted into a single _. Make sure that substitution of INVALID_CHARS (like space)
         # still happen.
@@ -180,6 +216,43 @@ class ContentTest(unittest.TestCase):
             asset_location
         )
 
+    @ddt.data(
+        (AssetManifestEntry(content_digest='0123456789abcdef0123456789abcdef', locked=False), True),
+        (AssetManifestEntry(content_digest='0123456789abcdef0123456789abcdef', locked=True), True),
+        (AssetManifestEntry(content_digest=None, locked=False), True),
+        (None, False),
+    )
+    @ddt.unpack
+    def test_canonicalized_asset_path_from_manifest(self, entry, exists):
+        course_key = CourseLocator(u'org', u'course', u'run')
+        path = u'/static/image.png?config=/static/image.png'
+        manifest = {u'image.png': entry} if exists else {}
+
+        with patch('xmodule.contentstore.content.AssetManager.find') as mock_find:
+            if exists:
+                mock_find.return_value = Mock(locked=entry.locked, content_digest=entry.content_digest)
+            else:
+                mock_find.side_effect = NotFoundError
+            expected = StaticContent.get_canonicalized_asset_path(course_key, path, u'cdn.example.com', [])
+            mock_find.reset_mock()
+
+            self.assertEqual(
+                StaticContent.get_canonicalized_asset_path(
+                    course_key, path, u'cdn.example.com', [], asset_manifest=manifest
+                ),
+                expected,
+            )
+            self.assertFalse(mock_find.called)
+
+    def test_canonicalized_asset_path_outside_manifest(self):
+        # Assets of other courses aren't in the manifest, so they are looked up.
+        course_key = CourseLocator(u'org', u'course', u'run')
+        path = u'/asset-v1:org+course+other_run+type@asset+block@image.png'
+        with patch('xmodule.contentstore.content.AssetManager.find') as mock_find:
+            mock_find.return_value = Mock(locked=False, content_digest=None)
+            StaticContent.get_canonicalized_asset_path(course_key, path, u'', [], asset_manifest={})
+        self.assertTrue(mock_find.called)
+
     def test_static_content_stream_stream_data(self):
         """
         Test StaticContentStream stream_data function, asserts that we get all the bytes
@@ -54,3 +54,25 @@ class IgnoredFilesTestCase(unittest.TestCase):
         self.assertNotIn("._example.txt", name_val)
         self.assertNotIn(".DS_Store", name_val)
         self.assertNotIn("example.txt~", name_val)
+
+
+class DeferredThumbnailsTestCase(unittest.TestCase):
+    """
+    Tests for importing static content with deferred thumbnails
+    """
+    def test_image_thumbnails_deferred(self):
+        course_id = CourseLocator("edX", "simple", "2012_Fall")
+        content_store = Mock()
+        static_content_importer = StaticContentImporter(
+            static_content_store=content_store,
+            course_data_path=DATA_DIR / "simple",
+            target_id=course_id,
+            defer_thumbnails=True
+        )
+        static_content_importer.import_static_content_directory()
+        self.assertFalse(content_store.generate_thumbnail.called)
+        self.assertEqual(
+            static_content_importer.deferred_thumbnail_keys,
+            [course_id.make_asset_key('asset', 'images_course_image.jpg')]
+        )
+        self.assertEqual(content_store.save.call_count, 1)
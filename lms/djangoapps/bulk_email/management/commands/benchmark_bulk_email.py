@@ -0,0 +1,163 @@
+"""
+Measure how many bulk email messages per second can be rendered and sent.
+
+Messages are rendered from the default course email template, both the way
+they used to be, from the whole context for each recipient, and compiled
+once for all recipients.  They are then sent over a single connection to an
+SMTP server, by default a local sink started with aiosmtpd, and, for
+comparison, over a new connection for each message.
+
+    $ ./manage.py lms benchmark_bulk_email --messages 2000
+    $ ./manage.py lms benchmark_bulk_email --host smtp.example.com --port 2525
+"""
+
+
+import socket
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from bulk_email.models import CourseEmailTemplate
+from bulk_email.tasks import RECIPIENT_CONTEXT_KEYS
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+GLOBAL_CONTEXT = {
+    'course_title': u'Demonstration Course',
+    'course_root': u'/courses/course-v1:edX+DemoX+Demo_Course/',
+    'course_language': u'en',
+    'course_url': u'https://courses.example.com/courses/course-v1:edX+DemoX+Demo_Course/',
+    'course_image_url': u'https://courses.example.com/asset-v1:edX+DemoX+Demo_Course+type@asset+block@images_course_image.jpg',
+    'course_end_date': u'Dec 31, 2030',
+    'account_settings_url': u'https://courses.example.com/account/settings',
+    'email_settings_url': u'https://courses.example.com/dashboard',
+    'platform_name': u'Example',
+    'year': 2020,
+    'course_id': u'course-v1:edX+DemoX+Demo_Course',
+}
+
+TEXT_MESSAGE = u'Welcome to the course, %%USER_FULLNAME%%!\n\n' + u'The course starts next week. ' * 40
+HTML_MESSAGE = u'<p>Welcome to the course, %%USER_FULLNAME%%!</p>' + u'<p>The course starts next week.</p>' * 40
+
+
+class _SinkHandler(object):
+    """
+    aiosmtpd handler counting and discarding the messages it receives.
+    """
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):  # pylint: disable=unused-argument
+        self.received += 1
+        return '250 Message accepted for delivery'
+
+
+class Command(BaseCommand):
+    """
+    Django management command to benchmark rendering and sending bulk email.
+    """
+    help = 'Measure how many bulk email messages per second can be rendered and sent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000, help='Number of messages to render and send.')
+        parser.add_argument('--host', help='SMTP server to send to, instead of a local aiosmtpd sink.')
+        parser.add_argument('--port', type=int, default=25, help='Port of the SMTP server given with --host.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1,
+            help='Number of messages passed to the email backend at once, like BULK_EMAIL_SEND_BATCH_SIZE.',
+        )
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1:
+            raise CommandError('--messages must be at least 1.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        template = CourseEmailTemplate.get_template()
+        recipients = [_recipient_context(number) for number in range(options['messages'])]
+
+        start = time.time()
+        for recipient in recipients:
+            context = dict(GLOBAL_CONTEXT, **recipient)
+            template.render_plaintext(TEXT_MESSAGE, context)
+            template.render_htmltext(HTML_MESSAGE, context)
+        self._report(u'rendered per recipient', len(recipients), time.time() - start)
+
+        start = time.time()
+        plaintext_template = template.compile_plaintext(TEXT_MESSAGE, GLOBAL_CONTEXT, RECIPIENT_CONTEXT_KEYS)
+        html_template = template.compile_htmltext(HTML_MESSAGE, GLOBAL_CONTEXT, RECIPIENT_CONTEXT_KEYS)
+        messages = []
+        for recipient in recipients:
+            message = EmailMultiAlternatives(
+                u'Welcome', plaintext_template.render(recipient), u'course@example.com', [recipient['email']],
+            )
+            message.attach_alternative(html_template.render(recipient), 'text/html')
+            messages.append(message)
+        self._report(u'rendered compiled', len(recipients), time.time() - start)
+
+        controller = None
+        host, port = options['host'], options['port']
+        if host is None:
+            if Controller is None:
+                raise CommandError('aiosmtpd is not installed, give the SMTP server to send to with --host.')
+            host, port = '127.0.0.1', _free_port()
+            controller = Controller(_SinkHandler(), hostname=host, port=port)
+            controller.start()
+        try:
+            self._send(u'sent over one connection', messages, host, port, options['batch_size'], reuse=True)
+            self._send(u'sent over a connection each', messages, host, port, 1, reuse=False)
+        finally:
+            if controller is not None:
+                controller.stop()
+        if controller is not None:
+            self.stdout.write(u'The sink received {} messages.'.format(controller.handler.received))
+
+    def _send(self, name, messages, host, port, batch_size, reuse):
+        """
+        Sends the messages, and writes out how fast it went.
+        """
+        start = time.time()
+        if reuse:
+            connection = get_connection(SMTP_BACKEND, host=host, port=port)
+            connection.open()
+            try:
+                for index in range(0, len(messages), batch_size):
+                    connection.send_messages(messages[index:index + batch_size])
+            finally:
+                connection.close()
+        else:
+            for message in messages:
+                get_connection(SMTP_BACKEND, host=host, port=port).send_messages([message])
+        self._report(name, len(messages), time.time() - start)
+
+    def _report(self, name, count, seconds):
+        self.stdout.write(u'{name}: {rate:.0f} messages/s'.format(name=name, rate=count / seconds))
+
+
+def _recipient_context(number):
+    """
+    Returns the recipient-specific email context of a learner.
+    """
+    return {
+        'email': u'learner{}@example.com'.format(number),
+        'name': u'Learner {}'.format(number),
+        'user_id': number,
+        'unsubscribe_link': u'https://courses.example.com/bulk_email/email/optout/token{}/'.format(number),
+    }
+
+
+def _free_port():
+    """
+    Returns a local TCP port that is not in use.
+    """
+    sock = socket.socket()
+    try:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
@@ -4,6 +4,9 @@ Models for bulk email
 
 
 import logging
+import re
+import string
+from collections import ChainMap
 
 import markupsafe
 import six
@@ -346,6 +349,8 @@ class Optout(models.Model):
 # the location where the email message body is to be inserted.
 COURSE_EMAIL_MESSAGE_BODY_TAG = '{{message_body}}'
 
+_FORMATTER = string.Formatter()
+
 
 class CourseEmailTemplate(models.Model):
     """
@@ -433,6 +438,106 @@ class CourseEmailTemplate(models.Model):
                 context[key] = markupsafe.escape(value)
         return CourseEmailTemplate._render(self.html_template, htmltext, context)
 
+    def compile_plaintext(self, plaintext, context, recipient_keys):
+        """
+        Returns a `CompiledCourseEmailTemplate` rendering plain text messages
+        like `render_plaintext`, for recipients differing only in the values
+        of `recipient_keys`.  The other values are taken from `context`.
+        """
+        return CompiledCourseEmailTemplate(self.plain_template, plaintext, context, recipient_keys)
+
+    def compile_htmltext(self, htmltext, context, recipient_keys):
+        """
+        Returns a `CompiledCourseEmailTemplate` rendering HTML messages like
+        `render_htmltext`, for recipients differing only in the values of
+        `recipient_keys`.  The other values are taken from `context`.
+        """
+        return CompiledCourseEmailTemplate(self.html_template, htmltext, context, recipient_keys, escape=True)
+
+
+class CompiledCourseEmailTemplate(object):
+    """
+    An email template and message body, with everything that is the same
+    for all recipients of a bulk email already formatted.
+
+    Rendering a message for a recipient then only formats the fields using
+    one of the `recipient_keys`, and substitutes the keywords of the message
+    body if it has any.  The message is the same as the one rendered by
+    `CourseEmailTemplate` with all values in a single context.
+    """
+    def __init__(self, format_string, message_body, context, recipient_keys, escape=False):
+        self.message_body = message_body
+        self.recipient_keys = frozenset(recipient_keys)
+        self.escape = escape
+        self.context = self._escape(context) if escape else dict(context)
+        self.has_keywords = '%%' in message_body
+
+        # Literal text, and (field_name, conversion, format_spec) tuples for
+        # the fields to format for each recipient.
+        self.parts = []
+        literal = []
+        for literal_text, field_name, format_spec, conversion in _FORMATTER.parse(format_string):
+            literal.append(literal_text)
+            if field_name is None:
+                continue
+            field = (field_name, conversion, format_spec)
+            if self._is_recipient_field(field_name, format_spec):
+                self.parts.append(u''.join(literal))
+                self.parts.append(field)
+                literal = []
+            else:
+                literal.append(self._format_field(field, self.context))
+        self.parts.append(u''.join(literal))
+
+    def render(self, recipient_context):
+        """
+        Returns the message for the recipient with the values of
+        `recipient_context`.
+        """
+        if self.escape:
+            recipient_context = self._escape(recipient_context)
+        context = ChainMap(recipient_context, self.context)
+        result = u''.join(
+            part if isinstance(part, six.string_types) else self._format_field(part, context)
+            for part in self.parts
+        )
+
+        message_body = self.message_body
+        if self.has_keywords and 'user_id' in context and 'course_id' in context:
+            message_body = substitute_keywords_with_data(message_body, context)
+        result = result.replace(COURSE_EMAIL_MESSAGE_BODY_TAG.format(), message_body, 1)
+        return wrap_message(result)
+
+    def _is_recipient_field(self, field_name, format_spec):
+        """
+        Returns whether the field has to be formatted for each recipient.
+        """
+        # Nested fields in format specs are rare enough not to be worth
+        # looking into.
+        return re.split(r'[.[]', field_name, 1)[0] in self.recipient_keys or '{' in format_spec
+
+    @staticmethod
+    def _format_field(field, context):
+        """
+        Formats a field the way ``str.format(**context)`` does.
+        """
+        field_name, conversion, format_spec = field
+        value, __ = _FORMATTER.get_field(field_name, (), context)
+        value = _FORMATTER.convert_field(value, conversion)
+        if '{' in format_spec:
+            format_spec = _FORMATTER.vformat(format_spec, (), context)
+        return _FORMATTER.format_field(value, format_spec)
+
+    @staticmethod
+    def _escape(context):
+        """
+        Returns a copy of the context with its string values HTML-escaped.
+        """
+        return {
+            key: markupsafe.escape(value) if isinstance(value, six.string_types) else value
+            for key, value in six.iteritems(context)
+        }
+
 
 @python_2_unicode_compatible
 class CourseAuthorization(models.Model):
@@ -43,10 +43,13 @@ from six import text_type
 from bulk_email.models import CourseEmail, Optout
 from bulk_email.api import get_unsubscribed_link
 from lms.djangoapps.courseware.courses import get_course
+from lms.djangoapps.instructor_task.config.waffle import bulk_email_id_ranges_enabled
 from lms.djangoapps.instructor_task.models import InstructorTask
 from lms.djangoapps.instructor_task.subtasks import (
     SubtaskStatus,
     check_subtask_is_valid,
+    generate_id_ranges,
+    queue_subtasks_for_id_ranges,
     queue_subtasks_for_query,
     update_subtask_status
 )
@@ -98,6 +101,13 @@ BULK_EMAIL_FAILURE_ERRORS = (
     SMTPException,
 )
 
+# Keys of the email context that are different for each recipient.  The rest
+# of each message is rendered once for all recipients of a subtask.
+RECIPIENT_CONTEXT_KEYS = ('email', 'name', 'user_id', 'unsubscribe_link')
+
+# Fields of each recipient passed to the subtasks sending emails, in addition to 'pk'.
+RECIPIENT_FIELDS = ['profile__name', 'email', 'username']
+
 
 def _get_course_email_context(course):
     """
@@ -185,11 +195,15 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
         target.get_users(course_id, user_id)
         for target in targets
     ]
+    if bulk_email_id_ranges_enabled():
+        return _queue_email_subtasks_for_id_ranges(
+            entry, action_name, email_id, recipient_qsets, global_email_context
+        )
+
     # Use union here to combine the qsets instead of the | operator.  This avoids generating an
     # inefficient OUTER JOIN query that would read the whole user table.
     combined_set = recipient_qsets[0].union(*recipient_qsets[1:]) if len(recipient_qsets) > 1 \
         else recipient_qsets[0]
-    recipient_fields = ['profile__name', 'email', 'username']
 
     log.info(u"Task %s: Preparing to queue subtasks for sending emails for course %s, email %s",
              task_id, course_id, email_id)
@@ -226,7 +240,7 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
         action_name,
         _create_send_email_subtask,
         [combined_set],
-        recipient_fields,
+        RECIPIENT_FIELDS,
         settings.BULK_EMAIL_EMAILS_PER_TASK,
         total_recipients,
     )
@@ -239,8 +253,62 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
     return progress
 
 
+def _queue_email_subtasks_for_id_ranges(entry, action_name, email_id, recipient_qsets, global_email_context):
+    """
+    Queues a subtask sending the email to each range of
+    settings.BULK_EMAIL_EMAILS_PER_TASK recipient ids.
+
+    Only the ids of the recipients are read here, target by target and in
+    id order.  Each subtask looks up the recipients in its range itself.
+    """
+    id_ranges = generate_id_ranges(recipient_qsets, settings.BULK_EMAIL_EMAILS_PER_TASK)
+    log.info(u"Task %s: Preparing to queue subtasks for sending emails for course %s, email %s",
+             entry.task_id, entry.course_id, email_id)
+
+    # Weird things happen if we allow empty querysets as input to emailing subtasks
+    # The task appears to hang at "0 out of 0 completed" and never finishes.
+    if not id_ranges:
+        msg = u"Bulk Email Task: Empty recipient set"
+        log.warning(msg)
+        raise ValueError(msg)
+
+    def _create_send_email_subtask(recipient_id_range, initial_subtask_status):
+        """Creates a subtask to send email to the recipients with ids in a given range."""
+        return send_course_email.subtask(
+            (
+                entry.id,
+                email_id,
+                [],
+                global_email_context,
+                initial_subtask_status.to_dict(),
+                recipient_id_range,
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.BULK_EMAIL_ROUTING_KEY,
+        )
+
+    return queue_subtasks_for_id_ranges(entry, action_name, _create_send_email_subtask, id_ranges)
+
+
+def _get_recipients_in_id_range(entry_id, email_id, recipient_id_range):
+    """
+    Returns the recipients of the email with ids in the (first_id, last_id)
+    range, in the form of the `to_list` of `send_course_email`.
+    """
+    first_id, last_id = recipient_id_range
+    requester_id = InstructorTask.objects.get(pk=entry_id).requester_id
+    course_email = CourseEmail.objects.get(id=email_id)
+    recipients = {}
+    for target in course_email.targets.all():
+        users = target.get_users(course_email.course_id, requester_id).filter(id__gte=first_id, id__lte=last_id)
+        for recipient in users.values('pk', *RECIPIENT_FIELDS):
+            recipients[recipient['pk']] = recipient
+    return [recipients[user_id] for user_id in sorted(recipients)]
+
+
 @task(default_retry_delay=settings.BULK_EMAIL_DEFAULT_RETRY_DELAY, max_retries=settings.BULK_EMAIL_MAX_RETRIES)
-def send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status_dict):
+def send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status_dict,
+                      recipient_id_range=None):
     """
     Sends an email to a list of recipients.
 
@@ -270,6 +338,10 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
         Most values will be zero on initial call, but may be different when the task is
         invoked as part of a retry.
 
+      * `recipient_id_range` : optional (first_id, last_id) tuple.  If given, `to_list` is
+        replaced by the recipients of the email with user ids in that range.  Retries
+        are given the remaining recipients in `to_list` instead.
+
     Sends to all addresses contained in to_list that are not also in the Optout table.
     Emails are sent multi-part, in both plain text and html.  Updates InstructorTask object
     with status information (sends, failures, skips) and updates number of subtasks completed.
@@ -295,6 +367,11 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
     send_exception = None
     new_subtask_status = None
     try:
+        if recipient_id_range is not None:
+            to_list = _get_recipients_in_id_range(entry_id, email_id, recipient_id_range)
+            num_to_send = len(to_list)
+            log.info(u"Send-email task %s for email %s: found %d recipients with ids in %s",
+                     current_task_id, email_id, num_to_send, recipient_id_range)
         course_title = global_email_context['course_title']
         start_time = time.time()
         new_subtask_status, send_exception = _send_course_email(
@@ -506,56 +583,70 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
     course_email_template = course_email.get_template()
 
     try:
-        connection = get_connection()
+        # The connection is kept open to send all the emails of the subtask.
+        connection = get_connection(settings.BULK_EMAIL_BACKEND)
         connection.open()
 
-        # Define context values to use in all course emails:
-        email_context = {'name': '', 'email': ''}
+        # Define context values to use in all course emails, and render
+        # everything but the recipient-specific values once:
+        email_context = {'course_id': course_email.course_id}
         email_context.update(global_email_context)
+        plaintext_template = course_email_template.compile_plaintext(
+            course_email.text_message, email_context, RECIPIENT_CONTEXT_KEYS
+        )
+        html_template = course_email_template.compile_htmltext(
+            course_email.html_message, email_context, RECIPIENT_CONTEXT_KEYS
+        )
+        batch_size = _get_send_batch_size(connection, task_id, email_id)
 
         start_time = time.time()
         while to_list:
-            # Update context with user-specific values from the user at the end of the list.
-            # At the end of processing this user, they will be popped off of the to_list.
+            # Create emails for the users at the end of the list.  At the end of processing
+            # each user, they will be popped off of the to_list.
             # That way, the to_list will always contain the recipients remaining to be emailed.
             # This is convenient for retries, which will need to send to those who haven't
             # yet been emailed, but not send to those who have already been sent to.
-            recipient_num += 1
-            current_recipient = to_list[-1]
-            email = current_recipient['email']
-            if _has_non_ascii_characters(email):
-                to_list.pop()
-                total_recipients_failed += 1
-                log.info(
-                    u"BulkEmail ==> Email address %s contains non-ascii characters. Skipping sending "
-                    u"email to %s, EmailId: %s ",
-                    email,
-                    current_recipient['profile__name'],
-                    email_id
+            batch = []
+            while len(batch) < min(batch_size, len(to_list)):
+                recipient_num += 1
+                current_recipient = to_list[-1 - len(batch)]
+                email = current_recipient['email']
+                if _has_non_ascii_characters(email):
+                    del to_list[-1 - len(batch)]
+                    total_recipients_failed += 1
+                    log.info(
+                        u"BulkEmail ==> Email address %s contains non-ascii characters. Skipping sending "
+                        u"email to %s, EmailId: %s ",
+                        email,
+                        current_recipient['profile__name'],
+                        email_id
+                    )
+                    subtask_status.increment(failed=1)
+                    continue
+
+                recipient_context = {
+                    'email': email,
+                    'name': current_recipient['profile__name'],
+                    'user_id': current_recipient['pk'],
+                    'unsubscribe_link': get_unsubscribed_link(
+                        current_recipient['username'], text_type(course_email.course_id)
+                    ),
+                }
+
+                # Construct message content using templates and context:
+                plaintext_msg = plaintext_template.render(recipient_context)
+                html_msg = html_template.render(recipient_context)
+
+                # Create email:
+                email_msg = EmailMultiAlternatives(
+                    course_email.subject,
+                    plaintext_msg,
+                    from_addr,
+                    [email],
+                    connection=connection
                 )
-                subtask_status.increment(failed=1)
-                continue
-
-            email_context['email'] = email
-            email_context['name'] = current_recipient['profile__name']
-            email_context['user_id'] = current_recipient['pk']
-            email_context['course_id'] = course_email.course_id
-            email_context['unsubscribe_link'] = get_unsubscribed_link(current_recipient['username'],
-                                                                      text_type(course_email.course_id))
-
-            # Construct message content using templates and context:
-            plaintext_msg = course_email_template.render_plaintext(course_email.text_message, email_context)
-            html_msg = course_email_template.render_htmltext(course_email.html_message, email_context)
-
-            # Create email:
-            email_msg = EmailMultiAlternatives(
-                course_email.subject,
-                plaintext_msg,
-                from_addr,
-                [email],
-                connection=connection
-            )
-            email_msg.attach_alternative(html_msg, 'text/html')
+                email_msg.attach_alternative(html_msg, 'text/html')
+                batch.append((recipient_num, current_recipient, email_msg))
 
             # Throttle if we have gotten the rate limiter.  This is not very high-tech,
             # but if a task has been retried for rate-limiting reasons, then we sleep
@@ -563,92 +654,99 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
             # the value depends on the number of workers that might be sending email in
             # parallel, and what the SES throttle rate is.
             if subtask_status.retried_nomax > 0:
-                sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS)
-
-            try:
-                log.info(
-                    u"BulkEmail ==> Task: %s, SubTask: %s, EmailId: %s, Recipient num: %s/%s, \
-                    Recipient name: %s, Email address: %s",
-                    parent_task_id,
-                    task_id,
-                    email_id,
-                    recipient_num,
-                    total_recipients,
-                    current_recipient['profile__name'],
-                    email
-                )
-                connection.send_messages([email_msg])
-
-            except SMTPDataError as exc:
-                # According to SMTP spec, we'll retry error codes in the 4xx range.  5xx range indicates hard failure.
-                total_recipients_failed += 1
-                log.error(
-                    u"BulkEmail ==> Status: Failed(SMTPDataError), Task: %s, SubTask: %s, EmailId: %s, \
-                    Recipient num: %s/%s, Email address: %s",
-                    parent_task_id,
-                    task_id,
-                    email_id,
-                    recipient_num,
-                    total_recipients,
-                    email
-                )
-                if exc.smtp_code >= 400 and exc.smtp_code < 500:
-                    # This will cause the outer handler to catch the exception and retry the entire task.
-                    raise exc
-                else:
+                sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS * len(batch))
+
+            batch_sent = False
+            if len(batch) > 1:
+                batch_sent = _send_batch(connection, [email_msg for __, __, email_msg in batch], task_id, email_id)
+
+            for recipient_num, current_recipient, email_msg in batch:
+                email = current_recipient['email']
+                try:
+                    if not batch_sent:
+                        log.info(
+                            u"BulkEmail ==> Task: %s, SubTask: %s, EmailId: %s, Recipient num: %s/%s, \
+                            Recipient name: %s, Email address: %s",
+                            parent_task_id,
+                            task_id,
+                            email_id,
+                            recipient_num,
+                            total_recipients,
+                            current_recipient['profile__name'],
+                            email
+                        )
+                        connection.send_messages([email_msg])
+
+                except SMTPDataError as exc:
+                    # According to SMTP spec, we'll retry error codes in the 4xx range.  5xx range indicates hard failure.
+                    total_recipients_failed += 1
+                    log.error(
+                        u"BulkEmail ==> Status: Failed(SMTPDataError), Task: %s, SubTask: %s, EmailId: %s, \
+                        Recipient num: %s/%s, Email address: %s",
+                        parent_task_id,
+                        task_id,
+                        email_id,
+                        recipient_num,
+                        total_recipients,
+                        email
+                    )
+                    if exc.smtp_code >= 400 and exc.smtp_code < 500:
+                        # This will cause the outer handler to catch the exception and retry the entire task.
+                        raise exc
+                    else:
+                        # This will fall through and not retry the message.
+                        log.warning(
+                            u'BulkEmail ==> Task: %s, SubTask: %s, EmailId: %s, Recipient num: %s/%s, \
+                            Email not delivered to %s due to error %s',
+                            parent_task_id,
+                            task_id,
+                            email_id,
+                            recipient_num,
+                            total_recipients,
+                            email,
+                            exc.smtp_error
+                        )
+                        subtask_status.increment(failed=1)
+
+                except SINGLE_EMAIL_FAILURE_ERRORS as exc:
                     # This will fall through and not retry the message.
-                    log.warning(
-                        u'BulkEmail ==> Task: %s, SubTask: %s, EmailId: %s, Recipient num: %s/%s, \
-                        Email not delivered to %s due to error %s',
+                    total_recipients_failed += 1
+                    log.error(
+                        u"BulkEmail ==> Status: Failed(SINGLE_EMAIL_FAILURE_ERRORS), Task: %s, SubTask: %s, \
+                        EmailId: %s, Recipient num: %s/%s, Email address: %s, Exception: %s",
                         parent_task_id,
                         task_id,
                         email_id,
                         recipient_num,
                         total_recipients,
                         email,
-                        exc.smtp_error
+                        exc
                     )
                     subtask_status.increment(failed=1)
 
-            except SINGLE_EMAIL_FAILURE_ERRORS as exc:
-                # This will fall through and not retry the message.
-                total_recipients_failed += 1
-                log.error(
-                    u"BulkEmail ==> Status: Failed(SINGLE_EMAIL_FAILURE_ERRORS), Task: %s, SubTask: %s, \
-                    EmailId: %s, Recipient num: %s/%s, Email address: %s, Exception: %s",
-                    parent_task_id,
-                    task_id,
-                    email_id,
-                    recipient_num,
-                    total_recipients,
-                    email,
-                    exc
-                )
-                subtask_status.increment(failed=1)
-
-            else:
-                total_recipients_successful += 1
-                log.info(
-                    u"BulkEmail ==> Status: Success, Task: %s, SubTask: %s, EmailId: %s, \
-                    Recipient num: %s/%s, Email address: %s,",
-                    parent_task_id,
-                    task_id,
-                    email_id,
-                    recipient_num,
-                    total_recipients,
-                    email
-                )
-                if settings.BULK_EMAIL_LOG_SENT_EMAILS:
-                    log.info(u'Email with id %s sent to %s', email_id, email)
                 else:
-                    log.debug(u'Email with id %s sent to %s', email_id, email)
-                subtask_status.increment(succeeded=1)
-
-            # Pop the user that was emailed off the end of the list only once they have
-            # successfully been processed.  (That way, if there were a failure that
-            # needed to be retried, the user is still on the list.)
-            recipients_info[email] += 1
-            to_list.pop()
+                    total_recipients_successful += 1
+                    log.info(
+                        u"BulkEmail ==> Status: Success, Task: %s, SubTask: %s, EmailId: %s, \
+                        Recipient num: %s/%s, Email address: %s,",
+                        parent_task_id,
+                        task_id,
+                        email_id,
+                        recipient_num,
+                        total_recipients,
+                        email
+                    )
+                    if settings.BULK_EMAIL_LOG_SENT_EMAILS:
+                        log.info(u'Email with id %s sent to %s', email_id, email)
+                    else:
+                        log.debug(u'Email with id %s sent to %s', email_id, email)
+                    subtask_status.increment(succeeded=1)
+
+                # Pop the user that was emailed off the end of the list only once they have
+                # successfully been processed.  (That way, if there were a failure that
+                # needed to be retried, the user is still on the list.)
+                recipients_info[email] += 1
+                to_list.pop()
 
         log.info(
             u"BulkEmail ==> Task: %s, SubTask: %s, EmailId: %s, Total Successful Recipients: %s/%s, \
@@ -729,6 +827,66 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
         connection.close()
 
 
+def _get_send_batch_size(connection, task_id, email_id):
+    """
+    Returns the number of messages to pass to `connection` at once.
+
+    Messages are only sent in batches with backends which send a batch all or
+    nothing, as the true `sends_batches_atomically` attribute of the backend
+    states.  Others, such as Django's SMTP backend, deliver the messages one by
+    one until one of them fails, so sending the batch again, one message at a
+    time or on retry, would send duplicates to the recipients before it.
+    """
+    batch_size = max(1, settings.BULK_EMAIL_SEND_BATCH_SIZE)
+    if batch_size > 1 and not getattr(connection, 'sends_batches_atomically', False):
+        log.warning(
+            u"BulkEmail ==> SubTask: %s, EmailId: %s, %s does not send batches all or nothing, "
+            u"sending emails one at a time",
+            task_id,
+            email_id,
+            connection.__class__.__name__
+        )
+        return 1
+    return batch_size
+
+
+def _send_batch(connection, messages, task_id, email_id):
+    """
+    Sends `messages` with a single call to `connection`, which email backends
+    using the batch sending API of an email service provider turn into a
+    single request.
+
+    Returns whether the messages were sent.  If one of them could not be
+    delivered to its recipient, they are not, and have to be sent one at a
+    time to find out which.  Errors calling for a retry are raised.
+    """
+    try:
+        connection.send_messages(messages)
+    except SMTPDataError as exc:
+        if exc.smtp_code >= 400 and exc.smtp_code < 500:
+            raise
+        log.warning(
+            u"BulkEmail ==> SubTask: %s, EmailId: %s, Batch of %s emails not delivered due to error %s, "
+            u"sending them one at a time",
+            task_id,
+            email_id,
+            len(messages),
+            exc.smtp_error
+        )
+        return False
+    except SINGLE_EMAIL_FAILURE_ERRORS as exc:
+        log.warning(
+            u"BulkEmail ==> SubTask: %s, EmailId: %s, Batch of %s emails not delivered due to error %s, "
+            u"sending them one at a time",
+            task_id,
+            email_id,
+            len(messages),
+            exc
+        )
+        return False
+    return True
+
+
 def _get_current_task():
     """
     Stub to make it easier to test without actually running Celery.
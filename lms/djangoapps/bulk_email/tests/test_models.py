@@ -269,6 +269,31 @@ class CourseEmailTemplateTest(TestCase):
         self.assertIn(context['course_title'], message)
         self.assertIn(context['name'], message)
 
+    def test_compiled_templates_render_same_messages(self):
+        template = CourseEmailTemplate.get_template()
+        message = u"Dear %%USER_FULLNAME%%, thanks for enrolling in %%COURSE_DISPLAY_NAME%%."
+        recipient_keys = ('email', 'name', 'user_id', 'unsubscribe_link')
+        context = self._add_xss_fields(self._get_sample_html_context())
+        global_context = {key: value for key, value in context.items() if key not in recipient_keys}
+        compiled_plaintext = template.compile_plaintext(message, global_context, recipient_keys)
+        compiled_htmltext = template.compile_htmltext(message, global_context, recipient_keys)
+
+        for number in range(2):
+            recipient_context = {
+                'email': u'learner{}@example.com'.format(number),
+                'name': u"<b>Learner {}</b>".format(number),
+                'user_id': number,
+                'unsubscribe_link': u'/bulk_email/email/optout/token{}'.format(number),
+            }
+            self.assertEqual(
+                compiled_plaintext.render(recipient_context),
+                template.render_plaintext(message, dict(global_context, **recipient_context)),
+            )
+            self.assertEqual(
+                compiled_htmltext.render(recipient_context),
+                template.render_htmltext(message, dict(global_context, **recipient_context)),
+            )
+
 
 class CourseAuthorizationTest(TestCase):
     """Test the CourseAuthorization model."""
@@ -28,9 +28,11 @@ from boto.ses.exceptions import (
 from celery.states import FAILURE, SUCCESS
 from django.conf import settings
 from django.core.management import call_command
+from django.test.utils import override_settings
 from mock import Mock, patch
 from opaque_keys.edx.locator import CourseLocator
 from six.moves import range
+from waffle.testutils import override_switch
 
 from bulk_email.models import SEND_TO_LEARNERS, SEND_TO_MYSELF, SEND_TO_STAFF, CourseEmail, Optout
 from bulk_email.tasks import _get_course_email_context
@@ -245,6 +247,46 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
                 send_bulk_course_email, 'emailed', num_emails, expected_succeeds, skipped=expected_skipped
             )
 
+    @override_settings(BULK_EMAIL_SEND_BATCH_SIZE=10)
+    def test_successful_in_batches(self):
+        # Select number of emails to fit into a single subtask.
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        # We also send email to the instructor:
+        self._create_students(num_emails - 1)
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            get_conn.return_value.sends_batches_atomically = True
+            get_conn.return_value.send_messages.side_effect = cycle([None])
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
+        batches = [args[0] for args, __ in get_conn.return_value.send_messages.call_args_list]
+        self.assertEqual(sum(len(batch) for batch in batches), num_emails)
+        self.assertEqual(max(len(batch) for batch in batches), 10)
+
+    @override_settings(BULK_EMAIL_SEND_BATCH_SIZE=10)
+    def test_no_batches_for_backends_sending_part_of_a_batch(self):
+        # Select number of emails to fit into a single subtask.
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        # We also send email to the instructor:
+        self._create_students(num_emails - 1)
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            get_conn.return_value.sends_batches_atomically = False
+            get_conn.return_value.send_messages.side_effect = cycle([None])
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
+        batches = [args[0] for args, __ in get_conn.return_value.send_messages.call_args_list]
+        self.assertEqual(len(batches), num_emails)
+
+    @override_settings(BULK_EMAIL_SEND_BATCH_SIZE=10)
+    def test_batch_failure_sends_one_at_a_time(self):
+        # Select number of emails to fit into a single subtask.
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        # We also send email to the instructor:
+        self._create_students(num_emails - 1)
+        exception = SESAddressBlacklistedError(554, "Email address is blacklisted")
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            get_conn.return_value.sends_batches_atomically = True
+            # The first batch fails, and so does the first email then sent on its own:
+            get_conn.return_value.send_messages.side_effect = chain([exception, exception], cycle([None]))
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails - 1, failed=1)
+
     def _test_email_address_failures(self, exception):
         """Test that celery handles bad address errors by failing and not retrying."""
         # Select number of emails to fit into a single subtask.
@@ -473,3 +515,8 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
         self.assertIn('account_settings_url', result)
         self.assertIn('email_settings_url', result)
         self.assertIn('platform_name', result)
+
+
+@override_switch('instructor_task.send_bulk_email_by_id_ranges', active=True)
+class TestBulkEmailInstructorTaskByIdRanges(TestBulkEmailInstructorTask):
+    """Tests instructor task that send bulk email, with subtasks given ranges of recipient ids."""
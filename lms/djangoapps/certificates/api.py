@@ -7,9 +7,11 @@ rather than importing Django models directly.
 
 
 import logging
+from uuid import uuid4
 
 import six
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from django.urls import reverse
 from eventtracking import tracker
@@ -29,6 +31,11 @@ from lms.djangoapps.certificates.models import (
     certificate_status_for_student
 )
 from lms.djangoapps.certificates.queue import XQueueCertInterface
+from lms.djangoapps.grades.api import (
+    CourseGradeFactory,
+    clear_prefetched_course_grades,
+    prefetch_course_and_subsection_grades
+)
 from lms.djangoapps.instructor.access import list_with_level
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from util.organizations_helpers import get_course_organization_id
@@ -37,6 +44,8 @@ from xmodule.modulestore.django import modulestore
 log = logging.getLogger("edx.certificate")
 MODES = GeneratedCertificate.MODES
 
+RENDERED_CERTIFICATES_GENERATION_KEY = u'certificates.rendered.generation'
+
 
 def is_passing_status(cert_status):
     """
@@ -211,6 +220,58 @@ def generate_user_certificates(student, course_key, course=None, insecure=False,
     if insecure:
         xqueue.use_https = False
 
+    return _add_certificate(xqueue, student, course_key, course, generation_mode, forced_grade=forced_grade)
+
+
+def generate_certificates_for_students(students, course_key, course=None, insecure=False, generation_mode='batch'):
+    """
+    Like `generate_user_certificates` for each of `students`, but their
+    grades, enrollments, certificates, whitelist and verification status are
+    fetched for all of them at once.
+
+    Returns a dict of the resulting certificate status, or None if no
+    certificate was generated, by user id.
+    """
+    if not course:
+        course = modulestore().get_course(course_key, depth=0)
+
+    statuses = {}
+    beta_tester_ids = set(list_with_level(course, u'beta').values_list('id', flat=True))
+    students_to_certify = []
+    for student in students:
+        if student.id in beta_tester_ids:
+            log.info(
+                u'Cancelling course certificate generation for user [%s] against course [%s], user is a Beta Tester.',
+                student.username, course_key,
+            )
+            statuses[student.id] = None
+        else:
+            students_to_certify.append(student)
+
+    xqueue = XQueueCertInterface()
+    if insecure:
+        xqueue.use_https = False
+    xqueue.prefetch_students(students_to_certify, course_key)
+    prefetch_course_and_subsection_grades(course_key, students_to_certify)
+    try:
+        for student, course_grade, error in CourseGradeFactory().iter(students_to_certify, course=course):
+            if error is not None:
+                # CourseGradeFactory has already logged the error.
+                statuses[student.id] = None
+                continue
+            statuses[student.id] = _add_certificate(
+                xqueue, student, course_key, course, generation_mode, course_grade=course_grade,
+            )
+    finally:
+        clear_prefetched_course_grades(course_key)
+    return statuses
+
+
+def _add_certificate(xqueue, student, course_key, course, generation_mode, forced_grade=None, course_grade=None):
+    """
+    Adds the certificate of the student to the queue, emits its
+    `edx.certificate.created` event, and returns its status.
+    """
     generate_pdf = not has_html_certificates_enabled(course)
 
     cert = xqueue.add_cert(
@@ -218,7 +279,8 @@ def generate_user_certificates(student, course_key, course=None, insecure=False,
         course_key,
         course=course,
         generate_pdf=generate_pdf,
-        forced_grade=forced_grade
+        forced_grade=forced_grade,
+        course_grade=course_grade,
     )
 
     message = u'Queued Certificate Generation task for {user} : {course}'
@@ -643,6 +705,38 @@ def emit_certificate_event(event_name, user, course_id, course=None, event_data=
         tracker.emit(event_name, event_data)
 
 
+def get_rendered_certificates_generation(course_key):
+    """
+    Returns the generation of the certificates rendered for the course, which
+    changes whenever they have to be rendered again.
+    """
+    keys = [RENDERED_CERTIFICATES_GENERATION_KEY, _rendered_certificates_generation_key(course_key)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # A generation evicted from the cache is replaced by a new one,
+            # rather than started again, so that no stale page is served.
+            generation = uuid4().hex
+            generations[key] = generation if cache.add(key, generation, None) else cache.get(key, generation)
+    return u'.'.join(generations[key] for key in keys)
+
+
+def invalidate_rendered_certificates(course_key=None):
+    """
+    Makes the certificates rendered for the course, or for all courses if
+    `course_key` is None, be rendered again.
+    """
+    if course_key is None:
+        key = RENDERED_CERTIFICATES_GENERATION_KEY
+    else:
+        key = _rendered_certificates_generation_key(course_key)
+    cache.set(key, uuid4().hex, None)
+
+
+def _rendered_certificates_generation_key(course_key):
+    return u'{}.{}'.format(RENDERED_CERTIFICATES_GENERATION_KEY, course_key)
+
+
 def get_asset_url_by_slug(asset_slug):
     """
     Returns certificate template asset url for given asset_slug.
@@ -22,6 +22,7 @@ from lms.djangoapps.certificates.models import (
     CertificateWhitelist,
     ExampleCertificate,
     GeneratedCertificate,
+    certificate_status,
     certificate_status_for_student
 )
 from lms.djangoapps.grades.api import CourseGradeFactory
@@ -107,6 +108,16 @@ class XQueueCertInterface(object):
         self.whitelist = CertificateWhitelist.objects.all()
         self.restricted = UserProfile.objects.filter(allow_certificate=False)
         self.use_https = True
+        self.prefetched_students = None
+
+    def prefetch_students(self, students, course_id):
+        """
+        Fetches what `add_cert` needs to know about each of `students` in the
+        course with a few queries for all of them, rather than several queries
+        for each student.  Students who are not among them are still looked up
+        one by one when they are added.
+        """
+        self.prefetched_students = _PrefetchedStudents(self, students, course_id)
 
     def regen_cert(self, student, course_id, course=None, forced_grade=None, template_file=None, generate_pdf=True):
         """(Re-)Make certificate for a particular student in a particular course
@@ -190,7 +201,8 @@ class XQueueCertInterface(object):
         raise NotImplementedError
 
     # pylint: disable=too-many-statements
-    def add_cert(self, student, course_id, course=None, forced_grade=None, template_file=None, generate_pdf=True):
+    def add_cert(self, student, course_id, course=None, forced_grade=None, template_file=None, generate_pdf=True,
+                 course_grade=None):
         """
         Request a new certificate for a student.
 
@@ -201,6 +213,7 @@ class XQueueCertInterface(object):
                          the certificate request. If this is given, grading
                          will be skipped.
           generate_pdf - Boolean should a message be sent in queue to generate certificate PDF
+          course_grade - the student's course grade, if it has already been read
 
         Will change the certificate status to 'generating' or
         `downloadable` in case of web view certificates.
@@ -247,7 +260,11 @@ class XQueueCertInterface(object):
             status.unverified,
         ]
 
-        cert_status_dict = certificate_status_for_student(student, course_id)
+        prefetched = self._get_prefetched(student, course_id)
+        if prefetched is not None:
+            cert_status_dict = certificate_status(prefetched.certificates.get(student.id))
+        else:
+            cert_status_dict = certificate_status_for_student(student, course_id)
         cert_status = cert_status_dict.get('status')
         download_url = cert_status_dict.get('download_url')
         cert = None
@@ -277,18 +294,27 @@ class XQueueCertInterface(object):
         if course is None:
             course = modulestore().get_course(course_id, depth=0)
 
-        profile = UserProfile.objects.get(user=student)
-        profile_name = profile.name
+        if prefetched is not None and student.id in prefetched.profile_names:
+            profile_name = prefetched.profile_names[student.id]
+        else:
+            profile_name = UserProfile.objects.get(user=student).name
 
         # Needed for access control in grading.
         self.request.user = student
         self.request.session = {}
 
-        is_whitelisted = self.whitelist.filter(user=student, course_id=course_id, whitelist=True).exists()
-        course_grade = CourseGradeFactory().read(student, course)
+        if prefetched is not None:
+            is_whitelisted = student.id in prefetched.whitelisted_user_ids
+        else:
+            is_whitelisted = self.whitelist.filter(user=student, course_id=course_id, whitelist=True).exists()
+        if course_grade is None:
+            course_grade = CourseGradeFactory().read(student, course)
         enrollment_mode, __ = CourseEnrollment.enrollment_mode_for_user(student, course_id)
         mode_is_verified = enrollment_mode in GeneratedCertificate.VERIFIED_CERTS_MODES
-        user_is_verified = IDVerificationService.user_is_verified(student)
+        if prefetched is not None:
+            user_is_verified = student.id in prefetched.verified_user_ids
+        else:
+            user_is_verified = IDVerificationService.user_is_verified(student)
         cert_mode = enrollment_mode
 
         is_eligible_for_certificate = CourseMode.is_eligible_for_certificate(enrollment_mode, cert_status)
@@ -332,7 +358,10 @@ class XQueueCertInterface(object):
             mode_is_verified,
             generate_pdf
         )
-        cert, created = GeneratedCertificate.objects.get_or_create(user=student, course_id=course_id)
+        if prefetched is not None and student.id in prefetched.certificates:
+            cert = prefetched.certificates[student.id]
+        else:
+            cert, __ = GeneratedCertificate.objects.get_or_create(user=student, course_id=course_id)
 
         cert.mode = cert_mode
         cert.user = student
@@ -407,7 +436,11 @@ class XQueueCertInterface(object):
         # Check to see whether the student is on the the embargoed
         # country restricted list. If so, they should not receive a
         # certificate -- set their status to restricted and log it.
-        if self.restricted.filter(user=student).exists():
+        if prefetched is not None:
+            is_restricted = student.id in prefetched.restricted_user_ids
+        else:
+            is_restricted = self.restricted.filter(user=student).exists()
+        if is_restricted:
             cert.status = status.restricted
             cert.save()
 
@@ -441,6 +474,16 @@ class XQueueCertInterface(object):
         # Finally, generate the certificate and send it off.
         return self._generate_cert(cert, course, student, grade_contents, template_pdf, generate_pdf)
 
+    def _get_prefetched(self, student, course_id):
+        """
+        Returns the data prefetched about `student` in the course, or None if
+        there is none.
+        """
+        prefetched = self.prefetched_students
+        if prefetched is not None and prefetched.course_id == course_id and student.id in prefetched.user_ids:
+            return prefetched
+        return None
+
     def _generate_cert(self, cert, course, student, grade_contents, template_pdf, generate_pdf):
         """
         Generate a certificate for the student. If `generate_pdf` is True,
@@ -623,3 +666,27 @@ class XQueueCertInterface(object):
             cert_status,
             download_url
         )
+
+
+class _PrefetchedStudents(object):
+    """
+    What `XQueueCertInterface.add_cert` needs to know about a batch of
+    students in a course, fetched for all of them at once.
+    """
+    def __init__(self, cert_interface, students, course_id):
+        user_ids = [student.id for student in students]
+        self.course_id = course_id
+        self.user_ids = set(user_ids)
+        self.whitelisted_user_ids = set(cert_interface.whitelist.filter(
+            user_id__in=user_ids, course_id=course_id, whitelist=True,
+        ).values_list('user_id', flat=True))
+        self.restricted_user_ids = set(
+            cert_interface.restricted.filter(user_id__in=user_ids).values_list('user_id', flat=True)
+        )
+        self.profile_names = dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'name'))
+        self.verified_user_ids = set(IDVerificationService.get_verified_user_ids(user_ids))
+        self.certificates = {
+            cert.user_id: cert
+            for cert in GeneratedCertificate.objects.filter(user_id__in=user_ids, course_id=course_id)
+        }
+        CourseEnrollment.bulk_fetch_enrollment_states(students, course_id)
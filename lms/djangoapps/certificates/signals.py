@@ -10,9 +10,13 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from course_modes.models import CourseMode
+from lms.djangoapps.certificates.api import invalidate_rendered_certificates
 from lms.djangoapps.certificates.models import (
     CertificateGenerationCourseSetting,
+    CertificateHtmlViewConfiguration,
     CertificateStatuses,
+    CertificateTemplate,
+    CertificateTemplateAsset,
     CertificateWhitelist,
     GeneratedCertificate
 )
@@ -48,6 +52,17 @@ def _update_cert_settings_on_pacing_change(sender, updated_course_overview, **kw
     ))
 
 
+@receiver(post_save, sender=CertificateHtmlViewConfiguration, dispatch_uid="invalidate_rendered_certificates_config")
+@receiver(post_save, sender=CertificateTemplate, dispatch_uid="invalidate_rendered_certificates_template")
+@receiver(post_save, sender=CertificateTemplateAsset, dispatch_uid="invalidate_rendered_certificates_asset")
+def _invalidate_rendered_certificates(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Makes all web certificates be rendered again when the configuration or
+    templates they are rendered with change.
+    """
+    invalidate_rendered_certificates()
+
+
 @receiver(post_save, sender=CertificateWhitelist, dispatch_uid="append_certificate_whitelist")
 def _listen_for_certificate_whitelist_append(sender, instance, **kwargs):  # pylint: disable=unused-argument
     course = CourseOverview.get_from_id(instance.course_id)
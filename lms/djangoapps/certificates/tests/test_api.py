@@ -35,6 +35,7 @@ from lms.djangoapps.courseware.tests.factories import GlobalStaffFactory
 from lms.djangoapps.grades.tests.utils import mock_passing_grade
 from openedx.core.djangoapps.site_configuration.tests.test_util import with_site_configuration
 from student.models import CourseEnrollment
+from student.roles import CourseBetaTesterRole
 from student.tests.factories import UserFactory
 from util.testing import EventTestMixin
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase, SharedModuleStoreTestCase
@@ -576,6 +577,36 @@ class GenerateUserCertificatesTest(EventTestMixin, WebCertificateTestMixin, Modu
             generation_mode='batch'
         )
 
+    def test_generate_certificates_for_students(self):
+        beta_tester = UserFactory()
+        CourseEnrollment.enroll(beta_tester, self.course.id, mode='honor')
+        CourseBetaTesterRole(self.course.id).add_users(beta_tester)
+        CourseEnrollment.enroll(self.student_no_cert, self.course.id, mode='honor')
+
+        with mock_passing_grade():
+            with self._mock_queue():
+                statuses = certs_api.generate_certificates_for_students(
+                    [self.student, self.student_no_cert, beta_tester], self.course.id,
+                )
+
+        self.assertEqual(statuses, {
+            self.student.id: CertificateStatuses.generating,
+            self.student_no_cert.id: CertificateStatuses.generating,
+            beta_tester.id: None,
+        })
+        self.assertFalse(GeneratedCertificate.objects.filter(user=beta_tester).exists())
+        for student in (self.student, self.student_no_cert):
+            cert = GeneratedCertificate.eligible_certificates.get(user=student, course_id=self.course.id)
+            self.assert_event_emitted(
+                'edx.certificate.created',
+                user_id=student.id,
+                course_id=six.text_type(self.course.id),
+                certificate_url=certs_api.get_certificate_url(student.id, self.course.id),
+                certificate_id=cert.verify_uuid,
+                enrollment_mode=cert.mode,
+                generation_mode='batch'
+            )
+
     def test_xqueue_submit_task_error(self):
         with mock_passing_grade():
             with self._mock_queue(is_successful=False):
@@ -39,6 +39,7 @@ from lms.djangoapps.certificates.tests.factories import (
     GeneratedCertificateFactory,
     LinkedInAddToProfileConfigurationFactory
 )
+from lms.djangoapps.certificates.views import webview
 from lms.djangoapps.grades.tests.utils import mock_passing_grade
 from openedx.core.djangoapps.certificates.config import waffle
 from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
@@ -1650,3 +1651,73 @@ class CertificateEventTests(CommonCertificatesTestCase, EventTrackingTestCase):
             },
             actual_event
         )
+
+
+@override_settings(FEATURES=FEATURES_WITH_CERTS_ENABLED)
+class CertificateCacheTests(CommonCertificatesTestCase, CacheIsolationTestCase):
+    """
+    Test caching the certificate pages viewed anonymously.
+    """
+    ENABLED_CACHES = ['default']
+
+    def setUp(self):
+        super(CertificateCacheTests, self).setUp()
+        self._add_course_certificates(count=1, signatory_count=1)
+        self.client.logout()
+        self.test_url = get_certificate_url(course_id=self.course.id, uuid=self.cert.verify_uuid)
+
+    def _assert_renders(self, count, url=None):
+        """
+        Views the certificate, and asserts that the course was loaded `count`
+        times to render it.
+        """
+        with patch(
+            'lms.djangoapps.certificates.views.webview.get_course_by_id', wraps=webview.get_course_by_id
+        ) as mock_get_course:
+            response = self.client.get(url or self.test_url)
+        self.assertContains(response, self.user.profile.name)
+        self.assertEqual(mock_get_course.call_count, count)
+
+    def test_anonymous_views_are_cached(self):
+        self._assert_renders(1)
+        with patch('lms.djangoapps.certificates.views.webview.emit_certificate_event') as mock_emit:
+            self._assert_renders(0)
+        mock_emit.assert_called_once()
+        self.assertEqual(mock_emit.call_args[0][:3], ('evidence_visited', self.user, six.text_type(self.course.id)))
+
+    def test_logged_in_views_are_not_cached(self):
+        self.client.login(username=self.user.username, password='foo')
+        self._assert_renders(1)
+        self._assert_renders(1)
+
+    def test_evidence_visits_are_not_cached(self):
+        self._assert_renders(1, url=self.test_url + '?evidence_visit=1')
+        self._assert_renders(1, url=self.test_url + '?evidence_visit=1')
+
+    @override_settings(CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        self._assert_renders(1)
+        self._assert_renders(1)
+
+    def test_publishing_the_course_invalidates(self):
+        self._assert_renders(1)
+        # Only the course overview is updated, as in Studio, which doesn't run the certificates signal handlers.
+        self.store.update_item(self.course, self.user.id)
+        self._assert_renders(1)
+        self._assert_renders(0)
+
+    def test_configuration_change_invalidates(self):
+        self._assert_renders(1)
+        CertificateHtmlViewConfigurationFactory.create()
+        self._assert_renders(1)
+
+    def test_certificate_change_invalidates(self):
+        self._assert_renders(1)
+        self.cert.save()
+        self._assert_renders(1)
+
+    def test_revoked_certificate_is_not_served(self):
+        self._assert_renders(1)
+        self.cert.invalidate()
+        response = self.client.get(self.test_url)
+        self.assertEqual(response.status_code, 404)
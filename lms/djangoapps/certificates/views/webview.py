@@ -4,6 +4,7 @@ Certificate HTML webview.
 """
 
 
+import hashlib
 import logging
 from datetime import datetime
 from uuid import uuid4
@@ -12,6 +13,7 @@ import pytz
 import six
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.http import Http404, HttpResponse
 from django.template import RequestContext
 from django.utils import translation
@@ -30,7 +32,8 @@ from lms.djangoapps.certificates.api import (
     get_certificate_footer_context,
     get_certificate_header_context,
     get_certificate_template,
-    get_certificate_url
+    get_certificate_url,
+    get_rendered_certificates_generation
 )
 from lms.djangoapps.certificates.models import (
     CertificateGenerationCourseSetting,
@@ -43,6 +46,7 @@ from lms.djangoapps.certificates.permissions import PREVIEW_CERTIFICATES
 from lms.djangoapps.courseware.courses import get_course_by_id
 from openedx.core.djangoapps.catalog.utils import get_course_run_details
 from openedx.core.djangoapps.certificates.api import certificates_viewable_for_course, display_date_for_certificate
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from openedx.core.djangoapps.lang_pref.api import get_closest_released_language
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 from openedx.core.lib.courses import course_image_url
@@ -449,23 +453,75 @@ def render_cert_by_uuid(request, certificate_uuid):
     This public view generates an HTML representation of the specified certificate
     """
     try:
-        certificate = GeneratedCertificate.eligible_certificates.get(
+        certificate = GeneratedCertificate.eligible_certificates.select_related('user').get(
             verify_uuid=certificate_uuid,
             status=CertificateStatuses.downloadable
         )
-        return render_html_view(request, certificate.user.id, six.text_type(certificate.course_id))
     except GeneratedCertificate.DoesNotExist:
         raise Http404
 
+    cache_key = _get_rendered_certificate_cache_key(request, certificate)
+    if cache_key:
+        content = cache.get(cache_key)
+        if content is not None:
+            # The page is the same, but the visit is still tracked.
+            emit_certificate_event(
+                'evidence_visited',
+                certificate.user,
+                six.text_type(certificate.course_id),
+                CourseOverview.get_from_id(certificate.course_id),
+                {
+                    'certificate_id': certificate.verify_uuid,
+                    'enrollment_mode': certificate.mode,
+                    'social_network': CertificateSocialNetworks.linkedin
+                }
+            )
+            return HttpResponse(content)
+    return render_html_view(request, certificate.user.id, six.text_type(certificate.course_id), cache_key=cache_key)
+
+
+def _get_rendered_certificate_cache_key(request, certificate):
+    """
+    Returns the key under which the page of the certificate rendered for the
+    request is cached, or None if it is not to be cached.
+
+    Only pages viewed anonymously are cached, as the header shows who is
+    logged in, and never previews or visits tracked for badges.  The key
+    changes when the certificate, its course or the certificate templates
+    and configuration change.  Publishing a course in Studio updates its
+    overview, which is part of the key, since Studio doesn't run the
+    certificates signal handlers.
+    """
+    if not settings.CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT or not settings.FEATURES.get('CERTIFICATES_HTML_VIEW', False):
+        return None
+    if request.user.is_authenticated or 'preview' in request.GET or 'evidence_visit' in request.GET:
+        return None
+    course_overview = CourseOverview.get_from_ids_cached([certificate.course_id])[certificate.course_id]
+    if course_overview is None:
+        return None
+    version = u'|'.join([
+        six.text_type(certificate.modified_date),
+        six.text_type(course_overview.modified),
+        get_rendered_certificates_generation(certificate.course_id),
+        six.text_type(translation.get_language()),
+        request.scheme,
+        request.get_host(),
+    ])
+    return u'certificates.rendered.{uuid}.{version}'.format(
+        uuid=certificate.verify_uuid,
+        version=hashlib.md5(version.encode('utf-8')).hexdigest(),
+    )
+
 
 @handle_500(
     template_path="certificates/server-error.html",
     test_func=lambda request: request.GET.get('preview', None)
 )
-def render_html_view(request, user_id, course_id):
+def render_html_view(request, user_id, course_id, cache_key=None):
     """
     This public view generates an HTML representation of the specified user and course
     If a certificate is not available, we display a "Sorry!" screen instead
+    The page of a valid certificate is cached under `cache_key`, if given.
     """
     try:
         user_id = int(user_id)
@@ -595,7 +651,10 @@ def render_html_view(request, user_id, course_id):
         _track_certificate_events(request, context, course, user, user_certificate)
 
         # Render the certificate
-        return _render_valid_certificate(request, context, custom_template)
+        response = _render_valid_certificate(request, context, custom_template)
+        if cache_key:
+            cache.set(cache_key, response.content, settings.CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT)
+        return response
 
 
 def _get_catalog_data_for_course(course_key):
@@ -430,12 +430,19 @@ class Program(TimeStampedModel):
         Returns the list of children courses
         """
 
+        course_ids = [
+            CourseLocator(*course_code.code_sections())
+            for course_code in self.course_codes.all().order_by('programcoursecode')
+        ]
+        overviews = CourseOverview.get_from_ids_cached(course_ids)
+
         list_of_courses = []
 
-        for course_code in self.course_codes.all().order_by('programcoursecode'):
-            org, code, run = course_code.code_sections()
-            list_of_courses.append(
-                CourseOverview.objects.get(id=CourseLocator(org, code, run)))
+        for course_id in course_ids:
+            if overviews[course_id] is None:
+                raise CourseOverview.DoesNotExist(
+                    "CourseOverview matching query does not exist: {}".format(course_id))
+            list_of_courses.append(overviews[course_id])
 
         return list_of_courses
 
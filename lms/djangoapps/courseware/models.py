@@ -32,6 +32,7 @@ from six import text_type
 from six.moves import range
 
 import coursewarehistoryextended
+import coursewarehistoryextended.buffer
 from openedx.core.djangolib.markup import HTML
 
 log = logging.getLogger("edx.courseware")
@@ -217,6 +218,8 @@ class BaseStudentModuleHistory(models.Model):
         history_entries = []
 
         if settings.FEATURES.get('ENABLE_CSMH_EXTENDED'):
+            # Make sure rows queued by this thread are visible to the query below.
+            coursewarehistoryextended.buffer.flush_history_buffer()
             history_entries += coursewarehistoryextended.models.StudentModuleHistoryExtended.objects.filter(
                 # Django will sometimes try to join to courseware_studentmodule
                 # so just do an in query
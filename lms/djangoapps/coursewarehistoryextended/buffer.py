@@ -0,0 +1,121 @@
+"""
+Buffered writes for StudentModuleHistoryExtended.
+
+History rows are normally inserted synchronously from the StudentModule
+``post_save`` receiver, which adds a second insert (into a separately routed
+database) to every problem check. When the
+``ENABLE_CSMH_EXTENDED_BUFFERED_WRITES`` feature is on, rows are collected in a
+per-thread buffer instead and written with a single ``bulk_create`` when:
+
+* the buffer reaches ``CSMH_EXTENDED_BUFFER_MAX_SIZE`` rows,
+* the current request finishes, or
+* the current celery task finishes.
+
+``CSMH_EXTENDED_BUFFER_MAX_SIZE`` is therefore also the upper bound on the
+number of history rows a single thread can lose if its process dies before a
+flush.
+"""
+
+
+import logging
+import threading
+
+from celery.signals import task_postrun
+from django.conf import settings
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_MAX_SIZE = 100
+
+
+def is_buffering_enabled():
+    """
+    Returns whether history writes should go through the buffer.
+    """
+    return settings.FEATURES.get('ENABLE_CSMH_EXTENDED_BUFFERED_WRITES', False)
+
+
+class HistoryBuffer(threading.local):
+    """
+    Thread-local buffer of unsaved history model instances.
+    """
+
+    def __init__(self):
+        super(HistoryBuffer, self).__init__()
+        self.entries = []
+        self.flushed_count = 0
+        self.dropped_count = 0
+
+    @property
+    def max_size(self):
+        """
+        Maximum number of rows held before a synchronous flush is forced.
+        """
+        return getattr(settings, 'CSMH_EXTENDED_BUFFER_MAX_SIZE', DEFAULT_BUFFER_MAX_SIZE)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        """
+        Queue ``entry`` for writing, flushing if the buffer is full.
+        """
+        self.entries.append(entry)
+        if len(self.entries) >= self.max_size:
+            self.flush()
+
+    def discard(self, student_module_id):
+        """
+        Drop any queued rows for the given StudentModule, e.g. because it was deleted.
+        """
+        self.entries = [entry for entry in self.entries if entry.student_module_id != student_module_id]
+
+    def flush(self):
+        """
+        Write all queued rows with one ``bulk_create`` per model class.
+
+        Failures are logged and the rows are dropped rather than retried, so
+        a broken history database never fails the request that triggered
+        the flush.
+        """
+        if not self.entries:
+            return
+
+        entries, self.entries = self.entries, []
+        by_model = {}
+        for entry in entries:
+            by_model.setdefault(type(entry), []).append(entry)
+
+        for model_class, model_entries in by_model.items():
+            try:
+                model_class.objects.bulk_create(model_entries)
+                self.flushed_count += len(model_entries)
+            except Exception:  # pylint: disable=broad-except
+                self.dropped_count += len(model_entries)
+                log.exception(
+                    u'Failed to write %d buffered %s rows; they have been dropped.',
+                    len(model_entries),
+                    model_class.__name__,
+                )
+
+
+history_buffer = HistoryBuffer()
+
+
+def flush_history_buffer():
+    """
+    Write any history rows queued by the current thread.
+    """
+    history_buffer.flush()
+
+
+@receiver(request_finished)
+def _flush_on_request_finished(sender, **kwargs):  # pylint: disable=unused-argument
+    flush_history_buffer()
+
+
+@task_postrun.connect
+def _flush_on_task_postrun(**kwargs):  # pylint: disable=unused-argument
+    flush_history_buffer()
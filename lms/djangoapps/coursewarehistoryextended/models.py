@@ -23,6 +23,8 @@ from django.utils.encoding import python_2_unicode_compatible
 from lms.djangoapps.courseware.models import BaseStudentModuleHistory, StudentModule
 from lms.djangoapps.courseware.fields import UnsignedBigIntAutoField
 
+from .buffer import history_buffer, is_buffering_enabled
+
 
 @python_2_unicode_compatible
 class StudentModuleHistoryExtended(BaseStudentModuleHistory):
@@ -48,6 +50,9 @@ class StudentModuleHistoryExtended(BaseStudentModuleHistory):
         Checks the instance's module_type, and creates & saves a
         StudentModuleHistoryExtended entry if the module_type is one that
         we save.
+
+        When buffered writes are enabled the entry is queued and written in
+        bulk at the end of the request instead of being inserted here.
         """
         if instance.module_type in StudentModuleHistoryExtended.HISTORY_SAVING_TYPES:
             history_entry = StudentModuleHistoryExtended(student_module=instance,
@@ -56,7 +61,10 @@ class StudentModuleHistoryExtended(BaseStudentModuleHistory):
                                                          state=instance.state,
                                                          grade=instance.grade,
                                                          max_grade=instance.max_grade)
-            history_entry.save()
+            if is_buffering_enabled():
+                history_buffer.add(history_entry)
+            else:
+                history_entry.save()
 
     @receiver(post_delete, sender=StudentModule)
     def delete_history(sender, instance, **kwargs):  # pylint: disable=no-self-argument, unused-argument
@@ -64,6 +72,7 @@ class StudentModuleHistoryExtended(BaseStudentModuleHistory):
         Django can't cascade delete across databases, so we tell it at the model level to
         on_delete=DO_NOTHING and then listen for post_delete so we can clean up the CSMHE rows.
         """
+        history_buffer.discard(instance.id)
         StudentModuleHistoryExtended.objects.filter(student_module=instance).all().delete()
 
     def __str__(self):
@@ -10,12 +10,16 @@ import json
 from unittest import skipUnless
 
 from django.conf import settings
-from django.test import TestCase
+from django.core.signals import request_finished
+from django.test import TestCase, override_settings
 from mock import patch
 
 from lms.djangoapps.courseware.models import BaseStudentModuleHistory, StudentModule, StudentModuleHistory
 from lms.djangoapps.courseware.tests.factories import StudentModuleFactory, course_id, location
 
+from .buffer import flush_history_buffer, history_buffer
+from .models import StudentModuleHistoryExtended
+
 
 @skipUnless(settings.FEATURES["ENABLE_CSMH_EXTENDED"], "CSMH Extended needs to be enabled")
 class TestStudentModuleHistoryBackends(TestCase):
@@ -78,3 +82,54 @@ class TestStudentModuleHistoryBackends(TestCase):
         student_module = StudentModule.objects.all()
         history = BaseStudentModuleHistory.get_history(student_module)
         self.assertEqual(len(history), 0)
+
+
+@skipUnless(settings.FEATURES["ENABLE_CSMH_EXTENDED"], "CSMH Extended needs to be enabled")
+@patch.dict("django.conf.settings.FEATURES", {"ENABLE_CSMH_EXTENDED_BUFFERED_WRITES": True})
+class TestBufferedStudentModuleHistoryExtended(TestCase):
+    """ Tests of buffered CSMHE writes """
+    multi_db = True
+
+    def setUp(self):
+        super(TestBufferedStudentModuleHistoryExtended, self).setUp()
+        self.addCleanup(history_buffer.flush)
+
+    def _create_module(self, order):
+        return StudentModuleFactory.create(module_state_key=location('usage_id_{}'.format(order)),
+                                           course_id=course_id,
+                                           state=json.dumps({'order': order}))
+
+    def test_writes_are_deferred_until_flush(self):
+        self._create_module(1)
+        self._create_module(2)
+        self.assertEqual(len(history_buffer), 2)
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 0)
+
+        flush_history_buffer()
+        self.assertEqual(len(history_buffer), 0)
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 2)
+
+    def test_flush_on_request_finished(self):
+        self._create_module(1)
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 1)
+
+    @override_settings(CSMH_EXTENDED_BUFFER_MAX_SIZE=2)
+    def test_flush_when_full(self):
+        self._create_module(1)
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 0)
+        self._create_module(2)
+        self.assertEqual(len(history_buffer), 0)
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 2)
+
+    def test_get_history_sees_buffered_rows(self):
+        csm = self._create_module(1)
+        history = BaseStudentModuleHistory.get_history([csm])
+        self.assertEqual({'order': 1}, json.loads(history[0].state))
+
+    def test_delete_discards_buffered_rows(self):
+        csm = self._create_module(1)
+        csm.delete()
+        self.assertEqual(len(history_buffer), 0)
+        flush_history_buffer()
+        self.assertEqual(StudentModuleHistoryExtended.objects.count(), 0)
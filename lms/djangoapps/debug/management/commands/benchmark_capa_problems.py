@@ -0,0 +1,166 @@
+"""
+Measure how many randomized capa problems per second can be rendered and checked.
+
+Every problem gets a seed of its own, so that no execution of its Python code
+can be served from a cache, like for learners seeing a problem for the first
+time.  The problems are run with the sandboxes configured by CODE_JAIL, and,
+if --pool-size is given, again with that many pre-warmed sandboxes, for
+comparison.
+
+    $ ./manage.py lms benchmark_capa_problems --problems 200 --pool-size 2
+"""
+
+
+import gettext
+import time
+
+from codejail import jail_code
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from capa.capa_problem import LoncapaProblem, LoncapaSystem
+from capa.safe_exec.sandbox_pool import DEFAULT_MAX_EXECUTIONS, configure_sandbox_pool, get_sandbox_pool
+from edxmako.shortcuts import render_to_string
+
+PROBLEM_XML = u"""
+<problem>
+<script type="loncapa/python">
+import numpy
+a = random.randint(1, 1000)
+b = random.randint(1, 1000)
+expected = str(int(numpy.add(a, b)))
+
+def check(expect, ans):
+    return ans.strip() == expect
+</script>
+<p>What is $a + $b?</p>
+<customresponse cfn="check" expect="$expected">
+    <textline size="10"/>
+</customresponse>
+</problem>
+"""
+
+
+class _BenchmarkModule(object):
+    """
+    The little of a capa module that LoncapaProblem needs.
+    """
+    location = u'benchmark'
+
+    class runtime(object):  # pylint: disable=invalid-name
+        @staticmethod
+        def track_function(*args, **kwargs):  # pylint: disable=unused-argument
+            pass
+
+    @staticmethod
+    def correctness_available():
+        return True
+
+
+class Command(BaseCommand):
+    """
+    Django management command to benchmark rendering and checking capa problems.
+    """
+    help = 'Measure how many randomized capa problems per second can be rendered and checked.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--problems', type=int, default=100, help='Number of problems to render and check.')
+        parser.add_argument(
+            '--pool-size', type=int, default=0,
+            help='Also run the problems with this many pre-warmed sandboxes.',
+        )
+        parser.add_argument(
+            '--max-executions', type=int, default=DEFAULT_MAX_EXECUTIONS,
+            help='Number of executions after which a pre-warmed sandbox is replaced.',
+        )
+        parser.add_argument('--problem-file', help='Problem XML to use instead of a built-in randomized problem.')
+
+    def handle(self, *args, **options):
+        if options['problems'] < 1:
+            raise CommandError('--problems must be at least 1.')
+        problem_xml = PROBLEM_XML
+        if options['problem_file']:
+            with open(options['problem_file']) as problem_file:
+                problem_xml = problem_file.read()
+
+        _configure_codejail()
+        if not jail_code.is_configured('python'):
+            self.stdout.write('Warning: codejail is not configured, code will run unsandboxed.')
+
+        pool = get_sandbox_pool()
+        if pool is not None:
+            pool.wait_until_ready()
+        self._report(u'configured', problem_xml, options['problems'], pool)
+        if options['pool_size']:
+            pool = configure_sandbox_pool(options['pool_size'], options['max_executions'])
+            if pool is None:
+                raise CommandError('Pre-warmed sandboxes need codejail to be configured.')
+            try:
+                pool.wait_until_ready()
+                self._report(
+                    u'{} pre-warmed'.format(options['pool_size']), problem_xml, options['problems'], pool,
+                )
+            finally:
+                pool.close()
+
+    def _report(self, name, problem_xml, count, pool):
+        """
+        Renders and checks count problems, and writes out how fast it went.
+        """
+        render_seconds, check_seconds = _run_problems(problem_xml, count)
+        self.stdout.write(
+            u'{name} sandboxes ({pool}): {render:.1f} problems rendered/s, {check:.1f} problems checked/s, '
+            u'{total:.1f} problems rendered and checked/s'.format(
+                name=name,
+                pool=u'pooled' if pool is not None else u'not pooled',
+                render=count / render_seconds,
+                check=count / check_seconds,
+                total=count / (render_seconds + check_seconds),
+            )
+        )
+
+
+def _configure_codejail():
+    """
+    Configures codejail from CODE_JAIL, which the codejail middleware does for web requests.
+    """
+    config = getattr(settings, 'CODE_JAIL', {})
+    if config.get('python_bin'):
+        jail_code.configure('python', config['python_bin'], user=config.get('user'))
+    for name, value in config.get('limits', {}).items():
+        jail_code.set_limit(name, value)
+
+
+def _run_problems(problem_xml, count):
+    """
+    Renders, then checks, count problems with distinct seeds, and returns the
+    seconds spent rendering them and checking them.
+    """
+    capa_system = LoncapaSystem(
+        ajax_url='/benchmark',
+        anonymous_student_id='benchmark',
+        cache=None,
+        can_execute_unsafe_code=lambda: False,
+        get_python_lib_zip=lambda: None,
+        DEBUG=False,
+        filestore=None,
+        i18n=gettext.NullTranslations(),
+        node_path='',
+        render_template=render_to_string,
+        seed=0,
+        STATIC_URL=settings.STATIC_URL,
+        xqueue=None,
+    )
+
+    render_seconds = check_seconds = 0.0
+    for seed in range(count):
+        start = time.time()
+        problem = LoncapaProblem(problem_xml, u'benchmark', capa_system, _BenchmarkModule(), seed=seed)
+        problem.get_html()
+        render_seconds += time.time() - start
+
+        answers = {answer_id: problem.context.get('expected', u'') for answer_id in problem.get_question_answers()}
+        start = time.time()
+        problem.grade_answers(answers)
+        check_seconds += time.time() - start
+    return render_seconds, check_seconds
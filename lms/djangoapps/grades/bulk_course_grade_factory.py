@@ -0,0 +1,581 @@
+"""
+Bulk Course Grade Factory Class
+
+Computes and persists the course grades of a whole batch of users at once,
+for use by whole-course regrades.  Raw problem scores for the batch are
+loaded into (user x scorable block) arrays: CSM scores with one query for
+the whole batch, and submissions scores with one submissions API call per
+user, since that API has no bulk read.  Problem weights, subsection
+aggregation, drop-lowest and the rest of the grading policy are then
+applied with vectorized NumPy operations.
+Subsection and course grades are then written with bulk queries.
+
+Results are identical to those of CourseGradeFactory().update(...,
+force_update_subsections=True).  To guarantee this, values are accumulated
+in the same order as in the per-user code path, so that floating point
+sums match exactly.
+"""
+
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import partial
+from logging import getLogger
+
+import numpy as np
+import six
+from django.conf import settings
+from pytz import UTC
+from submissions import api as submissions_api
+
+from lms.djangoapps.courseware.model_data import ScoresClient
+from lms.djangoapps.courseware.models import StudentModule
+from openedx.core.djangoapps.signals.signals import (
+    COURSE_GRADE_CHANGED,
+    COURSE_GRADE_NOW_FAILED,
+    COURSE_GRADE_NOW_PASSED
+)
+from student.models import anonymous_id_for_user
+from xmodule.graders import AggregatedScore, AssignmentFormatGrader, ProblemScore, WeightedSubsectionsGrader
+
+from .config import should_persist_grades
+from .course_data import CourseData
+from .course_grade import PrecomputedCourseGrade, _uniqueify_and_keep_order
+from .course_grade_factory import CourseGradeFactory
+from .models import BlockRecord, PersistentCourseGrade, PersistentSubsectionGrade
+from .scores import _get_explicit_graded, possibly_scored
+from .subsection_grade import PrecomputedSubsectionGrade
+from .transformer import GradesTransformer
+
+log = getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_NO_TIMESTAMP = np.iinfo(np.int64).max
+
+
+class BulkCourseGradeFactory(object):
+    """
+    Factory class to compute and persist the course grades of many users at once.
+    """
+    GradeResult = CourseGradeFactory.GradeResult
+
+    def iter(self, users, course=None, collected_block_structure=None, course_key=None):
+        """
+        Given a course and an iterable of students (User), computes and saves
+        the grades of all the students, then yields a GradeResult for every
+        student, in order.  This is the bulk equivalent of
+        CourseGradeFactory().iter(..., force_update=True).
+
+        Errors specific to a single student are returned in their GradeResult,
+        as in CourseGradeFactory.iter.  Errors while writing the grades of the
+        batch are raised.
+        """
+        course_data = CourseData(
+            user=None, course=course, collected_block_structure=collected_block_structure, course_key=course_key,
+        )
+        users = list(users)
+
+        if not self._can_compute_in_bulk(course_data):
+            for result in CourseGradeFactory().iter(
+                    users,
+                    course=course_data.course,
+                    collected_block_structure=course_data.collected_structure,
+                    course_key=course_data.course_key,
+                    force_update=True,
+            ):
+                yield result
+            return
+
+        results = {}
+        layouts = []
+        for user in users:
+            try:
+                layouts.append(_UserLayout(user, course_data))
+            except Exception as exc:  # pylint: disable=broad-except
+                log.exception(
+                    u'Cannot grade student %s in course %s because of exception: %s',
+                    user.id,
+                    course_data.course_key,
+                    six.text_type(exc)
+                )
+                results[user.id] = self.GradeResult(user, None, exc)
+
+        if layouts:
+            for course_grade in self._compute_and_persist(layouts, course_data):
+                results[course_grade.user.id] = self.GradeResult(course_grade.user, course_grade, None)
+
+        for user in users:
+            yield results[user.id]
+
+    @staticmethod
+    def _can_compute_in_bulk(course_data):
+        """
+        Returns whether grades for the course can go through the bulk path.
+        The per-user path is used when grades are not persisted, since
+        there is then nothing to write in bulk, and when random scores are
+        generated for profiling.
+        """
+        return should_persist_grades(course_data.course_key) and not settings.GENERATE_PROFILE_SCORES
+
+    def _compute_and_persist(self, layouts, course_data):
+        """
+        Computes, saves, and returns the CourseGrade objects of all the given users.
+        """
+        scores = _ScoreMatrix.load(layouts, course_data.course_key)
+        existing_grades = {
+            (grade.user_id, grade.full_usage_key): grade
+            for grade in PersistentSubsectionGrade.objects.select_related('override').filter(
+                course_id=course_data.course_key,
+                user_id__in=[layout.user.id for layout in layouts],
+            )
+        }
+
+        course_grades = []
+        subsection_grade_params = []
+        for row, layout in enumerate(layouts):
+            subsection_grades = OrderedDict()
+            for location, block_keys in six.iteritems(layout.subsections):
+                subsection_grade, grade_params = scores.subsection_grade(
+                    row, layout, location, block_keys, existing_grades.get((layout.user.id, location)),
+                )
+                subsection_grades[location] = subsection_grade
+                subsection_grade_params.append(grade_params)
+            course_grades.append(PrecomputedCourseGrade(
+                layout.user, layout.course_data, subsection_grades, force_update_subsections=True,
+            ))
+
+        course = PrecomputedCourseGrade._prep_course_for_grading(course_data.course)  # pylint: disable=protected-access
+        percents = _grader_percents(
+            course.grader, [course_grade.graded_subsections_by_format for course_grade in course_grades],
+        )
+        for row, course_grade in enumerate(course_grades):
+            course_grade.update(percent=percents[row] if percents is not None else None)
+
+        PersistentSubsectionGrade.bulk_update_or_create_grades(
+            subsection_grade_params, course_data.course_key, existing_grades,
+        )
+        PersistentCourseGrade.bulk_update_or_create(course_data.course_key, [
+            dict(
+                user_id=course_grade.user.id,
+                course_version=course_grade.course_data.version,
+                course_edited_timestamp=course_grade.course_data.edited_on,
+                grading_policy_hash=course_grade.course_data.grading_policy_hash,
+                percent_grade=course_grade.percent,
+                letter_grade=course_grade.letter_grade or "",
+                passed=course_grade.passed,
+            )
+            for course_grade in course_grades
+            if course_grade.attempted
+        ])
+
+        for course_grade in course_grades:
+            self._send_signals(course_grade)
+            log.info(
+                u'Grades: Bulk Update, %s, User: %s, %s, persisted: %s',
+                course_grade.course_data.full_string(), course_grade.user.id, course_grade, course_grade.attempted,
+            )
+        return course_grades
+
+    @staticmethod
+    def _send_signals(course_grade):
+        """
+        Sends the same signals as CourseGradeFactory._update.
+        """
+        course_data = course_grade.course_data
+        COURSE_GRADE_CHANGED.send_robust(
+            sender=None,
+            user=course_grade.user,
+            course_grade=course_grade,
+            course_key=course_data.course_key,
+            deadline=course_data.course.end,
+        )
+        if course_grade.passed:
+            COURSE_GRADE_NOW_PASSED.send(
+                sender=CourseGradeFactory,
+                user=course_grade.user,
+                course_id=course_data.course_key,
+            )
+        else:
+            COURSE_GRADE_NOW_FAILED.send(
+                sender=CourseGradeFactory,
+                user=course_grade.user,
+                course_id=course_data.course_key,
+                grade=course_grade,
+            )
+
+
+class _UserLayout(object):
+    """
+    The user-specific course structure of a single user, and the
+    scorable blocks of each of the subsections visible to that user.
+    """
+    def __init__(self, user, course_data):
+        self.user = user
+        self.course_data = CourseData(
+            user,
+            course=course_data.course,
+            collected_block_structure=course_data.collected_structure,
+            course_key=course_data.course_key,
+        )
+        self.structure = self.course_data.structure
+
+        # Subsections are visited in the same order as CourseGrade.chapter_grades,
+        # and blocks in the same order as CreateSubsectionGrade.
+        self.subsections = OrderedDict()
+        for chapter_key in self.structure.get_children(self.course_data.location):
+            for subsection_key in _uniqueify_and_keep_order(self.structure.get_children(chapter_key)):
+                if subsection_key not in self.subsections:
+                    self.subsections[subsection_key] = [
+                        block_key
+                        for block_key in self.structure.post_order_traversal(
+                            filter_func=possibly_scored,
+                            start_node=subsection_key,
+                        )
+                        if getattr(self.structure[block_key], 'has_score', False)
+                    ]
+
+    def scorable_blocks(self):
+        """
+        Returns the set of all scorable blocks visible to the user.
+        """
+        return {block_key for block_keys in six.itervalues(self.subsections) for block_key in block_keys}
+
+
+_SubsectionTotals = namedtuple('_SubsectionTotals', [
+    'earned_all', 'possible_all', 'earned_graded', 'possible_graded', 'attempted_all_col', 'attempted_graded_col',
+])
+
+
+class _ScoreMatrix(object):
+    """
+    Problem scores for a batch of users, as (user x scorable block) arrays.
+
+    Rows follow the order of the given user layouts, and columns are
+    assigned to scorable blocks in the order they are first seen.
+    """
+    def __init__(self, layouts):
+        self._layouts_subsections = [layout.subsections for layout in layouts]
+        self.columns = OrderedDict()
+        for layout in layouts:
+            for block_keys in six.itervalues(layout.subsections):
+                for block_key in block_keys:
+                    self.columns.setdefault(block_key, len(self.columns))
+
+        shape = (len(layouts), len(self.columns))
+        self.visible = np.zeros(shape, dtype=bool)
+        self.has_weight = np.zeros(shape, dtype=bool)
+        self.weight = np.zeros(shape)
+        self.explicit_graded = np.zeros(shape, dtype=bool)
+        self.submission_valid = np.zeros(shape, dtype=bool)
+        self.submission_earned = np.zeros(shape)
+        self.submission_possible = np.zeros(shape)
+        self.csm_valid = np.zeros(shape, dtype=bool)
+        self.csm_earned = np.zeros(shape)
+        self.csm_possible = np.zeros(shape)
+        self.latest_valid = np.zeros(shape, dtype=bool)
+        self.latest_possible = np.zeros(shape)
+        self.first_attempted = np.full(shape, _NO_TIMESTAMP, dtype=np.int64)
+
+        # Python objects that must be stored as-is, keyed by (row, column).
+        self.weight_values = {}
+        self.first_attempted_values = {}
+
+        self._subsection_totals = {}
+
+    @classmethod
+    def load(cls, layouts, course_key):
+        """
+        Returns a _ScoreMatrix for the given user layouts, with the scores
+        of all the users read from CSM in one query, and from the submissions
+        API one user at a time.
+        """
+        matrix = cls(layouts)
+        csm_scores = matrix._read_csm_scores(layouts, course_key)
+        for row, layout in enumerate(layouts):
+            anonymous_user_id = anonymous_id_for_user(layout.user, course_key)
+            submissions_scores = submissions_api.get_scores(six.text_type(course_key), anonymous_user_id)
+            matrix._fill_row(row, layout, submissions_scores, csm_scores.get(layout.user.id, {}))
+        matrix._compute_weighted_scores()
+        return matrix
+
+    def _read_csm_scores(self, layouts, course_key):
+        """
+        Returns the CSM scores of all the users for all the scorable blocks,
+        in a dict of {user_id: {location: ScoresClient.Score}}.
+        """
+        scores = {}
+        if not self.columns:
+            return scores
+        queryset = StudentModule.objects.filter(
+            course_id=course_key,
+            student_id__in=[layout.user.id for layout in layouts],
+            module_state_key__in=list(self.columns),
+        ).values_list('student_id', 'module_state_key', 'grade', 'max_grade', 'created')
+        for user_id, location, correct, total, created in queryset:
+            # See ScoresClient.fetch_scores for why the course key is mapped back in.
+            scores.setdefault(user_id, {})[location.map_into_course(course_key)] = ScoresClient.Score(
+                correct, total, created,
+            )
+        return scores
+
+    def _fill_row(self, row, layout, submissions_scores, csm_scores):
+        """
+        Fills the raw score values of a single user, following the same
+        order of precedence as scores.get_score: submissions API, then CSM,
+        then the latest block content.
+        """
+        for block_key in layout.scorable_blocks():
+            col = self.columns[block_key]
+            block = layout.structure[block_key]
+            self.visible[row, col] = True
+
+            weight = getattr(block, 'weight', None)
+            self.weight_values[row, col] = weight
+            if weight is not None:
+                self.has_weight[row, col] = True
+                self.weight[row, col] = weight
+            self.explicit_graded[row, col] = _get_explicit_graded(block)
+
+            submission = submissions_scores.get(six.text_type(block_key)) if submissions_scores else None
+            if submission:
+                self.submission_valid[row, col] = True
+                self.submission_earned[row, col] = submission['points_earned']
+                self.submission_possible[row, col] = submission['points_possible']
+                self._set_first_attempted(row, col, submission['created_at'])
+                continue
+
+            score = csm_scores.get(block_key.replace(version=None, branch=None))
+            if score and score.total is not None:
+                self.csm_valid[row, col] = True
+                self.csm_possible[row, col] = score.total
+                if score.correct is not None:
+                    self.csm_earned[row, col] = score.correct
+                    self._set_first_attempted(row, col, score.created)
+                continue
+
+            max_score = block.transformer_data[GradesTransformer].max_score
+            if max_score is not None:
+                self.latest_valid[row, col] = True
+                self.latest_possible[row, col] = max_score
+
+    def _set_first_attempted(self, row, col, first_attempted):
+        if first_attempted:
+            self.first_attempted[row, col] = (first_attempted - _EPOCH) // timedelta(microseconds=1)
+            self.first_attempted_values[row, col] = first_attempted
+
+    def _compute_weighted_scores(self):
+        """
+        Computes the weighted earned and possible values, as in
+        scores.weighted_score, and the graded status of every score.
+        """
+        self.raw_possible = np.where(self.csm_valid, self.csm_possible, self.latest_possible)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            use_weight = self.has_weight & (self.raw_possible != 0)
+            self.earned = np.where(use_weight, self.csm_earned * self.weight / self.raw_possible, self.csm_earned)
+            self.possible = np.where(use_weight, self.weight, self.raw_possible)
+
+        # Scores from the submissions API are already weighted.
+        self.earned = np.where(self.submission_valid, self.submission_earned, self.earned)
+        self.possible = np.where(self.submission_valid, self.submission_possible, self.possible)
+
+        self.present = self.visible & (self.submission_valid | self.csm_valid | self.latest_valid)
+        self.graded = self.present & (self.possible > 0.0) & self.explicit_graded
+
+    def subsection_totals(self, location):
+        """
+        Returns the _SubsectionTotals of the given subsection for all rows.
+
+        For each row, the scores of the subsection's blocks are accumulated
+        in that user's block order, one block position at a time across all
+        users, which matches graders.aggregate_scores exactly.
+        """
+        if location in self._subsection_totals:
+            return self._subsection_totals[location]
+
+        num_rows = self.visible.shape[0]
+        block_columns = [
+            [self.columns[block_key] for block_key in subsections.get(location, [])]
+            for subsections in self._layouts_subsections
+        ]
+        width = max(len(columns) for columns in block_columns)
+        column_index = np.full((num_rows, width), -1, dtype=np.int64)
+        for row, columns in enumerate(block_columns):
+            column_index[row, :len(columns)] = columns
+
+        rows = np.arange(num_rows)
+        earned_all, possible_all = np.zeros(num_rows), np.zeros(num_rows)
+        earned_graded, possible_graded = np.zeros(num_rows), np.zeros(num_rows)
+        attempted_all = np.full(num_rows, _NO_TIMESTAMP, dtype=np.int64)
+        attempted_graded = np.full(num_rows, _NO_TIMESTAMP, dtype=np.int64)
+        attempted_all_col = np.full(num_rows, -1, dtype=np.int64)
+        attempted_graded_col = np.full(num_rows, -1, dtype=np.int64)
+
+        for position in range(width):
+            columns = column_index[:, position]
+            is_block = columns >= 0
+            columns = np.where(is_block, columns, 0)
+            included = is_block & self.present[rows, columns]
+            included_graded = included & self.graded[rows, columns]
+            earned = self.earned[rows, columns]
+            possible = self.possible[rows, columns]
+            first_attempted = self.first_attempted[rows, columns]
+
+            earned_all += np.where(included, earned, 0.0)
+            possible_all += np.where(included, possible, 0.0)
+            earned_graded += np.where(included_graded, earned, 0.0)
+            possible_graded += np.where(included_graded, possible, 0.0)
+
+            earlier = included & (first_attempted < attempted_all)
+            attempted_all = np.where(earlier, first_attempted, attempted_all)
+            attempted_all_col = np.where(earlier, columns, attempted_all_col)
+            earlier = included_graded & (first_attempted < attempted_graded)
+            attempted_graded = np.where(earlier, first_attempted, attempted_graded)
+            attempted_graded_col = np.where(earlier, columns, attempted_graded_col)
+
+        totals = _SubsectionTotals(
+            earned_all, possible_all, earned_graded, possible_graded, attempted_all_col, attempted_graded_col,
+        )
+        self._subsection_totals[location] = totals
+        return totals
+
+    def subsection_grade(self, row, layout, location, block_keys, existing_grade):
+        """
+        Returns the PrecomputedSubsectionGrade of the given subsection for the
+        user in the given row, and the parameters for persisting it.
+        """
+        totals = self.subsection_totals(location)
+
+        first_attempted_all = self.first_attempted_values.get((row, totals.attempted_all_col[row]))
+        first_attempted_graded = self.first_attempted_values.get((row, totals.attempted_graded_col[row]))
+        all_total = AggregatedScore(
+            float(totals.earned_all[row]), float(totals.possible_all[row]), False,
+            first_attempted=first_attempted_all,
+        )
+        graded_total = AggregatedScore(
+            float(totals.earned_graded[row]), float(totals.possible_graded[row]), True,
+            first_attempted=first_attempted_graded,
+        )
+        subsection = layout.structure[location]
+        grade_params = dict(
+            user_id=layout.user.id,
+            usage_key=location,
+            course_version=getattr(subsection, 'course_version', None),
+            subtree_edited_timestamp=getattr(subsection, 'subtree_edited_on', None),
+            earned_all=all_total.earned,
+            possible_all=all_total.possible,
+            earned_graded=graded_total.earned,
+            possible_graded=graded_total.possible,
+            visible_blocks=[
+                BlockRecord(block_key, score.weight, score.raw_possible, score.graded)
+                for block_key, score in six.iteritems(self.problem_scores(row, block_keys))
+            ],
+            first_attempted=first_attempted_all,
+        )
+
+        override = getattr(existing_grade, 'override', None)
+        if override is not None:
+            # As in CreateSubsectionGrade.update_or_create_model, the totals
+            # of overridden grades are read back from the persisted model.
+            if existing_grade.first_attempted is not None:
+                first_attempted_all = existing_grade.first_attempted
+            all_total = AggregatedScore(
+                _override_or_default(override.earned_all_override, all_total.earned),
+                _override_or_default(override.possible_all_override, all_total.possible),
+                False,
+                first_attempted=first_attempted_all,
+            )
+            graded_total = AggregatedScore(
+                _override_or_default(override.earned_graded_override, graded_total.earned),
+                _override_or_default(override.possible_graded_override, graded_total.possible),
+                True,
+                first_attempted=first_attempted_all,
+            )
+
+        subsection_grade = PrecomputedSubsectionGrade(
+            subsection, all_total, graded_total, partial(self.problem_scores, row, block_keys), override=override,
+        )
+        return subsection_grade, grade_params
+
+    def problem_scores(self, row, block_keys):
+        """
+        Returns the ProblemScores of the given blocks for the user in the
+        given row, in an OrderedDict keyed by block.
+        """
+        problem_scores = OrderedDict()
+        for block_key in block_keys:
+            col = self.columns[block_key]
+            if not self.present[row, col]:
+                continue
+            if self.submission_valid[row, col]:
+                raw_earned, raw_possible = None, None
+            else:
+                raw_earned, raw_possible = float(self.csm_earned[row, col]), float(self.raw_possible[row, col])
+            problem_scores[block_key] = ProblemScore(
+                raw_earned,
+                raw_possible,
+                float(self.earned[row, col]),
+                float(self.possible[row, col]),
+                self.weight_values[row, col],
+                bool(self.graded[row, col]),
+                first_attempted=self.first_attempted_values.get((row, col)),
+            )
+        return problem_scores
+
+
+def _override_or_default(override_value, default):
+    return override_value if override_value is not None else default
+
+
+def _grader_percents(grader, grade_sheets):
+    """
+    Returns an array with the course percent computed by the given grader
+    for each of the given grade sheets, or None if the grader is not one
+    that can be vectorized, i.e. anything other than a
+    WeightedSubsectionsGrader of AssignmentFormatGraders.
+    """
+    if not isinstance(grader, WeightedSubsectionsGrader):
+        return None
+    if not all(isinstance(subgrader, AssignmentFormatGrader) for subgrader, _, _ in grader.subgraders):
+        return None
+
+    total_percent = np.zeros(len(grade_sheets))
+    for subgrader, _, weight in grader.subgraders:
+        total_percent += _assignment_format_percents(subgrader, grade_sheets) * weight
+    return total_percent
+
+
+def _assignment_format_percents(subgrader, grade_sheets):
+    """
+    Vectorized equivalent of AssignmentFormatGrader.grade(...)['percent']
+    for each of the given grade sheets.
+    """
+    num_rows = len(grade_sheets)
+    section_percents = [
+        [subsection_grade.percent_graded for subsection_grade in six.itervalues(grade_sheet.get(subgrader.type, {}))]
+        for grade_sheet in grade_sheets
+    ]
+    min_count = int(float(subgrader.min_count))
+    counts = np.array([max(min_count, len(percents)) for percents in section_percents], dtype=np.int64)
+    width = int(counts.max()) if num_rows else 0
+
+    # Sections missing to reach min_count count as 0%.
+    breakdown = np.zeros((num_rows, width))
+    for row, percents in enumerate(section_percents):
+        breakdown[row, :len(percents)] = percents
+    in_breakdown = np.arange(width)[np.newaxis, :] < counts[:, np.newaxis]
+
+    kept = in_breakdown
+    if subgrader.drop_count > 0:
+        # Same stable descending sort as AssignmentFormatGrader.total_with_drops,
+        # with the padding beyond each row's breakdown sorted last.
+        sort_keys = np.where(in_breakdown, -breakdown, np.inf)
+        ranks = np.argsort(np.argsort(sort_keys, axis=1, kind='stable'), axis=1)
+        dropped = in_breakdown & (ranks >= (counts - subgrader.drop_count)[:, np.newaxis])
+        kept = in_breakdown & ~dropped
+
+    aggregate_score = np.zeros(num_rows)
+    for position in range(width):
+        aggregate_score += np.where(kept[:, position], breakdown[:, position], 0.0)
+
+    divisor = counts - subgrader.drop_count
+    return np.where(divisor > 0, aggregate_score / np.maximum(divisor, 1), aggregate_score)
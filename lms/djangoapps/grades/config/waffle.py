@@ -12,6 +12,10 @@ WAFFLE_NAMESPACE = u'grades'
 # Switches
 ASSUME_ZERO_GRADE_IF_ABSENT = u'assume_zero_grade_if_absent'
 DISABLE_REGRADE_ON_POLICY_CHANGE = u'disable_regrade_on_policy_change'
+# Compute whole-course regrades with the BulkCourseGradeFactory.
+BULK_COMPUTE_COURSE_GRADES = u'bulk_compute_course_grades'
+# Merge bursts of score changes into one subsection grade update per (user, course).
+COALESCE_SUBSECTION_GRADE_UPDATES = u'coalesce_subsection_grade_updates'
 
 # Course Flags
 REJECTED_EXAM_OVERRIDES_GRADE = u'rejected_exam_overrides_grade'
@@ -330,5 +330,32 @@ class CourseGrade(CourseGradeBase):
         return success_cutoff and percent >= success_cutoff
 
 
+class PrecomputedCourseGrade(CourseGrade):
+    """
+    Course Grade class for grades whose subsection grades were
+    computed in bulk by the BulkCourseGradeFactory.
+    """
+    def __init__(self, user, course_data, subsection_grades, *args, **kwargs):
+        super(PrecomputedCourseGrade, self).__init__(user, course_data, *args, **kwargs)
+        self._precomputed_subsection_grades = subsection_grades
+
+    def update(self, percent=None):  # pylint: disable=arguments-differ
+        """
+        Updates the grade for the course from the given course percent,
+        as computed by the grader, or from self.grader_result if None.
+        """
+        if percent is None:
+            return super(PrecomputedCourseGrade, self).update()
+
+        grade_cutoffs = self.course_data.course.grade_cutoffs
+        self.percent = self._compute_percent({'percent': percent})
+        self.letter_grade = self._compute_letter_grade(grade_cutoffs, self.percent)
+        self.passed = self._compute_passed(grade_cutoffs, self.percent)
+        return self
+
+    def _get_subsection_grade(self, subsection, force_update_subsections=False):
+        return self._precomputed_subsection_grades[subsection.location]
+
+
 def _uniqueify_and_keep_order(iterable):
     return list(OrderedDict([(item, None) for item in iterable]).keys())
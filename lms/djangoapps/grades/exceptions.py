@@ -9,3 +9,11 @@ class DatabaseNotReadyError(IOError):
     the data we're trying to find.
     """
     pass
+
+
+class QueueUnavailableError(Exception):
+    """
+    Raised when a subsection grade update cannot be added to the coalescing
+    queue, because the cache lost its sequence counter.
+    """
+    pass
@@ -11,14 +11,19 @@ persisted, course grades are also immune to changes in course content.
 
 import json
 import logging
+import threading
 from base64 import b64encode
-from collections import defaultdict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import lru_cache
 from hashlib import sha1
 
 import six
 from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_migrate
+from django.dispatch import receiver
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.timezone import now
 from lazy import lazy
@@ -37,6 +42,11 @@ log = logging.getLogger(__name__)
 
 BLOCK_RECORD_LIST_VERSION = 1
 
+# Number of serialized block record lists kept per process.  Most learners in
+# a course see the same blocks in a subsection, so a course-wide grading run
+# only needs to serialize and hash each distinct list once.
+BLOCK_RECORD_LIST_DIGEST_CACHE_SIZE = 4096
+
 # Used to serialize information about a block at the time it was used in
 # grade calculation.
 BlockRecord = namedtuple('BlockRecord', ['locator', 'weight', 'raw_possible', 'graded'])
@@ -79,7 +89,7 @@ class BlockRecordList(object):
         supported by adding a label indicated which algorithm was used, e.g.,
         "sha256$j0NDRmSPa5bfid2pAcUXaxCm2Dlh3TwayItZstwyeqQ=".
         """
-        return b64encode(sha1(self.json_value.encode('utf-8')).digest()).decode('utf-8')
+        return self._digest[1]
 
     @lazy
     def json_value(self):
@@ -87,19 +97,15 @@ class BlockRecordList(object):
         Return a JSON-serialized version of the list of block records, using a
         stable ordering.
         """
-        list_of_block_dicts = [block._asdict() for block in self.blocks]
-        for block_dict in list_of_block_dicts:
-            block_dict['locator'] = six.text_type(block_dict['locator'])  # BlockUsageLocator is not json-serializable
-        data = {
-            u'blocks': list_of_block_dicts,
-            u'course_key': six.text_type(self.course_key),
-            u'version': self.version,
-        }
-        return json.dumps(
-            data,
-            separators=(',', ':'),  # Remove spaces from separators for more compact representation
-            sort_keys=True,
-        )
+        return self._digest[0]
+
+    @lazy
+    def _digest(self):
+        """
+        Returns the (json_value, hash_value) pair, shared by all
+        BlockRecordLists with the same contents.
+        """
+        return _block_record_list_digest(self.blocks, self.course_key, self.version)
 
     @classmethod
     def from_json(cls, blockrecord_json):
@@ -128,6 +134,103 @@ class BlockRecordList(object):
         return cls(blocks, course_key)
 
 
+def _block_record_list_digest(blocks, course_key, version):
+    """
+    Returns the JSON serialization of the given block records and the
+    base64-encoded sha1 hash of that serialization, both computed once per
+    distinct list of block records.
+    """
+    # Weights of 1, 1.0 and True compare equal but are serialized differently,
+    # so the types of the values are part of the cache key.
+    value_types = tuple(tuple(map(type, block)) for block in blocks)
+    return _cached_block_record_list_digest(blocks, value_types, course_key, version)
+
+
+@lru_cache(maxsize=BLOCK_RECORD_LIST_DIGEST_CACHE_SIZE)
+def _cached_block_record_list_digest(blocks, value_types, course_key, version):  # pylint: disable=unused-argument
+    """
+    Serializes and hashes the given block records, see _block_record_list_digest.
+    """
+    list_of_block_dicts = [block._asdict() for block in blocks]
+    for block_dict in list_of_block_dicts:
+        block_dict['locator'] = six.text_type(block_dict['locator'])  # BlockUsageLocator is not json-serializable
+    data = {
+        u'blocks': list_of_block_dicts,
+        u'course_key': six.text_type(course_key),
+        u'version': version,
+    }
+    json_value = json.dumps(
+        data,
+        separators=(',', ':'),  # Remove spaces from separators for more compact representation
+        sort_keys=True,
+    )
+    hash_value = b64encode(sha1(json_value.encode('utf-8')).digest()).decode('utf-8')
+    return json_value, hash_value
+
+
+class VisibleBlocksIdCache(object):
+    """
+    A process-wide, bounded LRU mapping of VisibleBlocks hashes to ids.
+
+    VisibleBlocks rows are never updated, so a hash in this cache is
+    known to be persisted, and writers can skip looking it up.  The id
+    is None for rows created by a bulk insert that did not return ids.
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        """
+        Maximum number of hashes held; 0 disables the cache.
+        """
+        return getattr(settings, 'GRADES_VISIBLE_BLOCKS_CACHE_SIZE', 0)
+
+    def __contains__(self, hashed):
+        return hashed in self._entries
+
+    def get(self, hashed):
+        """
+        Returns the id cached for the given hash, or None.
+        """
+        with self._lock:
+            try:
+                self._entries.move_to_end(hashed)
+            except KeyError:
+                return None
+            return self._entries[hashed]
+
+    def set_many(self, ids_by_hash):
+        """
+        Adds the given hash to id mappings, evicting the least recently
+        used entries beyond max_size.
+        """
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        with self._lock:
+            for hashed, visible_blocks_id in six.iteritems(ids_by_hash):
+                if self._entries.get(hashed) is not None and visible_blocks_id is None:
+                    visible_blocks_id = self._entries[hashed]
+                self._entries[hashed] = visible_blocks_id
+                self._entries.move_to_end(hashed)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def set_many_on_commit(self, ids_by_hash):
+        """
+        Adds the given hash to id mappings once the current transaction is
+        committed, as the rows would not exist if it were rolled back.
+        """
+        if self.max_size > 0:
+            transaction.on_commit(lambda: self.set_many(ids_by_hash))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 @python_2_unicode_compatible
 class VisibleBlocks(models.Model):
     """
@@ -146,6 +249,9 @@ class VisibleBlocks(models.Model):
 
     _CACHE_NAMESPACE = u"grades.models.VisibleBlocks"
 
+    # Hashes of persisted VisibleBlocks, shared across requests.
+    known_ids = VisibleBlocksIdCache()
+
     class Meta(object):
         app_label = "grades"
 
@@ -193,15 +299,27 @@ class VisibleBlocks(models.Model):
                 # We still have to do a get_or_create, because
                 # another user may have had this block hash created,
                 # even if the user we checked the cache for hasn't yet.
-                model, _ = cls.objects.get_or_create(
-                    hashed=blocks.hash_value, blocks_json=blocks.json_value, course_id=blocks.course_key,
-                )
+                model = cls._known_or_get_or_create(blocks)
                 cls._update_cache(user_id, blocks.course_key, [model])
         else:
-            model, _ = cls.objects.get_or_create(
-                hashed=blocks.hash_value,
-                defaults={u'blocks_json': blocks.json_value, u'course_id': blocks.course_key},
-            )
+            model = cls._known_or_get_or_create(blocks)
+        return model
+
+    @classmethod
+    def _known_or_get_or_create(cls, blocks):
+        """
+        Returns the VisibleBlocks for ``blocks``, without querying the
+        database if this process already knows its id.
+        """
+        known_id = cls.known_ids.get(blocks.hash_value)
+        if known_id is not None:
+            return cls(id=known_id, hashed=blocks.hash_value, blocks_json=blocks.json_value, course_id=blocks.course_key)
+
+        model, _ = cls.objects.get_or_create(
+            hashed=blocks.hash_value,
+            defaults={u'blocks_json': blocks.json_value, u'course_id': blocks.course_key},
+        )
+        cls.known_ids.set_many_on_commit({model.hashed: model.id})
         return model
 
     @classmethod
@@ -221,6 +339,7 @@ class VisibleBlocks(models.Model):
             for brl in block_record_lists
         ])
         cls._update_cache(user_id, course_key, created)
+        cls.known_ids.set_many_on_commit({visible_blocks.hashed: visible_blocks.id for visible_blocks in created})
         return created
 
     @classmethod
@@ -232,8 +351,39 @@ class VisibleBlocks(models.Model):
         """
         cached_records = cls.bulk_read(user_id, course_key)
         non_existent_brls = {brl for brl in block_record_lists if brl.hash_value not in cached_records}
+        # Rows this process already persisted for other learners need not be created.
+        non_existent_brls = {brl for brl in non_existent_brls if brl.hash_value not in cls.known_ids}
         cls.bulk_create(user_id, course_key, non_existent_brls)
 
+    @classmethod
+    def bulk_get_or_create_for_course(cls, course_key, block_record_lists):
+        """
+        Creates VisibleBlocks for the given iterator of BlockRecordList
+        objects, regardless of user, skipping any whose hash already
+        exists.  Unlike bulk_get_or_create, this does not consult or
+        update the per-user request cache, so it is suitable for writing
+        the visible blocks of many learners at once.
+        """
+        brls_by_hash = {
+            brl.hash_value: brl for brl in block_record_lists if brl.hash_value not in cls.known_ids
+        }
+        if not brls_by_hash:
+            return
+        existing_ids = dict(
+            cls.objects.filter(hashed__in=list(brls_by_hash)).values_list('hashed', 'id')
+        )
+        created = cls.objects.bulk_create(
+            [
+                VisibleBlocks(blocks_json=brl.json_value, hashed=hash_value, course_id=course_key)
+                for hash_value, brl in six.iteritems(brls_by_hash)
+                if hash_value not in existing_ids
+            ],
+            # Another worker may have created the same hash in the meantime.
+            ignore_conflicts=True,
+        )
+        existing_ids.update({visible_blocks.hashed: visible_blocks.id for visible_blocks in created})
+        cls.known_ids.set_many_on_commit(existing_ids)
+
     @classmethod
     def _initialize_cache(cls, user_id, course_key):
         """
@@ -264,6 +414,16 @@ class VisibleBlocks(models.Model):
         return u"visible_blocks_cache.{}.{}".format(course_key, user_id)
 
 
+@receiver(post_delete, sender=VisibleBlocks)
+@receiver(post_migrate)
+def _forget_deleted_visible_blocks(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forgets the persisted VisibleBlocks when some are deleted, or when the
+    tables may have been flushed.
+    """
+    VisibleBlocks.known_ids.clear()
+
+
 @python_2_unicode_compatible
 class PersistentSubsectionGrade(TimeStampedModel):
     """
@@ -475,6 +635,61 @@ class PersistentSubsectionGrade(TimeStampedModel):
             cls._emit_grade_calculated_event(grade)
         return grades
 
+    @classmethod
+    def bulk_update_or_create_grades(cls, grade_params_iter, course_key, existing_grades):
+        """
+        Bulk update or creation of grades for any number of users in a course.
+
+        Arguments:
+            grade_params_iter: list of dicts of grade parameters, as used by
+                update_or_create_grade.
+            course_key: The course the grades belong to.
+            existing_grades: dict of previously persisted grades in the course,
+                keyed by (user_id, full_usage_key).  Matching grades are updated
+                in place; as with update_or_create_grade, an existing
+                first_attempted value is never overwritten.
+        """
+        if not grade_params_iter:
+            return []
+
+        list(map(cls._prepare_params, grade_params_iter))
+        VisibleBlocks.bulk_get_or_create_for_course(
+            course_key, [params['visible_blocks'] for params in grade_params_iter]
+        )
+        list(map(cls._prepare_params_visible_blocks_id, grade_params_iter))
+
+        modified = now()
+        grades_to_create = []
+        grades_to_update = []
+        for params in grade_params_iter:
+            grade = existing_grades.get((params['user_id'], params['usage_key']))
+            if grade is None:
+                grades_to_create.append(PersistentSubsectionGrade(**params))
+            else:
+                first_attempted = params.pop('first_attempted')
+                for field_name, value in six.iteritems(params):
+                    setattr(grade, field_name, value)
+                if grade.first_attempted is None:
+                    grade.first_attempted = first_attempted
+                grade.modified = modified
+                grades_to_update.append(grade)
+
+        cls.objects.bulk_update(grades_to_update, fields=[
+            'course_version',
+            'subtree_edited_timestamp',
+            'earned_all',
+            'possible_all',
+            'earned_graded',
+            'possible_graded',
+            'first_attempted',
+            'visible_blocks_id',
+            'modified',
+        ])
+        grades = grades_to_update + cls.objects.bulk_create(grades_to_create)
+        for grade in grades:
+            cls._emit_grade_calculated_event(grade)
+        return grades
+
     @classmethod
     def _prepare_params(cls, params):
         """
@@ -629,6 +844,60 @@ class PersistentCourseGrade(TimeStampedModel):
         cls._update_cache(course_id, user_id, grade)
         return grade
 
+    @classmethod
+    def bulk_update_or_create(cls, course_id, grade_params_iter):
+        """
+        Creates or updates the course grades of many users in a course.
+        Each item of grade_params_iter holds the user_id and the keyword
+        arguments accepted by update_or_create.
+        Returns the list of PersistedCourseGrade objects.
+        """
+        if not grade_params_iter:
+            return []
+
+        existing_grades = {
+            grade.user_id: grade
+            for grade in cls.objects.filter(
+                course_id=course_id,
+                user_id__in=[params['user_id'] for params in grade_params_iter],
+            )
+        }
+        modified = now()
+        grades_to_create = []
+        grades_to_update = []
+        for params in grade_params_iter:
+            params = dict(params)
+            passed = params.pop('passed')
+            if params.get('course_version', None) is None:
+                params['course_version'] = ""
+
+            grade = existing_grades.get(params['user_id'])
+            if grade is None:
+                grade = PersistentCourseGrade(course_id=course_id, **params)
+                grades_to_create.append(grade)
+            else:
+                for field_name, value in six.iteritems(params):
+                    setattr(grade, field_name, value)
+                grade.modified = modified
+                grades_to_update.append(grade)
+            if passed and not grade.passed_timestamp:
+                grade.passed_timestamp = modified
+
+        cls.objects.bulk_update(grades_to_update, fields=[
+            'course_edited_timestamp',
+            'course_version',
+            'grading_policy_hash',
+            'percent_grade',
+            'letter_grade',
+            'passed_timestamp',
+            'modified',
+        ])
+        grades = grades_to_update + cls.objects.bulk_create(grades_to_create)
+        for grade in grades:
+            cls._emit_grade_calculated_event(grade)
+            cls._update_cache(course_id, grade.user_id, grade)
+        return grades
+
     @classmethod
     def _update_cache(cls, course_id, user_id, grade):
         course_cache = get_cache(cls._CACHE_NAMESPACE).get(cls._cache_key(course_id))
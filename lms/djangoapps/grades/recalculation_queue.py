@@ -0,0 +1,146 @@
+"""
+Pending subsection grade updates, coalesced per (user, course).
+
+Problem-heavy sessions trigger a recalculation for every score change,
+most of them for the same user and course within a few seconds of each
+other.  When the ``grades.coalesce_subsection_grade_updates`` switch is
+enabled, score changes are appended to a queue stored in the Django
+cache, and a single task is scheduled per (user, course) to drain it.
+
+The cache holds, for each (user, course):
+
+* a sequence counter, incremented atomically for every new update,
+* one entry per update, keyed by its sequence number,
+* the sequence number of the last entry drained, and
+* a marker set while a drain task is scheduled.
+
+Entries are only deleted once a drain task has read them, so an update
+can never be dropped by a concurrent enqueue; at worst it is processed
+twice, which is harmless since recalculation is idempotent.
+
+The sequence counter expires, or may be evicted, independently of the
+sequence number of the last entry drained.  It is then started again from
+that number, so that new entries are numbered above it.
+"""
+
+
+from django.core.cache import cache
+
+from .exceptions import QueueUnavailableError
+
+CACHE_KEY_PREFIX = u'grades.recalculation_queue'
+
+# Long enough to outlive any reasonable task backlog.
+CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+
+ENQUEUED_STAT = u'enqueued'
+SCHEDULED_STAT = u'scheduled'
+
+
+class SubsectionGradeUpdateQueue(object):
+    """
+    Queue of pending subsection grade updates for a single (user, course).
+    """
+    def __init__(self, user_id, course_id):
+        self.user_id = user_id
+        self.course_id = course_id
+
+    def enqueue(self, update_kwargs):
+        """
+        Adds the given recalculation kwargs to the queue.
+
+        Returns True if the caller should schedule a drain task, i.e. if
+        none is currently scheduled for this (user, course).
+
+        Raises QueueUnavailableError if the update could not be added.
+        """
+        # A drain cannot move past a missing counter, so numbering restarts
+        # above the last entry drained.
+        cache.add(self._key(u'seq'), cache.get(self._key(u'done'), 0), CACHE_TIMEOUT_SECONDS)
+        try:
+            sequence = cache.incr(self._key(u'seq'))
+        except ValueError:
+            # The counter was evicted between add and incr.
+            raise QueueUnavailableError
+        cache.set(self._entry_key(sequence), update_kwargs, CACHE_TIMEOUT_SECONDS)
+        _increment_stat(ENQUEUED_STAT)
+
+        should_schedule = cache.add(self._key(u'scheduled'), True, CACHE_TIMEOUT_SECONDS)
+        if should_schedule:
+            _increment_stat(SCHEDULED_STAT)
+        return should_schedule
+
+    def mark_scheduled(self):
+        """
+        Marks a drain task as scheduled, e.g. when a drain is rescheduled.
+        """
+        cache.set(self._key(u'scheduled'), True, CACHE_TIMEOUT_SECONDS)
+
+    def drain(self):
+        """
+        Removes and returns the pending updates, in the order they were added,
+        along with whether any updates are known to be pending but could not
+        be read yet (their entry is still being written by another process).
+
+        The scheduled marker is cleared first, so that any update added
+        from now on schedules a new drain task.
+        """
+        cache.delete(self._key(u'scheduled'))
+
+        last_drained = cache.get(self._key(u'done'), 0)
+        last_added = cache.get(self._key(u'seq'), 0)
+        entry_keys = [self._entry_key(sequence) for sequence in range(last_drained + 1, last_added + 1)]
+        entries = cache.get_many(entry_keys)
+
+        updates = []
+        for entry_key in entry_keys:
+            if entry_key not in entries:
+                break
+            updates.append(entries[entry_key])
+
+        if updates:
+            cache.set(self._key(u'done'), last_drained + len(updates), CACHE_TIMEOUT_SECONDS)
+            cache.delete_many(entry_keys[:len(updates)])
+        return updates, len(updates) < len(entry_keys)
+
+    def depth(self):
+        """
+        Returns the number of updates waiting to be drained.
+        """
+        return cache.get(self._key(u'seq'), 0) - cache.get(self._key(u'done'), 0)
+
+    def _key(self, name):
+        return u'{}.{}.{}.{}'.format(CACHE_KEY_PREFIX, self.course_id, self.user_id, name)
+
+    def _entry_key(self, sequence):
+        return self._key(u'entry.{}'.format(sequence))
+
+
+def get_queue_stats():
+    """
+    Returns a dict of statistics about coalesced subsection grade updates:
+    the number of updates enqueued, the number of drain tasks scheduled,
+    and the resulting dedup ratio (the fraction of updates that did not
+    need a task of their own).
+    """
+    enqueued = cache.get(_stat_key(ENQUEUED_STAT), 0)
+    scheduled = cache.get(_stat_key(SCHEDULED_STAT), 0)
+    return {
+        ENQUEUED_STAT: enqueued,
+        SCHEDULED_STAT: scheduled,
+        u'dedup_ratio': 1.0 - float(scheduled) / enqueued if enqueued else 0.0,
+    }
+
+
+def _increment_stat(name):
+    key = _stat_key(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter was evicted between add and incr.
+        cache.add(key, 1, None)
+
+
+def _stat_key(name):
+    return u'{}.stats.{}'.format(CACHE_KEY_PREFIX, name)
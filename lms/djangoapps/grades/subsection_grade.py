@@ -269,6 +269,26 @@ class ReadSubsectionGrade(NonZeroSubsectionGrade):
         return problem_scores
 
 
+class PrecomputedSubsectionGrade(NonZeroSubsectionGrade):
+    """
+    Class for Subsection grades whose totals were computed in bulk,
+    for many users at once, by the BulkCourseGradeFactory.
+
+    Problem scores are only materialized when requested, through the
+    given ``problem_scores_loader`` callable.
+    """
+    def __init__(self, subsection, all_total, graded_total, problem_scores_loader, override=None):
+        self._problem_scores_loader = problem_scores_loader
+        super(PrecomputedSubsectionGrade, self).__init__(subsection, all_total, graded_total, override)
+
+    @lazy
+    def problem_scores(self):
+        """
+        Returns the scores of the problem blocks that compose this subsection.
+        """
+        return self._problem_scores_loader()
+
+
 class CreateSubsectionGrade(NonZeroSubsectionGrade):
     """
     Class for Subsection grades that are newly created or updated.
@@ -3,6 +3,7 @@ This module contains tasks for asynchronous execution of grade updates.
 """
 
 
+from collections import OrderedDict
 from logging import getLogger
 
 import six
@@ -26,11 +27,13 @@ from track.event_transaction_utils import set_event_transaction_id, set_event_tr
 from util.date_utils import from_timestamp
 from xmodule.modulestore.django import modulestore
 
-from .config.waffle import DISABLE_REGRADE_ON_POLICY_CHANGE, waffle
+from .bulk_course_grade_factory import BulkCourseGradeFactory
+from .config.waffle import BULK_COMPUTE_COURSE_GRADES, DISABLE_REGRADE_ON_POLICY_CHANGE, waffle
 from .constants import ScoreDatabaseTableEnum
 from .course_grade_factory import CourseGradeFactory
-from .exceptions import DatabaseNotReadyError
+from .exceptions import DatabaseNotReadyError, QueueUnavailableError
 from .grade_utils import are_grades_frozen
+from .recalculation_queue import SubsectionGradeUpdateQueue
 from .signals.signals import SUBSECTION_SCORE_CHANGED
 from .subsection_grade_factory import SubsectionGradeFactory
 from .transformer import GradesTransformer
@@ -44,6 +47,7 @@ KNOWN_RETRY_ERRORS = (  # Errors we expect occasionally, should be resolved on r
     DatabaseNotReadyError,
 )
 RECALCULATE_GRADE_DELAY_SECONDS = 2  # to prevent excessive _has_db_updated failures. See TNL-6424.
+COALESCED_RECALCULATE_GRADE_DELAY_SECONDS = 10  # window over which score changes are merged into one task.
 RETRY_DELAY_SECONDS = 40
 SUBSECTION_GRADE_TIMEOUT_SECONDS = 300
 
@@ -112,6 +116,9 @@ def compute_grades_for_course(course_key, offset, batch_size, **kwargs):  # pyli
     The set of students will be determined by the order of enrollment date, and
     limited to at most <batch_size> students, starting from the specified
     offset.
+
+    When the BULK_COMPUTE_COURSE_GRADES switch is enabled, the whole set
+    of students is graded at once by the BulkCourseGradeFactory.
     """
     course_key = CourseKey.from_string(course_key)
     if are_grades_frozen(course_key):
@@ -120,7 +127,11 @@ def compute_grades_for_course(course_key, offset, batch_size, **kwargs):  # pyli
 
     enrollments = CourseEnrollment.objects.filter(course_id=course_key).order_by('created')
     student_iter = (enrollment.user for enrollment in enrollments[offset:offset + batch_size])
-    for result in CourseGradeFactory().iter(users=student_iter, course_key=course_key, force_update=True):
+    if waffle().is_enabled(BULK_COMPUTE_COURSE_GRADES):
+        results = BulkCourseGradeFactory().iter(users=student_iter, course_key=course_key)
+    else:
+        results = CourseGradeFactory().iter(users=student_iter, course_key=course_key, force_update=True)
+    for result in results:
         if result.error is not None:
             raise result.error
 
@@ -251,6 +262,106 @@ def _recalculate_subsection_grade(self, **kwargs):
         raise self.retry(kwargs=kwargs, exc=exc)
 
 
+def enqueue_coalesced_subsection_update(**kwargs):
+    """
+    Adds a subsection grade update, with the same keyword arguments as
+    recalculate_subsection_grade_v3, to the pending updates of its
+    (user, course), and schedules a task to process them if none is
+    scheduled yet.  All the updates received until the task runs are
+    merged into a single recalculation.
+    """
+    queue = SubsectionGradeUpdateQueue(kwargs['user_id'], kwargs['course_id'])
+    try:
+        should_schedule = queue.enqueue(kwargs)
+    except QueueUnavailableError:
+        log.warning(u"Grades: could not queue a coalesced update, recalculating directly. kwargs=%s", kwargs)
+        recalculate_subsection_grade_v3.apply_async(kwargs=kwargs, countdown=RECALCULATE_GRADE_DELAY_SECONDS)
+        return
+    if should_schedule:
+        recalculate_subsection_grades_coalesced.apply_async(
+            kwargs=dict(user_id=kwargs['user_id'], course_id=kwargs['course_id']),
+            countdown=COALESCED_RECALCULATE_GRADE_DELAY_SECONDS,
+        )
+
+
+@task(
+    bind=True,
+    base=LoggedPersistOnFailureTask,
+    time_limit=SUBSECTION_GRADE_TIMEOUT_SECONDS,
+    max_retries=2,
+    default_retry_delay=RETRY_DELAY_SECONDS,
+    routing_key=settings.RECALCULATE_GRADES_ROUTING_KEY
+)
+def recalculate_subsection_grades_coalesced(self, user_id, course_id, updates=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drains the pending subsection grade updates of the given user and
+    course, see enqueue_coalesced_subsection_update, and applies them
+    all with a single load of the course structure.
+
+    On retry, the updates drained by the first attempt are passed back
+    in ``updates``, since they are no longer in the queue.
+    """
+    queue = SubsectionGradeUpdateQueue(user_id, course_id)
+    if updates is None:
+        updates, has_unreadable_updates = queue.drain()
+        if has_unreadable_updates:
+            # Another process is still writing some updates; pick them up shortly.
+            queue.mark_scheduled()
+            recalculate_subsection_grades_coalesced.apply_async(
+                kwargs=dict(user_id=user_id, course_id=course_id),
+                countdown=RECALCULATE_GRADE_DELAY_SECONDS,
+            )
+    if not updates:
+        return
+
+    try:
+        course_key = CourseLocator.from_string(course_id)
+        if are_grades_frozen(course_key):
+            log.info(
+                u"Attempted recalculate_subsection_grades_coalesced for course '%s', but grades are frozen.",
+                course_key,
+            )
+            return
+
+        set_custom_metrics_for_course_key(course_key)
+        set_custom_metric('coalesced_update_count', len(updates))
+        set_custom_metric('coalesced_queue_depth', queue.depth())
+        set_event_transaction_id(updates[-1].get('event_transaction_id'))
+        set_event_transaction_type(updates[-1].get('event_transaction_type'))
+
+        # Merge the updates per scored block, keeping the most inclusive options.
+        merged_updates = {}
+        latest_updates = {}
+        for update in updates:
+            scored_block_usage_key = UsageKey.from_string(update['usage_id']).replace(course_key=course_key)
+            latest_updates[scored_block_usage_key] = update
+            only_if_higher, score_deleted, force_update_subsections = merged_updates.get(
+                scored_block_usage_key, (True, False, False),
+            )
+            merged_updates[scored_block_usage_key] = (
+                only_if_higher and bool(update['only_if_higher']),
+                score_deleted or update['score_deleted'],
+                force_update_subsections or update.get('force_update_subsections', False),
+            )
+        set_custom_metric('coalesced_scored_block_count', len(merged_updates))
+
+        # Only the latest score of each block has to be in the database, since
+        # it supersedes the earlier ones, e.g. when a saved score is then deleted.
+        for scored_block_usage_key, update in six.iteritems(latest_updates):
+            if not _has_db_updated_with_new_score(self, scored_block_usage_key, **update):
+                raise DatabaseNotReadyError
+
+        _update_merged_subsection_grades(course_key, user_id, merged_updates)
+    except Exception as exc:
+        if not isinstance(exc, KNOWN_RETRY_ERRORS):
+            log.info(u"Grades: unexpected failure in coalesced recalculation: {}. task id: {}. updates={}".format(
+                repr(exc),
+                self.request.id,
+                updates,
+            ))
+        raise self.retry(kwargs=dict(user_id=user_id, course_id=course_id, updates=updates), exc=exc)
+
+
 def _has_db_updated_with_new_score(self, scored_block_usage_key, **kwargs):
     """
     Returns whether the database has been updated with the
@@ -308,22 +419,50 @@ def _update_subsection_grades(
     for each subsection containing the given block, and to signal
     that those subsection grades were updated.
     """
+    _update_merged_subsection_grades(
+        course_key,
+        user_id,
+        {scored_block_usage_key: (only_if_higher, score_deleted, force_update_subsections)},
+    )
+
+
+def _update_merged_subsection_grades(course_key, user_id, merged_updates):
+    """
+    Updates, with a single load of the course structure, the subsection
+    grades of every subsection containing any of the given scored blocks,
+    and signals that those subsection grades were updated.
+
+    merged_updates is a dict of scored block usage key to a tuple of
+    (only_if_higher, score_deleted, force_update_subsections).  When a
+    subsection contains several of the blocks, their options are combined
+    so that the subsection is updated if any of them requires it.
+    """
     student = User.objects.get(id=user_id)
     store = modulestore()
     with store.bulk_operations(course_key):
         course_structure = get_course_blocks(student, store.make_course_usage_key(course_key))
-        subsections_to_update = course_structure.get_transformer_block_field(
-            scored_block_usage_key,
-            GradesTransformer,
-            'subsections',
-            set(),
-        )
+        subsections_to_update = OrderedDict()
+        for scored_block_usage_key, options in six.iteritems(merged_updates):
+            for subsection_usage_key in course_structure.get_transformer_block_field(
+                scored_block_usage_key,
+                GradesTransformer,
+                'subsections',
+                set(),
+            ):
+                only_if_higher, score_deleted, force_update_subsections = options
+                if subsection_usage_key in subsections_to_update:
+                    previous = subsections_to_update[subsection_usage_key]
+                    only_if_higher = only_if_higher and previous[0]
+                    score_deleted = score_deleted or previous[1]
+                    force_update_subsections = force_update_subsections or previous[2]
+                subsections_to_update[subsection_usage_key] = (only_if_higher, score_deleted, force_update_subsections)
 
         course = store.get_course(course_key, depth=0)
         subsection_grade_factory = SubsectionGradeFactory(student, course, course_structure)
 
-        for subsection_usage_key in subsections_to_update:
+        for subsection_usage_key, options in six.iteritems(subsections_to_update):
             if subsection_usage_key in course_structure:
+                only_if_higher, score_deleted, force_update_subsections = options
                 subsection_grade = subsection_grade_factory.update(
                     course_structure[subsection_usage_key],
                     only_if_higher,
@@ -0,0 +1,165 @@
+"""
+Tests for the BulkCourseGradeFactory class.
+"""
+
+
+import random
+
+import ddt
+from mock import patch
+
+from capa.tests.response_xml_factory import MultipleChoiceResponseXMLFactory
+from lms.djangoapps.courseware.model_data import set_score
+from student.models import CourseEnrollment
+from student.tests.factories import UserFactory
+from xmodule.modulestore.tests.django_utils import SharedModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+
+from ..bulk_course_grade_factory import BulkCourseGradeFactory
+from ..course_grade_factory import CourseGradeFactory
+from ..models import PersistentCourseGrade, PersistentSubsectionGrade
+
+
+@ddt.ddt
+class TestBulkCourseGradeFactory(SharedModuleStoreTestCase):
+    """
+    Test that course grades computed in bulk are identical to
+    the ones computed one user at a time.
+    """
+    ENABLED_SIGNALS = ['course_published']
+
+    # (format, problem weights) of each subsection; a weight of None
+    # leaves the problem unweighted.
+    SUBSECTIONS = [
+        ('Homework', [None, 2]),
+        ('Homework', [3, None, 0.5]),
+        ('Homework', [None]),
+        ('Homework', [1, 1]),
+        ('Exam', [10, None, 7]),
+        ('Exam', [None]),
+        ('', [None, 4]),
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestBulkCourseGradeFactory, cls).setUpClass()
+        cls.course = CourseFactory.create()
+        problem_xml = MultipleChoiceResponseXMLFactory().build_xml(
+            question_text='The correct answer is Choice 2',
+            choices=[False, False, True],
+            choice_names=['choice_0', 'choice_1', 'choice_2']
+        )
+        cls.problems = []
+        with cls.store.bulk_operations(cls.course.id):
+            chapter = ItemFactory.create(parent=cls.course, category='chapter', display_name='Chapter')
+            for index, (subsection_format, weights) in enumerate(cls.SUBSECTIONS):
+                subsection = ItemFactory.create(
+                    parent=chapter,
+                    category='sequential',
+                    display_name='Subsection {}'.format(index),
+                    graded=bool(subsection_format),
+                    format=subsection_format,
+                )
+                vertical = ItemFactory.create(parent=subsection, category='vertical')
+                for weight in weights:
+                    metadata = {'weight': weight} if weight is not None else {}
+                    cls.problems.append(ItemFactory.create(
+                        parent=vertical, category='problem', data=problem_xml, metadata=metadata,
+                    ))
+
+        cls.course.set_grading_policy({
+            'GRADER': [
+                {'type': 'Homework', 'min_count': 5, 'drop_count': 2, 'short_label': 'HW', 'weight': 0.6},
+                {'type': 'Exam', 'min_count': 1, 'drop_count': 0, 'short_label': 'Ex', 'weight': 0.4},
+            ],
+            'GRADE_CUTOFFS': {'A': 0.8, 'Pass': 0.35},
+        })
+        cls.store.update_item(cls.course, 0)
+
+    def _create_users_with_random_scores(self, seed, num_users=6):
+        """
+        Creates enrolled users who answered a random subset of the problems
+        with random scores.
+        """
+        rand = random.Random(seed)
+        users = [UserFactory.create() for _ in range(num_users)]
+        for user in users:
+            CourseEnrollment.enroll(user, self.course.id)
+            for problem in self.problems:
+                if rand.random() < 0.7:
+                    max_score = rand.choice([1, 1, 2, 5])
+                    set_score(user.id, problem.location, rand.randint(0, max_score), max_score)
+        return users
+
+    def _snapshot_grades(self, users):
+        """
+        Returns the persisted subsection and course grade values of the users.
+        """
+        user_ids = [user.id for user in users]
+        subsection_grades = {
+            (grade.user_id, grade.usage_key): (
+                grade.earned_all,
+                grade.possible_all,
+                grade.earned_graded,
+                grade.possible_graded,
+                grade.first_attempted,
+                grade.visible_blocks_id,
+            )
+            for grade in PersistentSubsectionGrade.objects.filter(user_id__in=user_ids)
+        }
+        course_grades = {
+            grade.user_id: (grade.percent_grade, grade.letter_grade, grade.passed_timestamp is not None)
+            for grade in PersistentCourseGrade.objects.filter(user_id__in=user_ids)
+        }
+        return subsection_grades, course_grades
+
+    def _delete_grades(self, users):
+        user_ids = [user.id for user in users]
+        PersistentSubsectionGrade.objects.filter(user_id__in=user_ids).delete()
+        PersistentCourseGrade.objects.filter(user_id__in=user_ids).delete()
+
+    @ddt.data(*range(8))
+    def test_identical_to_per_user_grades(self, seed):
+        users = self._create_users_with_random_scores(seed)
+
+        expected = {}
+        for user in users:
+            course_grade = CourseGradeFactory().update(user, self.course, force_update_subsections=True)
+            expected[user.id] = (course_grade.percent, course_grade.letter_grade, course_grade.passed)
+        expected_persisted = self._snapshot_grades(users)
+        self._delete_grades(users)
+
+        results = list(BulkCourseGradeFactory().iter(users, course=self.course))
+        self.assertEqual([result.student for result in results], users)
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(
+                (result.course_grade.percent, result.course_grade.letter_grade, result.course_grade.passed),
+                expected[result.student.id],
+            )
+        self.assertEqual(self._snapshot_grades(users), expected_persisted)
+
+    def test_updates_existing_grades(self):
+        users = self._create_users_with_random_scores(seed=42)
+        for user in users:
+            CourseGradeFactory().update(user, self.course, force_update_subsections=True)
+        expected_persisted = self._snapshot_grades(users)
+
+        list(BulkCourseGradeFactory().iter(users, course=self.course))
+        self.assertEqual(self._snapshot_grades(users), expected_persisted)
+
+    def test_sends_course_grade_signals(self):
+        users = self._create_users_with_random_scores(seed=7, num_users=2)
+        with patch('lms.djangoapps.grades.bulk_course_grade_factory.COURSE_GRADE_CHANGED.send_robust') as changed:
+            list(BulkCourseGradeFactory().iter(users, course=self.course))
+        self.assertEqual(changed.call_count, 2)
+
+    def test_per_user_errors(self):
+        users = self._create_users_with_random_scores(seed=3, num_users=2)
+        with patch('lms.djangoapps.grades.bulk_course_grade_factory._UserLayout') as mock_layout:
+            mock_layout.side_effect = Exception('Error for user')
+            results = list(BulkCourseGradeFactory().iter(users, course=self.course))
+        self.assertEqual([result.student for result in results], users)
+        for result in results:
+            self.assertIsNone(result.course_grade)
+            self.assertEqual(str(result.error), 'Error for user')
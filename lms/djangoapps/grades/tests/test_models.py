@@ -12,8 +12,9 @@ from hashlib import sha1
 import ddt
 import pytz
 import six
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 from freezegun import freeze_time
 from mock import patch
@@ -28,7 +29,8 @@ from lms.djangoapps.grades.models import (
     PersistentCourseGrade,
     PersistentSubsectionGrade,
     PersistentSubsectionGradeOverride,
-    VisibleBlocks
+    VisibleBlocks,
+    _cached_block_record_list_digest
 )
 from student.tests.factories import UserFactory
 from track.event_transaction_utils import get_event_transaction_id, get_event_transaction_type
@@ -202,6 +204,95 @@ class VisibleBlocksTest(GradesModelTestCase):
             visible_blocks.blocks = expected_blocks
 
 
+@override_settings(GRADES_VISIBLE_BLOCKS_CACHE_SIZE=2)
+class VisibleBlocksIdCacheTest(GradesModelTestCase):
+    """
+    Test the process-wide cache of persisted VisibleBlocks.
+    """
+    def setUp(self):
+        super(VisibleBlocksIdCacheTest, self).setUp()
+        self.addCleanup(VisibleBlocks.known_ids.clear)
+        self.record_c = self.record_a._replace(weight=2)
+
+    def _get_or_create(self, blocks, user_id=1):
+        visible_blocks = VisibleBlocks.cached_get_or_create(
+            user_id, BlockRecordList.from_list(blocks, self.course_key)
+        )
+        self._run_commit_hooks()
+        return visible_blocks
+
+    def _run_commit_hooks(self):
+        """
+        Runs the on_commit hooks, as the test transaction is never committed.
+        """
+        hooks, connection.run_on_commit = connection.run_on_commit, []
+        for _, hook in hooks:
+            hook()
+
+    def test_identical_lists_share_digest(self):
+        first = BlockRecordList.from_list([self.record_a, self.record_b], self.course_key)
+        second = BlockRecordList.from_list([self.record_a, self.record_b], self.course_key)
+        self.assertIs(first.json_value, second.json_value)
+        self.assertIs(first.hash_value, second.hash_value)
+
+    def test_identical_lists_serialized_once(self):
+        _cached_block_record_list_digest.cache_clear()
+        with patch('lms.djangoapps.grades.models.json.dumps', wraps=json.dumps) as mock_dumps:
+            for _ in range(3):
+                BlockRecordList.from_list([self.record_a, self.record_b], self.course_key).hash_value
+        self.assertEqual(mock_dumps.call_count, 1)
+
+    def test_equal_values_serialized_differently(self):
+        digests = {
+            BlockRecordList.from_list([self.record_a._replace(weight=weight)], self.course_key).hash_value
+            for weight in (1, 1.0, True)
+        }
+        self.assertEqual(len(digests), 3)
+
+    def test_rolled_back_rows_not_known(self):
+        brl = BlockRecordList.from_list([self.record_a], self.course_key)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                VisibleBlocks.cached_get_or_create(1, brl)
+                raise ValueError
+        self._run_commit_hooks()
+        self.assertNotIn(brl.hash_value, VisibleBlocks.known_ids)
+
+        visible_blocks = self._get_or_create([self.record_a], user_id=2)
+        self.assertTrue(VisibleBlocks.objects.filter(id=visible_blocks.id).exists())
+
+    def test_known_hash_skips_query(self):
+        created = self._get_or_create([self.record_a])
+        with self.assertNumQueries(0):
+            cached = self._get_or_create([self.record_a], user_id=2)
+        self.assertEqual(cached.id, created.id)
+        self.assertEqual(cached.hashed, created.hashed)
+
+    def test_least_recently_used_evicted(self):
+        self._get_or_create([self.record_a])
+        self._get_or_create([self.record_b])
+        self._get_or_create([self.record_a])
+        self._get_or_create([self.record_c])
+        with self.assertNumQueries(0):
+            self._get_or_create([self.record_a], user_id=2)
+            self._get_or_create([self.record_c], user_id=2)
+        with self.assertNumQueries(1):
+            self._get_or_create([self.record_b], user_id=2)
+
+    def test_bulk_get_or_create_for_course(self):
+        brls = [BlockRecordList.from_list([record], self.course_key) for record in (self.record_a, self.record_b)]
+        VisibleBlocks.bulk_get_or_create_for_course(self.course_key, brls)
+        self._run_commit_hooks()
+        self.assertEqual(VisibleBlocks.objects.count(), 2)
+        with self.assertNumQueries(0):
+            VisibleBlocks.bulk_get_or_create_for_course(self.course_key, brls)
+
+    def test_cleared_on_delete(self):
+        self._get_or_create([self.record_a]).delete()
+        self._get_or_create([self.record_a], user_id=2)
+        self.assertEqual(VisibleBlocks.objects.count(), 1)
+
+
 @ddt.ddt
 class PersistentSubsectionGradeTest(GradesModelTestCase):
     """
@@ -0,0 +1,84 @@
+"""
+Tests for the coalesced subsection grade update queue.
+"""
+
+
+from django.core.cache import cache
+from django.test import TestCase
+from mock import patch
+
+from ..exceptions import QueueUnavailableError
+from ..recalculation_queue import SubsectionGradeUpdateQueue, get_queue_stats
+
+
+class SubsectionGradeUpdateQueueTest(TestCase):
+    """
+    Tests for SubsectionGradeUpdateQueue.
+    """
+    def setUp(self):
+        super(SubsectionGradeUpdateQueueTest, self).setUp()
+        self.addCleanup(cache.clear)
+        self.queue = SubsectionGradeUpdateQueue(1, u'course-v1:edX+Test+Run')
+
+    def test_only_first_enqueue_schedules(self):
+        self.assertTrue(self.queue.enqueue({'usage_id': 'a'}))
+        self.assertFalse(self.queue.enqueue({'usage_id': 'b'}))
+        self.assertFalse(self.queue.enqueue({'usage_id': 'c'}))
+        self.assertEqual(self.queue.depth(), 3)
+
+    def test_drain_returns_updates_in_order(self):
+        for usage_id in ('a', 'b', 'c'):
+            self.queue.enqueue({'usage_id': usage_id})
+        updates, has_unreadable_updates = self.queue.drain()
+        self.assertEqual([update['usage_id'] for update in updates], ['a', 'b', 'c'])
+        self.assertFalse(has_unreadable_updates)
+        self.assertEqual(self.queue.depth(), 0)
+        self.assertEqual(self.queue.drain(), ([], False))
+
+    def test_enqueue_after_drain_schedules_again(self):
+        self.queue.enqueue({'usage_id': 'a'})
+        self.queue.drain()
+        self.assertTrue(self.queue.enqueue({'usage_id': 'b'}))
+        updates, _ = self.queue.drain()
+        self.assertEqual([update['usage_id'] for update in updates], ['b'])
+
+    def test_drain_stops_at_unwritten_entry(self):
+        self.queue.enqueue({'usage_id': 'a'})
+        # Simulate another process that has reserved a sequence number
+        # but not yet written its entry.
+        cache.incr(self.queue._key(u'seq'))  # pylint: disable=protected-access
+        updates, has_unreadable_updates = self.queue.drain()
+        self.assertEqual([update['usage_id'] for update in updates], ['a'])
+        self.assertTrue(has_unreadable_updates)
+        self.assertEqual(self.queue.depth(), 1)
+
+    def test_lost_counter_restarts_after_drained_entries(self):
+        for usage_id in ('a', 'b'):
+            self.queue.enqueue({'usage_id': usage_id})
+        self.queue.drain()
+        cache.delete(self.queue._key(u'seq'))  # pylint: disable=protected-access
+
+        self.queue.enqueue({'usage_id': 'c'})
+        self.assertEqual(self.queue.depth(), 1)
+        updates, _ = self.queue.drain()
+        self.assertEqual([update['usage_id'] for update in updates], ['c'])
+
+    def test_counter_lost_before_incr(self):
+        with patch('lms.djangoapps.grades.recalculation_queue.cache.incr', side_effect=ValueError):
+            with self.assertRaises(QueueUnavailableError):
+                self.queue.enqueue({'usage_id': 'a'})
+
+    def test_queues_are_per_user_and_course(self):
+        other_queue = SubsectionGradeUpdateQueue(2, u'course-v1:edX+Test+Run')
+        self.assertTrue(self.queue.enqueue({'usage_id': 'a'}))
+        self.assertTrue(other_queue.enqueue({'usage_id': 'a'}))
+        self.assertEqual(self.queue.depth(), 1)
+        self.assertEqual(other_queue.depth(), 1)
+
+    def test_stats(self):
+        for usage_id in ('a', 'b', 'c', 'd'):
+            self.queue.enqueue({'usage_id': usage_id})
+        stats = get_queue_stats()
+        self.assertEqual(stats['enqueued'], 4)
+        self.assertEqual(stats['scheduled'], 1)
+        self.assertEqual(stats['dedup_ratio'], 0.75)
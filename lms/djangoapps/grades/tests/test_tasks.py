@@ -12,6 +12,7 @@ import ddt
 import pytz
 import six
 from django.conf import settings
+from django.core.cache import cache
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from mock import MagicMock, patch
@@ -19,12 +20,20 @@ from six.moves import range
 
 from lms.djangoapps.grades import tasks
 from lms.djangoapps.grades.config.models import PersistentGradesEnabledFlag
-from lms.djangoapps.grades.config.waffle import ENFORCE_FREEZE_GRADE_AFTER_COURSE_END, waffle_flags
+from lms.djangoapps.grades.config.waffle import (
+    COALESCE_SUBSECTION_GRADE_UPDATES,
+    ENFORCE_FREEZE_GRADE_AFTER_COURSE_END,
+    waffle,
+    waffle_flags
+)
 from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
+from lms.djangoapps.grades.exceptions import QueueUnavailableError
 from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade
+from lms.djangoapps.grades.recalculation_queue import SubsectionGradeUpdateQueue
 from lms.djangoapps.grades.services import GradesService
 from lms.djangoapps.grades.signals.signals import PROBLEM_WEIGHTED_SCORE_CHANGED
 from lms.djangoapps.grades.tasks import (
+    COALESCED_RECALCULATE_GRADE_DELAY_SECONDS,
     RECALCULATE_GRADE_DELAY_SECONDS,
     _course_task_args,
     compute_all_grades_for_course,
@@ -144,6 +153,76 @@ class RecalculateSubsectionGradeTest(HasCourseWithProblemsMixin, ModuleStoreTest
             PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **send_args)
             mock_task_apply.assert_called_once_with(countdown=RECALCULATE_GRADE_DELAY_SECONDS, kwargs=local_task_args)
 
+    def test_coalesced_updates_schedule_one_task(self):
+        self.set_up_course()
+        send_args = self.problem_weighted_score_changed_kwargs
+        with waffle().override(COALESCE_SUBSECTION_GRADE_UPDATES, active=True):
+            with patch(
+                'lms.djangoapps.grades.tasks.recalculate_subsection_grades_coalesced.apply_async',
+                return_value=None
+            ) as mock_task_apply:
+                for _ in range(3):
+                    PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **send_args)
+        mock_task_apply.assert_called_once_with(
+            countdown=COALESCED_RECALCULATE_GRADE_DELAY_SECONDS,
+            kwargs=dict(user_id=self.user.id, course_id=six.text_type(self.course.id)),
+        )
+        self.assertEqual(SubsectionGradeUpdateQueue(self.user.id, six.text_type(self.course.id)).depth(), 3)
+
+    def test_coalesced_update_falls_back_to_direct_task(self):
+        self.set_up_course()
+        send_args = self.problem_weighted_score_changed_kwargs
+        local_task_args = self.recalculate_subsection_grade_kwargs.copy()
+        local_task_args['event_transaction_type'] = u'edx.grades.problem.submitted'
+        local_task_args['force_update_subsections'] = False
+        with waffle().override(COALESCE_SUBSECTION_GRADE_UPDATES, active=True):
+            with patch(
+                'lms.djangoapps.grades.tasks.SubsectionGradeUpdateQueue.enqueue', side_effect=QueueUnavailableError
+            ):
+                with patch(
+                    'lms.djangoapps.grades.tasks.recalculate_subsection_grade_v3.apply_async',
+                    return_value=None
+                ) as mock_task_apply:
+                    PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **send_args)
+        mock_task_apply.assert_called_once_with(countdown=RECALCULATE_GRADE_DELAY_SECONDS, kwargs=local_task_args)
+
+    @patch('lms.djangoapps.grades.signals.signals.SUBSECTION_SCORE_CHANGED.send')
+    def test_coalesced_updates_load_structure_once(self, mock_subsection_signal):
+        self.set_up_course(create_multiple_subsections=True)
+        self.addCleanup(cache.clear)
+        queue = SubsectionGradeUpdateQueue(self.user.id, six.text_type(self.course.id))
+        other_problem = ItemFactory.create(parent=self.sequential, category='problem')
+        for usage_key in (self.problem.location, other_problem.location, self.problem.location):
+            update_kwargs = dict(self.recalculate_subsection_grade_kwargs)
+            update_kwargs['usage_id'] = six.text_type(usage_key)
+            queue.enqueue(update_kwargs)
+
+        with self.mock_csm_get_score():
+            with patch('lms.djangoapps.grades.tasks.get_course_blocks', wraps=tasks.get_course_blocks) as mock_blocks:
+                tasks.recalculate_subsection_grades_coalesced.apply(
+                    kwargs=dict(user_id=self.user.id, course_id=six.text_type(self.course.id)),
+                )
+        self.assertEqual(mock_blocks.call_count, 1)
+        # Both problems are in the same subsection, which is updated once.
+        self.assertEqual(mock_subsection_signal.call_count, 1)
+        self.assertEqual(queue.depth(), 0)
+
+    @patch('lms.djangoapps.grades.signals.signals.SUBSECTION_SCORE_CHANGED.send')
+    def test_coalesced_updates_superseded_by_deletion(self, mock_subsection_signal):
+        self.set_up_course()
+        self.addCleanup(cache.clear)
+        queue = SubsectionGradeUpdateQueue(self.user.id, six.text_type(self.course.id))
+        queue.enqueue(dict(self.recalculate_subsection_grade_kwargs))
+        queue.enqueue(dict(self.recalculate_subsection_grade_kwargs, score_deleted=True))
+
+        # The score saved by the first update is gone by the time the task runs.
+        with self.mock_csm_get_score(score=None):
+            tasks.recalculate_subsection_grades_coalesced.apply(
+                kwargs=dict(user_id=self.user.id, course_id=six.text_type(self.course.id)),
+            )
+        self.assertEqual(mock_subsection_signal.call_count, 1)
+        self.assertEqual(queue.depth(), 0)
+
     @patch('lms.djangoapps.grades.signals.signals.SUBSECTION_SCORE_CHANGED.send')
     def test_triggers_subsection_score_signal(self, mock_subsection_signal):
         """
@@ -11,6 +11,10 @@ WAFFLE_SWITCHES = WaffleSwitchNamespace(name=WAFFLE_NAMESPACE)
 
 # Waffle switches
 OPTIMIZE_GET_LEARNERS_FOR_COURSE = 'optimize_get_learners_for_course'
+GENERATE_PROBLEM_GRADE_REPORT_IN_SHARDS = 'generate_problem_grade_report_in_shards'
+RESCORE_PROBLEMS_IN_BATCHES = 'rescore_problems_in_batches'
+SEND_BULK_EMAIL_BY_ID_RANGES = 'send_bulk_email_by_id_ranges'
+GENERATE_CERTIFICATES_IN_BULK = 'generate_certificates_in_bulk'
 
 # Course override flags
 GENERATE_PROBLEM_GRADE_REPORT_VERIFIED_ONLY = 'generate_problem_grade_report_verified_only'
@@ -40,6 +44,38 @@ def optimize_get_learners_switch_enabled():
     return WAFFLE_SWITCHES.is_enabled(OPTIMIZE_GET_LEARNERS_FOR_COURSE)
 
 
+def problem_grade_report_sharding_enabled():
+    """
+    Returns True if problem grade reports should be generated by parallel
+    subtasks, each handling a range of learners, otherwise False.
+    """
+    return WAFFLE_SWITCHES.is_enabled(GENERATE_PROBLEM_GRADE_REPORT_IN_SHARDS)
+
+
+def rescore_in_batches_enabled():
+    """
+    Returns True if rescoring tasks should regrade learners' answers in
+    batches, checking each batch concurrently, otherwise False.
+    """
+    return WAFFLE_SWITCHES.is_enabled(RESCORE_PROBLEMS_IN_BATCHES)
+
+
+def bulk_email_id_ranges_enabled():
+    """
+    Returns True if bulk email subtasks should each be given a range of user
+    ids and look up their recipients themselves, otherwise False.
+    """
+    return WAFFLE_SWITCHES.is_enabled(SEND_BULK_EMAIL_BY_ID_RANGES)
+
+
+def bulk_certificate_generation_enabled():
+    """
+    Returns True if certificates should be generated for batches of learners
+    at once, by parallel subtasks in large courses, otherwise False.
+    """
+    return WAFFLE_SWITCHES.is_enabled(GENERATE_CERTIFICATES_IN_BULK)
+
+
 def problem_grade_report_verified_only(course_id):
     """
     Returns True if problem grade reports should only
@@ -16,3 +16,8 @@ class UpdateProblemModuleStateError(Exception):
 class DuplicateTaskException(Exception):
     """Exception indicating that a task already exists or has already completed."""
     pass
+
+
+class ReportShardError(Exception):
+    """Error signaling that one or more subtasks of a sharded report failed."""
+    pass
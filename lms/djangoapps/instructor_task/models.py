@@ -26,7 +26,7 @@ import six
 from boto.exception import BotoServerError
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.db import models, transaction
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext as _
@@ -286,6 +286,13 @@ class DjangoStorageReportStore(ReportStore):
 
         self.storage.save(path, buff)
 
+    def store_file(self, course_id, filename, file_obj):
+        """
+        Store the contents of the binary file-like object `file_obj`, which
+        must be positioned at its start, without reading it into memory.
+        """
+        self.storage.save(self.path_to(course_id, filename), File(file_obj))
+
     def store_rows(self, course_id, filename, rows):
         """
         Given a course_id, filename, and rows (each row is an iterable of
@@ -3,6 +3,7 @@ This module contains celery task functions for handling the management of subtas
 """
 
 
+import heapq
 import json
 import logging
 from contextlib import contextmanager
@@ -30,6 +31,8 @@ SUBTASK_LOCK_EXPIRE = 60 * 10  # Lock expires in 10 minutes
 # Number of times to retry if a subtask update encounters a lock on the InstructorTask.
 # (These are recursive retries, so don't make this number too large.)
 MAX_DATABASE_LOCK_RETRIES = 5
+# Number of primary keys read per query when splitting items into id ranges.
+ID_RANGE_QUERY_CHUNK_SIZE = 10000
 
 
 def _get_number_of_subtasks(total_num_items, items_per_task):
@@ -355,6 +358,99 @@ def queue_subtasks_for_query(
     return progress
 
 
+def _iter_distinct_ids(queryset, chunk_size):
+    """
+    Yields the distinct primary keys of the items in `queryset`, in ascending
+    order.  They are read `chunk_size` at a time, each query starting after
+    the last key read rather than at an offset.
+    """
+    queryset = queryset.order_by('pk')
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        for item_id in ids:
+            # Querysets with joins may return the same item more than once.
+            if item_id != last_id:
+                yield item_id
+                last_id = item_id
+        if len(ids) < chunk_size:
+            return
+
+
+def generate_id_ranges(item_querysets, items_per_task, chunk_size=ID_RANGE_QUERY_CHUNK_SIZE):
+    """
+    Splits the items of a list of querysets into ranges of primary keys, for
+    subtasks to each process the items in one of them.
+
+    The querysets are read separately, in primary key order, and merged, so
+    that items in several of them count only once.  This avoids both the
+    DISTINCT over their union and the counting of its rows.
+
+    Returns a list of (first_id, last_id, count) tuples, one for each range
+    of no more than `items_per_task` items, in ascending order.
+    """
+    merged_ids = heapq.merge(*[_iter_distinct_ids(queryset, chunk_size) for queryset in item_querysets])
+    id_ranges = []
+    first_id = last_id = None
+    count = 0
+    for item_id in merged_ids:
+        if item_id == last_id:
+            continue
+        if count == items_per_task:
+            id_ranges.append((first_id, last_id, count))
+            count = 0
+        if count == 0:
+            first_id = item_id
+        last_id = item_id
+        count += 1
+    if count:
+        id_ranges.append((first_id, last_id, count))
+    return id_ranges
+
+
+def queue_subtasks_for_id_ranges(entry, action_name, create_subtask_fcn, id_ranges):
+    """
+    Queues a subtask for each range of items returned by `generate_id_ranges`.
+
+    Arguments:
+        `entry` : the InstructorTask object for which subtasks are being queued.
+        `action_name` : a past-tense verb that can be used for constructing readable status messages.
+        `create_subtask_fcn` : a function of two arguments that constructs the desired kind of subtask object.
+            Arguments are a (first_id, last_id) tuple of the primary keys of the items to be processed
+            by this subtask, and a SubtaskStatus object reflecting initial status (and containing the
+            subtask's id).
+        `id_ranges` : a list of (first_id, last_id, count) tuples.
+
+    Returns:  the task progress as stored in the InstructorTask object.
+    """
+    task_id = entry.task_id
+    total_num_items = sum(count for __, __, count in id_ranges)
+    subtask_id_list = [str(uuid4()) for _ in id_ranges]
+
+    TASK_LOG.info(
+        u"Task %s: updating InstructorTask %s with subtask info for %s subtasks to process %s items.",
+        task_id,
+        entry.id,
+        len(subtask_id_list),
+        total_num_items,
+    )
+    # Make sure this is committed to database before handing off subtasks to celery.
+    with outer_atomic():
+        progress = initialize_subtask_info(entry, action_name, total_num_items, subtask_id_list)
+
+    for (first_id, last_id, __), subtask_id in zip(id_ranges, subtask_id_list):
+        new_subtask = create_subtask_fcn((first_id, last_id), SubtaskStatus.create(subtask_id))
+        TASK_LOG.info(
+            u"Queueing Task: %s Subtask: %s for ids %s to %s at timestamp: %s",
+            task_id, subtask_id, first_id, last_id, datetime.now()
+        )
+        new_subtask.apply_async()
+
+    # Return the task progress as stored in the InstructorTask object.
+    return progress
+
+
 def _acquire_subtask_lock(task_id):
     """
     Mark the specified task_id as being in progress.
@@ -459,10 +555,12 @@ def check_subtask_is_valid(entry_id, current_task_id, new_subtask_status):
         raise DuplicateTaskException(msg)
 
 
-def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count=0):
+def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count=0, complete_state=SUCCESS):
     """
     Update the status of the subtask in the parent InstructorTask object tracking its progress.
 
+    The InstructorTask is put in `complete_state` once all its subtasks are done.
+
     Because select_for_update is used to lock the InstructorTask object while it is being updated,
     multiple subtasks updating at the same time may time out while waiting for the lock.
     The actual update operation is surrounded by a try/except/else that permits the update to be
@@ -472,14 +570,14 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
     the attempting of retries has concluded.
     """
     try:
-        _update_subtask_status(entry_id, current_task_id, new_subtask_status)
+        _update_subtask_status(entry_id, current_task_id, new_subtask_status, complete_state)
     except DatabaseError:
         # If we fail, try again recursively.
         retry_count += 1
         if retry_count < MAX_DATABASE_LOCK_RETRIES:
             TASK_LOG.info(u"Retrying to update status for subtask %s of instructor task %d with status %s:  retry %d",
                           current_task_id, entry_id, new_subtask_status, retry_count)
-            update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count)
+            update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count, complete_state)
         else:
             TASK_LOG.info(u"Failed to update status after %d retries for subtask %s of instructor task %d with status %s",
                           retry_count, current_task_id, entry_id, new_subtask_status)
@@ -492,7 +590,7 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
 
 
 @transaction.atomic
-def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
+def _update_subtask_status(entry_id, current_task_id, new_subtask_status, complete_state=SUCCESS):
     """
     Update the status of the subtask in the parent InstructorTask object tracking its progress.
 
@@ -512,7 +610,7 @@ def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
     subtasks.  'Total' is expected to have been set at the time the subtasks were created.
     The other three counters are incremented depending on the value of `status`.  Once the counters
     for 'succeeded' and 'failed' match the 'total', the subtasks are done and the InstructorTask's
-    "status" is changed to SUCCESS.
+    "status" is changed to `complete_state`, which is SUCCESS unless the caller has work left to do.
 
     The "subtasks" field also contains a 'status' key, that contains a dict that stores status
     information for each subtask.  At the moment, the value for each subtask (keyed by its task_id)
@@ -569,7 +667,7 @@ def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
         # if there was a catastrophic failure that occurred, and figure out how to
         # report that here.
         if num_remaining <= 0:
-            entry.task_state = SUCCESS
+            entry.task_state = complete_state
         entry.subtasks = json.dumps(subtask_dict)
         entry.task_output = InstructorTask.create_output_for_success(task_progress)
 
@@ -29,8 +29,12 @@ from django.conf import settings
 from django.utils.translation import ugettext_noop
 
 from bulk_email.tasks import perform_delegate_email_batches
+from lms.djangoapps.instructor_task.config.waffle import rescore_in_batches_enabled
 from lms.djangoapps.instructor_task.tasks_base import BaseInstructorTask
-from lms.djangoapps.instructor_task.tasks_helper.certs import generate_students_certificates
+from lms.djangoapps.instructor_task.tasks_helper.certs import (
+    generate_students_certificates,
+    generate_students_certificates_subtask
+)
 from lms.djangoapps.instructor_task.tasks_helper.enrollments import (
     upload_may_enroll_csv,
     upload_students_csv
@@ -45,6 +49,7 @@ from lms.djangoapps.instructor_task.tasks_helper.misc import (
 from lms.djangoapps.instructor_task.tasks_helper.module_state import (
     delete_problem_module_state,
     override_score_module_state,
+    perform_batch_rescore,
     perform_module_state_update,
     rescore_problem_module_state,
     reset_attempts_module_state
@@ -75,9 +80,11 @@ def rescore_problem(entry_id, xmodule_instance_args):
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('rescored')
-    update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
-
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    if rescore_in_batches_enabled():
+        visit_fcn = partial(perform_batch_rescore, xmodule_instance_args)
+    else:
+        update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+        visit_fcn = partial(perform_module_state_update, update_fcn, None)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -204,6 +211,18 @@ def calculate_problem_grade_report(entry_id, xmodule_instance_args):
     return run_main_task(entry_id, task_fn, action_name)
 
 
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)
+def generate_problem_grade_report_shard(entry_id, xmodule_instance_args, min_user_id, max_user_id,
+                                        subtask_status_dict, action_name):
+    """
+    Generate the problem grade report rows of the learners with ids in
+    [min_user_id, max_user_id], as one subtask of calculate_problem_grade_report.
+    """
+    return ProblemGradeReport.generate_shard(
+        xmodule_instance_args, entry_id, min_user_id, max_user_id, subtask_status_dict, action_name,
+    )
+
+
 @task(base=BaseInstructorTask)
 def calculate_students_features_csv(entry_id, xmodule_instance_args):
     """
@@ -268,6 +287,18 @@ def generate_certificates(entry_id, xmodule_instance_args):
     return run_main_task(entry_id, task_fn, action_name)
 
 
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)
+def generate_certificates_for_students(entry_id, xmodule_instance_args, student_ids, subtask_status_dict,
+                                       action_name):
+    """
+    Generate the certificates of the learners with the given ids, as one
+    subtask of generate_certificates.
+    """
+    return generate_students_certificates_subtask(
+        xmodule_instance_args, entry_id, student_ids, subtask_status_dict, action_name,
+    )
+
+
 @task(base=BaseInstructorTask)
 def cohort_students(entry_id, xmodule_instance_args):
     """
@@ -3,24 +3,48 @@ Instructor tasks related to certificates.
 """
 
 
+import logging
 from time import time
+from uuid import uuid4
 
+from celery.states import FAILURE, SUCCESS
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db.models import Q
 
-from lms.djangoapps.certificates.api import generate_user_certificates
+from lms.djangoapps.certificates.api import generate_certificates_for_students, generate_user_certificates
 from lms.djangoapps.certificates.models import CertificateStatuses, GeneratedCertificate
+from lms.djangoapps.instructor_task.config.waffle import bulk_certificate_generation_enabled
+from lms.djangoapps.instructor_task.exceptions import DuplicateTaskException
+from lms.djangoapps.instructor_task.models import InstructorTask
+from lms.djangoapps.instructor_task.subtasks import (
+    SubtaskStatus,
+    check_subtask_is_valid,
+    initialize_subtask_info,
+    update_subtask_status
+)
 from student.models import CourseEnrollment
+from util.db import outer_atomic
 from xmodule.modulestore.django import modulestore
 
 from .runner import TaskProgress
 
+TASK_LOG = logging.getLogger('edx.celery.task')
+
+# Number of students whose certificates are generated together, when
+# certificates are generated in bulk.
+STUDENT_BATCH_SIZE = 100
+
 
 def generate_students_certificates(
-        _xmodule_instance_args, _entry_id, course_id, task_input, action_name):
+        _xmodule_instance_args, entry_id, course_id, task_input, action_name):
     """
     For a given `course_id`, generate certificates for only students present in 'students' key in task_input
     json column, otherwise generate certificates for all enrolled students.
+
+    When the instructor_task.generate_certificates_in_bulk switch is on, certificates are generated for
+    batches of students at once, and by parallel subtasks when there are more than
+    CERTIFICATE_GENERATION_USERS_PER_SUBTASK students.
     """
     start_time = time()
     students_to_generate_certs_for = CourseEnrollment.objects.users_enrolled_in(course_id)
@@ -73,6 +97,18 @@ def generate_students_certificates(
     task_progress.update_task_state(extra_meta=current_step)
 
     course = modulestore().get_course(course_id, depth=0)
+    if bulk_certificate_generation_enabled():
+        if len(students_require_certs) > settings.CERTIFICATE_GENERATION_USERS_PER_SUBTASK:
+            return _queue_certificate_subtasks(
+                _xmodule_instance_args, entry_id, students_require_certs, task_progress, action_name,
+            )
+        for students in _batches(students_require_certs):
+            succeeded, failed = _generate_certificates_for_batch(students, course_id, course)
+            task_progress.attempted += succeeded + failed
+            task_progress.succeeded += succeeded
+            task_progress.failed += failed
+        return task_progress.update_task_state(extra_meta=current_step)
+
     # Generate certificate for each student
     for student in students_require_certs:
         task_progress.attempted += 1
@@ -90,6 +126,90 @@ def generate_students_certificates(
     return task_progress.update_task_state(extra_meta=current_step)
 
 
+def generate_students_certificates_subtask(
+        _xmodule_instance_args, entry_id, student_ids, subtask_status_dict, _action_name):
+    """
+    Generates the certificates of the students with the given ids, as one of
+    the subtasks queued by `generate_students_certificates`.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    try:
+        check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+    except DuplicateTaskException:
+        TASK_LOG.warning(u'Certificates: skipping duplicate subtask %s of task %s', current_task_id, entry_id)
+        return subtask_status.to_dict()
+
+    course_id = InstructorTask.objects.get(pk=entry_id).course_id
+    students = list(User.objects.filter(id__in=student_ids).order_by('id'))
+    # Students who have been deleted since the subtask was queued.
+    subtask_status.increment(failed=len(student_ids) - len(students))
+    try:
+        course = modulestore().get_course(course_id, depth=0)
+        for batch in _batches(students):
+            succeeded, failed = _generate_certificates_for_batch(batch, course_id, course)
+            subtask_status.increment(succeeded=succeeded, failed=failed)
+    except Exception:  # pylint: disable=broad-except
+        TASK_LOG.exception(u'Certificates: subtask %s of task %s failed', current_task_id, entry_id)
+        subtask_status.increment(failed=len(student_ids) - subtask_status.attempted, state=FAILURE)
+    else:
+        subtask_status.increment(state=SUCCESS)
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    return subtask_status.to_dict()
+
+
+def _queue_certificate_subtasks(xmodule_instance_args, entry_id, students, task_progress, action_name):
+    """
+    Queues a subtask for each CERTIFICATE_GENERATION_USERS_PER_SUBTASK students,
+    in id order.  Progress is recorded in the InstructorTask's subtask status as
+    each of them completes.
+    """
+    # Imported here since the tasks module imports this one.
+    from lms.djangoapps.instructor_task.tasks import generate_certificates_for_students as generate_certificates_task
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    student_ids = sorted(student.id for student in students)
+    subtask_size = settings.CERTIFICATE_GENERATION_USERS_PER_SUBTASK
+    id_chunks = [student_ids[index:index + subtask_size] for index in range(0, len(student_ids), subtask_size)]
+    subtask_id_list = [str(uuid4()) for _ in id_chunks]
+
+    # Make sure this is committed to database before handing off subtasks to celery.
+    with outer_atomic():
+        progress = initialize_subtask_info(entry, action_name, task_progress.total, subtask_id_list)
+        # Students who already have a certificate are not handled by any subtask.
+        progress['skipped'] = task_progress.skipped
+        entry.task_output = InstructorTask.create_output_for_success(progress)
+        entry.save_now()
+
+    for ids, subtask_id in zip(id_chunks, subtask_id_list):
+        TASK_LOG.info(
+            u'Certificates: queueing subtask %s of task %s for %s students', subtask_id, entry_id, len(ids),
+        )
+        generate_certificates_task.apply_async(
+            (entry_id, xmodule_instance_args, ids, SubtaskStatus.create(subtask_id).to_dict(), action_name),
+            task_id=subtask_id,
+        )
+    return progress
+
+
+def _generate_certificates_for_batch(students, course_id, course):
+    """
+    Generates the certificates of a batch of students, and returns how many of
+    them got a passing certificate status and how many did not.
+    """
+    statuses = generate_certificates_for_students(students, course_id, course=course)
+    succeeded = sum(1 for status in statuses.values() if CertificateStatuses.is_passing_status(status))
+    return succeeded, len(students) - succeeded
+
+
+def _batches(students):
+    """
+    Yields the students in lists of STUDENT_BATCH_SIZE.
+    """
+    for index in range(0, len(students), STUDENT_BATCH_SIZE):
+        yield students[index:index + STUDENT_BATCH_SIZE]
+
+
 def students_require_certificate(course_id, enrolled_students, statuses_to_regenerate=None):
     """
     Returns list of students where certificates needs to be generated.
@@ -2,16 +2,24 @@
 Functionality for generating grade reports.
 """
 
+import csv
+import io
+import json
 import logging
+import os
 import re
+import shutil
+import tempfile
 from collections import OrderedDict, defaultdict
 from datetime import datetime
 from itertools import chain
 from time import time
 
 import six
+from celery.states import FAILURE, SUCCESS
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from lazy import lazy
 from opaque_keys.edx.keys import UsageKey
 from pytz import UTC
@@ -31,8 +39,18 @@ from lms.djangoapps.instructor_analytics.csvs import format_dictlist
 from lms.djangoapps.instructor_task.config.waffle import (
     course_grade_report_verified_only,
     optimize_get_learners_switch_enabled,
+    problem_grade_report_sharding_enabled,
     problem_grade_report_verified_only
 )
+from lms.djangoapps.instructor_task.exceptions import DuplicateTaskException, ReportShardError
+from lms.djangoapps.instructor_task.models import PROGRESS, InstructorTask, ReportStore
+from lms.djangoapps.instructor_task.subtasks import (
+    SUBTASK_LOCK_EXPIRE,
+    SubtaskStatus,
+    check_subtask_is_valid,
+    queue_subtasks_for_query,
+    update_subtask_status
+)
 from lms.djangoapps.teams.models import CourseTeamMembership
 from lms.djangoapps.verify_student.services import IDVerificationService
 from openedx.core.lib.cache_utils import get_cache
@@ -46,7 +64,7 @@ from xmodule.partitions.partitions_service import PartitionService
 from xmodule.split_test_module import get_split_user_partitions
 
 from .runner import TaskProgress
-from .utils import upload_csv_to_report_store
+from .utils import upload_csv_file_to_report_store, upload_csv_to_report_store
 
 TASK_LOG = logging.getLogger('edx.celery.task')
 
@@ -121,9 +139,26 @@ class GradeReportBase(object):
             for element in generator:
                 yield element
 
-    def _batch_users(self, context):
+    def _enrolled_learners(self, context, min_user_id=None, max_user_id=None):
         """
-        Returns a generator of batches of users.
+        Returns a queryset of the learners enrolled in the course, ordered by
+        id and optionally limited to ids in [min_user_id, max_user_id].
+        """
+        filter_kwargs = {
+            'courseenrollment__course_id': context.course_id,
+        }
+        if context.report_for_verified_only:
+            filter_kwargs['courseenrollment__mode'] = CourseMode.VERIFIED
+        if min_user_id is not None:
+            filter_kwargs['id__gte'] = min_user_id
+        if max_user_id is not None:
+            filter_kwargs['id__lte'] = max_user_id
+        return get_user_model().objects.filter(**filter_kwargs).order_by('id')
+
+    def _batch_users(self, context, min_user_id=None, max_user_id=None):
+        """
+        Returns a generator of batches of users, optionally limited to
+        ids in [min_user_id, max_user_id].
         """
         def grouper(iterable, chunk_size=100, fillvalue=None):
             args = [iter(iterable)] * chunk_size
@@ -146,7 +181,7 @@ class GradeReportBase(object):
             if verified_only:
                 filter_kwargs['courseenrollment__mode'] = CourseMode.VERIFIED
 
-            user_ids_list = get_user_model().objects.filter(**filter_kwargs).values_list('id', flat=True).order_by('id')
+            user_ids_list = self._enrolled_learners(context, min_user_id, max_user_id).values_list('id', flat=True)
             user_chunks = grouper(user_ids_list)
             for user_ids in user_chunks:
                 user_ids = [user_id for user_id in user_ids if user_id is not None]
@@ -717,8 +752,159 @@ class ProblemGradeReport(GradeReportBase):
         """
         with modulestore().bulk_operations(course_id):
             context = _ProblemGradeReportContext(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name)
+            report = ProblemGradeReport()
+            if problem_grade_report_sharding_enabled():
+                learner_count = report._get_enrolled_learner_count(context)  # pylint: disable=protected-access
+                if learner_count > settings.PROBLEM_GRADE_REPORT_USERS_PER_SHARD:
+                    # pylint: disable=protected-access
+                    return report._queue_shards(context, _xmodule_instance_args, learner_count)
             # pylint: disable=protected-access
-            return ProblemGradeReport()._generate(context)
+            return report._generate(context)
+
+    @classmethod
+    def generate_shard(cls, _xmodule_instance_args, entry_id, min_user_id, max_user_id, subtask_status_dict,
+                       action_name):
+        """
+        Public method to generate the rows of a sharded grade report for the
+        learners with ids in [min_user_id, max_user_id].  The last shard to
+        finish combines the rows of all shards into the final report.
+        """
+        subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+        current_task_id = subtask_status.task_id
+        try:
+            check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+        except DuplicateTaskException:
+            TASK_LOG.warning(u'ProblemGradeReport: skipping duplicate shard %s of task %s', current_task_id, entry_id)
+            return subtask_status.to_dict()
+
+        entry = InstructorTask.objects.get(pk=entry_id)
+        try:
+            with modulestore().bulk_operations(entry.course_id):
+                context = _ProblemGradeReportContext(
+                    _xmodule_instance_args, entry_id, entry.course_id, json.loads(entry.task_input), action_name,
+                )
+                # pylint: disable=protected-access
+                cls()._generate_shard(context, min_user_id, max_user_id)
+        except Exception:  # pylint: disable=broad-except
+            TASK_LOG.exception(
+                u'ProblemGradeReport: shard %s of task %s failed for users %s-%s',
+                current_task_id, entry_id, min_user_id, max_user_id,
+            )
+            subtask_status.increment(state=FAILURE)
+        else:
+            subtask_status.increment(
+                succeeded=context.task_progress.succeeded,
+                failed=context.task_progress.failed,
+                state=SUCCESS,
+            )
+        # The task only succeeds once the parts of all shards have been combined.
+        update_subtask_status(entry_id, current_task_id, subtask_status, complete_state=PROGRESS)
+        cls._combine_shards_if_complete(_xmodule_instance_args, entry_id, action_name)
+        return subtask_status.to_dict()
+
+    def _queue_shards(self, context, xmodule_instance_args, learner_count):
+        """
+        Queues a subtask for each range of PROBLEM_GRADE_REPORT_USERS_PER_SHARD
+        enrolled learners.  Progress is recorded in the InstructorTask's
+        subtask status as each of them completes.
+        """
+        # Imported here since the tasks module imports this one.
+        from lms.djangoapps.instructor_task.tasks import generate_problem_grade_report_shard
+
+        def _create_shard_subtask(learners, initial_subtask_status):
+            """Creates a subtask to generate the rows of the given learners."""
+            user_ids = [learner['pk'] for learner in learners]
+            return generate_problem_grade_report_shard.subtask(
+                (
+                    context.entry_id,
+                    xmodule_instance_args,
+                    min(user_ids),
+                    max(user_ids),
+                    initial_subtask_status.to_dict(),
+                    context.action_name,
+                ),
+                task_id=initial_subtask_status.task_id,
+                routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+            )
+
+        context.update_status('ProblemGradeReport - 1: Queueing problem grade shards')
+        return queue_subtasks_for_query(
+            InstructorTask.objects.get(pk=context.entry_id),
+            context.action_name,
+            _create_shard_subtask,
+            [self._enrolled_learners(context)],
+            [],
+            settings.PROBLEM_GRADE_REPORT_USERS_PER_SHARD,
+            learner_count,
+        )
+
+    def _generate_shard(self, context, min_user_id, max_user_id):
+        """
+        Writes the rows of the learners with ids in [min_user_id, max_user_id]
+        to temporary files, one batch of users at a time, and stores them as
+        parts of the final report.
+        """
+        shard_store = _ReportShardStore(context.course_id, context.entry_id, context.file_name)
+        with _CsvTempFile() as success_file, _CsvTempFile() as error_file:
+            for success_rows, error_rows in self._batched_rows(context, min_user_id, max_user_id):
+                success_file.writerows(success_rows)
+                error_file.writerows(error_rows)
+            shard_store.store_part(_ReportShardStore.SUCCESS, min_user_id, success_file)
+            shard_store.store_part(_ReportShardStore.ERROR, min_user_id, error_file)
+
+    @classmethod
+    def _combine_shards_if_complete(cls, _xmodule_instance_args, entry_id, action_name):
+        """
+        Once every shard of the report is done, concatenates their parts into
+        the final report and marks the task as succeeded, or marks it as
+        failed if any of them, or combining their parts, failed.
+        """
+        entry = InstructorTask.objects.get(pk=entry_id)
+        subtask_dict = json.loads(entry.subtasks)
+        if subtask_dict['succeeded'] + subtask_dict['failed'] < subtask_dict['total']:
+            return
+        if not cache.add(u'problem-grade-report-combine-{}'.format(entry_id), True, SUBTASK_LOCK_EXPIRE):
+            # Another shard finished at the same time and is combining the parts.
+            return
+
+        context = _ProblemGradeReportContext(
+            _xmodule_instance_args, entry_id, entry.course_id, json.loads(entry.task_input), action_name,
+        )
+        shard_store = _ReportShardStore(context.course_id, entry_id, context.file_name)
+        if subtask_dict['failed']:
+            shard_store.delete_parts()
+            error = ReportShardError(
+                u'{} of {} shards of the problem grade report failed'.format(
+                    subtask_dict['failed'], subtask_dict['total'],
+                )
+            )
+            TASK_LOG.error(u'ProblemGradeReport: task %s: %s', entry_id, error)
+            entry.task_output = InstructorTask.create_output_for_failure(error, None)
+            entry.task_state = FAILURE
+            entry.save_now()
+            return
+
+        try:
+            report = cls()
+            date = datetime.now(UTC)
+            with modulestore().bulk_operations(entry.course_id):
+                success_headers = report._success_headers(context)
+            with shard_store.combine_parts(_ReportShardStore.SUCCESS, success_headers) as report_file:
+                upload_csv_file_to_report_store(report_file.file, context.file_name, context.course_id, date)
+            if shard_store.part_paths(_ReportShardStore.ERROR):
+                with shard_store.combine_parts(_ReportShardStore.ERROR, report._error_headers()) as report_file:
+                    upload_csv_file_to_report_store(
+                        report_file.file, context.file_name + '_err', context.course_id, date,
+                    )
+        except Exception as error:  # pylint: disable=broad-except
+            TASK_LOG.exception(u'ProblemGradeReport: task %s: failed to combine the shards', entry_id)
+            entry.task_output = InstructorTask.create_output_for_failure(error, None)
+            entry.task_state = FAILURE
+        else:
+            TASK_LOG.info(u'ProblemGradeReport: task %s: combined %s shards', entry_id, subtask_dict['total'])
+            entry.task_state = SUCCESS
+        entry.save_now()
+        shard_store.delete_parts()
 
     def _generate(self, context):
         """
@@ -806,17 +992,116 @@ class ProblemGradeReport(GradeReportBase):
 
         return success_rows, error_rows
 
-    def _batched_rows(self, context):
+    def _batched_rows(self, context, min_user_id=None, max_user_id=None):
         """
         A generator of batches of (success_rows, error_rows) for this report.
         """
-        for users in self._batch_users(context):
+        for users in self._batch_users(context, min_user_id, max_user_id):
             yield self._rows_for_users(context, users)
             # Clear the CourseEnrollment caches after each batch of users has been processed
             get_cache('get_enrollment').clear()
             get_cache(CourseEnrollment.MODE_CACHE_NAMESPACE).clear()
 
 
+class _CsvTempFile(object):
+    """
+    A CSV written row by row to an anonymous temporary file, so that large
+    reports are never held in memory.  `file` is the underlying binary file,
+    positioned at its start once `rewind` has been called.
+    """
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self._text = io.TextIOWrapper(self.file, encoding='utf-8', newline='')
+        self._writer = csv.writer(self._text)
+        self.row_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._text.detach()
+        self.file.close()
+
+    def writerows(self, rows):
+        """
+        Writes the given rows, each an iterable of values.
+        """
+        for row in rows:
+            self._writer.writerow([text_type(item) for item in row])
+            self.row_count += 1
+
+    def append(self, csv_file):
+        """
+        Appends the contents of the given binary CSV file.
+        """
+        self._text.flush()
+        shutil.copyfileobj(csv_file, self.file)
+
+    def rewind(self):
+        """
+        Flushes written rows and seeks to the start of the file.
+        """
+        self._text.flush()
+        self.file.seek(0)
+
+
+class _ReportShardStore(object):
+    """
+    The report store location of the parts written by each shard of a report,
+    named after the first user id of the shard so they sort in report order.
+    """
+    SUCCESS = 'success'
+    ERROR = 'error'
+
+    def __init__(self, course_id, entry_id, file_name):
+        self.course_id = course_id
+        self.report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        self.directory = u'{}_parts/{}'.format(file_name, entry_id)
+
+    def store_part(self, kind, min_user_id, csv_file):
+        """
+        Stores the rows written to `csv_file`, unless there are none.
+        """
+        if not csv_file.row_count:
+            return
+        csv_file.rewind()
+        filename = u'{}/{}/{:012d}.csv'.format(self.directory, kind, min_user_id)
+        self.report_store.store_file(self.course_id, filename, csv_file.file)
+
+    def combine_parts(self, kind, header_row):
+        """
+        Returns a _CsvTempFile with the given header followed by the contents
+        of every part of the given kind, rewound and ready to be uploaded.
+        """
+        report_file = _CsvTempFile()
+        report_file.writerows([header_row])
+        for part_path in self.part_paths(kind):
+            with self.report_store.storage.open(part_path, 'rb') as part:
+                report_file.append(part)
+        report_file.rewind()
+        return report_file
+
+    def delete_parts(self):
+        """
+        Deletes the parts of every kind.
+        """
+        for kind in (self.SUCCESS, self.ERROR):
+            for part_path in self.part_paths(kind):
+                self.report_store.storage.delete(part_path)
+
+    def part_paths(self, kind):
+        """
+        Returns the storage paths of the parts of the given kind, in report order.
+        """
+        directory = self.report_store.path_to(self.course_id, u'{}/{}'.format(self.directory, kind))
+        try:
+            _, filenames = self.report_store.storage.listdir(directory)
+        except OSError:
+            # FileSystemStorage fails if no part of this kind was stored.
+            return []
+        return [os.path.join(directory, filename) for filename in sorted(filenames)]
+
+
 class ProblemResponses(object):
     """
     Class to encapsulate functionality related to generating Problem Responses Reports.
@@ -5,10 +5,15 @@ Instructor Tasks related to module state.
 
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from time import time
 
 import six
-from django.utils.translation import ugettext_noop
+from django.conf import settings
+from django.db import connections
+from django.utils.translation import get_language, ugettext_noop
+from django.utils.translation import override as override_language
 from opaque_keys.edx.keys import UsageKey
 from xblock.runtime import KvsFieldData
 from xblock.scorable import Score
@@ -23,6 +28,7 @@ from student.models import get_user_by_username_or_email
 from track.event_transaction_utils import create_new_event_transaction_id, set_event_transaction_type
 from track.views import task_track
 from util.db import outer_atomic
+from xmodule.capa_base import regrade_answers
 from xmodule.modulestore.django import modulestore
 
 from ..exceptions import UpdateProblemModuleStateError
@@ -61,26 +67,9 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
 
     """
     start_time = time()
-    usage_keys = []
-    problem_url = task_input.get('problem_url')
-    entrance_exam_url = task_input.get('entrance_exam_url')
     student_identifier = task_input.get('student')
     override_score_task = action_name == ugettext_noop('overridden')
-    problems = {}
-
-    # if problem_url is present make a usage key from it
-    if problem_url:
-        usage_key = UsageKey.from_string(problem_url).map_into_course(course_id)
-        usage_keys.append(usage_key)
-
-        # find the problem descriptor:
-        problem_descriptor = modulestore().get_item(usage_key)
-        problems[six.text_type(usage_key)] = problem_descriptor
-
-    # if entrance_exam is present grab all problems in it
-    if entrance_exam_url:
-        problems = get_problems_in_section(entrance_exam_url)
-        usage_keys = [UsageKey.from_string(location) for location in problems.keys()]
+    problems, usage_keys = _get_problems_to_update(course_id, task_input)
 
     modules_to_update = _get_modules_to_update(
         course_id, usage_keys, student_identifier, filter_fcn, override_score_task
@@ -95,20 +84,204 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
         # There is no try here:  if there's an error, we let it throw, and the task will
         # be marked as FAILED, with a stack trace.
         update_status = update_fcn(module_descriptor, module_to_update, task_input)
-        if update_status == UPDATE_STATUS_SUCCEEDED:
-            # If the update_fcn returns true, then it performed some kind of work.
-            # Logging of failures is left to the update_fcn itself.
-            task_progress.succeeded += 1
-        elif update_status == UPDATE_STATUS_FAILED:
-            task_progress.failed += 1
-        elif update_status == UPDATE_STATUS_SKIPPED:
-            task_progress.skipped += 1
-        else:
-            raise UpdateProblemModuleStateError(u"Unexpected update_status returned: {}".format(update_status))
+        _count_update_status(task_progress, update_status)
+
+    return task_progress.update_task_state()
+
+
+def perform_batch_rescore(xmodule_instance_args, _entry_id, course_id, task_input, action_name):
+    """
+    Rescores the StudentModule instances of the problem(s) in `task_input`,
+    like `perform_module_state_update` with `rescore_problem_module_state`,
+    but RESCORE_BATCH_SIZE learners at a time.
+
+    For each batch, the course is loaded once, learners who never submitted
+    an answer to a capa problem are skipped without instantiating the problem,
+    the answers of the others are regraded by RESCORE_WORKERS threads, so that
+    their sandboxed checks run concurrently, and the new state and score of
+    each learner are then saved and published in a transaction of their own.
+
+    Unlike `rescore_problem_module_state`, which counts learners whose problem
+    can't be loaded for them as failed even if they never answered it, these
+    learners are counted as skipped when they never answered.
+
+    Returns the task's results, as `perform_module_state_update` does.
+    """
+    start_time = time()
+    problems, usage_keys = _get_problems_to_update(course_id, task_input)
+    modules_to_update = _get_modules_to_update(course_id, usage_keys, task_input.get('student'), None)
+
+    task_progress = TaskProgress(action_name, modules_to_update.count(), start_time)
+    task_progress.update_task_state()
+
+    with modulestore().bulk_operations(course_id):
+        course = get_course_by_id(course_id)
+        with ThreadPoolExecutor(max_workers=settings.RESCORE_WORKERS) as executor:
+            for batch in _iter_module_batches(modules_to_update, settings.RESCORE_BATCH_SIZE):
+                update_statuses = _rescore_batch(
+                    executor, xmodule_instance_args, course, problems, batch, task_input,
+                )
+                for update_status in update_statuses:
+                    task_progress.attempted += 1
+                    _count_update_status(task_progress, update_status)
+                task_progress.update_task_state()
 
     return task_progress.update_task_state()
 
 
+def _rescore_batch(executor, xmodule_instance_args, course, problems, student_modules, task_input):
+    """
+    Rescores the given StudentModule instances, with the answers to capa
+    problems regraded by `executor`, and returns the update status of each.
+
+    The block of a problem is shared by all learners and bound to one of them
+    at a time, so it is bound to each learner twice: once to start rescoring
+    and take the learner's LoncapaProblem, which is then regraded apart from
+    the block, and once to save and publish the regraded state.
+    """
+    update_statuses = []
+    regrading = []
+    attempts = []
+    for student_module in student_modules:
+        module_descriptor = problems[six.text_type(student_module.module_state_key)]
+        if hasattr(module_descriptor, 'calculate_rescore') and not _has_submitted_answer(student_module):
+            update_statuses.append(UPDATE_STATUS_SKIPPED)
+            continue
+
+        # Kept for the second binding, so the learner's state is only fetched once.
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            course.id, student_module.student, module_descriptor
+        )
+        instance = _get_rescore_instance(
+            xmodule_instance_args, course, module_descriptor, student_module, field_data_cache
+        )
+        update_status = _check_rescore_instance(instance, student_module)
+        if update_status is not None:
+            update_statuses.append(update_status)
+        elif not hasattr(instance, 'calculate_rescore'):
+            # Blocks other than capa problems cannot be regraded apart from saving
+            # their new score, so they are rescored in full right away.
+            with outer_atomic():
+                update_statuses.append(_rescore_instance(instance, student_module, task_input))
+        else:
+            event_info = instance.start_rescore()
+            regrading.append((student_module, module_descriptor, field_data_cache, event_info, instance.lcp))
+            attempts.append(instance.attempts)
+
+    errors = executor.map(
+        partial(_regrade_answers, get_language()), [lcp for _, _, _, _, lcp in regrading], attempts
+    )
+
+    for (student_module, module_descriptor, field_data_cache, event_info, lcp), error in zip(regrading, errors):
+        instance = _get_rescore_instance(
+            xmodule_instance_args, course, module_descriptor, student_module, field_data_cache
+        )
+        instance.lcp = lcp
+        # One transaction per learner, as with `rescore_problem_module_state`,
+        # so that locks are held briefly and a fatal error keeps earlier learners' scores.
+        with outer_atomic():
+            update_statuses.append(_finish_rescore_instance(instance, student_module, task_input, event_info, error))
+    return update_statuses
+
+
+def _get_rescore_instance(xmodule_instance_args, course, module_descriptor, student_module, field_data_cache):
+    """
+    Returns the block of `student_module` bound to its learner, for rescoring.
+    """
+    return _get_module_instance_for_task(
+        course.id,
+        student_module.student,
+        module_descriptor,
+        xmodule_instance_args,
+        grade_bucket_type='rescore',
+        course=course,
+        field_data_cache=field_data_cache,
+    )
+
+
+def _regrade_answers(language, lcp, attempts):
+    """
+    Regrades the answers held by the LoncapaProblem `lcp`, in a thread of the
+    executor, and returns the exception raised while regrading them, if any.
+
+    Only the LCP is regraded here, so that nothing but its sandboxed checks
+    runs concurrently.  Translations are activated per thread, so the task's
+    language is activated again.
+    """
+    try:
+        with override_language(language):
+            regrade_answers(lcp, attempts)
+    except Exception as error:  # pylint: disable=broad-except
+        return error
+    finally:
+        # Database connections are per thread, and would be left open otherwise.
+        connections.close_all()
+    return None
+
+
+def _finish_rescore_instance(instance, student_module, task_input, event_info, error):
+    """
+    Saves and publishes the score of a capa problem `instance` whose answers
+    were regraded by `_regrade_answers`, or tracks the error that prevented it.
+    """
+    create_new_event_transaction_id()
+    set_event_transaction_type(grades_events.GRADES_RESCORE_EVENT_TYPE)
+
+    if error is not None:
+        instance.fail_rescore(event_info, error)
+        if not isinstance(error, (LoncapaProblemError, StudentInputError, ResponseError)):
+            raise error
+        _log_rescore_failure(student_module)
+        return UPDATE_STATUS_FAILED
+
+    instance.finish_rescore(event_info, instance.calculate_score(), only_if_higher=task_input['only_if_higher'])
+    instance.save()
+    _log_rescore_success(student_module)
+    return UPDATE_STATUS_SUCCEEDED
+
+
+def _has_submitted_answer(student_module):
+    """
+    Returns whether the stored state of a capa problem shows an answer was submitted.
+    """
+    try:
+        return bool(student_module.state and json.loads(student_module.state).get('done'))
+    except ValueError:
+        # Let instantiating the problem deal with the broken state.
+        return True
+
+
+def _iter_module_batches(student_modules, batch_size):
+    """
+    Yields lists of at most `batch_size` of the given StudentModule
+    instances, with their students, paginated by id.
+    """
+    student_modules = student_modules.select_related('student').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(student_modules.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def _count_update_status(task_progress, update_status):
+    """
+    Adds the `update_status` returned for one StudentModule to `task_progress`.
+    """
+    if update_status == UPDATE_STATUS_SUCCEEDED:
+        # If the update_fcn returns true, then it performed some kind of work.
+        # Logging of failures is left to the update_fcn itself.
+        task_progress.succeeded += 1
+    elif update_status == UPDATE_STATUS_FAILED:
+        task_progress.failed += 1
+    elif update_status == UPDATE_STATUS_SKIPPED:
+        task_progress.skipped += 1
+    else:
+        raise UpdateProblemModuleStateError(u"Unexpected update_status returned: {}".format(update_status))
+
+
 @outer_atomic
 def rescore_problem_module_state(xmodule_instance_args, module_descriptor, student_module, task_input):
     '''
@@ -125,7 +298,6 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
     # unpack the StudentModule:
     course_id = student_module.course_id
     student = student_module.student
-    usage_key = student_module.module_state_key
 
     with modulestore().bulk_operations(course_id):
         course = get_course_by_id(course_id)
@@ -140,60 +312,87 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
             grade_bucket_type='rescore',
             course=course
         )
+        update_status = _check_rescore_instance(instance, student_module)
+        if update_status is not None:
+            return update_status
+        return _rescore_instance(instance, student_module, task_input)
 
-        if instance is None:
-            # Either permissions just changed, or someone is trying to be clever
-            # and load something they shouldn't have access to.
-            msg = u"No module {location} for student {student}--access denied?".format(
-                location=usage_key,
-                student=student
-            )
-            TASK_LOG.warning(msg)
-            return UPDATE_STATUS_FAILED
 
-        if not hasattr(instance, 'rescore'):
-            # This should not happen, since it should be already checked in the
-            # caller, but check here to be sure.
-            msg = u"Specified module {0} of type {1} does not support rescoring.".format(usage_key, instance.__class__)
-            raise UpdateProblemModuleStateError(msg)
+def _check_rescore_instance(instance, student_module):
+    """
+    Returns the update status of `student_module` if its `instance` should
+    not be rescored, or None if it should.
 
-        # We check here to see if the problem has any submissions. If it does not, we don't want to rescore it
-        if not instance.has_submitted_answer():
-            return UPDATE_STATUS_SKIPPED
+    Raises UpdateProblemModuleStateError if the module doesn't support rescoring.
+    """
+    if instance is None:
+        # Either permissions just changed, or someone is trying to be clever
+        # and load something they shouldn't have access to.
+        msg = u"No module {location} for student {student}--access denied?".format(
+            location=student_module.module_state_key,
+            student=student_module.student
+        )
+        TASK_LOG.warning(msg)
+        return UPDATE_STATUS_FAILED
+
+    if not hasattr(instance, 'rescore'):
+        # This should not happen, since it should be already checked in the
+        # caller, but check here to be sure.
+        msg = u"Specified module {0} of type {1} does not support rescoring.".format(
+            student_module.module_state_key, instance.__class__
+        )
+        raise UpdateProblemModuleStateError(msg)
 
-        # Set the tracking info before this call, because it makes downstream
-        # calls that create events.  We retrieve and store the id here because
-        # the request cache will be erased during downstream calls.
-        create_new_event_transaction_id()
-        set_event_transaction_type(grades_events.GRADES_RESCORE_EVENT_TYPE)
-
-        # specific events from CAPA are not propagated up the stack. Do we want this?
-        try:
-            instance.rescore(only_if_higher=task_input['only_if_higher'])
-        except (LoncapaProblemError, StudentInputError, ResponseError):
-            TASK_LOG.warning(
-                u"error processing rescore call for course %(course)s, problem %(loc)s "
-                u"and student %(student)s",
-                dict(
-                    course=course_id,
-                    loc=usage_key,
-                    student=student
-                )
-            )
-            return UPDATE_STATUS_FAILED
+    # We check here to see if the problem has any submissions. If it does not, we don't want to rescore it
+    if not instance.has_submitted_answer():
+        return UPDATE_STATUS_SKIPPED
+    return None
 
-        instance.save()
-        TASK_LOG.debug(
-            u"successfully processed rescore call for course %(course)s, problem %(loc)s "
-            u"and student %(student)s",
-            dict(
-                course=course_id,
-                loc=usage_key,
-                student=student
-            )
+
+def _rescore_instance(instance, student_module, task_input):
+    """
+    Rescores the student's submission to the module `instance`, and returns the update status.
+    """
+    # Set the tracking info before this call, because it makes downstream
+    # calls that create events.  We retrieve and store the id here because
+    # the request cache will be erased during downstream calls.
+    create_new_event_transaction_id()
+    set_event_transaction_type(grades_events.GRADES_RESCORE_EVENT_TYPE)
+
+    # specific events from CAPA are not propagated up the stack. Do we want this?
+    try:
+        instance.rescore(only_if_higher=task_input['only_if_higher'])
+    except (LoncapaProblemError, StudentInputError, ResponseError):
+        _log_rescore_failure(student_module)
+        return UPDATE_STATUS_FAILED
+
+    instance.save()
+    _log_rescore_success(student_module)
+    return UPDATE_STATUS_SUCCEEDED
+
+
+def _log_rescore_failure(student_module):
+    TASK_LOG.warning(
+        u"error processing rescore call for course %(course)s, problem %(loc)s "
+        u"and student %(student)s",
+        dict(
+            course=student_module.course_id,
+            loc=student_module.module_state_key,
+            student=student_module.student
         )
+    )
 
-        return UPDATE_STATUS_SUCCEEDED
+
+def _log_rescore_success(student_module):
+    TASK_LOG.debug(
+        u"successfully processed rescore call for course %(course)s, problem %(loc)s "
+        u"and student %(student)s",
+        dict(
+            course=student_module.course_id,
+            loc=student_module.module_state_key,
+            student=student_module.student
+        )
+    )
 
 
 @outer_atomic
@@ -319,16 +518,19 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
 
 
 def _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args=None,
-                                  grade_bucket_type=None, course=None):
+                                  grade_bucket_type=None, course=None, field_data_cache=None):
     """
     Fetches a StudentModule instance for a given `course_id`, `student` object, and `module_descriptor`.
 
     `xmodule_instance_args` is used to provide information for creating a track function and an XQueue callback.
     These are passed, along with `grade_bucket_type`, to get_module_for_descriptor_internal, which sidesteps
     the need for a Request object when instantiating an xmodule instance.
+
+    The student's state is fetched for the module unless `field_data_cache` already holds it.
     """
     # reconstitute the problem's corresponding XModule:
-    field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
+    if field_data_cache is None:
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
     student_data = KvsFieldData(DjangoKeyValueStore(field_data_cache))
 
     # get request-related tracking information from args passthrough, and supplement with task-specific
@@ -388,6 +590,33 @@ def _get_task_id_from_xmodule_args(xmodule_instance_args):
         return xmodule_instance_args.get('task_id', UNKNOWN_TASK_ID)
 
 
+def _get_problems_to_update(course_id, task_input):
+    """
+    Returns the descriptors of the problems to update for `task_input`, keyed
+    by their usage id, along with their usage keys.
+    """
+    usage_keys = []
+    problems = {}
+    problem_url = task_input.get('problem_url')
+    entrance_exam_url = task_input.get('entrance_exam_url')
+
+    # if problem_url is present make a usage key from it
+    if problem_url:
+        usage_key = UsageKey.from_string(problem_url).map_into_course(course_id)
+        usage_keys.append(usage_key)
+
+        # find the problem descriptor:
+        problem_descriptor = modulestore().get_item(usage_key)
+        problems[six.text_type(usage_key)] = problem_descriptor
+
+    # if entrance_exam is present grab all problems in it
+    if entrance_exam_url:
+        problems = get_problems_in_section(entrance_exam_url)
+        usage_keys = [UsageKey.from_string(location) for location in problems.keys()]
+
+    return problems, usage_keys
+
+
 def _get_modules_to_update(course_id, usage_keys, student_identifier, filter_fcn, override_score_task=False):
     """
     Fetches a StudentModule instances for a given `course_id`, `student` object, and `usage_keys`.
@@ -21,6 +21,7 @@ from django.urls import reverse
 from mock import patch
 from six import text_type
 from six.moves import range
+from waffle.testutils import override_switch
 
 from capa.responsetypes import StudentInputError
 from capa.tests.response_xml_factory import CodeResponseXMLFactory, CustomResponseXMLFactory
@@ -434,6 +435,15 @@ class TestRescoringTask(TestIntegrationTask):
             self.check_state(user, descriptor, 0, 1, expected_attempts=2)
 
 
+@override_switch('instructor_task.rescore_problems_in_batches', active=True)
+@override_settings(RESCORE_BATCH_SIZE=2)
+class TestBatchRescoringTask(TestRescoringTask):
+    """
+    Runs the rescoring tests with learners rescored in batches.
+    """
+    pass
+
+
 @override_settings(RATELIMIT_ENABLE=False)
 class TestResetAttemptsTask(TestIntegrationTask):
     """
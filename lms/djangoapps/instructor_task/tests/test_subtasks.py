@@ -5,10 +5,15 @@ Unit tests for instructor_task subtasks.
 
 from uuid import uuid4
 
+from django.contrib.auth.models import User
 from mock import Mock, patch
 from six.moves import range
 
-from lms.djangoapps.instructor_task.subtasks import queue_subtasks_for_query
+from lms.djangoapps.instructor_task.subtasks import (
+    generate_id_ranges,
+    queue_subtasks_for_id_ranges,
+    queue_subtasks_for_query
+)
 from lms.djangoapps.instructor_task.tests.factories import InstructorTaskFactory
 from lms.djangoapps.instructor_task.tests.test_base import InstructorTaskCourseTestCase
 from student.models import CourseEnrollment
@@ -82,3 +87,41 @@ class TestSubtasks(InstructorTaskCourseTestCase):
         self.assertEqual(len(mock_create_subtask_fcn_args[0][0][0]), 3)
         self.assertEqual(len(mock_create_subtask_fcn_args[1][0][0]), 3)
         self.assertEqual(len(mock_create_subtask_fcn_args[2][0][0]), 5)
+
+    def test_generate_id_ranges(self):
+        """Test generate_id_ranges() counts items in several querysets once."""
+        self._enroll_students_in_course(self.course.id, 7)
+        user_ids = sorted(User.objects.filter(courseenrollment__course_id=self.course.id).values_list('id', flat=True))
+        querysets = [
+            User.objects.filter(id__in=user_ids[:5]),
+            User.objects.filter(id__in=user_ids[3:7]),
+        ]
+
+        id_ranges = generate_id_ranges(querysets, items_per_task=3, chunk_size=2)
+
+        self.assertEqual(id_ranges, [
+            (user_ids[0], user_ids[2], 3),
+            (user_ids[3], user_ids[5], 3),
+            (user_ids[6], user_ids[6], 1),
+        ])
+
+    def test_queue_subtasks_for_id_ranges(self):
+        """Test queue_subtasks_for_id_ranges() queues a subtask for each range."""
+        instructor_task = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='bulk_course_email',
+        )
+        mock_create_subtask_fcn = Mock()
+
+        progress = queue_subtasks_for_id_ranges(
+            instructor_task, 'action_name', mock_create_subtask_fcn, [(1, 10, 3), (12, 20, 2)]
+        )
+
+        self.assertEqual(progress['total'], 5)
+        self.assertEqual(
+            [args[0][0] for args in mock_create_subtask_fcn.call_args_list],
+            [(1, 10), (12, 20)],
+        )
+        self.assertEqual(mock_create_subtask_fcn.return_value.apply_async.call_count, 2)
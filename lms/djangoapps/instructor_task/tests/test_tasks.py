@@ -16,6 +16,7 @@ from django.utils.translation import ugettext_noop
 from mock import MagicMock, Mock, patch
 from opaque_keys.edx.keys import i4xEncoder
 from six.moves import range
+from waffle.testutils import override_switch
 
 from course_modes.models import CourseMode
 from lms.djangoapps.courseware.models import StudentModule
@@ -492,6 +493,39 @@ class TestRescoreInstructorTask(TestInstructorTasks):
         )
 
 
+@override_switch('instructor_task.rescore_problems_in_batches', active=True)
+class TestBatchRescoreInstructorTask(TestInstructorTasks):
+    """Tests rescoring problems in batches."""
+
+    def test_rescore_with_no_state(self):
+        self._test_run_with_no_state(rescore_problem, 'rescored')
+
+    def test_rescore_with_failure(self):
+        self._test_run_with_failure(rescore_problem, 'We expected this to fail')
+
+    def test_unanswered_problems_are_not_loaded(self):
+        self._create_students_with_state(3, json.dumps({'done': False}))
+        task_entry = self._create_input_entry()
+        with patch(
+                'lms.djangoapps.instructor_task.tasks_helper.module_state.get_module_for_descriptor_internal'
+        ) as mock_get_module:
+            status = self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        self.assertFalse(mock_get_module.called)
+        self.assertEqual(status['skipped'], 3)
+        self.assertEqual(status['attempted'], 3)
+
+    def test_rescoring_unaccessable(self):
+        self._create_students_with_state(2, json.dumps({'done': True}))
+        task_entry = self._create_input_entry()
+        with patch(
+                'lms.djangoapps.instructor_task.tasks_helper.module_state.get_module_for_descriptor_internal',
+                return_value=None
+        ):
+            status = self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        self.assertEqual(status['failed'], 2)
+        self.assertEqual(status['total'], 2)
+
+
 class TestResetAttemptsInstructorTask(TestInstructorTasks):
     """Tests instructor task that resets problem attempts."""
 
@@ -9,6 +9,7 @@ Unit tests for LMS instructor-initiated background tasks helper functions.
 """
 
 
+import json
 import os
 import shutil
 import tempfile
@@ -17,6 +18,7 @@ from datetime import datetime, timedelta
 
 import ddt
 import unicodecsv
+from celery.states import FAILURE, SUCCESS
 from django.conf import settings
 from django.test.utils import override_settings
 from django.urls import reverse
@@ -53,6 +55,7 @@ from lms.djangoapps.instructor_task.tasks_helper.grades import (
     ProblemGradeReport,
     ProblemResponses
 )
+from lms.djangoapps.instructor_task.subtasks import SubtaskStatus, initialize_subtask_info
 from lms.djangoapps.instructor_task.tasks_helper.misc import (
     cohort_students_and_upload,
     upload_course_survey_report,
@@ -79,7 +82,7 @@ from xmodule.modulestore.tests.django_utils import SharedModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory, check_mongo_calls
 from xmodule.partitions.partitions import Group, UserPartition
 
-from ..models import ReportStore
+from ..models import PROGRESS, InstructorTask, ReportStore
 from ..tasks_helper.utils import UPDATE_STATUS_FAILED, UPDATE_STATUS_SUCCEEDED
 
 _TEAMS_CONFIG = TeamsConfig({
@@ -800,6 +803,127 @@ class TestProblemGradeReport(TestReportMixin, InstructorTaskModuleTestCase):
             )))
         ])
 
+    @patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task')
+    def test_sharded_report(self, _get_current_task):
+        """
+        Rows generated by separate shards are combined into a single report,
+        in user id order, once the last shard completes.
+        """
+        vertical = ItemFactory.create(
+            parent_location=self.problem_section.location,
+            category='vertical',
+            metadata={'graded': True},
+            display_name='Problem Vertical'
+        )
+        self.define_option_problem(u'Problem1', parent=vertical)
+        self.submit_student_answer(self.student_1.username, u'Problem1', ['Option 1'])
+
+        entry = InstructorTask.create(self.course.id, 'problem_grade_report', 'key', {}, self.student_1)
+        initialize_subtask_info(entry, 'graded', 2, ['shard_1', 'shard_2'])
+        # Complete the shards out of order.
+        for subtask_id, student in (('shard_2', self.student_2), ('shard_1', self.student_1)):
+            ProblemGradeReport.generate_shard(
+                None, entry.id, student.id, student.id, SubtaskStatus.create(subtask_id).to_dict(), 'graded',
+            )
+
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(entry.task_state, SUCCESS)
+        self.assertDictContainsSubset({'attempted': 2, 'succeeded': 2, 'failed': 0}, json.loads(entry.task_output))
+        problem_name = u'Homework 1: Subsection - Problem1'
+        header_row = self.csv_header_row + [problem_name + ' (Earned)', problem_name + ' (Possible)']
+        self.verify_rows_in_csv([
+            dict(list(zip(
+                header_row,
+                [
+                    text_type(self.student_1.id),
+                    self.student_1.email,
+                    self.student_1.username,
+                    ENROLLED_IN_COURSE,
+                    '0.01', '1.0', '2.0',
+                ]
+            ))),
+            dict(list(zip(
+                header_row,
+                [
+                    text_type(self.student_2.id),
+                    self.student_2.email,
+                    self.student_2.username,
+                    ENROLLED_IN_COURSE,
+                    '0.0', u'Not Attempted', '2.0',
+                ]
+            ))),
+        ])
+        report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        self.assertEqual(len(report_store.links_for(self.course.id)), 1)
+
+    @patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task')
+    def test_failed_shard_fails_report(self, _get_current_task):
+        entry = InstructorTask.create(self.course.id, 'problem_grade_report', 'key', {}, self.student_1)
+        initialize_subtask_info(entry, 'graded', 2, ['shard_1', 'shard_2'])
+        with patch.object(ProblemGradeReport, '_rows_for_users', side_effect=Exception('Error for shard')):
+            ProblemGradeReport.generate_shard(
+                None, entry.id, self.student_1.id, self.student_1.id, SubtaskStatus.create('shard_1').to_dict(), 'graded',
+            )
+        ProblemGradeReport.generate_shard(
+            None, entry.id, self.student_2.id, self.student_2.id, SubtaskStatus.create('shard_2').to_dict(), 'graded',
+        )
+
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(entry.task_state, FAILURE)
+        self.assertEqual(json.loads(entry.task_output)['exception'], 'ReportShardError')
+        report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        self.assertEqual(report_store.links_for(self.course.id), [])
+
+    @patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task')
+    def test_report_fails_if_shards_cannot_be_combined(self, _get_current_task):
+        entry = InstructorTask.create(self.course.id, 'problem_grade_report', 'key', {}, self.student_1)
+        initialize_subtask_info(entry, 'graded', 2, ['shard_1', 'shard_2'])
+        states = []
+
+        def _fail_upload(*args):
+            states.append(InstructorTask.objects.get(pk=entry.id).task_state)
+            raise Exception('Report store unavailable')
+
+        with patch(
+            'lms.djangoapps.instructor_task.tasks_helper.grades.upload_csv_file_to_report_store',
+            side_effect=_fail_upload,
+        ):
+            for subtask_id, student in (('shard_1', self.student_1), ('shard_2', self.student_2)):
+                ProblemGradeReport.generate_shard(
+                    None, entry.id, student.id, student.id, SubtaskStatus.create(subtask_id).to_dict(), 'graded',
+                )
+
+        # The task was still in progress while its shards were being combined.
+        self.assertEqual(states, [PROGRESS])
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(entry.task_state, FAILURE)
+        self.assertEqual(json.loads(entry.task_output)['message'], 'Report store unavailable')
+
+    @override_switch('instructor_task.generate_problem_grade_report_in_shards', active=True)
+    @override_settings(PROBLEM_GRADE_REPORT_USERS_PER_SHARD=1)
+    @patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task')
+    def test_report_queued_in_shards(self, _get_current_task):
+        """
+        Courses with more learners than fit in a shard have their report
+        generated by shard subtasks, which run eagerly in tests.
+        """
+        entry = InstructorTask.create(self.course.id, 'problem_grade_report', 'key', {}, self.student_1)
+        ProblemGradeReport.generate(None, entry.id, self.course.id, {}, 'graded')
+
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(json.loads(entry.subtasks)['total'], 2)
+        self.assertEqual(entry.task_state, SUCCESS)
+        self.verify_rows_in_csv([
+            dict(list(zip(
+                self.csv_header_row,
+                [text_type(self.student_1.id), self.student_1.email, self.student_1.username, ENROLLED_IN_COURSE, '0.0']
+            ))),
+            dict(list(zip(
+                self.csv_header_row,
+                [text_type(self.student_2.id), self.student_2.email, self.student_2.username, ENROLLED_IN_COURSE, '0.0']
+            ))),
+        ])
+
 
 class TestProblemReportSplitTestContent(TestReportMixin, TestConditionalContent, InstructorTaskModuleTestCase):
     """
@@ -1907,6 +2031,69 @@ class TestCertificateGeneration(InstructorTaskModuleTestCase):
         with self.assertNumQueries(3):
             self.assertCertificatesGenerated(task_input, expected_results)
 
+    def _create_students_for_bulk_generation(self):
+        """
+        Creates 10 students, 2 of whom already have a certificate and 5 of
+        whom are white-listed.
+        """
+        students = self._create_students(10)
+        for student in students[:2]:
+            GeneratedCertificateFactory.create(
+                user=student,
+                course_id=self.course.id,
+                status=CertificateStatuses.downloadable,
+                mode='honor'
+            )
+        for student in students[2:7]:
+            CertificateWhitelistFactory.create(user=student, course_id=self.course.id, whitelist=True)
+        return students
+
+    @override_switch('instructor_task.generate_certificates_in_bulk', active=True)
+    def test_bulk_certificate_generation_for_students(self):
+        """
+        Verify that generating certificates in bulk gives the same results as
+        generating them one student at a time.
+        """
+        self._create_students_for_bulk_generation()
+        expected_results = {
+            'action_name': 'certificates generated',
+            'total': 10,
+            'attempted': 8,
+            'succeeded': 5,
+            'failed': 3,
+            'skipped': 2
+        }
+        self.assertCertificatesGenerated({'student_set': None}, expected_results)
+        self.assertEqual(
+            GeneratedCertificate.objects.filter(
+                course_id=self.course.id, status__in=CertificateStatuses.PASSED_STATUSES,
+            ).count(),
+            7,
+        )
+
+    @override_settings(CERTIFICATE_GENERATION_USERS_PER_SUBTASK=3)
+    @override_switch('instructor_task.generate_certificates_in_bulk', active=True)
+    def test_certificate_generation_in_subtasks(self):
+        """
+        Verify that certificates are generated by subtasks in large courses,
+        and that their progress is added up in the InstructorTask.
+        """
+        students = self._create_students_for_bulk_generation()
+        task_input = {'student_set': None}
+        entry = InstructorTask.create(self.course.id, 'certificate_generation', 'key', task_input, students[0])
+        with patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task'):
+            with patch('capa.xqueue_interface.XQueueInterface.send_to_queue') as mock_queue:
+                mock_queue.return_value = (0, "Successfully queued")
+                generate_students_certificates(None, entry.id, self.course.id, task_input, 'certificates generated')
+
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(entry.task_state, SUCCESS)
+        self.assertEqual(json.loads(entry.subtasks)['total'], 3)
+        self.assertDictContainsSubset(
+            {'total': 10, 'attempted': 8, 'succeeded': 5, 'failed': 3, 'skipped': 2},
+            json.loads(entry.task_output),
+        )
+
     @ddt.data(
         CertificateStatuses.downloadable,
         CertificateStatuses.generating,
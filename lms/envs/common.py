@@ -357,6 +357,12 @@ FEATURES = {
     # extended history table.
     'ENABLE_CSMH_EXTENDED': True,
 
+    # Queue new CSMH Extended rows in memory and write them with a single
+    # bulk insert at the end of the request (or celery task) rather than
+    # inserting one row synchronously on every StudentModule save. See
+    # CSMH_EXTENDED_BUFFER_MAX_SIZE for the bound on unwritten rows.
+    'ENABLE_CSMH_EXTENDED_BUFFERED_WRITES': False,
+
     # Read from both the CSMH and CSMHE history tables.
     # This is the default, but can be disabled if all history
     # lives in the Extended table, saving the frontend from
@@ -631,6 +637,19 @@ CACHES = {
     },
 }
 
+# Local disk cache for course assets too large to be held in the course_assets
+# cache.  Disabled unless DIRECTORY is set; MAX_SIZE bounds the total size of
+# the cache and MAX_FILE_SIZE the size of any single asset in it, in bytes.
+CONTENTSERVER_DISK_CACHE = {
+    'DIRECTORY': None,
+    'MAX_SIZE': 10 * 1024 ** 3,
+    'MAX_FILE_SIZE': 2 * 1024 ** 3,
+}
+
+# Whether to serve the WebP version of an asset thumbnail, when one was generated,
+# to browsers which accept WebP.
+CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS = False
+
 ############################ OAUTH2 Provider ###################################
 OAUTH_EXPIRE_CONFIDENTIAL_CLIENT_DAYS = 365
 OAUTH_EXPIRE_PUBLIC_CLIENT_DAYS = 30
@@ -1133,6 +1152,14 @@ CODE_JAIL = {
         'REALTIME': 3,
         'PROXY': 0,
     },
+
+    # Pre-warmed sandboxes each process keeps (see common/lib/capa/capa/safe_exec/README.rst).
+    'pool': {
+        # How many? 0 runs every execution in a sandbox of its own.
+        'SIZE': 0,
+        # After how many executions is a sandbox replaced?
+        'MAX_EXECUTIONS': 100,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -1610,6 +1637,11 @@ PIPELINE = {
 STATICFILES_STORAGE = 'openedx.core.storage.ProductionStorage'
 STATICFILES_STORAGE_KWARGS = {}
 
+# Number of staticfiles lookups, and of pieces of HTML with rewritten static URLs,
+# each process remembers (see static_replace).  0 disables these caches, as well
+# as the use of cached course asset manifests.
+STATIC_REPLACE_CACHE_SIZE = 1000
+
 # List of finder classes that know how to find static files in various locations.
 # Note: the pipeline finder is included to be able to discover optimized files
 STATICFILES_FINDERS = [
@@ -2228,6 +2260,17 @@ BULK_EMAIL_LOG_SENT_EMAILS = False
 # parallel, and what the SES rate is.
 BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS = 0.02
 
+# Email backend used to send bulk email, e.g. the backend of an email service
+# provider.  Defaults to EMAIL_BACKEND.
+BULK_EMAIL_BACKEND = None
+
+# Number of bulk email messages passed to the email backend at once, for
+# backends using the batch sending API of an email service provider to send
+# them in a single request.  Only backends whose sends_batches_atomically
+# attribute is true get batches, since a batch failing part way is sent again;
+# no backend shipped here has one, so the others get one message at a time.
+BULK_EMAIL_SEND_BATCH_SIZE = 1
+
 ############################# Email Opt In ####################################
 
 # Minimum age for organization-wide email opt in
@@ -2869,8 +2912,30 @@ POLICY_CHANGE_GRADES_ROUTING_KEY = 'edx.lms.core.default'
 
 RECALCULATE_GRADES_ROUTING_KEY = 'edx.lms.core.default'
 
+# Maximum number of VisibleBlocks hashes each process remembers as already
+# persisted, so that grade writes can skip looking them up.
+GRADES_VISIBLE_BLOCKS_CACHE_SIZE = 10000
+
 SOFTWARE_SECURE_VERIFICATION_ROUTING_KEY = 'edx.lms.core.default'
 
+# Number of learners handled by each subtask of a problem grade report, when
+# the instructor_task.generate_problem_grade_report_in_shards switch is on.
+PROBLEM_GRADE_REPORT_USERS_PER_SHARD = 5000
+
+# Number of learners whose certificates are generated by each subtask, when
+# the instructor_task.generate_certificates_in_bulk switch is on.
+CERTIFICATE_GENERATION_USERS_PER_SUBTASK = 2000
+
+# Seconds for which the web certificate pages viewed anonymously, like those
+# shared on social networks, are cached.  0 disables the cache.
+CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT = 15 * 60
+
+# Number of learners regraded together by a rescoring task, and number of
+# threads checking their answers, when the
+# instructor_task.rescore_problems_in_batches switch is on.
+RESCORE_BATCH_SIZE = 100
+RESCORE_WORKERS = 4
+
 GRADES_DOWNLOAD = {
     'STORAGE_CLASS': 'django.core.files.storage.FileSystemStorage',
     'STORAGE_KWARGS': {
@@ -3567,6 +3632,12 @@ APP_UPGRADE_CACHE_TIMEOUT = 3600
 # if you want to avoid an overlap in ids while searching for history across the two tables.
 STUDENTMODULEHISTORYEXTENDED_OFFSET = 10000
 
+# Maximum number of coursewarehistoryextended.StudentModuleHistoryExtended rows a
+# single thread keeps in memory when FEATURES['ENABLE_CSMH_EXTENDED_BUFFERED_WRITES']
+# is on. Reaching it forces a flush, so it also bounds how many history rows can be
+# lost if a process dies before the end of its request.
+CSMH_EXTENDED_BUFFER_MAX_SIZE = 100
+
 # Cutoff date for granting audit certificates
 
 AUDIT_CERT_CUTOFF_DATE = None
@@ -3850,6 +3921,11 @@ ACE_CHANNEL_TRANSACTIONAL_EMAIL = 'django_email'
 ACE_CHANNEL_SAILTHRU_API_KEY = ""
 ACE_CHANNEL_SAILTHRU_API_SECRET = ""
 
+# Number of schedule messages (nudges, upgrade reminders and course updates)
+# sent by each send task. With more than 1, the recipients of a batch are
+# looked up together and fewer tasks are queued.
+SCHEDULES_SEND_BATCH_SIZE = 1
+
 ############### Settings swift #####################################
 SWIFT_USERNAME = None
 SWIFT_KEY = None
@@ -226,6 +226,11 @@ if ENV_TOKENS.get('SESSION_COOKIE_NAME', None):
     # NOTE, there's a bug in Django (http://bugs.python.org/issue18012) which necessitates this being a str()
     SESSION_COOKIE_NAME = str(ENV_TOKENS.get('SESSION_COOKIE_NAME'))
 
+CONTENTSERVER_DISK_CACHE = ENV_TOKENS.get('CONTENTSERVER_DISK_CACHE', CONTENTSERVER_DISK_CACHE)
+CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS = ENV_TOKENS.get(
+    'CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS', CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS
+)
+
 CACHES = ENV_TOKENS['CACHES']
 # Cache used for location mapping -- called many times with the same key/value
 # in a given request.
@@ -243,6 +248,7 @@ if 'staticfiles' in CACHES:
 # Once we have migrated to service assets off S3, then we can convert this back to
 # managed by the yaml file contents
 STATICFILES_STORAGE = os.environ.get('STATICFILES_STORAGE', ENV_TOKENS.get('STATICFILES_STORAGE', STATICFILES_STORAGE))
+STATIC_REPLACE_CACHE_SIZE = ENV_TOKENS.get('STATIC_REPLACE_CACHE_SIZE', STATIC_REPLACE_CACHE_SIZE)
 
 # Load all AWS_ prefixed variables to allow an S3Boto3Storage to be configured
 _locals = locals()
@@ -574,6 +580,20 @@ GRADES_DOWNLOAD_ROUTING_KEY = ENV_TOKENS.get('GRADES_DOWNLOAD_ROUTING_KEY', HIGH
 
 GRADES_DOWNLOAD = ENV_TOKENS.get("GRADES_DOWNLOAD", GRADES_DOWNLOAD)
 
+PROBLEM_GRADE_REPORT_USERS_PER_SHARD = ENV_TOKENS.get(
+    'PROBLEM_GRADE_REPORT_USERS_PER_SHARD', PROBLEM_GRADE_REPORT_USERS_PER_SHARD
+)
+CERTIFICATE_GENERATION_USERS_PER_SUBTASK = ENV_TOKENS.get(
+    'CERTIFICATE_GENERATION_USERS_PER_SUBTASK', CERTIFICATE_GENERATION_USERS_PER_SUBTASK
+)
+CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT = ENV_TOKENS.get(
+    'CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT', CERTIFICATE_HTML_VIEW_CACHE_TIMEOUT
+)
+RESCORE_BATCH_SIZE = ENV_TOKENS.get('RESCORE_BATCH_SIZE', RESCORE_BATCH_SIZE)
+RESCORE_WORKERS = ENV_TOKENS.get('RESCORE_WORKERS', RESCORE_WORKERS)
+
+GRADES_VISIBLE_BLOCKS_CACHE_SIZE = ENV_TOKENS.get('GRADES_VISIBLE_BLOCKS_CACHE_SIZE', GRADES_VISIBLE_BLOCKS_CACHE_SIZE)
+
 # Rate limit for regrading tasks that a grading policy change can kick off
 
 # financial reports
@@ -776,6 +796,8 @@ STUDENTMODULEHISTORYEXTENDED_OFFSET = ENV_TOKENS.get(
     'STUDENTMODULEHISTORYEXTENDED_OFFSET', STUDENTMODULEHISTORYEXTENDED_OFFSET
 )
 
+CSMH_EXTENDED_BUFFER_MAX_SIZE = ENV_TOKENS.get('CSMH_EXTENDED_BUFFER_MAX_SIZE', CSMH_EXTENDED_BUFFER_MAX_SIZE)
+
 # Cutoff date for granting audit certificates
 if ENV_TOKENS.get('AUDIT_CERT_CUTOFF_DATE', None):
     AUDIT_CERT_CUTOFF_DATE = dateutil.parser.parse(ENV_TOKENS.get('AUDIT_CERT_CUTOFF_DATE'))
@@ -154,6 +154,8 @@ STATICFILES_DIRS += [
 # find pipelined assets will raise a ValueError.
 # http://stackoverflow.com/questions/12816941/unit-testing-with-django-pipeline
 STATICFILES_STORAGE = 'pipeline.storage.NonPackagingPipelineStorage'
+# Tests mock the staticfiles storage and change assets, which process-wide caches would not notice.
+STATIC_REPLACE_CACHE_SIZE = 0
 
 # Don't use compression during tests
 PIPELINE['JS_COMPRESSOR'] = None
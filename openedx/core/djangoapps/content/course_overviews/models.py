@@ -5,11 +5,14 @@ Declaration of CourseOverview model
 
 import json
 import logging
+from copy import copy
+from uuid import uuid4
 
 import six
 from ccx_keys.locator import CCXLocator
 from config_models.models import ConfigurationModel
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.fields import BooleanField, DateTimeField, DecimalField, FloatField, IntegerField, TextField
@@ -128,6 +131,10 @@ class CourseOverview(TimeStampedModel):
 
     history = HistoricalRecords()
 
+    # Overviews loaded by get_from_ids_cached, by (course id, VERSION), along
+    # with the generation of their course they were loaded at.
+    _process_cache = {}
+
     @classmethod
     def _create_or_update(cls, course):
         """
@@ -404,6 +411,54 @@ class CourseOverview(TimeStampedModel):
                     overviews[course_id] = None
         return overviews
 
+    @classmethod
+    def get_from_ids_cached(cls, course_ids):
+        """
+        Return a dict mapping course_ids to CourseOverviews, like
+        `get_from_ids`, with their tabs and image sets loaded.
+
+        The overviews are kept in the process, and loaded again once their
+        generation in the shared cache changes, when their course is
+        published or deleted.  Copies of them are returned, so that callers
+        can set attributes on them.
+
+        Course IDs for non-existent or broken courses will map to None.
+
+        Arguments:
+            course_ids (iterable[CourseKey])
+
+        Returns: dict[CourseKey, CourseOverview|None]
+        """
+        course_ids = list(course_ids)
+        generations = get_course_overview_generations(course_ids)
+        overviews = {}
+        for course_id in course_ids:
+            generation, overview = cls._process_cache.get((course_id, cls.VERSION), (None, None))
+            if generation == generations[course_id]:
+                overviews[course_id] = copy(overview)
+
+        missing_ids = [course_id for course_id in course_ids if course_id not in overviews]
+        if not missing_ids:
+            return overviews
+        loaded = {
+            overview.id: overview
+            for overview in cls.objects.select_related('image_set').prefetch_related('tab_set').filter(
+                id__in=missing_ids,
+                version__gte=cls.VERSION
+            )
+        }
+        for course_id in missing_ids:
+            overview = loaded.get(course_id)
+            if overview is None:
+                try:
+                    overview = cls.load_from_module_store(course_id)
+                except (cls.DoesNotExist, IOError):
+                    overviews[course_id] = None
+                    continue
+            cls._process_cache[(course_id, cls.VERSION)] = (generations[course_id], overview)
+            overviews[course_id] = copy(overview)
+        return overviews
+
     def clean_id(self, padding_char='='):
         """
         Returns a unique deterministic base32-encoded ID for the course.
@@ -667,7 +722,11 @@ class CourseOverview(TimeStampedModel):
         """
         Returns an iterator of CourseTabs.
         """
-        for tab_dict in self.tab_set.all().values():
+        # The tabs are read from the instances, which may have been
+        # prefetched, rather than with values().
+        tab_fields = [field.attname for field in CourseOverviewTab._meta.concrete_fields]
+        for tab_model in self.tab_set.all():
+            tab_dict = {field: getattr(tab_model, field) for field in tab_fields}
             tab = CourseTab.from_json(tab_dict)
             if tab is None:
                 log.warning("Can't instantiate CourseTab from %r", tab_dict)
@@ -1082,11 +1141,52 @@ class SimulateCoursePublishConfig(ConfigurationModel):
         return six.text_type(self.arguments)
 
 
-def _invalidate_overview_cache(**kwargs):  # pylint: disable=unused-argument
+COURSE_OVERVIEW_GENERATION_KEY = u'course_overviews.generation'
+
+
+def get_course_overview_generations(course_ids):
+    """
+    Returns a dict mapping the course_ids to the generations of their
+    overviews, which change whenever they have to be loaded again.
+    """
+    keys = {course_id: _course_overview_generation_key(course_id) for course_id in course_ids}
+    generations = cache.get_many([COURSE_OVERVIEW_GENERATION_KEY] + list(keys.values()))
+    for key in [COURSE_OVERVIEW_GENERATION_KEY] + list(keys.values()):
+        if key not in generations:
+            # A generation evicted from the cache is replaced by a new one,
+            # rather than started again, so that no stale overview is used.
+            generation = uuid4().hex
+            generations[key] = generation if cache.add(key, generation, None) else cache.get(key, generation)
+    return {
+        course_id: u'{}.{}'.format(generations[COURSE_OVERVIEW_GENERATION_KEY], generations[key])
+        for course_id, key in six.iteritems(keys)
+    }
+
+
+def invalidate_cached_course_overviews(course_id=None):
+    """
+    Makes the overview of the course, or of all courses if `course_id` is
+    None, be loaded again by get_from_ids_cached in every process.
+    """
+    if course_id is None:
+        key = COURSE_OVERVIEW_GENERATION_KEY
+    else:
+        key = _course_overview_generation_key(course_id)
+    cache.set(key, uuid4().hex, None)
+
+
+def _course_overview_generation_key(course_id):
+    return u'{}.{}'.format(COURSE_OVERVIEW_GENERATION_KEY, course_id)
+
+
+def _invalidate_overview_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
     """
-    Invalidate the course overview request cache.
+    Invalidate the course overview request cache, and the overviews cached
+    in the processes once the change is committed.
     """
     RequestCache('course_overview').clear()
+    course_id = instance.id if sender is CourseOverview else None
+    transaction.on_commit(lambda: invalidate_cached_course_overviews(course_id))
 
 
 post_save.connect(_invalidate_overview_cache, sender=CourseOverview)
@@ -10,7 +10,7 @@ from django.dispatch.dispatcher import receiver
 
 from xmodule.modulestore.django import SignalHandler
 
-from .models import CourseOverview
+from .models import CourseOverview, invalidate_cached_course_overviews
 
 LOG = logging.getLogger(__name__)
 
@@ -30,6 +30,7 @@ def _listen_for_course_publish(sender, course_key, **kwargs):  # pylint: disable
     except CourseOverview.DoesNotExist:
         previous_course_overview = None
     updated_course_overview = CourseOverview.load_from_module_store(course_key)
+    invalidate_cached_course_overviews(course_key)
     _check_for_course_changes(previous_course_overview, updated_course_overview)
 
 
@@ -40,6 +41,7 @@ def _listen_for_course_delete(sender, course_key, **kwargs):  # pylint: disable=
     invalidates the corresponding CourseOverview cache entry if one exists.
     """
     CourseOverview.objects.filter(id=course_key).delete()
+    invalidate_cached_course_overviews(course_key)
     # import CourseAboutSearchIndexer inline due to cyclic import
     from cms.djangoapps.contentstore.courseware_index import CourseAboutSearchIndexer
     # Delete course entry from Course About Search_index
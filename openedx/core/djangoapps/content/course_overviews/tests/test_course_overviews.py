@@ -595,6 +595,54 @@ class CourseOverviewTestCase(CatalogIntegrationMixin, ModuleStoreTestCase, Cache
         assert mock_load_from_modulestore.call_count == 3
 
 
+
+class CourseOverviewProcessCacheTestCase(ModuleStoreTestCase, CacheIsolationTestCase):
+    """
+    Tests for the CourseOverviews cached in the process.
+    """
+    ENABLED_CACHES = ['default']
+    ENABLED_SIGNALS = ['course_deleted', 'course_published']
+
+    def setUp(self):
+        super(CourseOverviewProcessCacheTestCase, self).setUp()
+        patcher = mock.patch.dict(CourseOverview._process_cache, clear=True)  # pylint: disable=protected-access
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.course = CourseFactory.create(emit_signals=True)
+
+    def test_overviews_are_cached(self):
+        first_overview = CourseOverview.get_from_ids_cached([self.course.id])[self.course.id]
+        with self.assertNumQueries(0):
+            overview = CourseOverview.get_from_ids_cached([self.course.id])[self.course.id]
+            tab_ids = {tab.tab_id for tab in overview.tabs}
+        self.assertIsNot(overview, first_overview)
+        self.assertEqual(overview.id, self.course.id)
+        self.assertEqual(tab_ids, {tab.tab_id for tab in CourseOverview.get_from_id(self.course.id).tabs})
+
+    def test_publishing_invalidates(self):
+        CourseOverview.get_from_ids_cached([self.course.id])
+        self.course.display_name = u'Updated display name'
+        self.store.update_item(self.course, ModuleStoreEnum.UserID.test)
+
+        overview = CourseOverview.get_from_ids_cached([self.course.id])[self.course.id]
+        self.assertEqual(overview.display_name, u'Updated display name')
+
+    def test_deleting_invalidates(self):
+        CourseOverview.get_from_ids_cached([self.course.id])
+        self.store.delete_course(self.course.id, ModuleStoreEnum.UserID.test)
+
+        self.assertEqual(CourseOverview.get_from_ids_cached([self.course.id]), {self.course.id: None})
+
+    def test_missing_courses(self):
+        course_without_overview = CourseFactory.create(emit_signals=False)
+        non_existent_course_key = CourseKey.from_string('course-v1:This+Course+IsFake')
+
+        overviews = CourseOverview.get_from_ids_cached([course_without_overview.id, non_existent_course_key])
+        self.assertEqual(overviews[course_without_overview.id].id, course_without_overview.id)
+        self.assertIsNone(overviews[non_existent_course_key])
+        with self.assertNumQueries(0):
+            CourseOverview.get_from_ids_cached([course_without_overview.id])
+
 @ddt.ddt
 class CourseOverviewImageSetTestCase(ModuleStoreTestCase):
     """
@@ -3,13 +3,18 @@ Helper functions for caching course assets.
 """
 
 
+from collections import namedtuple
+from uuid import uuid4
+
 import six
+from six.moves import cPickle as pickle
 
 from django.core.cache import caches
 from django.core.cache.backends.base import InvalidCacheBackendError
 from opaque_keys import InvalidKeyError
 
 from xmodule.contentstore.content import STATIC_CONTENT_VERSION
+from xmodule.contentstore.django import contentstore
 
 # See if there's a "course_assets" cache configured, and if not, fallback to the default cache.
 CONTENT_CACHE = caches['default']
@@ -18,6 +23,29 @@ try:
 except InvalidCacheBackendError:
     pass
 
+METADATA_KEY_PREFIX = u'metadata.'
+EXISTS_KEY_PREFIX = u'exists.'
+GENERATION_KEY_PREFIX = u'assets_generation.'
+MANIFEST_KEY_PREFIX = u'assets_manifest.'
+
+# Courses with more assets than this, or whose manifest takes more bytes than this
+# once pickled by the cache, have their assets looked up one at a time rather than
+# through a manifest, which wouldn't fit in a cache entry (memcached's limit is 1MB).
+MAX_MANIFEST_SIZE = 5000
+MAX_MANIFEST_BYTES = 1000 * 1000
+# Cached instead of the manifest of such courses, so it isn't built again and again.
+MANIFEST_TOO_LARGE = u'too-large'
+
+# What the content server needs to know about an asset to answer a conditional
+# request for it, without its body.
+AssetMetadata = namedtuple(
+    'AssetMetadata', ['content_digest', 'last_modified_at', 'locked', 'length', 'content_type']
+)
+
+
+def _metadata_key(location):
+    return (METADATA_KEY_PREFIX + six.text_type(location)).encode("utf-8")
+
 
 def set_cached_content(content):
     """
@@ -51,4 +79,109 @@ def del_cached_content(location):
         # although deprecated keys allowed run=None, new keys don't if there is no version.
         pass
 
+    locations.extend([
+        prefix.encode("utf-8") + loc for prefix in (METADATA_KEY_PREFIX, EXISTS_KEY_PREFIX) for loc in locations
+    ])
     CONTENT_CACHE.delete_many(locations, version=STATIC_CONTENT_VERSION)
+    invalidate_course_assets(location.course_key)
+
+
+def invalidate_course_assets(course_key):
+    """
+    Makes anything cached under the current generation of the course's assets stale.
+
+    Deleting cached content does this already; call it directly when assets are
+    changed without going through the cache, e.g. by a course import.
+    """
+    CONTENT_CACHE.set(_generation_key(course_key), uuid4().hex, None, version=STATIC_CONTENT_VERSION)
+
+
+def _generation_key(course_key):
+    # Runs are left out since assets of old-style courses may be cached without one.
+    return (GENERATION_KEY_PREFIX + u'{}+{}'.format(course_key.org, course_key.course)).encode("utf-8")
+
+
+def get_course_assets_generation(course_key):
+    """
+    Returns a token which changes whenever the cached content of any asset of the given
+    course is deleted, i.e. whenever one of its assets is added, changed or removed.
+
+    Anything derived from the assets of a course can be cached under this token, and
+    it becomes stale as soon as one of the assets changes. Returns None if the token
+    can't be stored, e.g. with a dummy cache, in which case nothing should be cached.
+    """
+    key = _generation_key(course_key)
+    generation = CONTENT_CACHE.get(key, version=STATIC_CONTENT_VERSION)
+    if generation is None:
+        # A new token, rather than a counter starting over, if the previous one was evicted.
+        CONTENT_CACHE.add(key, uuid4().hex, None, version=STATIC_CONTENT_VERSION)
+        generation = CONTENT_CACHE.get(key, version=STATIC_CONTENT_VERSION)
+    return generation
+
+
+def get_course_asset_manifest(course_key):
+    """
+    Returns the asset manifest of the given course (see ContentStore.get_course_asset_manifest),
+    building it at most once per generation of the course's assets.
+
+    Returns None if the manifest can't be cached, or the course has too many assets for one
+    to fit in a cache entry, in which case its assets should be looked up one at a time.
+    """
+    generation = get_course_assets_generation(course_key)
+    if generation is None:
+        return None
+
+    key = (MANIFEST_KEY_PREFIX + u'{}.{}'.format(course_key, generation)).encode("utf-8")
+    manifest = CONTENT_CACHE.get(key, version=STATIC_CONTENT_VERSION)
+    if manifest is None:
+        manifest = contentstore().get_course_asset_manifest(course_key)
+        if len(manifest) > MAX_MANIFEST_SIZE or _pickled_size(manifest) > MAX_MANIFEST_BYTES:
+            manifest = MANIFEST_TOO_LARGE
+        CONTENT_CACHE.set(key, manifest, version=STATIC_CONTENT_VERSION)
+    return None if manifest == MANIFEST_TOO_LARGE else manifest
+
+
+def _pickled_size(value):
+    """
+    Returns the number of bytes `value` takes once pickled, as cache backends do.
+    """
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def set_cached_metadata(content):
+    """
+    Stores the metadata of the given piece of content in the cache, using its location as the key.
+    """
+    metadata = AssetMetadata(
+        content_digest=getattr(content, 'content_digest', None),
+        last_modified_at=content.last_modified_at,
+        locked=bool(getattr(content, 'locked', False)),
+        length=content.length,
+        content_type=content.content_type,
+    )
+    CONTENT_CACHE.set(_metadata_key(content.location), metadata, version=STATIC_CONTENT_VERSION)
+
+
+def get_cached_metadata(location):
+    """
+    Retrieves the AssetMetadata of the given piece of content by its location if cached.
+    """
+    return CONTENT_CACHE.get(_metadata_key(location), version=STATIC_CONTENT_VERSION)
+
+
+def _exists_key(location):
+    return (EXISTS_KEY_PREFIX + six.text_type(location)).encode("utf-8")
+
+
+def set_cached_asset_exists(location, exists):
+    """
+    Stores whether there is an asset at the given location in the cache.
+    """
+    CONTENT_CACHE.set(_exists_key(location), exists, version=STATIC_CONTENT_VERSION)
+
+
+def get_cached_asset_exists(location):
+    """
+    Retrieves whether there is an asset at the given location if cached, or None otherwise.
+    """
+    return CONTENT_CACHE.get(_exists_key(location), version=STATIC_CONTENT_VERSION)
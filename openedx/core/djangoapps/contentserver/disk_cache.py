@@ -0,0 +1,269 @@
+"""
+Local disk cache for course assets.
+
+Assets too large for the ``course_assets`` cache are otherwise streamed from
+GridFS on every request, including every range request a video player or PDF
+viewer makes.  When ``CONTENTSERVER_DISK_CACHE['DIRECTORY']`` is set, such
+assets are copied to local disk the first time they are requested, by a
+background thread while that request is streamed from GridFS, and served from
+there afterwards.  A lock file per asset makes sure only one thread of all
+the processes of a server copies it.
+
+Files are named after the asset's ``content_digest``, so a changed asset is
+simply a different file and nothing ever needs invalidating.  The total size
+of the cache is bounded by ``MAX_SIZE``: since that takes a scan of the whole
+cache, each process removes the least recently used files until the cache
+fits once it has added ``EVICTION_INTERVAL`` of ``MAX_SIZE`` since it last
+did, so the cache may briefly exceed ``MAX_SIZE`` by that much per process.
+Recency is tracked through file modification times, which are updated on
+every hit, so the cache can be shared by all the processes of a server.
+"""
+
+
+import fcntl
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+DEFAULT_MAX_FILE_SIZE = 2 * 1024 ** 3
+
+# Digests are hex md5 checksums; anything else could escape the cache directory.
+DIGEST_PATTERN = re.compile(r'^[0-9a-fA-F]{16,128}$')
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+# The fraction of the maximum size of the cache a process adds between evictions.
+EVICTION_INTERVAL = 0.05
+
+FILL_THREAD_NAME = u'asset-disk-cache-fill'
+
+
+class AssetDiskCache(object):
+    """
+    A size-bounded, content-addressed cache of asset files in `directory`.
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.eviction_interval = int(max_size * EVICTION_INTERVAL)
+        self._written_lock = threading.Lock()
+        # Evict on the first write, since other processes may have filled the cache.
+        self._written = self.eviction_interval
+
+    def is_cacheable(self, content):
+        """
+        Returns whether the given content can be stored in this cache.
+        """
+        digest = getattr(content, 'content_digest', None)
+        return (
+            digest is not None and
+            DIGEST_PATTERN.match(digest) is not None and
+            content.length is not None and
+            content.length <= self.max_file_size
+        )
+
+    def open(self, digest):
+        """
+        Returns the cached file for `digest`, opened for binary reading, or
+        None if it is not cached.
+        """
+        path = self._path(digest)
+        try:
+            cached_file = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted by another process; the open file remains readable.
+            pass
+        return cached_file
+
+    def store(self, digest, chunks):
+        """
+        Writes the iterable of byte strings `chunks` to the cache as `digest`,
+        evicting least recently used files if it's time to.  Returns the cached
+        file, opened for binary reading.
+        """
+        path = self._path(digest)
+        directory = self._make_directory(path)
+
+        # Write to a temporary file and rename it, so that other processes
+        # never see a partially written file.
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            os.rename(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        cached_file = open(path, 'rb')
+        with self._written_lock:
+            self._written += size
+            evict = self._written >= self.eviction_interval
+            if evict:
+                self._written = 0
+        if evict:
+            self.evict()
+        return cached_file
+
+    def fill_in_background(self, digest, load_content):
+        """
+        Copies the content returned by calling `load_content` to the cache as
+        `digest`, in a background thread, unless another thread is already
+        copying it.  Returns the thread, or None if none was started.
+        """
+        lock_path = os.path.join(self._make_directory(self._path(digest)), '.lock-' + digest)
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            lock_file.close()
+            return None
+        thread = threading.Thread(
+            target=self._fill, args=(digest, load_content, lock_path, lock_file), name=FILL_THREAD_NAME,
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _fill(self, digest, load_content, lock_path, lock_file):
+        """
+        Copies the content returned by `load_content` to the cache as
+        `digest`, then releases the lock held on `lock_file`.
+        """
+        try:
+            # Another thread may have copied it since it was found missing.
+            if not os.path.exists(self._path(digest)):
+                content = load_content()
+                # The asset may have changed since.
+                if content.content_digest == digest:
+                    self.store(digest, content.stream_data()).close()
+        except Exception:  # pylint: disable=broad-except
+            log.exception(u'Failed to copy asset %s to the disk cache', digest)
+        finally:
+            # Removed before being unlocked, so that a thread locking it
+            # afterwards sees the file copied above.
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            lock_file.close()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits in max_size.
+        """
+        entries = []
+        total_size = 0
+        for dir_path, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    # Temporary and lock files.
+                    continue
+                path = os.path.join(dir_path, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                # Removed concurrently by another process.
+                pass
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    @staticmethod
+    def _make_directory(path):
+        """
+        Creates the directory of `path` if it doesn't exist yet, and returns it.
+        """
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created concurrently by another process.
+                pass
+        return directory
+
+
+_disk_caches = {}
+
+
+def get_disk_cache():
+    """
+    Returns the configured AssetDiskCache, or None if the disk cache is disabled.
+
+    The same instance is returned for as long as the configuration doesn't
+    change, so that it can count what the process writes to it.
+    """
+    config = getattr(settings, 'CONTENTSERVER_DISK_CACHE', {})
+    directory = config.get('DIRECTORY')
+    if not directory:
+        return None
+    key = (
+        directory,
+        config.get('MAX_SIZE', DEFAULT_MAX_SIZE),
+        config.get('MAX_FILE_SIZE', DEFAULT_MAX_FILE_SIZE),
+    )
+    disk_cache = _disk_caches.get(key)
+    if disk_cache is None:
+        disk_cache = _disk_caches.setdefault(key, AssetDiskCache(*key))
+    return disk_cache
+
+
+class FileRange(object):
+    """
+    A read-only view of the bytes first..last (inclusive) of an open file.
+
+    It exposes the underlying ``fileno``, positioned at `first`, so that WSGI
+    servers supporting ``wsgi.file_wrapper`` can send the range with
+    ``sendfile``; others read it through ``read``, which stops at `last`.
+    """
+    def __init__(self, file_obj, first, last):
+        self._file = file_obj
+        self._file.seek(first)
+        self._remaining = last - first + 1
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        """
+        Reads up to `size` bytes, without going past the end of the range.
+        """
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
@@ -5,17 +5,22 @@ Middleware to serve assets.
 
 import datetime
 import logging
+import uuid
 
 import six
+from django.conf import settings
 from django.http import (
+    FileResponse,
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseForbidden,
     HttpResponseNotFound,
     HttpResponseNotModified,
-    HttpResponsePermanentRedirect
+    HttpResponsePermanentRedirect,
+    StreamingHttpResponse
 )
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_etags, quote_etag
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.locator import AssetLocator
 from six import text_type
@@ -23,12 +28,25 @@ from six import text_type
 from openedx.core.djangoapps.header_control import force_header_for_response
 from student.models import CourseEnrollment
 from xmodule.assetstore.assetmgr import AssetManager
-from xmodule.contentstore.content import XASSET_LOCATION_TAG, StaticContent
+from xmodule.contentstore.content import (
+    XASSET_LOCATION_TAG,
+    XASSET_THUMBNAIL_TAIL_NAME,
+    StaticContent,
+    StaticContentStream
+)
 from xmodule.exceptions import NotFoundError
 from xmodule.modulestore import InvalidLocationError
 from xmodule.modulestore.exceptions import ItemNotFoundError
 
-from .caching import get_cached_content, set_cached_content
+from .caching import (
+    get_cached_asset_exists,
+    get_cached_content,
+    get_cached_metadata,
+    set_cached_asset_exists,
+    set_cached_content,
+    set_cached_metadata
+)
+from .disk_cache import COPY_CHUNK_SIZE, FileRange, get_disk_cache
 from .models import CdnUserAgentsConfig, CourseAssetCacheTtlConfig
 
 log = logging.getLogger(__name__)
@@ -43,6 +61,10 @@ except ImportError:
 
 HTTP_DATE_FORMAT = u"%a, %d %b %Y %H:%M:%S GMT"
 
+# Requests for more ranges than this are answered with the full content, so
+# that a single request can't make us send many overlapping copies of an asset.
+MAX_MULTIPART_RANGES = 16
+
 
 class StaticContentServer(MiddlewareMixin):
     """
@@ -79,6 +101,28 @@ class StaticContentServer(MiddlewareMixin):
             except (InvalidLocationError, InvalidKeyError):
                 return HttpResponseBadRequest()
 
+            # Thumbnails may have a WebP version, which is smaller, for browsers that accept it.
+            # Versioned requests are left alone since their digest is the one of the JPEG version.
+            vary_on_accept = requested_digest is None and self.is_negotiable_thumbnail(loc)
+            if vary_on_accept and 'image/webp' in request.META.get('HTTP_ACCEPT', ''):
+                webp_loc = StaticContent.compute_location(
+                    loc.course_key, StaticContent.generate_webp_thumbnail_name(loc.block_id), is_thumbnail=True
+                )
+                if self.asset_exists(webp_loc):
+                    loc = webp_loc
+
+            # Most asset requests are browsers revalidating an asset they already have,
+            # which only needs its metadata, so try to answer those without loading it.
+            metadata = get_cached_metadata(loc)
+            if metadata is not None and self.is_conditional_request(request):
+                if newrelic:
+                    newrelic.agent.add_custom_parameter('contentserver.metadata_cache_hit', True)
+                if requested_digest is None or requested_digest == metadata.content_digest:
+                    if not self.is_user_authorized(request, metadata, loc):
+                        return HttpResponseForbidden('Unauthorized')
+                    if self.is_not_modified(request, metadata):
+                        return self.not_modified_response(metadata, vary_on_accept)
+
             # Attempt to load the asset to make sure it exists, and grab the asset digest
             # if we're able to load it.
             actual_digest = None
@@ -88,6 +132,9 @@ class StaticContentServer(MiddlewareMixin):
             except (ItemNotFoundError, NotFoundError):
                 return HttpResponseNotFound()
 
+            if metadata is None:
+                set_cached_metadata(content)
+
             # If this was a versioned asset, and the digest doesn't match, redirect
             # them to the actual version.
             if requested_digest is not None and actual_digest is not None and (actual_digest != requested_digest):
@@ -120,11 +167,8 @@ class StaticContentServer(MiddlewareMixin):
 
             # Figure out if the client sent us a conditional request, and let them know
             # if this asset has changed since then.
-            last_modified_at_str = content.last_modified_at.strftime(HTTP_DATE_FORMAT)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            if self.is_not_modified(request, content):
+                return self.not_modified_response(content, vary_on_accept)
 
             # *** File streaming within a byte range ***
             # If a Range is provided, parse Range attribute of the request
@@ -133,9 +177,11 @@ class StaticContentServer(MiddlewareMixin):
             # Response -> Content-Range attribute structure: "Content-Range: bytes first-last/totalLength"
             # http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35
             response = None
+            cached_file = self.load_asset_file_from_disk_cache(content)
+
             if request.META.get('HTTP_RANGE'):
                 # If we have a StaticContent, get a StaticContentStream.  Can't manipulate the bytes otherwise.
-                if isinstance(content, StaticContent):
+                if cached_file is None and isinstance(content, StaticContent):
                     content = AssetManager.find(loc, as_stream=True)
 
                 header_value = request.META['HTTP_RANGE']
@@ -151,19 +197,37 @@ class StaticContentServer(MiddlewareMixin):
                     if unit != 'bytes':
                         # Only accept ranges in bytes
                         log.warning(u"Unknown unit in Range header: %s for content: %s", header_value, text_type(loc))
+                    elif len(ranges) > MAX_MULTIPART_RANGES:
+                        # We send back the full content.
+                        log.warning(
+                            u"Too many ranges in Range header: %s for content: %s", header_value, text_type(loc)
+                        )
                     elif len(ranges) > 1:
                         # According to Http/1.1 spec content for multiple ranges should be sent as a multipart message.
                         # http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.16
-                        # But we send back the full content.
-                        log.warning(
-                            u"More than 1 ranges in Range header: %s for content: %s", header_value, text_type(loc)
-                        )
+                        # Unsatisfiable ranges are left out of it.
+                        ranges = [(first, last) for first, last in ranges if 0 <= first <= last < content.length]
+                        if not ranges:
+                            log.warning(
+                                u"Cannot satisfy ranges in Range header: %s for content: %s",
+                                header_value, text_type(loc)
+                            )
+                            if cached_file is not None:
+                                cached_file.close()
+                            return HttpResponse(status=416)  # Requested Range Not Satisfiable
+
+                        response = self.multipart_range_response(content, cached_file, ranges)
+                        if newrelic:
+                            newrelic.agent.add_custom_parameter('contentserver.ranged', True)
                     else:
                         first, last = ranges[0]
 
                         if 0 <= first <= last < content.length:
                             # If the byte range is satisfiable
-                            response = HttpResponse(content.stream_data_in_range(first, last))
+                            if cached_file is not None:
+                                response = FileResponse(FileRange(cached_file, first, last))
+                            else:
+                                response = HttpResponse(content.stream_data_in_range(first, last))
                             response['Content-Range'] = u'bytes {first}-{last}/{length}'.format(
                                 first=first, last=last, length=content.length
                             )
@@ -177,11 +241,16 @@ class StaticContentServer(MiddlewareMixin):
                                 u"Cannot satisfy ranges in Range header: %s for content: %s",
                                 header_value, text_type(loc)
                             )
+                            if cached_file is not None:
+                                cached_file.close()
                             return HttpResponse(status=416)  # Requested Range Not Satisfiable
 
             # If Range header is absent or syntactically invalid return a full content response.
             if response is None:
-                response = HttpResponse(content.stream_data())
+                if cached_file is not None:
+                    response = FileResponse(FileRange(cached_file, 0, content.length - 1))
+                else:
+                    response = HttpResponse(content.stream_data())
                 response['Content-Length'] = content.length
 
             if newrelic:
@@ -190,20 +259,22 @@ class StaticContentServer(MiddlewareMixin):
 
             # "Accept-Ranges: bytes" tells the user that only "bytes" ranges are allowed
             response['Accept-Ranges'] = 'bytes'
-            response['Content-Type'] = content.content_type
+            if not response['Content-Type'].startswith('multipart/byteranges'):
+                response['Content-Type'] = content.content_type
             response['X-Frame-Options'] = 'ALLOW'
 
             # Set any caching headers, and do any response cleanup needed.  Based on how much
             # middleware we have in place, there's no easy way to use the built-in Django
             # utilities and properly sanitize and modify a response to ensure that it is as
             # cacheable as possible, which is why we do it ourselves.
-            self.set_caching_headers(content, response)
+            self.set_caching_headers(content, response, vary_on_accept)
 
             return response
 
-    def set_caching_headers(self, content, response):
+    def set_caching_headers(self, content, response, vary_on_accept=False):
         """
-        Sets caching headers based on whether or not the asset is locked.
+        Sets caching headers based on whether or not the asset is locked, and on whether
+        the response depends on the Accept header of the request.
         """
 
         is_locked = getattr(content, "locked", False)
@@ -227,11 +298,141 @@ class StaticContentServer(MiddlewareMixin):
             response['Cache-Control'] = "private, no-cache, no-store"
 
         response['Last-Modified'] = content.last_modified_at.strftime(HTTP_DATE_FORMAT)
+        etag = self.get_etag(content)
+        if etag is not None:
+            response['ETag'] = etag
 
         # Force the Vary header to only vary responses on Origin, so that XHR and browser requests get cached
         # separately and don't screw over one another. i.e. a browser request that doesn't send Origin, and
         # caches a version of the response without CORS headers, in turn breaking XHR requests.
-        force_header_for_response(response, 'Vary', 'Origin')
+        force_header_for_response(response, 'Vary', 'Origin, Accept' if vary_on_accept else 'Origin')
+
+    @staticmethod
+    def get_etag(content):
+        """
+        Returns the ETag of the given content, derived from its digest, or None if it has no digest.
+        """
+        digest = getattr(content, 'content_digest', None)
+        if digest is None:
+            return None
+        return quote_etag(digest)
+
+    @staticmethod
+    def is_conditional_request(request):
+        """
+        Determines whether the given request is conditional on the asset having changed.
+        """
+        return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+    def is_not_modified(self, request, content):
+        """
+        Determines whether the client already has the current version of the given content,
+        according to the If-None-Match or, if absent, If-Modified-Since header of its request.
+
+        `content` can be the content itself or its cached AssetMetadata.
+        """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            etag = self.get_etag(content)
+            if etag is None:
+                return False
+            # Any asset with a digest is a strong validator, but compare weakly as
+            # proxies may have weakened the ETag (e.g. when compressing the asset).
+            client_etags = parse_etags(request.META['HTTP_IF_NONE_MATCH'])
+            return any(
+                client_etag == '*' or client_etag.replace('W/', '', 1) == etag for client_etag in client_etags
+            )
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        return if_modified_since is not None and (
+            if_modified_since == content.last_modified_at.strftime(HTTP_DATE_FORMAT)
+        )
+
+    def not_modified_response(self, content, vary_on_accept=False):
+        """
+        Returns a 304 response for the given content or its cached AssetMetadata.
+        """
+        response = HttpResponseNotModified()
+        self.set_caching_headers(content, response, vary_on_accept)
+        return response
+
+    @staticmethod
+    def is_negotiable_thumbnail(location):
+        """
+        Determines whether the asset at the given location is a JPEG thumbnail, which may
+        have a WebP version to serve instead.
+        """
+        return (
+            getattr(settings, 'CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS', False) and
+            location.block_type == 'thumbnail' and
+            location.block_id.endswith(XASSET_THUMBNAIL_TAIL_NAME)
+        )
+
+    def asset_exists(self, location):
+        """
+        Determines whether there is an asset at the given location, remembering
+        the answer in the cache until the asset's cached content is deleted.
+        """
+        exists = get_cached_asset_exists(location)
+        if exists is None:
+            exists = get_cached_metadata(location) is not None
+            if not exists:
+                try:
+                    self.load_asset_from_location(location)
+                    exists = True
+                except (ItemNotFoundError, NotFoundError):
+                    pass
+            set_cached_asset_exists(location, exists)
+        return exists
+
+    def multipart_range_response(self, content, cached_file, ranges):
+        """
+        Returns a multipart/byteranges response with the given (first, last) ranges of the content.
+
+        Each range is read by seeking to it, either in the disk cached file or, through the
+        GridFS stream, directly to the chunk holding its first byte.
+        """
+        boundary = uuid.uuid4().hex
+        parts = []
+        for first, last in ranges:
+            part_header = (
+                u'--{boundary}\r\n'
+                u'Content-Type: {content_type}\r\n'
+                u'Content-Range: bytes {first}-{last}/{length}\r\n'
+                u'\r\n'
+            ).format(
+                boundary=boundary, content_type=content.content_type, first=first, last=last, length=content.length
+            )
+            parts.append((part_header.encode('utf-8'), first, last))
+        closing_boundary = u'--{boundary}--\r\n'.format(boundary=boundary).encode('utf-8')
+
+        def multipart_content():
+            """
+            Yields the body of the response, closing the cached file once it's been read.
+            """
+            try:
+                for part_header, first, last in parts:
+                    yield part_header
+                    if cached_file is not None:
+                        file_range = FileRange(cached_file, first, last)
+                        chunk = file_range.read(COPY_CHUNK_SIZE)
+                        while chunk:
+                            yield chunk
+                            chunk = file_range.read(COPY_CHUNK_SIZE)
+                    else:
+                        for chunk in content.stream_data_in_range(first, last):
+                            yield chunk
+                    yield b'\r\n'
+                yield closing_boundary
+            finally:
+                if cached_file is not None:
+                    cached_file.close()
+
+        response = StreamingHttpResponse(multipart_content(), status=206)  # Partial Content
+        response['Content-Type'] = u'multipart/byteranges; boundary={boundary}'.format(boundary=boundary)
+        response['Content-Length'] = str(
+            sum(len(part_header) + last - first + 1 + 2 for part_header, first, last in parts) +
+            len(closing_boundary)
+        )
+        return response
 
     @staticmethod
     def is_cdn_request(request):
@@ -280,6 +481,36 @@ class StaticContentServer(MiddlewareMixin):
 
         return True
 
+    def load_asset_file_from_disk_cache(self, content):
+        """
+        Returns the file for the given content from the local disk cache, opened
+        for binary reading.
+
+        If it isn't cached yet, it is copied there in the background, from a
+        stream of its own, and None is returned so that the content is streamed
+        from the contentstore meanwhile.  None is also returned if the disk cache
+        is disabled, or for content that is either already held in memory or
+        can't be cached.
+        """
+        if not isinstance(content, StaticContentStream):
+            return None
+        disk_cache = get_disk_cache()
+        if disk_cache is None or not disk_cache.is_cacheable(content):
+            return None
+
+        cached_file = disk_cache.open(content.content_digest)
+        if newrelic:
+            newrelic.agent.add_custom_parameter('contentserver.disk_cache_hit', cached_file is not None)
+        if cached_file is None:
+            location = content.location
+            try:
+                disk_cache.fill_in_background(
+                    content.content_digest, lambda: AssetManager.find(location, as_stream=True),
+                )
+            except (IOError, OSError):
+                log.exception(u"Failed to start copying content to the disk cache: %s", text_type(location))
+        return cached_file
+
     def load_asset_from_location(self, location):
         """
         Loads an asset based on its location, either retrieving it from a cache
@@ -0,0 +1,53 @@
+"""
+Tests for the contentserver caching helpers.
+"""
+
+
+import unittest
+
+from django.core.cache.backends.locmem import LocMemCache
+from mock import patch
+from opaque_keys.edx.keys import CourseKey
+
+from xmodule.contentstore.content import AssetManifestEntry
+
+from .. import caching
+from ..caching import get_course_asset_manifest
+
+COURSE_KEY = CourseKey.from_string(u'course-v1:edX+Manifest+2020')
+
+
+class CourseAssetManifestTest(unittest.TestCase):
+    """
+    Tests for get_course_asset_manifest.
+    """
+    def setUp(self):
+        super(CourseAssetManifestTest, self).setUp()
+        cache_patcher = patch.object(caching, 'CONTENT_CACHE', LocMemCache('asset-manifest', {}))
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        contentstore_patcher = patch.object(caching, 'contentstore')
+        self.get_manifest = contentstore_patcher.start().return_value.get_course_asset_manifest
+        self.addCleanup(contentstore_patcher.stop)
+
+    def _manifest(self, name_length):
+        return {
+            u'{}-{}.png'.format(index, u'x' * name_length): AssetManifestEntry(u'a' * 32, False)
+            for index in range(10)
+        }
+
+    def test_manifest_cached(self):
+        manifest = self._manifest(10)
+        self.get_manifest.return_value = manifest
+        self.assertEqual(get_course_asset_manifest(COURSE_KEY), manifest)
+        self.assertEqual(get_course_asset_manifest(COURSE_KEY), manifest)
+        self.assertEqual(self.get_manifest.call_count, 1)
+
+    def test_manifest_too_large_once_pickled(self):
+        manifest = self._manifest(1000)
+        self.get_manifest.return_value = manifest
+        with patch.object(caching, 'MAX_MANIFEST_BYTES', 5000):
+            self.assertIsNone(get_course_asset_manifest(COURSE_KEY))
+            self.assertIsNone(get_course_asset_manifest(COURSE_KEY))
+        # The marker is cached so that the manifest isn't built again on every request.
+        self.assertEqual(self.get_manifest.call_count, 1)
@@ -8,11 +8,16 @@ import copy
 import datetime
 import ddt
 import logging
+import os
+import shutil
 import six
+import tempfile
+import threading
 import unittest
 from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
 from django.test import RequestFactory
 from django.test.client import Client
 from django.test.utils import override_settings
@@ -30,6 +35,8 @@ from xmodule.modulestore.exceptions import ItemNotFoundError
 from student.models import CourseEnrollment
 from student.tests.factories import UserFactory, AdminFactory
 
+from ..caching import AssetMetadata, del_cached_content
+from ..disk_cache import FILL_THREAD_NAME
 from ..middleware import parse_range_header, HTTP_DATE_FORMAT, StaticContentServer
 
 log = logging.getLogger(__name__)
@@ -238,20 +245,168 @@ class ContentStoreToyCourseTest(SharedModuleStoreTestCase):
             first=first_byte, last=last_byte, length=self.length_unlocked))
         self.assertEqual(resp['Content-Length'], str(last_byte - first_byte + 1))
 
+    def _assert_served_from_disk_cache(self, http_range, expected_status, expected_data):
+        """
+        Requests the unlocked asset, as a large asset that is streamed from the
+        contentstore, and verifies it is copied to the disk cache while the
+        first request is streamed, and served from there afterwards.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        content = AssetManager.find(self.unlocked_asset, as_stream=True)
+        cached_path = os.path.join(directory, content.content_digest[:2], content.content_digest)
+
+        with override_settings(CONTENTSERVER_DISK_CACHE={'DIRECTORY': directory}):
+            for from_disk_cache in (False, True):
+                with patch.object(
+                    StaticContentServer, 'load_asset_from_location',
+                    return_value=AssetManager.find(self.unlocked_asset, as_stream=True),
+                ):
+                    resp = self.client.get(self.url_unlocked, HTTP_RANGE=http_range)
+                self.assertEqual(resp.status_code, expected_status)
+                self.assertEqual(resp.streaming, from_disk_cache)
+                self.assertEqual(b''.join(resp.streaming_content) if resp.streaming else resp.content, expected_data)
+                self.assertEqual(resp['Content-Length'], str(len(expected_data)))
+                for thread in threading.enumerate():
+                    if thread.name == FILL_THREAD_NAME:
+                        thread.join()
+                self.assertTrue(os.path.exists(cached_path))
+
+    def test_disk_cache_full_file(self):
+        data = self.contentstore.find(self.unlocked_asset).data
+        self._assert_served_from_disk_cache('', 200, data)
+
+    def test_disk_cache_partial_file(self):
+        data = self.contentstore.find(self.unlocked_asset).data
+        first_byte = self.length_unlocked // 4
+        last_byte = self.length_unlocked // 2
+        self._assert_served_from_disk_cache(
+            'bytes={first}-{last}'.format(first=first_byte, last=last_byte), 206, data[first_byte:last_byte + 1],
+        )
+
     def test_range_request_multiple_ranges(self):
         """
-        Test that multiple ranges in request outputs the full content.
+        Test that multiple ranges in request output a multipart message with each range.
         """
-        first_byte = self.length_unlocked / 4
-        last_byte = self.length_unlocked / 2
+        data = self.contentstore.find(self.unlocked_asset).data
+        first_byte = self.length_unlocked // 4
+        last_byte = self.length_unlocked // 2
         # pylint: disable=unicode-format-string
-        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={first}-{last}, -100'.format(
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={first}-{last}, -10'.format(
             first=first_byte, last=last_byte))
 
-        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.status_code, 206)
         self.assertNotIn('Content-Range', resp)
+        self.assertTrue(resp['Content-Type'].startswith('multipart/byteranges; boundary='))
+        boundary = resp['Content-Type'].split('boundary=')[1].encode('utf-8')
+        body = b''.join(resp.streaming_content)
+        self.assertEqual(resp['Content-Length'], str(len(body)))
+
+        parts = body.split(b'--' + boundary)
+        self.assertEqual(parts[0], b'')
+        self.assertEqual(parts[-1], b'--\r\n')
+        expected_ranges = [(first_byte, last_byte), (self.length_unlocked - 10, self.length_unlocked - 1)]
+        for part, (first, last) in zip(parts[1:-1], expected_ranges):
+            headers, part_data = part.split(b'\r\n\r\n', 1)
+            self.assertIn(
+                u'Content-Range: bytes {first}-{last}/{length}'.format(
+                    first=first, last=last, length=self.length_unlocked
+                ).encode('utf-8'),
+                headers,
+            )
+            self.assertEqual(part_data, data[first:last + 1] + b'\r\n')
+
+    def test_range_request_multiple_unsatisfiable_ranges(self):
+        """
+        Test that a multiple range request with no satisfiable range outputs
+        416 Requested Range Not Satisfiable.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={first}-, {first}-{last}'.format(
+            first=self.length_unlocked, last=self.length_unlocked + 10))
+        self.assertEqual(resp.status_code, 416)
+
+    def test_range_request_too_many_ranges(self):
+        """
+        Test that a request for too many ranges outputs the full content.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=' + ', '.join(['0-1'] * 100))
+        self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp['Content-Length'], str(self.length_unlocked))
 
+    def test_etag(self):
+        """
+        Test that assets are served with an ETag, which browsers can revalidate them with.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertEqual(resp.status_code, 200)
+        content = AssetManager.find(self.unlocked_asset, as_stream=True)
+        etag = u'"{}"'.format(content.content_digest)
+        self.assertEqual(resp['ETag'], etag)
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='W/' + etag)
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"{}"'.format(FAKE_MD5_HASH))
+        self.assertEqual(resp.status_code, 200)
+
+    def _get_with_cached_metadata(self, asset_key, url, **extra):
+        """
+        Requests the given asset with its metadata cached, returning the
+        response and whether the asset itself had to be loaded.
+        """
+        content = AssetManager.find(asset_key, as_stream=True)
+        metadata = AssetMetadata(
+            content_digest=content.content_digest,
+            last_modified_at=content.last_modified_at,
+            locked=content.locked,
+            length=content.length,
+            content_type=content.content_type,
+        )
+        with patch('openedx.core.djangoapps.contentserver.middleware.get_cached_metadata', return_value=metadata):
+            with patch.object(
+                StaticContentServer, 'load_asset_from_location', return_value=content,
+            ) as mock_load_asset:
+                resp = self.client.get(url, **extra)
+        return resp, mock_load_asset.called
+
+    @ddt.data('If-None-Match', 'If-Modified-Since')
+    def test_not_modified_from_cached_metadata(self, header):
+        content = AssetManager.find(self.unlocked_asset, as_stream=True)
+        header_values = {
+            'If-None-Match': u'"{}"'.format(content.content_digest),
+            'If-Modified-Since': content.last_modified_at.strftime(HTTP_DATE_FORMAT),
+        }
+        resp, loaded = self._get_with_cached_metadata(
+            self.unlocked_asset, self.url_unlocked,
+            **{'HTTP_' + header.upper().replace('-', '_'): header_values[header]}
+        )
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(loaded)
+        self.assertEqual(resp['ETag'], header_values['If-None-Match'])
+
+    def test_modified_with_cached_metadata(self):
+        resp, loaded = self._get_with_cached_metadata(
+            self.unlocked_asset, self.url_unlocked, HTTP_IF_NONE_MATCH='"{}"'.format(FAKE_MD5_HASH),
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(loaded)
+
+    def test_locked_not_modified_from_cached_metadata(self):
+        content = AssetManager.find(self.locked_asset, as_stream=True)
+        etag = u'"{}"'.format(content.content_digest)
+
+        self.client.logout()
+        resp, loaded = self._get_with_cached_metadata(self.locked_asset, self.url_locked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(loaded)
+
+        self.client.login(username=self.staff_usr, password='test')
+        resp, loaded = self._get_with_cached_metadata(self.locked_asset, self.url_locked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(loaded)
+        self.assertEqual(resp['Cache-Control'], 'private, no-cache, no-store')
+
     @ddt.data(
         'bytes 0-',
         'bits=0-',
@@ -284,6 +439,65 @@ class ContentStoreToyCourseTest(SharedModuleStoreTestCase):
             first=(self.length_unlocked), last=(self.length_unlocked)))
         self.assertEqual(resp.status_code, 416)
 
+    def _save_thumbnails(self, *names_and_types):
+        """
+        Saves thumbnails with the given names and content types, returning their URLs.
+        """
+        urls = []
+        for name, content_type in names_and_types:
+            location = StaticContent.compute_location(self.course_key, name, is_thumbnail=True)
+            self.contentstore.save(StaticContent(location, name, content_type, b'thumbnail ' + name.encode('utf-8')))
+            self.addCleanup(self.contentstore.delete, location)
+            urls.append(six.text_type(location))
+        return urls
+
+    @ddt.data(
+        ('image/webp,image/*,*/*;q=0.8', 'image/webp'),
+        ('image/png,image/*,*/*;q=0.8', 'image/jpeg'),
+    )
+    @ddt.unpack
+    def test_webp_thumbnail_negotiation(self, accept, expected_content_type):
+        url, __ = self._save_thumbnails(('negotiated.jpg', 'image/jpeg'), ('negotiated.webp', 'image/webp'))
+        with override_settings(CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS=True):
+            resp = self.client.get(url, HTTP_ACCEPT=accept)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], expected_content_type)
+        self.assertEqual(resp['Vary'], 'Origin, Accept')
+
+    def test_webp_thumbnail_negotiation_without_webp(self):
+        url, = self._save_thumbnails(('jpeg_only.jpg', 'image/jpeg'))
+        with override_settings(CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS=True):
+            resp = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+
+    @patch('openedx.core.djangoapps.contentserver.caching.CONTENT_CACHE', LocMemCache('webp-negotiation', {}))
+    def test_webp_thumbnail_existence_cached(self):
+        url, = self._save_thumbnails(('cached_jpeg_only.jpg', 'image/jpeg'))
+        with override_settings(CONTENTSERVER_NEGOTIATE_WEBP_THUMBNAILS=True):
+            self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+            with patch(
+                'openedx.core.djangoapps.contentserver.middleware.AssetManager.find', wraps=AssetManager.find
+            ) as mock_find:
+                resp = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+            self.assertEqual(resp['Content-Type'], 'image/jpeg')
+            self.assertFalse(mock_find.called)
+
+            # Generating the WebP version deletes its cached content, and whether it exists.
+            self._save_thumbnails(('cached_jpeg_only.webp', 'image/webp'))
+            del_cached_content(
+                StaticContent.compute_location(self.course_key, 'cached_jpeg_only.webp', is_thumbnail=True)
+            )
+            resp = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+
+    def test_webp_thumbnail_negotiation_disabled(self):
+        url, __ = self._save_thumbnails(('not_negotiated.jpg', 'image/jpeg'), ('not_negotiated.webp', 'image/webp'))
+        resp = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'image/jpeg')
+        self.assertEqual(resp['Vary'], 'Origin')
+
     def test_vary_header_sent(self):
         """
         Tests that we're properly setting the Vary header to ensure browser requests don't get
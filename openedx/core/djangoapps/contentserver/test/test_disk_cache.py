@@ -0,0 +1,125 @@
+"""
+Tests for the contentserver local disk cache.
+"""
+
+
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import ddt
+from mock import Mock, patch
+
+from ..disk_cache import AssetDiskCache, FileRange
+
+DIGEST_A = 'a' * 32
+DIGEST_B = 'b' * 32
+DIGEST_C = 'c' * 32
+
+
+@ddt.ddt
+class AssetDiskCacheTest(unittest.TestCase):
+    """
+    Tests for AssetDiskCache.
+    """
+    def setUp(self):
+        super(AssetDiskCacheTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.disk_cache = AssetDiskCache(self.directory, max_size=20, max_file_size=10)
+
+    def _store(self, digest, data):
+        with self.disk_cache.store(digest, [data[:3], data[3:]]) as cached_file:
+            return cached_file.read()
+
+    def test_store_and_open(self):
+        self.assertIsNone(self.disk_cache.open(DIGEST_A))
+        self.assertEqual(self._store(DIGEST_A, b'0123456789'), b'0123456789')
+        with self.disk_cache.open(DIGEST_A) as cached_file:
+            self.assertEqual(cached_file.read(), b'0123456789')
+
+    def test_least_recently_used_evicted(self):
+        self._store(DIGEST_A, b'a' * 8)
+        self._store(DIGEST_B, b'b' * 8)
+        # Make the first file the most recently used one.
+        past = time.time() - 60
+        os.utime(self.disk_cache._path(DIGEST_B), (past, past))  # pylint: disable=protected-access
+        self.disk_cache.open(DIGEST_A).close()
+
+        self._store(DIGEST_C, b'c' * 8)
+        self.assertIsNone(self.disk_cache.open(DIGEST_B))
+        self.assertIsNotNone(self.disk_cache.open(DIGEST_A))
+        self.assertIsNotNone(self.disk_cache.open(DIGEST_C))
+
+    @ddt.data(
+        (DIGEST_A, 10, True),
+        (DIGEST_A, 11, False),
+        (DIGEST_A, None, False),
+        (None, 10, False),
+        ('../../etc/passwd', 10, False),
+    )
+    @ddt.unpack
+    def test_is_cacheable(self, digest, length, expected):
+        content = Mock(content_digest=digest, length=length)
+        self.assertEqual(self.disk_cache.is_cacheable(content), expected)
+
+    def test_failed_store_leaves_no_file(self):
+        def failing_chunks():
+            yield b'012'
+            raise IOError('Stream failed')
+
+        with self.assertRaises(IOError):
+            self.disk_cache.store(DIGEST_A, failing_chunks())
+        self.assertIsNone(self.disk_cache.open(DIGEST_A))
+        self.assertEqual(os.listdir(os.path.join(self.directory, DIGEST_A[:2])), [])
+
+
+    def test_eviction_runs_after_interval_written(self):
+        disk_cache = AssetDiskCache(self.directory, max_size=100, max_file_size=10)
+        with patch.object(disk_cache, 'evict') as mock_evict:
+            # Always on the first write of a process.
+            disk_cache.store(DIGEST_A, [b'a']).close()
+            self.assertEqual(mock_evict.call_count, 1)
+            disk_cache.store(DIGEST_B, [b'b' * 4]).close()
+            self.assertEqual(mock_evict.call_count, 1)
+            disk_cache.store(DIGEST_C, [b'c']).close()
+            self.assertEqual(mock_evict.call_count, 2)
+
+    def test_fill_in_background(self):
+        content = Mock(content_digest=DIGEST_A)
+        content.stream_data.return_value = [b'012', b'345']
+        self.disk_cache.fill_in_background(DIGEST_A, lambda: content).join()
+        with self.disk_cache.open(DIGEST_A) as cached_file:
+            self.assertEqual(cached_file.read(), b'012345')
+        self.assertEqual(os.listdir(os.path.join(self.directory, DIGEST_A[:2])), [DIGEST_A])
+
+    def test_fill_in_background_once(self):
+        os.makedirs(os.path.join(self.directory, DIGEST_A[:2]))
+        with open(os.path.join(self.directory, DIGEST_A[:2], '.lock-' + DIGEST_A), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            load_content = Mock()
+            self.assertIsNone(self.disk_cache.fill_in_background(DIGEST_A, load_content))
+        self.assertFalse(load_content.called)
+
+    def test_changed_content_not_filled(self):
+        content = Mock(content_digest=DIGEST_B)
+        content.stream_data.return_value = [b'012345']
+        self.disk_cache.fill_in_background(DIGEST_A, lambda: content).join()
+        self.assertIsNone(self.disk_cache.open(DIGEST_A))
+        self.assertIsNone(self.disk_cache.open(DIGEST_B))
+
+
+class FileRangeTest(unittest.TestCase):
+    """
+    Tests for FileRange.
+    """
+    def test_read_stops_at_end_of_range(self):
+        with tempfile.TemporaryFile() as temp_file:
+            temp_file.write(b'0123456789')
+            file_range = FileRange(temp_file, 2, 6)
+            self.assertEqual(file_range.read(3), b'234')
+            self.assertEqual(file_range.read(3), b'56')
+            self.assertEqual(file_range.read(3), b'')
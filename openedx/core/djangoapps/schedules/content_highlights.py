@@ -43,16 +43,20 @@ def course_has_highlights(course_key):
         return highlights_are_available
 
 
-def get_week_highlights(user, course_key, week_num):
+def get_week_highlights(user, course_key, week_num, course_cache=None):
     """
     Get highlights (list of unicode strings) for a given week.
     week_num starts at 1.
 
+    If a `course_cache` dict is given, the course is loaded from the
+    modulestore only if it is not already in it, and is then kept in it,
+    so that getting highlights for the learners of a course loads it once.
+
     Raises:
         CourseUpdateDoesNotExist: if highlights do not exist for
             the requested week_num.
     """
-    course_descriptor = _get_course_with_highlights(course_key)
+    course_descriptor = _get_course_with_highlights(course_key, course_cache)
     course_module = _get_course_module(course_descriptor, user)
     sections_with_highlights = _get_sections_with_highlights(course_module)
     highlights = _get_highlights_for_week(
@@ -63,14 +67,16 @@ def get_week_highlights(user, course_key, week_num):
     return highlights
 
 
-def get_next_section_highlights(user, course_key, start_date, target_date):
+def get_next_section_highlights(user, course_key, start_date, target_date, course_cache=None):
     """
     Get highlights (list of unicode strings) for a week, based upon the current date.
 
+    `course_cache` is used like in `get_week_highlights`.
+
     Raises:
         CourseUpdateDoeNotExist: if highlights do not exist for the requested date
     """
-    course_descriptor = _get_course_with_highlights(course_key)
+    course_descriptor = _get_course_with_highlights(course_key, course_cache)
     course_module = _get_course_module(course_descriptor, user)
     sections_with_highlights = _get_sections_with_highlights(course_module)
     highlights = _get_highlights_for_next_section(
@@ -82,7 +88,7 @@ def get_next_section_highlights(user, course_key, start_date, target_date):
     return highlights
 
 
-def _get_course_with_highlights(course_key):
+def _get_course_with_highlights(course_key, course_cache=None):
     # pylint: disable=missing-docstring
     if not COURSE_UPDATE_WAFFLE_FLAG.is_enabled(course_key):
         raise CourseUpdateDoesNotExist(
@@ -90,7 +96,7 @@ def _get_course_with_highlights(course_key):
             course_key,
         )
 
-    course_descriptor = _get_course_descriptor(course_key)
+    course_descriptor = _get_course_descriptor(course_key, course_cache)
     if not course_descriptor.highlights_enabled_for_messaging:
         raise CourseUpdateDoesNotExist(
             u"%s Course Update Messages are disabled.",
@@ -100,8 +106,13 @@ def _get_course_with_highlights(course_key):
     return course_descriptor
 
 
-def _get_course_descriptor(course_key):
-    course_descriptor = modulestore().get_course(course_key, depth=1)
+def _get_course_descriptor(course_key, course_cache=None):
+    if course_cache is None:
+        course_descriptor = modulestore().get_course(course_key, depth=1)
+    else:
+        if course_key not in course_cache:
+            course_cache[course_key] = modulestore().get_course(course_key, depth=1)
+        course_descriptor = course_cache[course_key]
     if course_descriptor is None:
         raise CourseUpdateDoesNotExist(
             u"Course {} not found.".format(course_key)
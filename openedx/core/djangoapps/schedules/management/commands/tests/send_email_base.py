@@ -18,7 +18,7 @@ from edx_ace.channel import ChannelMap, ChannelType
 from edx_ace.test_utils import StubPolicy, patch_policies
 from edx_ace.utils.date import serialize
 from freezegun import freeze_time
-from mock import Mock, patch
+from mock import MagicMock, Mock, patch
 from opaque_keys.edx.keys import CourseKey
 from six.moves import range
 
@@ -226,7 +226,8 @@ class ScheduleSendEmailTestMixin(FilteredQueryCountMixin):
                         site_id=self.site_config.site.id, target_day_str=target_day_str, day_offset=offset, bin_num=b,
                     ))
 
-                num_schedules = mock_metric.call_args[0][1]
+                metrics = dict(metric_call[0] for metric_call in mock_metric.call_args_list)
+                num_schedules = metrics['num_schedules']
                 if b in bins_in_use:
                     self.assertGreater(num_schedules, 0)
                 else:
@@ -280,6 +281,19 @@ class ScheduleSendEmailTestMixin(FilteredQueryCountMixin):
         else:
             self.assertFalse(mock_ace.send.called)
 
+    @patch.object(tasks, 'ace')
+    @patch.object(tasks, 'Message')
+    def test_deliver_batch(self, mock_message, mock_ace):
+        users = [UserFactory.create() for _ in range(2)]
+        self._update_schedule_config({'site': self.site_config.site, self.deliver_config: True})
+        usernames = [users[0].username, 'unknown', users[1].username]
+        mock_message.from_string.side_effect = [MagicMock(recipient=Mock(username=username)) for username in usernames]
+        # The second message is to a learner who does not exist, and the first fails to send.
+        mock_ace.send.side_effect = [Exception('failed'), None]
+
+        self.deliver_task(self.site_config.site.id, ['message 1', 'message 2', 'message 3'])
+        self.assertEqual(mock_ace.send.call_count, 2)
+
     @ddt.data(True, False)
     def test_enqueue_config(self, is_enabled):
         schedule_config_kwargs = {
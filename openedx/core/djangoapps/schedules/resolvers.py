@@ -2,6 +2,7 @@
 
 import datetime
 import logging
+import time
 from itertools import groupby
 
 import attr
@@ -28,6 +29,7 @@ from openedx.core.djangoapps.schedules.utils import PrefixedDebugLoggerMixin
 from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
 from openedx.core.djangolib.translation_utils import translate_date
 from openedx.features.course_experience import course_home_url_name
+from xmodule.modulestore.django import modulestore
 
 LOG = logging.getLogger(__name__)
 
@@ -82,8 +84,10 @@ class BinnedSchedulesBaseResolver(PrefixedDebugLoggerMixin, RecipientResolver):
     def __attrs_post_init__(self):
         # TODO: in the next refactor of this task, pass in current_datetime instead of reproducing it here
         self.current_datetime = self.target_datetime - datetime.timedelta(days=self.day_offset)
+        self.course_data = CourseDataCache()
 
     def send(self, msg_type):
+        dispatcher = MessageDispatcher(self.async_send_task, self.site)
         for (user, language, context) in self.schedules_for_bin():
             msg = msg_type.personalize(
                 Recipient(
@@ -93,8 +97,8 @@ class BinnedSchedulesBaseResolver(PrefixedDebugLoggerMixin, RecipientResolver):
                 language,
                 context,
             )
-            with function_trace('enqueue_send_task'):
-                self.async_send_task.apply_async((self.site.id, str(msg)), retry=False)
+            dispatcher.add(msg)
+        dispatcher.close()
 
     @classmethod
     def bin_num_for_user_id(cls, user_id):
@@ -109,6 +113,8 @@ class BinnedSchedulesBaseResolver(PrefixedDebugLoggerMixin, RecipientResolver):
         """
         Returns Schedules with the target_date, related to Users whose id matches the bin_num, and filtered by org_list.
 
+        The queryset is not evaluated: iterate over it with `iter_schedules`.
+
         Arguments:
         order_by -- string for field to sort the resulting Schedules by
         """
@@ -153,17 +159,23 @@ class BinnedSchedulesBaseResolver(PrefixedDebugLoggerMixin, RecipientResolver):
 
         LOG.info(u'Query = %r', schedules.query.sql_with_params())
 
-        with function_trace('schedule_query_set_evaluation'):
-            # This will run the query and cache all of the results in memory.
-            num_schedules = len(schedules)
+        return schedules
+
+    def iter_schedules(self, schedules):
+        """
+        Yields the schedules of the queryset, streamed from the database
+        rather than all kept in memory, and records how many there were.
+        """
+        num_schedules = 0
+        for schedule in schedules.iterator():
+            num_schedules += 1
+            yield schedule
 
         LOG.info(u'Number of schedules = %d', num_schedules)
 
         # This should give us a sense of the volume of data being processed by each task.
         set_custom_metric('num_schedules', num_schedules)
 
-        return schedules
-
     def filter_by_org(self, schedules):
         """
         Given the configuration of sites, get the list of orgs that should be included or excluded from this send.
@@ -197,7 +209,7 @@ class BinnedSchedulesBaseResolver(PrefixedDebugLoggerMixin, RecipientResolver):
         schedules = self.get_schedules_with_target_date_by_bin_and_orgs()
         template_context = get_base_template_context(self.site)
 
-        for (user, user_schedules) in groupby(schedules, lambda s: s.enrollment.user):
+        for (user, user_schedules) in groupby(self.iter_schedules(schedules), lambda s: s.enrollment.user):
             user_schedules = list(user_schedules)
             course_id_strs = [str(schedule.enrollment.course_id) for schedule in user_schedules]
 
@@ -240,6 +252,81 @@ class InvalidContextError(Exception):
     pass
 
 
+class CourseDataCache(object):
+    """
+    Course data that the messages to all the learners of a course have in
+    common, loaded once per task rather than once per learner.
+    """
+    def __init__(self):
+        # Modulestore courses, loaded with their sections for highlights, by
+        # course key.  This can be passed as the `course_cache` of the
+        # content_highlights functions.
+        self.courses = {}
+        self._home_urls = {}
+
+    def get_course(self, course_key):
+        """
+        Returns the modulestore course, or None if there is none.
+        """
+        if course_key not in self.courses:
+            self.courses[course_key] = modulestore().get_course(course_key, depth=1)
+        return self.courses[course_key]
+
+    def get_home_url(self, course_key):
+        """
+        Returns the trackable URL of the course home page.
+        """
+        if course_key not in self._home_urls:
+            self._home_urls[course_key] = _get_trackable_course_home_url(course_key)
+        return self._home_urls[course_key]
+
+
+class MessageDispatcher(object):
+    """
+    Queues the messages of a resolver to its send task, in batches of
+    SCHEDULES_SEND_BATCH_SIZE messages, and records how many were built and
+    queued, and how fast.
+    """
+    def __init__(self, async_send_task, site):
+        self.async_send_task = async_send_task
+        self.site = site
+        self.batch_size = max(getattr(settings, 'SCHEDULES_SEND_BATCH_SIZE', 1), 1)
+        self.batch = []
+        self.num_messages = 0
+        self.start_time = time.time()
+
+    def add(self, msg):
+        """
+        Adds a personalized message, queuing the batch when it is full.
+        """
+        self.batch.append(str(msg))
+        self.num_messages += 1
+        if len(self.batch) >= self.batch_size:
+            self._queue_batch()
+
+    def close(self):
+        """
+        Queues the messages left, and records the metrics.
+        """
+        if self.batch:
+            self._queue_batch()
+
+        duration = time.time() - self.start_time
+        messages_per_second = self.num_messages / duration if duration > 0 else 0
+        LOG.info(
+            u'Built %d messages in %.2f seconds (%.1f messages/s)', self.num_messages, duration, messages_per_second
+        )
+        set_custom_metric('num_messages', self.num_messages)
+        set_custom_metric('messages_per_second', round(messages_per_second, 1))
+
+    def _queue_batch(self):
+        # A message on its own is queued as it is, rather than as a list.
+        msg_strs = self.batch[0] if len(self.batch) == 1 else self.batch
+        with function_trace('enqueue_send_task'):
+            self.async_send_task.apply_async((self.site.id, msg_strs), retry=False)  # pylint: disable=no-member
+        self.batch = []
+
+
 class RecurringNudgeResolver(BinnedSchedulesBaseResolver):
     """
     Send a message to all users whose schedule started at ``self.current_date`` + ``day_offset``.
@@ -262,11 +349,11 @@ class RecurringNudgeResolver(BinnedSchedulesBaseResolver):
             raise InvalidContextError
         context = {
             'course_name': first_schedule.enrollment.course.display_name,
-            'course_url': _get_trackable_course_home_url(first_schedule.enrollment.course_id),
+            'course_url': self.course_data.get_home_url(first_schedule.enrollment.course_id),
         }
 
         # Information for including upsell messaging in template.
-        context.update(_get_upsell_information_for_schedule(user, first_schedule))
+        context.update(_get_upsell_information_for_schedule(user, first_schedule, self.course_data))
 
         return context
 
@@ -296,7 +383,7 @@ class UpgradeReminderResolver(BinnedSchedulesBaseResolver):
                 # We don't want to include instructor led courses in this email
                 continue
 
-            upsell_context = _get_upsell_information_for_schedule(user, schedule)
+            upsell_context = _get_upsell_information_for_schedule(user, schedule, self.course_data)
             if not upsell_context['show_upsell']:
                 continue
 
@@ -306,7 +393,7 @@ class UpgradeReminderResolver(BinnedSchedulesBaseResolver):
             course_id_str = str(schedule.enrollment.course_id)
             course_id_strs.append(course_id_str)
             course_links.append({
-                'url': _get_trackable_course_home_url(schedule.enrollment.course_id),
+                'url': self.course_data.get_home_url(schedule.enrollment.course_id),
                 'name': schedule.enrollment.course.display_name
             })
 
@@ -324,12 +411,12 @@ class UpgradeReminderResolver(BinnedSchedulesBaseResolver):
         return context
 
 
-def _get_upsell_information_for_schedule(user, schedule):
+def _get_upsell_information_for_schedule(user, schedule, course_data=None):
     template_context = {}
     enrollment = schedule.enrollment
     course = enrollment.course
 
-    verified_upgrade_link = _get_verified_upgrade_link(user, schedule)
+    verified_upgrade_link = _get_verified_upgrade_link(user, schedule, course_data)
     has_verified_upgrade_link = verified_upgrade_link is not None
 
     if has_verified_upgrade_link:
@@ -343,9 +430,13 @@ def _get_upsell_information_for_schedule(user, schedule):
     return template_context
 
 
-def _get_verified_upgrade_link(user, schedule):
+def _get_verified_upgrade_link(user, schedule, course_data=None):
     enrollment = schedule.enrollment
-    if enrollment.dynamic_upgrade_deadline is not None and can_show_verified_upgrade(user, enrollment):
+    if enrollment.dynamic_upgrade_deadline is None:
+        return None
+    # The modulestore course is otherwise loaded for each learner to find its user partitions.
+    course = course_data.get_course(enrollment.course_id) if course_data is not None else None
+    if can_show_verified_upgrade(user, enrollment, course=course):
         return verified_upgrade_deadline_link(user, enrollment.course)
 
 
@@ -360,6 +451,7 @@ class CourseUpdateResolver(BinnedSchedulesBaseResolver):
     experience_filter = Q(experience__experience_type=ScheduleExperience.EXPERIENCES.course_updates)
 
     def send(self, msg_type):
+        dispatcher = MessageDispatcher(self.async_send_task, self.site)
         for (user, language, context, is_self_paced) in self.schedules_for_bin():
             msg_type = CourseUpdate() if is_self_paced else InstructorLedCourseUpdate()
             msg = msg_type.personalize(
@@ -370,8 +462,8 @@ class CourseUpdateResolver(BinnedSchedulesBaseResolver):
                 language,
                 context,
             )
-            with function_trace('enqueue_send_task'):
-                self.async_send_task.apply_async((self.site.id, str(msg)), retry=False)  # pylint: disable=no-member
+            dispatcher.add(msg)
+        dispatcher.close()
 
     def schedules_for_bin(self):
         week_num = abs(self.day_offset) // 7
@@ -380,13 +472,15 @@ class CourseUpdateResolver(BinnedSchedulesBaseResolver):
         )
 
         template_context = get_base_template_context(self.site)
-        for schedule in schedules:
+        for schedule in self.iter_schedules(schedules):
             enrollment = schedule.enrollment
             course = schedule.enrollment.course
             user = enrollment.user
 
             try:
-                week_highlights = get_week_highlights(user, enrollment.course_id, week_num)
+                week_highlights = get_week_highlights(
+                    user, enrollment.course_id, week_num, course_cache=self.course_data.courses
+                )
             except CourseUpdateDoesNotExist:
                 LOG.warning(
                     u'Weekly highlights for user {} in week {} of course {} does not exist or is disabled'.format(
@@ -405,7 +499,7 @@ class CourseUpdateResolver(BinnedSchedulesBaseResolver):
 
                 template_context.update({
                     'course_name': schedule.enrollment.course.display_name,
-                    'course_url': _get_trackable_course_home_url(enrollment.course_id),
+                    'course_url': self.course_data.get_home_url(enrollment.course_id),
 
                     'week_num': week_num,
                     'week_highlights': week_highlights,
@@ -414,7 +508,7 @@ class CourseUpdateResolver(BinnedSchedulesBaseResolver):
                     'course_ids': [str(enrollment.course_id)],
                     'unsubscribe_url': unsubscribe_url,
                 })
-                template_context.update(_get_upsell_information_for_schedule(user, schedule))
+                template_context.update(_get_upsell_information_for_schedule(user, schedule, self.course_data))
 
                 yield (user, schedule.enrollment.course.closest_released_language, template_context, course.self_paced)
 
@@ -433,7 +527,11 @@ class CourseNextSectionUpdate(PrefixedDebugLoggerMixin, RecipientResolver):
     log_prefix = 'Next Section Course Update'
     experience_filter = Q(experience__experience_type=ScheduleExperience.EXPERIENCES.course_updates)
 
+    def __attrs_post_init__(self):
+        self.course_data = CourseDataCache()
+
     def send(self):
+        dispatcher = MessageDispatcher(self.async_send_task, self.site)
         schedules = self.get_schedules()
         for (user, language, context, is_self_paced) in schedules:
             msg_type = CourseUpdate() if is_self_paced else InstructorLedCourseUpdate()
@@ -451,8 +549,8 @@ class CourseNextSectionUpdate(PrefixedDebugLoggerMixin, RecipientResolver):
                     self.course_id
                 )
             )
-            with function_trace('enqueue_send_task'):
-                self.async_send_task.apply_async((self.site.id, str(msg)), retry=False)
+            dispatcher.add(msg)
+        dispatcher.close()
 
     def get_schedules(self):
         course_key = CourseKey.from_string(self.course_id)
@@ -461,10 +559,10 @@ class CourseNextSectionUpdate(PrefixedDebugLoggerMixin, RecipientResolver):
             self.experience_filter,
             active=True,
             enrollment__user__is_active=True,
-        )
+        ).select_related('enrollment__user', 'enrollment__course')
 
         template_context = get_base_template_context(self.site)
-        for schedule in schedules:
+        for schedule in schedules.iterator():
             enrollment = schedule.enrollment
             course = schedule.enrollment.course
             user = enrollment.user
@@ -476,7 +574,9 @@ class CourseNextSectionUpdate(PrefixedDebugLoggerMixin, RecipientResolver):
             ))
 
             try:
-                week_highlights, week_num = get_next_section_highlights(user, course.id, start_date, target_date)
+                week_highlights, week_num = get_next_section_highlights(
+                    user, course.id, start_date, target_date, course_cache=self.course_data.courses
+                )
             except CourseUpdateDoesNotExist:
                 LOG.warning(
                     u'Weekly highlights for user {} of course {} does not exist or is disabled'.format(
@@ -495,14 +595,14 @@ class CourseNextSectionUpdate(PrefixedDebugLoggerMixin, RecipientResolver):
 
             template_context.update({
                 'course_name': course.display_name,
-                'course_url': _get_trackable_course_home_url(enrollment.course_id),
+                'course_url': self.course_data.get_home_url(enrollment.course_id),
                 'week_num': week_num,
                 'week_highlights': week_highlights,
                 # This is used by the bulk email optout policy
                 'course_ids': [str(enrollment.course_id)],
                 'unsubscribe_url': unsubscribe_url,
             })
-            template_context.update(_get_upsell_information_for_schedule(user, schedule))
+            template_context.update(_get_upsell_information_for_schedule(user, schedule, self.course_data))
 
             yield (user, enrollment.course.closest_released_language, template_context, course.self_paced)
 
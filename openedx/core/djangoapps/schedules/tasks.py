@@ -247,16 +247,33 @@ class ScheduleCourseNextSectionUpdate(ScheduleMessageBaseTask):
 
 
 def _schedule_send(msg_str, site_id, delivery_config_var, log_prefix):
+    """
+    Sends the serialized message `msg_str`, or each message of a list of them
+    queued together, looking up the site and the recipients once.
+    """
+    msg_strs = msg_str if isinstance(msg_str, list) else [msg_str]
     site = Site.objects.select_related('configuration').get(pk=site_id)
     if _is_delivery_enabled(site, delivery_config_var, log_prefix):
-        msg = Message.from_string(msg_str)
-
-        user = User.objects.get(username=msg.recipient.username)
-        with emulate_http_request(site=site, user=user):
-            _annonate_send_task_for_monitoring(msg)
-            LOG.debug(u'%s: Sending message = %s', log_prefix, msg_str)
-            ace.send(msg)
-            _track_message_sent(site, user, msg)
+        msgs = [Message.from_string(serialized_msg) for serialized_msg in msg_strs]
+        users = User.objects.in_bulk([msg.recipient.username for msg in msgs], field_name='username')
+
+        for serialized_msg, msg in zip(msg_strs, msgs):
+            user = users.get(msg.recipient.username)
+            if user is None:
+                LOG.warning(u'%s: Skipping message to unknown user %s', log_prefix, msg.recipient.username)
+                continue
+            with emulate_http_request(site=site, user=user):
+                _annonate_send_task_for_monitoring(msg)
+                LOG.debug(u'%s: Sending message = %s', log_prefix, serialized_msg)
+                try:
+                    ace.send(msg)
+                except Exception:  # pylint: disable=broad-except
+                    if len(msgs) == 1:
+                        raise
+                    # The other messages of the batch are still sent.
+                    LOG.exception(u'%s: Failed to send message = %s', log_prefix, serialized_msg)
+                    continue
+                _track_message_sent(site, user, msg)
 
 
 def _track_message_sent(site, user, msg):
@@ -24,7 +24,7 @@ from openedx.core.djangoapps.schedules.tests.factories import ScheduleConfigFact
 from openedx.core.djangoapps.site_configuration.tests.factories import SiteConfigurationFactory, SiteFactory
 from openedx.core.djangoapps.waffle_utils.testutils import override_waffle_flag
 from openedx.core.djangolib.testing.utils import CacheIsolationMixin, skip_unless_lms
-from student.tests.factories import CourseEnrollmentFactory
+from student.tests.factories import CourseEnrollmentFactory, UserFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 
@@ -241,3 +241,27 @@ class TestCourseNextSectionUpdateResolver(SchedulesResolverTestMixin, ModuleStor
             mock_get_schedules.return_value = Schedule.objects.all()
             schedules = list(resolver.get_schedules())
         self.assertIn('optout', schedules[0][2]['unsubscribe_url'])
+
+    @override_waffle_flag(COURSE_UPDATE_WAFFLE_FLAG, True)
+    def test_course_is_loaded_once(self):
+        resolver = self.create_resolver()
+        CourseEnrollmentFactory(course_id=self.course.id, user=UserFactory.create(), mode=u'audit')
+        with patch('openedx.core.djangoapps.schedules.resolvers.get_schedules_with_due_date') as mock_get_schedules:
+            mock_get_schedules.return_value = Schedule.objects.all()
+            with patch.object(self.store, 'get_course', wraps=self.store.get_course) as mock_get_course:
+                schedules = list(resolver.get_schedules())
+        self.assertEqual(len(schedules), 2)
+        mock_get_course.assert_called_once_with(self.course.id, depth=1)
+
+    @override_settings(SCHEDULES_SEND_BATCH_SIZE=10)
+    @override_waffle_flag(COURSE_UPDATE_WAFFLE_FLAG, True)
+    def test_messages_are_queued_in_batches(self):
+        resolver = self.create_resolver()
+        CourseEnrollmentFactory(course_id=self.course.id, user=UserFactory.create(), mode=u'audit')
+        with patch('openedx.core.djangoapps.schedules.resolvers.get_schedules_with_due_date') as mock_get_schedules:
+            mock_get_schedules.return_value = Schedule.objects.all()
+            resolver.send()
+        resolver.async_send_task.apply_async.assert_called_once()
+        site_id, msg_strs = resolver.async_send_task.apply_async.call_args[0][0]
+        self.assertEqual(site_id, self.site_config.site.id)
+        self.assertEqual(len(msg_strs), 2)